@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+artifact_cache - 按内容比对的部署产物增量传输
+
+连接时启用同步或zsh配置时，proftpd.tar.gz、.zshrc、.p10k.zsh 每次都会被
+重新上传，即使远端已经是完全相同的内容。这里在传输前：
+
+1. 计算本地产物的sha256
+2. 向会话发送一条探测命令，一次取回所有目标路径的sha256
+3. 只传输不一致或缺失的产物
+
+是否需要传输只看远端的实际内容，不在本地记录部署历史。探测无法完成时
+（会话无法跟踪命令等）传输全部产物：容器重建后上次部署的文件可能已经不在了。
+"""
+
+import hashlib
+import re
+import shlex
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pane_stream import send_wrapped_command, wait_for_command
+from pane_transfer import PaneTransfer
+
+# 远端探测命令的超时时间（秒）
+PROBE_TIMEOUT = 10
+
+_PROBE_LINE = re.compile(r'^([0-9a-f]{64})\s+\*?(.+)$')
+
+
+@dataclass
+class Artifact:
+    """一个需要部署到远端的产物"""
+    remote_path: str  # 相对于会话当前目录的路径
+    content: bytes
+    mode: Optional[str] = None
+    digest: str = field(init=False)
+
+    def __post_init__(self):
+        self.digest = hashlib.sha256(self.content).hexdigest()
+
+    @classmethod
+    def from_file(cls, local_path, remote_path: str, mode: Optional[str] = None) -> 'Artifact':
+        """从本地文件构建产物"""
+        with open(local_path, 'rb') as f:
+            return cls(remote_path, f.read(), mode)
+
+
+@dataclass
+class ArtifactSyncResult:
+    """产物同步结果"""
+    success: bool
+    transferred: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    probe: str = ""  # remote / none（探测未完成，全部传输）
+
+
+def probe_command(remote_paths: List[str]) -> str:
+    """一次计算所有目标路径sha256的远端命令，缺失的文件不输出"""
+    paths = ' '.join(shlex.quote(path) for path in remote_paths)
+    return f'sha256sum {paths} 2>/dev/null || shasum -a 256 {paths} 2>/dev/null; true'
+
+
+def parse_probe_output(output: str) -> Dict[str, str]:
+    """解析 `sha256sum` 输出为 {路径: sha256}"""
+    digests = {}
+    for line in output.splitlines():
+        match = _PROBE_LINE.match(line.strip())
+        if match:
+            digests[match.group(2)] = match.group(1)
+    return digests
+
+
+def probe_remote_digests(session_name: str, remote_paths: List[str]) -> Optional[Dict[str, str]]:
+    """探测远端现有文件的sha256；探测无法完成时返回None"""
+    sentinel, stream, start_offset = send_wrapped_command(session_name, probe_command(remote_paths))
+    completion = wait_for_command(session_name, sentinel, stream, start_offset, PROBE_TIMEOUT)
+    if not completion.completed or completion.output is None or completion.truncated:
+        return None
+    return parse_probe_output(completion.output)
+
+
+def sync_artifacts(session_name: str, artifacts: List[Artifact]) -> ArtifactSyncResult:
+    """
+    把产物同步到会话当前所在机器，只传输远端不一致的部分
+
+    Args:
+        session_name: tmux会话名称（已位于产物相对路径的基准目录）
+        artifacts: 要部署的产物
+    """
+    result = ArtifactSyncResult(success=True)
+    remote = probe_remote_digests(session_name, [artifact.remote_path for artifact in artifacts])
+    if remote is not None:
+        result.probe = "remote"
+    else:
+        remote = {}
+        result.probe = "none"
+
+    transfer = PaneTransfer(session_name)
+    for artifact in artifacts:
+        if remote.get(artifact.remote_path) == artifact.digest:
+            result.skipped.append(artifact.remote_path)
+            continue
+        sent = transfer.send_bytes(artifact.content, artifact.remote_path, artifact.mode)
+        if sent.success:
+            result.transferred.append(artifact.remote_path)
+        else:
+            result.failed[artifact.remote_path] = sent.message
+            result.success = False
+    return result
@@ -10,12 +10,15 @@ AutoSyncManager - 自动同步管理器
 
 import os
 import time
-import base64
-import subprocess
 from pathlib import Path
 from typing import Dict, Any, Tuple, Optional
 from dataclasses import dataclass
 
+from tmux_client import tmux_run
+from pane_stream import send_wrapped_command, wait_for_command
+from artifact_cache import Artifact, sync_artifacts
+from path_filter import compile_path_filter
+
 def log_output(message: str, level: str = "INFO"):
     """日志输出函数"""
     import sys
@@ -48,6 +51,11 @@ class SyncConfig:
         if self.exclude_patterns is None:
             self.exclude_patterns = ["*.pyc", "__pycache__", ".git", "node_modules", ".DS_Store"]
 
+    @property
+    def path_filter(self):
+        """编译后的包含/排除规则"""
+        return compile_path_filter(self.sync_patterns, self.exclude_patterns)
+
 class AutoSyncManager:
     """自动同步管理器"""
     
@@ -133,18 +141,18 @@ class AutoSyncManager:
             
             # 创建目录命令
             create_cmd = f"mkdir -p {remote_workspace}"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, create_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, create_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(1)
             
             # 验证目录创建
             check_cmd = f"ls -la {remote_workspace} && echo 'WORKSPACE_CREATED'"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'WORKSPACE_CREATED' in result.stdout:
                 log_output("✅ 远程工作目录创建成功", "SUCCESS")
@@ -162,74 +170,28 @@ class AutoSyncManager:
             
             # 切换到远程工作目录
             cd_cmd = f"cd {remote_workspace}"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, cd_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(1)
-            
-            # 使用base64编码传输proftpd.tar.gz
-            log_output("📤 使用base64编码传输proftpd.tar.gz...", "INFO")
-            
-            # 读取文件并base64编码
-            with open(self.proftpd_source, 'rb') as f:
-                file_content = f.read()
+            sentinel, stream, start_offset = send_wrapped_command(self.session_name, cd_cmd)
+            wait_for_command(self.session_name, sentinel, stream, start_offset, timeout=5)
             
-            encoded_content = base64.b64encode(file_content).decode('utf-8')
+            # 通过会话传输通道（粘贴缓冲区+sha256校验）传输proftpd.tar.gz，远端已有相同内容时跳过
+            log_output("📤 通过会话传输proftpd.tar.gz...", "INFO")
+            sync_result = sync_artifacts(self.session_name, [Artifact.from_file(self.proftpd_source, "proftpd.tar.gz")])
             
-            # 分块传输（避免命令行长度限制）
-            chunk_size = 1000
-            chunks = [encoded_content[i:i+chunk_size] for i in range(0, len(encoded_content), chunk_size)]
-            
-            log_output(f"📤 分{len(chunks)}块传输文件...", "INFO")
-            
-            # 清空目标文件
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, 'rm -f proftpd.tar.gz.b64', 'Enter'],
-                         capture_output=True)
-            time.sleep(1)
-            
-            # 逐块写入
-            for i, chunk in enumerate(chunks):
-                if i == 0:
-                    cmd = f"echo '{chunk}' > proftpd.tar.gz.b64"
+            if sync_result.success:
+                if sync_result.skipped:
+                    log_output("⏭️ 远端proftpd.tar.gz与本地一致，跳过上传", "SUCCESS")
                 else:
-                    cmd = f"echo '{chunk}' >> proftpd.tar.gz.b64"
-                
-                subprocess.run(['tmux', 'send-keys', '-t', self.session_name, cmd, 'Enter'],
-                             capture_output=True)
-                time.sleep(0.1)
-                
-                # 显示进度
-                if i % 100 == 0:
-                    progress = int((i + 1) / len(chunks) * 100)
-                    log_output(f"📤 传输进度: {progress}%", "INFO")
-            
-            # 解码文件
-            log_output("🔄 解码文件...", "INFO")
-            decode_cmd = "base64 -d proftpd.tar.gz.b64 > proftpd.tar.gz && rm proftpd.tar.gz.b64"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, decode_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(3)
-            
-            # 验证文件传输
-            check_cmd = "ls -la proftpd.tar.gz && echo 'PROFTPD_UPLOADED'"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(2)
-            
-            result = subprocess.run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
-                                  capture_output=True, text=True)
-            
-            if 'PROFTPD_UPLOADED' in result.stdout:
-                log_output("✅ proftpd.tar.gz上传成功", "SUCCESS")
+                    log_output("✅ proftpd.tar.gz上传成功", "SUCCESS")
                 
                 # 解压文件
                 log_output("📦 解压proftpd.tar.gz...", "INFO")
                 extract_cmd = "tar -xzf proftpd.tar.gz && echo 'PROFTPD_EXTRACTED'"
-                subprocess.run(['tmux', 'send-keys', '-t', self.session_name, extract_cmd, 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', self.session_name, extract_cmd, 'Enter'],
+                         capture_output=True)
                 time.sleep(3)
                 
-                result = subprocess.run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 if 'PROFTPD_EXTRACTED' in result.stdout:
                     log_output("✅ proftpd解压成功", "SUCCESS")
@@ -237,7 +199,7 @@ class AutoSyncManager:
                 else:
                     return False, "proftpd解压失败"
             else:
-                return False, "proftpd.tar.gz上传失败"
+                return False, f"proftpd.tar.gz上传失败: {sync_result.failed.get('proftpd.tar.gz')}"
                 
         except Exception as e:
             return False, f"部署proftpd异常: {str(e)}"
@@ -249,20 +211,20 @@ class AutoSyncManager:
             
             # 进入proftpd目录
             cd_cmd = "cd proftpd"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, cd_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, cd_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(1)
             
             # 执行初始化脚本
             log_output("🔧 执行初始化脚本...", "INFO")
             init_cmd = f"bash ./init.sh {sync_config.remote_workspace}"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, init_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, init_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(5)
             
             # 检查初始化结果
-            result = subprocess.run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
+                              capture_output=True, text=True)
             
             log_output("📋 初始化脚本输出:", "INFO")
             # 显示最后几行输出
@@ -274,18 +236,18 @@ class AutoSyncManager:
             # 启动proftpd服务
             log_output("🚀 启动proftpd服务...", "INFO")
             start_cmd = f"bash ./start.sh"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, start_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, start_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(3)
             
             # 验证服务启动
             check_cmd = f"netstat -tlnp | grep {sync_config.ftp_port} && echo 'PROFTPD_RUNNING'"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'PROFTPD_RUNNING' in result.stdout or str(sync_config.ftp_port) in result.stdout:
                 log_output(f"✅ proftpd服务已启动，监听端口: {sync_config.ftp_port}", "SUCCESS")
@@ -317,7 +279,7 @@ class AutoSyncManager:
                 "localPath": sync_config.local_workspace or os.getcwd(),
                 "uploadOnSave": True,
                 "syncMode": "full",
-                "ignore": sync_config.exclude_patterns
+                "ignore": sync_config.path_filter.sftp_ignore()
             }
             
             # 保存配置文件
@@ -358,18 +320,18 @@ class AutoSyncManager:
             
             # 查找并停止proftpd进程
             stop_cmd = "pkill -f proftpd"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, stop_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, stop_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
             # 验证服务停止
             check_cmd = f"netstat -tlnp | grep {self.sync_config.ftp_port} || echo 'PROFTPD_STOPPED'"
-            subprocess.run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, check_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', self.session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'PROFTPD_STOPPED' in result.stdout:
                 log_output("✅ proftpd服务已停止", "SUCCESS")
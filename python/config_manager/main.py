@@ -6,6 +6,9 @@ from typing import Dict, Optional, Tuple, Any, List
 from pathlib import Path
 import getpass
 
+from config_store import get_config_store, invalidate_config, thaw
+from path_filter import normalize_patterns
+
 try:
     from colorama import init, Fore, Style
     init(autoreset=True)
@@ -113,9 +116,8 @@ class EnhancedConfigManager:
     def get_existing_servers(self) -> dict:
         if not self.config_path.exists(): return {}
         try:
-            with self.config_path.open('r', encoding='utf-8') as f:
-                content = f.read()
-            return yaml.safe_load(content).get('servers', {}) if content and content.strip() else {}
+            # 解析结果由ConfigStore缓存，这里返回可修改的副本
+            return thaw(get_config_store(self.config_path).get_servers())
         except Exception:
             return {}
 
@@ -135,6 +137,7 @@ class EnhancedConfigManager:
         config_path = self.config_path
         with open(config_path, 'w', encoding='utf-8') as f:
             yaml.safe_dump(final_cfg, f, allow_unicode=True)
+        invalidate_config(config_path)
         return True
 
     # 下面补充所有测试用例依赖的接口（占位实现，后续可完善）
@@ -452,6 +455,7 @@ class EnhancedConfigManager:
             servers = {name: config}
             with open(self.config_path, 'w', encoding='utf-8') as f:
                 yaml.safe_dump({'servers': servers}, f, allow_unicode=True)
+            invalidate_config(self.config_path)
         return {'success': True, 'updated': True, 'config': config}
 
     def mcp_guided_setup(self, server_name, host, username, port, connection_type, description):
@@ -521,7 +525,7 @@ class EnhancedConfigManager:
         if label == "排除":
             self.colored_print(f"\n🚫 **排除模式说明**:", Fore.CYAN)
             self.colored_print("指定哪些文件或目录不需要同步（避免同步不必要的文件）", Fore.WHITE)
-            self.colored_print("💡 示例: *.pyc, __pycache__, .git, node_modules", Fore.YELLOW)
+            self.colored_print("💡 示例: *.pyc, __pycache__, .git, node_modules, build/ (可用逗号分隔一次输入多个)", Fore.YELLOW)
             self.colored_print("💡 建议: 直接回车使用默认设置", Fore.YELLOW)
             if patterns:
                 self.colored_print(f"📋 当前默认设置: {', '.join(patterns)}", Fore.GREEN)
@@ -531,8 +535,7 @@ class EnhancedConfigManager:
                 val = self.smart_input(f"请输入排除模式（回车结束）", default="")
                 if not val:
                     break
-                if val not in patterns:
-                    patterns.append(val)
+                patterns = list(normalize_patterns(patterns + val.split(',')))
         
         return patterns
 
@@ -595,6 +598,7 @@ class EnhancedConfigManager:
         try:
             with self.config_path.open('w', encoding='utf-8') as f:
                 yaml.safe_dump(config, f, allow_unicode=True)
+            invalidate_config(self.config_path)
         except Exception:
             print(f"警告：保存配置文件失败: {self.config_path}", file=sys.stderr)
 
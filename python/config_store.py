@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+ConfigStore - 进程内共享的配置文件解析缓存
+
+配置文件只在内容变化时解析一次，解析结果冻结为只读记录后在各管理器之间
+共享，查询服务器配置只是字典访问，不再每次都打开并解析YAML。
+
+失效判断基于文件签名 (mtime_ns, size, inode)，每次查询只需一次stat；
+Linux上额外用inotify监听配置目录，文件被写入或替换时在后台线程中
+提前重新解析，下一次查询直接命中新结果。
+"""
+
+import os
+import struct
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import yaml
+
+from fs_watch import get_inotify_libc
+
+
+class FrozenDict(dict):
+    """只读字典：可以像普通dict一样读取和json序列化，但不能修改"""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("配置记录是只读的，请先调用thaw()获取可修改的副本")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self) -> dict:
+        return dict(self)
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> dict:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """递归冻结解析结果：dict转为FrozenDict，list转为tuple"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """递归生成可修改的副本：FrozenDict转为dict，tuple转为list"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+# 冻结记录可以直接yaml.dump / yaml.safe_dump
+yaml.representer.SafeRepresenter.add_representer(FrozenDict, yaml.representer.SafeRepresenter.represent_dict)
+yaml.representer.Representer.add_representer(FrozenDict, yaml.representer.SafeRepresenter.represent_dict)
+
+_EMPTY = FrozenDict()
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """文件签名 (mtime_ns, size, inode)，文件不存在时为None"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except OSError:
+        return None
+
+
+class _InotifyWatcher:
+    """监听目录中某个文件的写入/替换/删除事件（仅Linux，基于libc的inotify）"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_IGNORED = 0x00008000
+    IN_CLOEXEC = 0o2000000
+
+    _EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, path: str, callback: Callable[[], None]):
+        self.directory, self.filename = os.path.split(os.path.abspath(path))
+        self.callback = callback
+        self._fd = -1
+
+    def start(self) -> bool:
+        """开始监听，平台不支持时返回False"""
+        try:
+            libc = get_inotify_libc()
+        except (OSError, AttributeError):
+            return False
+
+        fd = libc.inotify_init1(self.IN_CLOEXEC)
+        if fd < 0:
+            return False
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM
+                | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE)
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), mask) < 0:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        return True
+
+    def _read_loop(self):
+        target = os.fsencode(self.filename)
+        try:
+            while True:
+                data = os.read(self._fd, 4096)
+                if not data:
+                    return
+                offset = 0
+                changed = False
+                while offset + self._EVENT_HEADER.size <= len(data):
+                    _, mask, _, name_len = self._EVENT_HEADER.unpack_from(data, offset)
+                    offset += self._EVENT_HEADER.size
+                    name = data[offset:offset + name_len].rstrip(b'\0')
+                    offset += name_len
+                    if mask & self.IN_IGNORED:
+                        # 目录被删除，监听自动失效
+                        return
+                    if name == target:
+                        changed = True
+                if changed:
+                    self.callback()
+        except OSError:
+            return
+        finally:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+
+
+class ConfigStore:
+    """单个配置文件的解析缓存"""
+
+    def __init__(self, config_path: str, watch: bool = True):
+        self.config_path = str(config_path)
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._config: FrozenDict = _EMPTY
+        self._version = 0
+        self._loaded = False
+        self._watching = False
+        self.stats = {'loads': 0, 'hits': 0}
+        if watch:
+            self._watching = _InotifyWatcher(self.config_path, self._on_file_event).start()
+
+    @property
+    def is_watching(self) -> bool:
+        """是否已启用inotify监听"""
+        return self._watching
+
+    def snapshot(self) -> Tuple[int, FrozenDict]:
+        """
+        获取当前配置及其版本号
+
+        版本号在每次重新解析后递增，调用方可以据此判断自己持有的派生数据
+        是否需要重建。
+        """
+        signature = _file_signature(self.config_path)
+        with self._lock:
+            if self._loaded and signature == self._signature:
+                self.stats['hits'] += 1
+                return self._version, self._config
+            return self._reload_locked(signature)
+
+    def get_config(self) -> FrozenDict:
+        """获取整个配置（只读）"""
+        return self.snapshot()[1]
+
+    def get_servers(self) -> FrozenDict:
+        """获取全部服务器配置（只读）"""
+        return self.get_config().get('servers') or _EMPTY
+
+    def get_server(self, server_name: str) -> Optional[FrozenDict]:
+        """获取单个服务器配置（只读），不存在时返回None"""
+        return self.get_servers().get(server_name)
+
+    @property
+    def version(self) -> int:
+        """当前配置版本号"""
+        return self.snapshot()[0]
+
+    def invalidate(self):
+        """丢弃缓存，下次查询时重新解析（本进程写入配置文件后调用）"""
+        with self._lock:
+            self._loaded = False
+
+    def _reload_locked(self, signature: Optional[Tuple[int, int, int]]) -> Tuple[int, FrozenDict]:
+        if signature is None:
+            config = _EMPTY
+        else:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                parsed = yaml.safe_load(f)
+            if parsed is not None and not isinstance(parsed, dict):
+                raise ValueError(f"配置文件顶层必须是映射: {self.config_path}")
+            config = freeze(parsed or {})
+            # 解析期间文件可能又被修改，以解析前的签名为准，下次查询会再次检测到变化
+        self._config = config
+        self._signature = signature
+        self._version += 1
+        self._loaded = True
+        self.stats['loads'] += 1
+        return self._version, self._config
+
+    def _on_file_event(self):
+        # 文件被写入或替换：后台提前解析，解析失败（例如编辑器写到一半）留给下次查询处理
+        try:
+            self.snapshot()
+        except Exception:
+            self.invalidate()
+
+
+_stores: Dict[str, ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _normalize_path(config_path) -> str:
+    return os.path.abspath(os.path.expanduser(str(config_path)))
+
+
+def get_config_store(config_path) -> ConfigStore:
+    """获取配置文件对应的共享ConfigStore"""
+    path = _normalize_path(config_path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ConfigStore(path)
+            _stores[path] = store
+        return store
+
+
+def invalidate_config(config_path):
+    """写入配置文件后调用，确保同一mtime精度内的修改也能被读到"""
+    path = _normalize_path(config_path)
+    with _stores_lock:
+        store = _stores.get(path)
+    if store is not None:
+        store.invalidate()
@@ -15,13 +15,22 @@ import sys
 import time
 import subprocess
 import threading
-import yaml
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
 import re
 from enum import Enum
 
+from tmux_client import list_sessions, tmux_run
+from config_store import get_config_store
+from server_record import get_server_records
+from ssh_pool import close_ssh_master
+from pane_stream import reset_pane_stream, send_raw_command, send_wrapped_command, wait_for_command
+from state_store import get_state_store
+from session_probe import invalidate_probe, probe_session
+
 
 def log_output(message: str, level: str = "INFO"):
     """增强的日志输出"""
@@ -225,7 +234,7 @@ class RelayConnector:
             
             # 步骤1: 启动relay-cli (严格遵循规则：不接任何参数)
             log_output("📡 启动 relay-cli...", "INFO")
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, 'relay-cli', 'Enter'],
                 capture_output=True, text=True
             )
@@ -270,7 +279,7 @@ class RelayConnector:
         while time.time() - start_time < timeout:
             try:
                 # 获取当前输出
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-p', '-t', session_name],
                     capture_output=True, text=True, check=True
                 )
@@ -328,7 +337,7 @@ class RelayConnector:
         
         try:
             # 发送SSH命令
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, ssh_cmd, 'Enter'],
                 capture_output=True, check=True
             )
@@ -366,7 +375,7 @@ class RelayConnector:
         
         while time.time() - start_time < timeout:
             try:
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-p', '-t', session_name],
                     capture_output=True, text=True, check=True
                 )
@@ -398,7 +407,7 @@ class SSHConnector:
             log_output(f"🔗 开始SSH连接: {server_config.host}", "INFO")
             
             # 发送SSH命令
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, ssh_cmd, 'Enter'],
                 capture_output=True, check=True
             )
@@ -431,7 +440,7 @@ class SSHConnector:
         
         while time.time() - start_time < timeout:
             try:
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-p', '-t', session_name],
                     capture_output=True, text=True, check=True
                 )
@@ -481,7 +490,7 @@ class DockerManager:
             
             # 发送docker exec命令
             docker_cmd = f"docker exec -it {container_name} {shell}"
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, docker_cmd, 'Enter'],
                 capture_output=True, check=True
             )
@@ -515,13 +524,13 @@ class DockerManager:
         while time.time() - start_time < timeout:
             try:
                 # 发送测试命令
-                subprocess.run(
+                tmux_run(
                     ['tmux', 'send-keys', '-t', session_name, 'echo "CONTAINER_CHECK_$(hostname)"', 'Enter'],
                     capture_output=True
                 )
                 time.sleep(2)
                 
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-p', '-t', session_name],
                     capture_output=True, text=True, check=True
                 )
@@ -543,9 +552,17 @@ class ConnectionManager:
     
     def __init__(self, config_path: Optional[str] = None):
         self.config_path = self._find_config_file() if not config_path else config_path
+        self._config_version = 0
         self.servers = self._load_servers()
         log_output("🚀 新一代连接管理器已初始化", "SUCCESS")
     
+    def reload_if_changed(self) -> bool:
+        """配置文件变化时重新加载服务器配置"""
+        if get_config_store(self.config_path).version == self._config_version:
+            return False
+        self.servers = self._load_servers()
+        return True
+    
     def _find_config_file(self) -> str:
         """查找配置文件 - 统一使用 ~/.remote-terminal/config.yaml"""
         user_config_dir = Path.home() / ".remote-terminal"
@@ -566,33 +583,26 @@ class ConnectionManager:
         servers = {}
         
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+            self._config_version, records = get_server_records(self.config_path)
             
-            servers_config = config.get('servers', {})
-            for name, server_data in servers_config.items():
+            for name, record in records.items():
                 # 解析连接类型
-                if server_data.get('type') == 'script_based':
-                    connection_config = server_data.get('specs', {}).get('connection', {})
-                    tool = connection_config.get('tool', 'ssh')
-                    connection_type = ConnectionType.RELAY if tool == 'relay-cli' else ConnectionType.SSH
+                if record.type == 'script_based':
+                    connection_type = ConnectionType.RELAY if record.connection_tool == 'relay-cli' else ConnectionType.SSH
                 else:
                     connection_type = ConnectionType.SSH
                 
-                # 解析Docker配置
-                docker_config = server_data.get('specs', {}).get('docker', {}) or server_data.get('docker', {})
-                
                 # 创建服务器配置
                 server_config = ServerConfig(
                     name=name,
-                    host=server_data.get('host', ''),
-                    username=server_data.get('username', ''),
+                    host=record.host,
+                    username=record.username,
                     connection_type=connection_type,
-                    port=server_data.get('port', 22),
-                    docker_container=docker_config.get('container_name'),
-                    docker_shell=docker_config.get('shell', 'zsh'),
-                    session_name=server_data.get('session', {}).get('name', f"{name}_session"),
-                    specs=server_data.get('specs', {})
+                    port=record.port,
+                    docker_container=record.docker_container,
+                    docker_shell=record.docker_shell,
+                    session_name=record.session_name,
+                    specs=record.raw.get('specs', {})
                 )
                 
                 servers[name] = server_config
@@ -622,10 +632,11 @@ class ConnectionManager:
             if server_config.docker_container:
                 log_output(f"🐳 Docker容器: {server_config.docker_container}", "INFO")
             
-            # 步骤1: 检查现有连接
+            # 步骤1: 检查现有连接（总是探测）
             if not force_recreate and self._check_existing_connection(session_name):
                 log_output("✅ 发现现有连接，验证状态...", "INFO")
                 if self._verify_connection_health(session_name, server_config):
+                    self._record_verified(server_name, server_config)
                     return ConnectionResult(
                         success=True,
                         message="连接已存在且健康",
@@ -661,6 +672,7 @@ class ConnectionManager:
             
             # 步骤5: 显示连接信息
             self._show_connection_summary(server_name, session_name, server_config)
+            self._record_verified(server_name, server_config)
             
             return ConnectionResult(
                 success=True,
@@ -681,10 +693,21 @@ class ConnectionManager:
                 status=ConnectionStatus.ERROR
             )
     
+    def _record_verified(self, server_name: str, server_config: ServerConfig,
+                         session_id: Optional[str] = None):
+        """持久化验证通过的连接，重启后的进程可以直接信任"""
+        try:
+            get_state_store().record_verified(server_name, server_config.session_name,
+                                              host=server_config.host,
+                                              container=server_config.docker_container or "",
+                                              session_id=session_id)
+        except Exception as e:
+            log_output(f"保存连接状态失败: {str(e)}", "WARNING")
+    
     def _check_existing_connection(self, session_name: str) -> bool:
         """检查现有连接是否存在"""
         try:
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'has-session', '-t', session_name],
                 capture_output=True
             )
@@ -693,51 +716,25 @@ class ConnectionManager:
             return False
     
     def _verify_connection_health(self, session_name: str, server_config: ServerConfig) -> bool:
-        """验证连接健康状态"""
-        try:
-            # 发送测试命令
-            subprocess.run(
-                ['tmux', 'send-keys', '-t', session_name, 'echo "HEALTH_CHECK_$(date +%s)"', 'Enter'],
-                capture_output=True
-            )
-            time.sleep(2)
-            
-            # 获取输出
-            result = subprocess.run(
-                ['tmux', 'capture-pane', '-p', '-t', session_name],
-                capture_output=True, text=True
-            )
-            
-            if result.returncode != 0:
-                return False
-            
-            output = result.stdout
-            
-            # 检查是否有响应
-            if 'HEALTH_CHECK_' in output:
-                # 检查是否在正确的环境中
-                if server_config.connection_type == ConnectionType.RELAY:
-                    # 对于relay连接，检查是否在目标服务器上
-                    return server_config.host.split('.')[0] in output
-                else:
-                    # 对于SSH连接，检查是否不在本地
-                    return not any(local_indicator in output for local_indicator in 
-                                 ['MacBook-Pro', 'localhost', 'Mac-Studio'])
-            
-            return False
-            
-        except:
+        """验证连接健康状态：探测命令有回应，且会话位于目标环境中"""
+        probe = probe_session(session_name)
+        if not probe.alive:
             return False
+        if server_config.connection_type == ConnectionType.RELAY:
+            # 对于relay连接，检查是否在目标服务器上
+            return server_config.host.split('.')[0] in probe.hostname
+        # 对于SSH连接，检查是否不在本地
+        return not probe.is_local
     
     def _create_session(self, session_name: str, force_recreate: bool = False) -> ConnectionResult:
         """创建tmux会话"""
         try:
             if force_recreate:
                 # 强制删除现有会话
-                subprocess.run(['tmux', 'kill-session', '-t', session_name], capture_output=True)
+                tmux_run(['tmux', 'kill-session', '-t', session_name], capture_output=True)
             
             # 创建新会话
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'new-session', '-d', '-s', session_name],
                 capture_output=True, text=True
             )
@@ -750,6 +747,8 @@ class ConnectionManager:
                 )
             
             log_output(f"✅ 创建tmux会话: {session_name}", "SUCCESS")
+            reset_pane_stream(session_name)
+            invalidate_probe(session_name)
             return ConnectionResult(
                 success=True,
                 message="会话创建成功",
@@ -792,9 +791,12 @@ class ConnectionManager:
             )
         
         session_name = self.servers[server_name].session_name
+        close_ssh_master(server_name)
+        get_state_store().remove(server_name)
+        invalidate_probe(session_name)
         
         try:
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'kill-session', '-t', session_name],
                 capture_output=True, text=True
             )
@@ -820,8 +822,15 @@ class ConnectionManager:
                 status=ConnectionStatus.ERROR
             )
     
-    def get_status(self, server_name: str) -> ConnectionResult:
-        """获取连接状态"""
+    def get_status(self, server_name: str, sessions: Optional[Dict[str, Any]] = None) -> ConnectionResult:
+        """
+        获取连接状态
+        
+        Args:
+            server_name: 服务器名称
+            sessions: 已取回的tmux会话表（list_sessions的结果），提供时不再逐台查询会话是否存在
+                      及其创建时间；为None时逐台检查
+        """
         if server_name not in self.servers:
             return ConnectionResult(
                 success=False,
@@ -831,8 +840,19 @@ class ConnectionManager:
         
         server_config = self.servers[server_name]
         session_name = server_config.session_name
+        store = get_state_store()
         
-        if not self._check_existing_connection(session_name):
+        session = sessions.get(session_name) if sessions is not None else None
+        if sessions is not None and session is None:
+            store.remove(server_name)
+            return ConnectionResult(
+                success=True,
+                message="未连接",
+                status=ConnectionStatus.DISCONNECTED
+            )
+        
+        if session is None and not self._check_existing_connection(session_name):
+            store.remove(server_name)
             return ConnectionResult(
                 success=True,
                 message="未连接",
@@ -840,6 +860,8 @@ class ConnectionManager:
             )
         
         if self._verify_connection_health(session_name, server_config):
+            self._record_verified(server_name, server_config,
+                                  session_id=session['created'] if session is not None else None)
             status = ConnectionStatus.READY
             message = "连接健康"
         else:
@@ -853,11 +875,23 @@ class ConnectionManager:
             status=status
         )
     
-    def list_servers(self) -> List[Dict[str, Any]]:
-        """列出所有服务器"""
+    def list_servers(self, max_parallel: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        列出所有服务器及其状态
+        
+        只调用一次tmux list-sessions判断所有会话是否存在并取得会话创建时间，
+        存在会话的服务器在线程池中并发探测（成功的探测结果有短时缓存）。
+        list-sessions失败时退回到逐台检查，不把所有服务器当作未连接。
+        """
+        sessions = list_sessions()
+        statuses = _run_for_servers(
+            list(self.servers),
+            lambda name: self.get_status(name, sessions=sessions),
+            max_parallel or DEFAULT_STATUS_PARALLELISM, None, None
+        )
         servers_info = []
         for name, config in self.servers.items():
-            status = self.get_status(name)
+            status = statuses[name]
             servers_info.append({
                 'name': name,
                 'host': config.host,
@@ -869,8 +903,16 @@ class ConnectionManager:
             })
         return servers_info
     
-    def execute_command(self, server_name: str, command: str) -> ConnectionResult:
-        """执行命令"""
+    def execute_command(self, server_name: str, command: str, raw: bool = False) -> ConnectionResult:
+        """
+        执行命令
+        
+        Args:
+            server_name: 服务器名称
+            command: 要执行的命令
+            raw: 原样发送，不加开始/结束标记（前台程序不是shell时使用，例如
+                 Python REPL、y/n提示），按输出稳定性判断完成，没有退出码
+        """
         if server_name not in self.servers:
             return ConnectionResult(
                 success=False,
@@ -889,28 +931,62 @@ class ConnectionManager:
                 )
             
             # 获取执行前的输出基线
-            baseline_result = subprocess.run(
+            baseline_result = tmux_run(
                 ['tmux', 'capture-pane', '-t', session_name, '-p'],
                 capture_output=True, text=True
             )
             baseline_output = baseline_result.stdout if baseline_result.returncode == 0 else ""
             
-            # 发送命令
-            subprocess.run(
-                ['tmux', 'send-keys', '-t', session_name, command, 'Enter'],
-                capture_output=True, check=True
-            )
+            if raw:
+                send_raw_command(session_name, command)
+                completion = None
+            else:
+                # 发送用开始/结束标记包裹的命令，结束标记携带真实退出码
+                sentinel, stream, start_offset = send_wrapped_command(session_name, command)
+                completion = wait_for_command(session_name, sentinel, stream, start_offset)
+            
+            if completion is None or not completion.tracked:
+                # 原样发送或无法跟踪结束标记时按输出稳定性判断
+                success, output = self._wait_for_command_completion(
+                    session_name, command, baseline_output
+                )
+                return ConnectionResult(
+                    success=success,
+                    message=output if success else "命令执行失败",
+                    status=ConnectionStatus.READY if success else ConnectionStatus.ERROR,
+                    details={'command': command, 'output': output}
+                )
             
-            # 等待命令完成
-            success, output = self._wait_for_command_completion(
-                session_name, command, baseline_output
-            )
+            # 输出取自开始/结束标记之间的字节，包含已滚出屏幕的部分
+            output = completion.output
+            if output is None:
+                output_result = tmux_run(
+                    ['tmux', 'capture-pane', '-t', session_name, '-p'],
+                    capture_output=True, text=True
+                )
+                output = output_result.stdout if output_result.returncode == 0 else ""
+            details = {
+                'command': command,
+                'output': output,
+                'exit_code': completion.exit_code,
+                'duration': completion.duration,
+                'truncated': completion.truncated
+            }
+            
+            if not completion.completed:
+                return ConnectionResult(
+                    success=False,
+                    message="命令执行超时",
+                    status=ConnectionStatus.ERROR,
+                    details=details
+                )
             
+            success = completion.exit_code == 0
             return ConnectionResult(
                 success=success,
-                message=output if success else "命令执行失败",
+                message=output if success else f"命令退出码: {completion.exit_code}",
                 status=ConnectionStatus.READY if success else ConnectionStatus.ERROR,
-                details={'command': command, 'output': output}
+                details=details
             )
             
         except Exception as e:
@@ -930,7 +1006,7 @@ class ConnectionManager:
             time.sleep(1)
             
             try:
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-t', session_name, '-p'],
                     capture_output=True, text=True
                 )
@@ -1026,11 +1102,12 @@ def get_server_status(server_name: str, config_path: Optional[str] = None) -> Co
         )
 
 
-def execute_server_command(server_name: str, command: str, config_path: Optional[str] = None) -> ConnectionResult:
+def execute_server_command(server_name: str, command: str, config_path: Optional[str] = None,
+                           raw: bool = False) -> ConnectionResult:
     """在服务器上执行命令 - MCP工具调用入口"""
     try:
         manager = create_connection_manager(config_path)
-        return manager.execute_command(server_name, command)
+        return manager.execute_command(server_name, command, raw=raw)
     except Exception as e:
         return ConnectionResult(
             success=False,
@@ -1140,14 +1217,14 @@ class EnvironmentManager:
     def _check_zsh_installed(self) -> bool:
         """检查zsh是否安装"""
         try:
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'which zsh', 'Enter'],
                 capture_output=True
             )
             time.sleep(1)
             
             # 获取输出检查
-            output = subprocess.run(
+            output = tmux_run(
                 ['tmux', 'capture-pane', '-t', self.session_name, '-p'],
                 capture_output=True, text=True
             ).stdout
@@ -1163,7 +1240,7 @@ class EnvironmentManager:
         try:
             # 尝试使用apt安装（Ubuntu/Debian）
             log_output("📦 正在安装zsh...", "INFO")
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'apt update && apt install -y zsh', 'Enter'],
                 capture_output=True
             )
@@ -1179,14 +1256,14 @@ class EnvironmentManager:
     def _check_oh_my_zsh_installed(self) -> bool:
         """检查oh-my-zsh是否安装"""
         try:
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'test -d ~/.oh-my-zsh && echo "EXISTS_OH_MY_ZSH" || echo "MISSING_OH_MY_ZSH"', 'Enter'],
                 capture_output=True
             )
             time.sleep(1)
             
             # 获取输出检查
-            output = subprocess.run(
+            output = tmux_run(
                 ['tmux', 'capture-pane', '-t', self.session_name, '-p'],
                 capture_output=True, text=True
             ).stdout
@@ -1201,7 +1278,7 @@ class EnvironmentManager:
         """安装oh-my-zsh"""
         try:
             log_output("📦 正在安装oh-my-zsh...", "INFO")
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'sh -c "$(curl -fsSL https://raw.githubusercontent.com/ohmyzsh/ohmyzsh/master/tools/install.sh)" "" --unattended', 'Enter'],
                 capture_output=True
             )
@@ -1217,14 +1294,14 @@ class EnvironmentManager:
     def _check_p10k_installed(self) -> bool:
         """检查P10k主题是否安装"""
         try:
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'test -d ~/.oh-my-zsh/themes/powerlevel10k && echo "EXISTS_P10K" || echo "MISSING_P10K"', 'Enter'],
                 capture_output=True
             )
             time.sleep(1)
             
             # 获取输出检查
-            output = subprocess.run(
+            output = tmux_run(
                 ['tmux', 'capture-pane', '-t', self.session_name, '-p'],
                 capture_output=True, text=True
             ).stdout
@@ -1239,7 +1316,7 @@ class EnvironmentManager:
         """安装P10k主题"""
         try:
             log_output("📦 正在安装P10k主题...", "INFO")
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'git clone --depth=1 https://github.com/romkatv/powerlevel10k.git ~/.oh-my-zsh/themes/powerlevel10k', 'Enter'],
                 capture_output=True
             )
@@ -1255,14 +1332,14 @@ class EnvironmentManager:
     def _check_config_exists(self, config_file: str) -> bool:
         """检查配置文件是否存在"""
         try:
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, f'test -f ~/{config_file} && echo "EXISTS_{config_file}" || echo "MISSING_{config_file}"', 'Enter'],
                 capture_output=True
             )
             time.sleep(1)
             
             # 获取输出检查
-            output = subprocess.run(
+            output = tmux_run(
                 ['tmux', 'capture-pane', '-t', self.session_name, '-p'],
                 capture_output=True, text=True
             ).stdout
@@ -1287,7 +1364,7 @@ class EnvironmentManager:
                     
                     # 步骤1: 先删除容器内的同名文件（如果存在）避免重命名问题
                     log_output(f"🗑️ 清理容器内现有的 {config_file}...", "DEBUG")
-                    subprocess.run(
+                    tmux_run(
                         ['tmux', 'send-keys', '-t', self.session_name, f'rm -f ~/{config_file}', 'Enter'],
                         capture_output=True
                     )
@@ -1303,14 +1380,14 @@ class EnvironmentManager:
                         log_output(f"✅ {config_file} 拷贝成功", "SUCCESS")
                         
                         # 步骤3: 验证文件确实存在且名称正确
-                        subprocess.run(
+                        tmux_run(
                             ['tmux', 'send-keys', '-t', self.session_name, f'ls -la ~/{config_file}', 'Enter'],
                             capture_output=True
                         )
                         time.sleep(1)
                         
                         # 获取验证结果
-                        verify_output = subprocess.run(
+                        verify_output = tmux_run(
                             ['tmux', 'capture-pane', '-t', self.session_name, '-p'],
                             capture_output=True, text=True
                         ).stdout
@@ -1343,14 +1420,14 @@ class EnvironmentManager:
         """切换到zsh环境"""
         try:
             log_output("🔄 切换到zsh环境", "INFO")
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', self.session_name, 'zsh', 'Enter'],
                 capture_output=True
             )
             time.sleep(2)
             
             # 检查是否成功切换
-            output = subprocess.run(
+            output = tmux_run(
                 ['tmux', 'capture-pane', '-t', self.session_name, '-p'],
                 capture_output=True, text=True
             ).stdout
@@ -1441,10 +1518,18 @@ class SimpleConnectionManager:
     
     def __init__(self, config_path: Optional[str] = None):
         self.config_path = self._find_config_file() if not config_path else config_path
+        self._config_version = 0
         self.servers = self._load_servers()
         self.guide = None  # 延迟初始化，每次连接时创建
         log_output("🚀 简化版连接管理器已初始化", "SUCCESS")
     
+    def reload_if_changed(self) -> bool:
+        """配置文件变化时重新加载服务器配置"""
+        if get_config_store(self.config_path).version == self._config_version:
+            return False
+        self.servers = self._load_servers()
+        return True
+    
     def _find_config_file(self) -> str:
         """查找配置文件 - 统一使用 ~/.remote-terminal/config.yaml"""
         user_config_dir = Path.home() / ".remote-terminal"
@@ -1465,39 +1550,29 @@ class SimpleConnectionManager:
         servers = {}
         
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+            self._config_version, records = get_server_records(self.config_path)
             
-            servers_config = config.get('servers', {})
-            for name, server_data in servers_config.items():
+            for name, record in records.items():
                 # 连接类型判断 - 优先使用配置文件中的connection_type
-                connection_type_str = server_data.get('connection_type', 'ssh')
+                connection_type_str = record.raw.get('connection_type', 'ssh')
                 if connection_type_str == 'relay':
                     connection_type = ConnectionType.RELAY
                 elif connection_type_str == 'relay_with_secondary':
                     connection_type = ConnectionType.RELAY_WITH_SECONDARY
                 elif connection_type_str == 'script_based':
-                    connection_config = server_data.get('specs', {}).get('connection', {})
-                    tool = connection_config.get('tool', 'ssh')
-                    connection_type = ConnectionType.RELAY if tool == 'relay-cli' else ConnectionType.SSH
+                    connection_type = ConnectionType.RELAY if record.connection_tool == 'relay-cli' else ConnectionType.SSH
                 else:
                     connection_type = ConnectionType.SSH
                 
-                # 简化的Docker配置 - 支持多种配置格式
-                docker_config = (
-                    server_data.get('specs', {}).get('docker', {}) or 
-                    server_data.get('docker', {}) or 
-                    server_data.get('docker_config', {})
-                )
-                
+                # Docker配置支持specs.docker、docker、docker_config多种格式，已在记录中归一
                 server_config = ServerConfig(
                     name=name,
-                    host=server_data.get('host', ''),
-                    username=server_data.get('username', ''),
+                    host=record.host,
+                    username=record.username,
                     connection_type=connection_type,
-                    docker_container=docker_config.get('container_name'),
-                    docker_shell=docker_config.get('shell', 'zsh'),
-                    session_name=server_data.get('session', {}).get('name', f"{name}_session")
+                    docker_container=record.docker_container,
+                    docker_shell=record.docker_shell,
+                    session_name=record.session_name
                 )
                 
                 servers[name] = server_config
@@ -1511,7 +1586,7 @@ class SimpleConnectionManager:
         """杀掉现有session（如果存在）"""
         try:
             # 检查session是否存在
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'has-session', '-t', session_name],
                 capture_output=True
             )
@@ -1519,7 +1594,7 @@ class SimpleConnectionManager:
             if result.returncode == 0:
                 # session存在，杀掉它
                 log_output(f"🔄 发现现有session {session_name}，正在清理...", "WARNING")
-                kill_result = subprocess.run(
+                kill_result = tmux_run(
                     ['tmux', 'kill-session', '-t', session_name],
                     capture_output=True
                 )
@@ -1542,7 +1617,7 @@ class SimpleConnectionManager:
     def _create_fresh_session(self, session_name: str) -> ConnectionResult:
         """创建全新的session"""
         try:
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'new-session', '-d', '-s', session_name],
                 capture_output=True, text=True
             )
@@ -1555,6 +1630,8 @@ class SimpleConnectionManager:
                 )
             
             log_output(f"✅ 创建新session: {session_name}", "SUCCESS")
+            reset_pane_stream(session_name)
+            invalidate_probe(session_name)
             return ConnectionResult(
                 success=True,
                 message="session创建成功",
@@ -1576,7 +1653,7 @@ class SimpleConnectionManager:
         """
         try:
             # 发送简单测试命令
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, 'echo "CONNECTION_TEST_OK"', 'Enter'],
                 capture_output=True
             )
@@ -1585,7 +1662,7 @@ class SimpleConnectionManager:
             time.sleep(1)
             
             # 获取输出
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'capture-pane', '-p', '-t', session_name],
                 capture_output=True, text=True
             )
@@ -1690,7 +1767,7 @@ class SimpleConnectionManager:
             log_output("📡 启动relay-cli（无参数）", "INFO")
             
             # 严格遵循规则：relay-cli 不接任何参数
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, 'relay-cli', 'Enter'],
                 capture_output=True
             )
@@ -1706,7 +1783,7 @@ class SimpleConnectionManager:
                 time.sleep(check_interval)
                 
                 # 获取当前输出
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-t', session_name, '-p'],
                     capture_output=True, text=True
                 )
@@ -1745,7 +1822,7 @@ class SimpleConnectionManager:
             
             # SSH到目标服务器
             log_output(f"🔗 SSH到目标服务器: {server_config.host}", "INFO")
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, f'ssh {server_config.host}', 'Enter'],
                 capture_output=True
             )
@@ -1780,8 +1857,7 @@ class SimpleConnectionManager:
             guide = SimpleInteractionGuide(session_name)
             
             # 获取二级跳板机配置
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+            config = get_config_store(self.config_path).get_config()
             
             servers_config = config.get('servers', {})
             server_data = servers_config.get(server_config.name, {})
@@ -1801,7 +1877,7 @@ class SimpleConnectionManager:
             log_output("📡 启动relay-cli（无参数）", "INFO")
             
             # 第一步：启动relay-cli
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, 'relay-cli', 'Enter'],
                 capture_output=True
             )
@@ -1816,7 +1892,7 @@ class SimpleConnectionManager:
             for i in range(0, max_wait, check_interval):
                 time.sleep(check_interval)
                 
-                result = subprocess.run(
+                result = tmux_run(
                     ['tmux', 'capture-pane', '-t', session_name, '-p'],
                     capture_output=True, text=True
                 )
@@ -1853,7 +1929,7 @@ class SimpleConnectionManager:
             # 第二步：SSH到二级跳板机
             log_output(f"🔗 SSH到二级跳板机: {secondary_host}", "INFO")
             ssh_cmd = f'ssh {secondary_username}@{secondary_host}'
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, ssh_cmd, 'Enter'],
                 capture_output=True
             )
@@ -1863,7 +1939,7 @@ class SimpleConnectionManager:
             secondary_password = secondary_config.get('password')
             if secondary_password:
                 log_output("🔐 输入二级跳板机密码", "INFO")
-                subprocess.run(
+                tmux_run(
                     ['tmux', 'send-keys', '-t', session_name, secondary_password, 'Enter'],
                     capture_output=True
                 )
@@ -1876,7 +1952,7 @@ class SimpleConnectionManager:
             # 第三步：从二级跳板机SSH到目标服务器
             log_output(f"🔗 从二级跳板机SSH到目标服务器: {server_config.host}", "INFO")
             target_ssh_cmd = f'ssh {server_config.username}@{server_config.host}'
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, target_ssh_cmd, 'Enter'],
                 capture_output=True
             )
@@ -1916,7 +1992,7 @@ class SimpleConnectionManager:
             log_output(f"🔗 SSH连接到: {server_config.host}", "INFO")
             
             ssh_cmd = f'ssh {server_config.username}@{server_config.host}'
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, ssh_cmd, 'Enter'],
                 capture_output=True
             )
@@ -1960,14 +2036,14 @@ class SimpleConnectionManager:
             
             # 步骤1: 检查容器是否存在
             check_cmd = f'docker ps -a --format "table {{.Names}}" | grep -w {container_name}'
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, check_cmd, 'Enter'],
                 capture_output=True
             )
             time.sleep(2)
             
             # 获取检查结果
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'capture-pane', '-t', session_name, '-p'],
                 capture_output=True, text=True
             )
@@ -1978,8 +2054,7 @@ class SimpleConnectionManager:
                 log_output(f"🔨 容器 {container_name} 不存在，正在创建...", "INFO")
                 
                 # 获取Docker配置
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f)
+                config = get_config_store(self.config_path).get_config()
                 
                 servers_config = config.get('servers', {})
                 server_data = servers_config.get(server_config.name, {})
@@ -2033,7 +2108,7 @@ class SimpleConnectionManager:
                 docker_run_str = ' '.join(docker_run_cmd)
                 log_output(f"🚀 创建容器命令: {docker_run_str}", "INFO")
                 
-                subprocess.run(
+                tmux_run(
                     ['tmux', 'send-keys', '-t', session_name, docker_run_str, 'Enter'],
                     capture_output=True
                 )
@@ -2046,7 +2121,7 @@ class SimpleConnectionManager:
                     time.sleep(check_interval)
                     
                     # 获取当前输出
-                    result = subprocess.run(
+                    result = tmux_run(
                         ['tmux', 'capture-pane', '-t', session_name, '-p'],
                         capture_output=True, text=True
                     )
@@ -2056,7 +2131,7 @@ class SimpleConnectionManager:
                     # 检查是否有交互式提示
                     if 'Choice [ynrq]:' in output or 'Choice [ynq]:' in output:
                         log_output("🔍 检测到Docker交互式提示，自动选择 'y'", "INFO")
-                        subprocess.run(
+                        tmux_run(
                             ['tmux', 'send-keys', '-t', session_name, 'y', 'Enter'],
                             capture_output=True
                         )
@@ -2089,7 +2164,7 @@ class SimpleConnectionManager:
             # 步骤2: 用bash进入docker环境
             log_output(f"🐳 进入Docker容器: {container_name}", "INFO")
             bash_cmd = f'docker exec -it {container_name} bash'
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, bash_cmd, 'Enter'],
                 capture_output=True
             )
@@ -2151,7 +2226,7 @@ class SimpleConnectionManager:
             # 步骤4: 如果不自动配置，但用户偏好不是bash，直接切换
             if not server_config.auto_configure_shell and server_config.preferred_shell != "bash":
                 log_output(f"🔄 切换到 {server_config.preferred_shell}", "INFO")
-                subprocess.run(
+                tmux_run(
                     ['tmux', 'send-keys', '-t', session_name, server_config.preferred_shell, 'Enter'],
                     capture_output=True
                 )
@@ -2162,7 +2237,7 @@ class SimpleConnectionManager:
             
             # 简单验证是否成功进入容器
             time.sleep(1)
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'capture-pane', '-t', session_name, '-p'],
                 capture_output=True, text=True
             )
@@ -2219,6 +2294,9 @@ class SimpleConnectionManager:
             )
         
         session_name = self.servers[server_name].session_name
+        close_ssh_master(server_name)
+        get_state_store().remove(server_name)
+        invalidate_probe(session_name)
         
         if self._kill_existing_session(session_name):
             return ConnectionResult(
@@ -2245,7 +2323,7 @@ class SimpleConnectionManager:
         session_name = self.servers[server_name].session_name
         
         try:
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'has-session', '-t', session_name],
                 capture_output=True
             )
@@ -2285,8 +2363,8 @@ class SimpleConnectionManager:
             for name, config in self.servers.items()
         ]
     
-    def execute_command(self, server_name: str, command: str) -> ConnectionResult:
-        """执行命令（简化版）"""
+    def execute_command(self, server_name: str, command: str, raw: bool = False) -> ConnectionResult:
+        """执行命令（简化版，总是原样发送，raw参数只为与完整版接口一致）"""
         if server_name not in self.servers:
             return ConnectionResult(
                 success=False,
@@ -2298,7 +2376,7 @@ class SimpleConnectionManager:
         
         try:
             # 检查session是否存在
-            result = subprocess.run(
+            result = tmux_run(
                 ['tmux', 'has-session', '-t', session_name],
                 capture_output=True
             )
@@ -2311,7 +2389,7 @@ class SimpleConnectionManager:
                 )
             
             # 执行命令
-            subprocess.run(
+            tmux_run(
                 ['tmux', 'send-keys', '-t', session_name, command, 'Enter'],
                 capture_output=True
             )
@@ -2351,6 +2429,28 @@ def create_connection_manager(config_path: Optional[str] = None, simple_mode: bo
         return ConnectionManager(config_path)
 
 
+# 进程级共享的管理器实例，键为(配置路径, 模式, HOME)
+_shared_managers: Dict[Tuple[Optional[str], bool, str], Any] = {}
+_shared_managers_lock = threading.Lock()
+
+
+def get_connection_manager(config_path: Optional[str] = None, simple_mode: bool = False) -> Any:
+    """
+    获取进程级共享的连接管理器
+    
+    首次调用时创建，之后复用同一实例；配置文件mtime变化时自动重新加载。
+    """
+    key = (config_path, simple_mode, str(Path.home()))
+    with _shared_managers_lock:
+        manager = _shared_managers.get(key)
+        if manager is None:
+            manager = create_connection_manager(config_path, simple_mode)
+            _shared_managers[key] = manager
+        else:
+            manager.reload_if_changed()
+        return manager
+
+
 # ===== 更新现有的函数支持简化模式 =====
 def connect_server(server_name: str, force_recreate: bool = False, config_path: Optional[str] = None, simple_mode: bool = False) -> ConnectionResult:
     """
@@ -2366,7 +2466,7 @@ def connect_server(server_name: str, force_recreate: bool = False, config_path:
         ConnectionResult: 连接结果
     """
     try:
-        manager = create_connection_manager(config_path, simple_mode)
+        manager = get_connection_manager(config_path, simple_mode)
         if simple_mode:
             return manager.connect(server_name)
         else:
@@ -2379,6 +2479,173 @@ def connect_server(server_name: str, force_recreate: bool = False, config_path:
         )
 
 
+# 批量连接时默认的最大并发数
+DEFAULT_CONNECT_PARALLELISM = 4
+
+# 批量执行命令时默认的最大并发数（只是向各会话发送按键并等待结束标记，可以更高）
+DEFAULT_BROADCAST_PARALLELISM = 16
+
+# 查询所有服务器状态时的最大并发探测数
+DEFAULT_STATUS_PARALLELISM = 16
+
+
+def _run_for_servers(server_names: List[str], action: Callable[[str], ConnectionResult],
+                     max_parallel: int, on_result: Optional[Callable[[str, ConnectionResult], None]],
+                     server_lock: Optional[Callable[[str], ContextManager]]) -> Dict[str, ConnectionResult]:
+    """在有上限的线程池中对多台服务器执行同一操作，按完成顺序回调，按输入顺序返回"""
+    names = list(dict.fromkeys(server_names))
+    results: Dict[str, ConnectionResult] = {}
+    if not names:
+        return results
+    
+    def run_one(server_name: str) -> ConnectionResult:
+        start_time = time.time()
+        try:
+            with server_lock(server_name) if server_lock is not None else nullcontext():
+                result = action(server_name)
+        except Exception as e:
+            result = ConnectionResult(
+                success=False,
+                message=f"操作异常: {str(e)}",
+                status=ConnectionStatus.ERROR
+            )
+        result.details = dict(result.details or {}, latency=round(time.time() - start_time, 3))
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(names))),
+                            thread_name_prefix="fanout") as executor:
+        futures = {executor.submit(run_one, name): name for name in names}
+        for future in as_completed(futures):
+            server_name = futures[future]
+            result = future.result()
+            results[server_name] = result
+            if on_result is not None:
+                try:
+                    on_result(server_name, result)
+                except Exception as e:
+                    log_output(f"批量操作回调异常: {str(e)}", "WARNING")
+    
+    return {name: results[name] for name in names}
+
+
+def connect_servers(server_names: List[str], max_parallel: int = DEFAULT_CONNECT_PARALLELISM,
+                    force_recreate: bool = False, config_path: Optional[str] = None,
+                    simple_mode: bool = False,
+                    on_result: Optional[Callable[[str, ConnectionResult], None]] = None,
+                    server_lock: Optional[Callable[[str], ContextManager]] = None) -> Dict[str, ConnectionResult]:
+    """
+    并发连接多台服务器
+    
+    每台服务器的握手、进入Docker和shell配置在独立线程中进行，总耗时接近
+    最慢的一台而不是各台之和。
+    
+    Args:
+        server_names: 服务器名称列表（重复的名称只连接一次）
+        max_parallel: 最大并发连接数
+        force_recreate: 是否强制重建（仅在复杂模式下生效）
+        config_path: 配置文件路径
+        simple_mode: 是否使用简化模式
+        on_result: 每台服务器完成时的回调 (server_name, result)，按完成顺序调用
+        server_lock: 返回服务器级锁的函数，避免与同一服务器上的其它操作交错
+    
+    Returns:
+        Dict[str, ConnectionResult]: 按输入顺序排列的连接结果，details中的latency为耗时
+    """
+    try:
+        manager = get_connection_manager(config_path, simple_mode)
+    except Exception as e:
+        return {name: ConnectionResult(success=False, message=f"连接异常: {str(e)}",
+                                       status=ConnectionStatus.ERROR)
+                for name in dict.fromkeys(server_names)}
+    
+    def connect_one(server_name: str) -> ConnectionResult:
+        if simple_mode:
+            return manager.connect(server_name)
+        return manager.connect(server_name, force_recreate)
+    
+    def report(server_name: str, result: ConnectionResult):
+        log_output(f"{'✅' if result.success else '❌'} {server_name}: {result.message}",
+                   "SUCCESS" if result.success else "ERROR")
+        if on_result is not None:
+            on_result(server_name, result)
+    
+    log_output(f"🚀 批量连接 {len(set(server_names))} 台服务器（并发 {max(1, max_parallel)}）", "INFO")
+    return _run_for_servers(server_names, connect_one, max_parallel, report, server_lock)
+
+
+def list_active_servers(config_path: Optional[str] = None, simple_mode: bool = False) -> List[str]:
+    """
+    列出当前存在tmux会话的服务器（只调用一次tmux list-sessions）
+    
+    Returns:
+        List[str]: 服务器名称列表
+    """
+    manager = get_connection_manager(config_path, simple_mode)
+    sessions = list_sessions()
+    if sessions is None:
+        # list-sessions失败，逐台检查
+        return [name for name, server in manager.servers.items()
+                if manager._check_existing_connection(server.session_name)]
+    return [name for name, server in manager.servers.items() if server.session_name in sessions]
+
+
+def broadcast_command(command: str, server_names: Optional[List[str]] = None,
+                      max_parallel: int = DEFAULT_BROADCAST_PARALLELISM,
+                      config_path: Optional[str] = None, simple_mode: bool = False,
+                      on_result: Optional[Callable[[str, ConnectionResult], None]] = None,
+                      server_lock: Optional[Callable[[str], ContextManager]] = None) -> Dict[str, ConnectionResult]:
+    """
+    在多台服务器上并发执行同一命令
+    
+    Args:
+        command: 要执行的命令
+        server_names: 目标服务器；为None时使用当前已连接（会话存在）的全部服务器
+        max_parallel: 最大并发数
+        config_path: 配置文件路径
+        simple_mode: 是否使用简化模式
+        on_result: 每台服务器完成时的回调 (server_name, result)，按完成顺序调用
+        server_lock: 返回服务器级锁的函数，避免与同一服务器上的其它操作交错
+    
+    Returns:
+        Dict[str, ConnectionResult]: 按输入顺序排列的执行结果，details中包含
+        output、exit_code和latency
+    """
+    if server_names is None:
+        server_names = list_active_servers(config_path, simple_mode)
+    
+    def execute_one(server_name: str) -> ConnectionResult:
+        return execute_server_command(server_name, command, config_path, simple_mode)
+    
+    return _run_for_servers(server_names, execute_one, max_parallel, on_result, server_lock)
+
+
+def group_command_outputs(results: Dict[str, ConnectionResult]) -> List[Dict[str, Any]]:
+    """
+    把输出和退出码完全相同的服务器归为一组
+    
+    Returns:
+        List[Dict[str, Any]]: 每组包含servers、exit_code、output、success，按组大小降序
+    """
+    groups: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+    for server_name, result in results.items():
+        details = result.details or {}
+        if 'output' in details:
+            output = (details.get('output') or '').strip()
+        else:
+            output = result.message
+        key = (details.get('exit_code'), output)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'servers': [],
+                'exit_code': details.get('exit_code'),
+                'output': output,
+                'success': result.success
+            }
+        group['servers'].append(server_name)
+    return sorted(groups.values(), key=lambda group: len(group['servers']), reverse=True)
+
+
 def disconnect_server(server_name: str, config_path: Optional[str] = None, simple_mode: bool = False) -> ConnectionResult:
     """
     断开服务器连接
@@ -2392,7 +2659,7 @@ def disconnect_server(server_name: str, config_path: Optional[str] = None, simpl
         ConnectionResult: 操作结果
     """
     try:
-        manager = create_connection_manager(config_path, simple_mode)
+        manager = get_connection_manager(config_path, simple_mode)
         return manager.disconnect(server_name)
     except Exception as e:
         return ConnectionResult(
@@ -2415,7 +2682,7 @@ def get_server_status(server_name: str, config_path: Optional[str] = None, simpl
         ConnectionResult: 状态结果
     """
     try:
-        manager = create_connection_manager(config_path, simple_mode)
+        manager = get_connection_manager(config_path, simple_mode)
         return manager.get_status(server_name)
     except Exception as e:
         return ConnectionResult(
@@ -2425,7 +2692,8 @@ def get_server_status(server_name: str, config_path: Optional[str] = None, simpl
         )
 
 
-def execute_server_command(server_name: str, command: str, config_path: Optional[str] = None, simple_mode: bool = False) -> ConnectionResult:
+def execute_server_command(server_name: str, command: str, config_path: Optional[str] = None, simple_mode: bool = False,
+                           raw: bool = False) -> ConnectionResult:
     """
     执行服务器命令
     
@@ -2434,13 +2702,14 @@ def execute_server_command(server_name: str, command: str, config_path: Optional
         command: 要执行的命令
         config_path: 配置文件路径
         simple_mode: 是否使用简化模式
+        raw: 原样发送，不加开始/结束标记（前台程序不是shell时使用）
     
     Returns:
         ConnectionResult: 执行结果
     """
     try:
-        manager = create_connection_manager(config_path, simple_mode)
-        return manager.execute_command(server_name, command)
+        manager = get_connection_manager(config_path, simple_mode)
+        return manager.execute_command(server_name, command, raw=raw)
     except Exception as e:
         return ConnectionResult(
             success=False,
@@ -2461,7 +2730,7 @@ def list_all_servers(config_path: Optional[str] = None, simple_mode: bool = Fals
         List[Dict[str, Any]]: 服务器列表
     """
     try:
-        manager = create_connection_manager(config_path, simple_mode)
+        manager = get_connection_manager(config_path, simple_mode)
         return manager.list_servers()
     except Exception as e:
         log_output(f"列出服务器异常: {str(e)}", "ERROR")
@@ -23,6 +23,23 @@ import re
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
+from tmux_client import list_sessions, tmux_run
+from config_store import get_config_store
+from server_record import ServerRecord, get_server_records
+from ssh_pool import close_ssh_master
+from pane_stream import reset_pane_stream, send_raw_command, send_wrapped_command, wait_for_command
+from artifact_cache import Artifact, sync_artifacts
+from state_store import get_state_store
+from session_probe import invalidate_probe, probe_session
+from health_monitor import HealthMonitor
+from heartbeat import heartbeat
+from latency_stats import (COMMAND, CONNECT_PREFIX, HEARTBEAT, latency_stats, latency_summary,
+                           metrics_snapshot, recent_mean, restore_metrics)
+
+
+# 写入.zshrc以禁用Powerlevel10k配置向导
+ZSH_WIZARD_DISABLE_LINE = b"POWERLEVEL9K_DISABLE_CONFIGURATION_WIZARD=true"
+
 
 def log_output(message, level="INFO"):
     """增强的日志输出，带级别标识"""
@@ -208,25 +225,72 @@ class EnhancedSSHManager:
         self.interactive_guides: Dict[str, InteractiveGuide] = {}
         
         # 🚀 第一阶段优化：连接稳定性增强
-        self.health_check_interval = 30  # 健康检查间隔(秒)
+        self.health_check_interval = float(os.getenv('MCP_HEALTH_INTERVAL', 30))  # 健康检查间隔(秒)
         self.max_retry_attempts = 3  # 最大重试次数
         self.connection_quality_threshold = 0.8  # 连接质量阈值
         self.heartbeat_timeout = 10  # 心跳超时时间
         self.connection_metrics: Dict[str, Dict] = {}  # 连接质量指标
+        self._metrics_lock = threading.Lock()
+        # 后台定期检查已连接服务器，状态查询读取最近的检查结果
+        self.health_monitor = HealthMonitor(
+            self.check_connection_health, interval=self.health_check_interval
+        )
         
         # 直接集成配置加载逻辑，不再依赖base_manager
-        self.servers: Dict[str, Any] = {}
+        self.servers: Dict[str, ServerRecord] = {}
         self.global_settings: Dict[str, Any] = {}
         self.security_settings: Dict[str, Any] = {}
+        self._config_version = 0
         
         # 查找并加载配置文件
         self.config_path = self._find_config_file() if config_path is None else config_path
         self._load_config()
         
+        # 恢复上次进程持久化的连接状态和健康指标
+        self.state_store = get_state_store()
+        self._restore_persisted_state()
+        
         log_output("🚀 Enhanced SSH Manager 已启动", "SUCCESS")
         log_output("💡 新功能: 智能连接检测、自动Docker环境、一键恢复、交互引导", "INFO")
         log_output("🔧 连接稳定性增强: 心跳检测、自动重连、连接质量监控", "INFO")
     
+    def _restore_persisted_state(self):
+        """从状态存储恢复连接状态和健康指标（进程重启后）"""
+        try:
+            persisted = self.state_store.all()
+        except Exception as e:
+            log_output(f"读取持久化连接状态失败: {str(e)}", "WARNING")
+            return
+        for server_name, state in persisted.items():
+            if state.metrics:
+                self.connection_metrics[server_name] = restore_metrics(state.metrics)
+            server = self.get_server(server_name)
+            if server is None or self.state_store.trusted(server_name, server.session_name) is None:
+                continue
+            # 恢复的状态未经探测，智能连接或探测验证后才就绪
+            self.start_connection_health_monitor(server_name)
+            self.connection_states[server_name] = ConnectionState(
+                server_name=server_name,
+                session_name=state.session_name,
+                stage="initializing",
+                progress=0,
+                message="已从持久化状态恢复，等待探测验证",
+                last_update=state.verified_at
+            )
+    
+    def _persist_verified(self, server_name: str, session_name: str):
+        """记录验证通过的连接，重启后的进程可以直接信任"""
+        server = self.get_server(server_name)
+        try:
+            self.state_store.record_verified(
+                server_name, session_name,
+                host=getattr(server, 'host', '') if server else '',
+                container=getattr(server, 'docker_container', '') if server else '',
+                metrics=metrics_snapshot(self.connection_metrics.get(server_name))
+            )
+        except Exception as e:
+            log_output(f"保存连接状态失败: {str(e)}", "WARNING")
+    
     def _find_config_file(self) -> str:
         """查找配置文件"""
         # 1. 用户目录配置（修复：使用正确的目录名）
@@ -256,47 +320,9 @@ class EnhancedSSHManager:
             raise FileNotFoundError(f"配置文件不存在: {self.config_path}")
         
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-            
-
-            # 解析服务器配置
-            servers_config = config.get('servers', {})
-            for server_name, server_config in servers_config.items():
-                # 构建specs字典
-                specs = server_config.get('specs', {})
-                
-                # 如果是script_based类型，将connection、docker等配置放入specs
-                if server_config.get('type') == 'script_based':
-                    if 'connection' in server_config:
-                        specs['connection'] = server_config['connection']
-                    if 'docker' in server_config:
-                        specs['docker'] = server_config['docker']
-                    if 'bos' in server_config:
-                        specs['bos'] = server_config['bos']
-                    if 'environment_setup' in server_config:
-                        specs['environment_setup'] = server_config['environment_setup']
-                
-                # 保存docker配置的副本，确保server.docker始终可用
-                docker_config = server_config.get('docker', {})
-                
-                # 创建服务器对象
-                server_obj = type('ServerConfig', (), {
-                    'name': server_name,
-                    'type': server_config.get('type', 'direct_ssh'),
-                    'host': server_config.get('host', ''),
-                    'port': server_config.get('port', 22),
-                    'username': server_config.get('username', ''),
-                    'private_key_path': server_config.get('private_key_path', ''),
-                    'description': server_config.get('description', ''),
-                    'specs': specs,
-                    'session': server_config.get('session'),
-                    'jump_host': server_config.get('jump_host'),
-                    'password': server_config.get('password'),
-                    'docker': docker_config  # 修复：使用保存的docker配置
-                })()
-                
-                self.servers[server_name] = server_obj
+            # 服务器记录按配置版本缓存，各管理器共享同一份只读记录
+            self._config_version, self.servers = get_server_records(self.config_path)
+            config = get_config_store(self.config_path).get_config()
             
             # 加载全局设置
             self.global_settings = config.get('global_settings', {})
@@ -305,6 +331,13 @@ class EnhancedSSHManager:
         except Exception as e:
             raise Exception(f"配置文件解析失败: {str(e)}")
     
+    def reload_config_if_changed(self) -> bool:
+        """配置文件变化时重新加载服务器配置，连接状态和健康指标保持不变"""
+        if get_config_store(self.config_path).version == self._config_version:
+            return False
+        self._load_config()
+        return True
+    
     def get_server(self, server_name: str):
         """获取服务器配置"""
         return self.servers.get(server_name)
@@ -328,37 +361,61 @@ class EnhancedSSHManager:
         
         return servers_info
     
-    def execute_command_internal(self, server_name: str, command: str) -> Tuple[bool, str]:
-        """执行命令的内部实现 - 增强版智能等待"""
+    def execute_command_internal(self, server_name: str, command: str, raw: bool = False) -> Tuple[bool, str]:
+        """执行命令的内部实现 - 增强版智能等待（raw为True时原样发送，不加开始/结束标记）"""
         server = self.get_server(server_name)
         if not server:
             return False, f"服务器 {server_name} 不存在"
         
         # 对于script_based类型，使用tmux会话执行
         if server.type == 'script_based':
-            session_name = server.session.get('name', f"{server_name}_session") if server.session else f"{server_name}_session"
+            session_name = server.session_name
             
             try:
                 # 检查会话是否存在
-                check_result = subprocess.run(['tmux', 'has-session', '-t', session_name], 
-                                            capture_output=True)
+                check_result = tmux_run(['tmux', 'has-session', '-t', session_name], 
+                                        capture_output=True)
                 
                 if check_result.returncode != 0:
                     return False, f"会话 {session_name} 不存在，请先建立连接"
                 
                 # 🔧 获取执行前的输出基线
-                baseline_result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                               capture_output=True, text=True)
+                baseline_result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                           capture_output=True, text=True)
                 baseline_output = baseline_result.stdout if baseline_result.returncode == 0 else ""
                 
-                # 发送命令
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, command, 'Enter'], 
-                             capture_output=True)
-                
-                # 🔧 智能等待命令执行完成
-                success, output = self._wait_for_command_completion(session_name, command, baseline_output)
-                
-                return success, output
+                if raw:
+                    # 前台程序不是shell（REPL、y/n提示等），原样发送并按输出稳定性判断完成
+                    send_raw_command(session_name, command)
+                    return self._wait_for_command_completion(session_name, command, baseline_output)
+                
+                # 🔧 发送用开始/结束标记包裹的命令，结束标记携带真实退出码
+                sentinel, stream, start_offset = send_wrapped_command(session_name, command)
+                completion = wait_for_command(session_name, sentinel, stream, start_offset)
+                
+                if not completion.tracked:
+                    # 无法跟踪结束标记时回退到输出稳定性判断
+                    return self._wait_for_command_completion(session_name, command, baseline_output)
+                
+                # 🔧 输出取自开始/结束标记之间的字节，包含已滚出屏幕的部分
+                output = completion.output
+                if output is None:
+                    output_result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                             capture_output=True, text=True)
+                    output = output_result.stdout if output_result.returncode == 0 else ""
+                elif completion.truncated:
+                    log_output("⚠️ 输出过长，开头部分已超出缓冲区", "WARNING")
+                
+                if not completion.completed:
+                    log_output("⏰ 命令执行超时", "WARNING")
+                    return False, f"命令执行超时\n{output}"
+                
+                self._record_latency(server_name, COMMAND, completion.duration)
+                log_output(f"✅ 命令执行完成（退出码 {completion.exit_code}，"
+                           f"{completion.duration * 1000:.0f}ms，{completion.via}）", "DEBUG")
+                if completion.exit_code != 0:
+                    return False, f"{output}\n命令退出码: {completion.exit_code}"
+                return True, output
                 
             except Exception as e:
                 return False, f"命令执行失败: {str(e)}"
@@ -378,8 +435,8 @@ class EnhancedSSHManager:
             
             try:
                 # 获取当前输出
-                result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 if result.returncode != 0:
                     return False, "无法获取命令输出"
@@ -454,7 +511,7 @@ class EnhancedSSHManager:
         if not server:
             return False, f"服务器 {server_name} 不存在"
         
-        session_name = server.session.get('name', f"{server_name}_session") if server.session else f"{server_name}_session"
+        session_name = server.session_name
         
         # 🚀 第一阶段优化：启动连接健康监控
         self.start_connection_health_monitor(server_name)
@@ -469,17 +526,26 @@ class EnhancedSSHManager:
             last_update=time.time()
         )
         
+        connect_start = time.monotonic()
         try:
             # 阶段1: 智能连接检测
             self._update_progress(server_name, 10, "检测现有连接状态...")
             
             if not force_recreate:
+                # 总是先探测；重启前验证过的连接探测通过后跳过心跳和完整的连接流程
+                trusted = self.state_store.trusted(server_name, session_name)
                 existing_status = self._detect_existing_connection(server_name, session_name)
+                self._record_stage(server_name, "detect", connect_start)
+                if trusted is not None and existing_status == "ready":
+                    self._persist_verified(server_name, session_name)
+                    self._update_progress(server_name, 100, "连接已就绪（已恢复并验证）")
+                    return True, f"连接已存在且正常: {session_name}"
                 if existing_status == "ready":
                     # 🚀 第一阶段优化：验证连接健康状态
                     health_status = self.check_connection_health(server_name)
                     if health_status['status'] == 'healthy':
                         self._update_progress(server_name, 100, "连接已就绪且健康！")
+                        self._persist_verified(server_name, session_name)
                         log_output(f"🔍 连接质量: {health_status['connection_quality']:.2f}, 响应时间: {health_status['response_time']:.2f}s", "INFO")
                         return True, f"连接已存在且正常: {session_name}"
                     else:
@@ -498,7 +564,9 @@ class EnhancedSSHManager:
             
             # 阶段2: 建立新连接
             self._update_progress(server_name, 20, "建立新连接...")
+            stage_start = time.monotonic()
             success, msg = self._establish_smart_connection(server, session_name)
+            self._record_stage(server_name, "establish", stage_start)
             if not success:
                 self._update_progress(server_name, 0, f"连接失败: {msg}")
                 return False, msg
@@ -515,7 +583,9 @@ class EnhancedSSHManager:
             # 阶段3: Docker环境设置
             if server.specs and server.specs.get('docker'):
                 self._update_progress(server_name, 60, "设置Docker环境...")
+                stage_start = time.monotonic()
                 success, msg = self._setup_docker_environment(server, session_name)
+                self._record_stage(server_name, "docker", stage_start)
                 if not success:
                     log_output(f"Docker设置失败: {msg}", "WARNING")
                     log_output("💡 继续使用主机环境", "INFO")
@@ -523,14 +593,18 @@ class EnhancedSSHManager:
             # 阶段3.5: 同步环境设置
             if hasattr(server, 'sync') and server.sync and server.sync.get('enabled'):
                 self._update_progress(server_name, 75, "设置同步环境...")
+                stage_start = time.monotonic()
                 success, msg = self._setup_sync_environment(server, session_name)
+                self._record_stage(server_name, "sync", stage_start)
                 if not success:
                     log_output(f"同步设置失败: {msg}", "WARNING")
                     log_output("💡 继续使用普通连接", "INFO")
             
             # 阶段4: 环境验证
             self._update_progress(server_name, 90, "验证环境...")
+            stage_start = time.monotonic()
             success = self._verify_environment(session_name)
+            self._record_stage(server_name, "verify", stage_start)
             if not success:
                 return False, "环境验证失败"
             
@@ -539,7 +613,10 @@ class EnhancedSSHManager:
             final_health = self.check_connection_health(server_name)
             
             # 完成
+            self._record_stage(server_name, "total", connect_start)
             self._update_progress(server_name, 100, "连接已就绪！")
+            if final_health['status'] == 'healthy':
+                self._persist_verified(server_name, session_name)
             
             # 显示连接信息
             self._show_connection_info(server_name, session_name)
@@ -571,8 +648,8 @@ class EnhancedSSHManager:
         """
         try:
             # 检查tmux会话是否存在
-            check_result = subprocess.run(['tmux', 'has-session', '-t', session_name], 
-                                        capture_output=True)
+            check_result = tmux_run(['tmux', 'has-session', '-t', session_name], 
+                                    capture_output=True)
             
             if check_result.returncode != 0:
                 return "none"
@@ -582,55 +659,39 @@ class EnhancedSSHManager:
             is_relay = server and hasattr(server, 'connection_type') and server.connection_type == 'relay'
             target_host = server.host if server else None
             
-            # 发送更明确的测试命令
-            test_command = f'echo "CONNECTION_TEST_$(hostname)_$(whoami)_$(date +%s)"'
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, test_command, 'Enter'], 
-                         capture_output=True)
-            time.sleep(3)  # 增加等待时间
-            
-            # 获取输出
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            # 发送带唯一标记的探测命令，标记回显即返回
+            probe = probe_session(session_name)
+            log_output(f"🔍 连接状态检测: {probe.message}, 主机 {probe.hostname or '-'}, "
+                       f"耗时 {probe.latency:.2f}s{' (缓存)' if probe.cached else ''}", "DEBUG")
             
-            if result.returncode != 0:
-                return "failed"
-            
-            output = result.stdout
-            log_output(f"🔍 连接状态检测输出: {output[-200:]}", "DEBUG")
-            
-            # 分析连接状态
-            if 'CONNECTION_TEST_' in output:
-                # 对于relay连接，使用更智能的检测逻辑
-                if is_relay:
-                    # 检查是否在目标服务器上
-                    if target_host and target_host.split('.')[0] in output:
-                        log_output(f"✅ 检测到目标服务器环境: {target_host}", "SUCCESS")
-                        return "ready"
-                    
-                    # 检查是否在relay环境中
-                    if '-bash-baidu-ssl$' in output or 'baidu' in output.lower():
-                        log_output("🔍 检测到relay环境，但可能未连接到目标服务器", "INFO")
-                        return "recoverable"
-                    
-                    # 检查是否在本地
-                    if any(local_indicator in output for local_indicator in 
-                           ['MacBook-Pro', 'localhost', 'xuyehua@MacBook']):
-                        log_output("⚠️ 检测到本地环境，relay连接可能需要重新认证", "WARNING")
-                        return "recoverable"
-                    
-                    # 无法明确判断，保守返回ready
-                    return "ready"
-                else:
-                    # 非relay连接的原有逻辑
-                    if any(local_indicator in output for local_indicator in 
-                           ['MacBook-Pro', 'localhost', 'xuyehua@MacBook']):
-                        return "recoverable"  # 会话存在但在本地
-                    else:
-                        return "ready"  # 连接正常
-            else:
-                # 没有收到测试命令回应
+            if not probe.alive:
+                # 没有收到探测命令回应
                 log_output("❌ 测试命令无响应，连接可能已断开", "WARNING")
                 return "recoverable"  # 会话无响应但可能恢复
+            
+            output = f"{probe.hostname} {probe.user}"
+            # 对于relay连接，使用更智能的检测逻辑
+            if is_relay:
+                # 检查是否在目标服务器上
+                if target_host and target_host.split('.')[0] in output:
+                    log_output(f"✅ 检测到目标服务器环境: {target_host}", "SUCCESS")
+                    return "ready"
+                
+                # 检查是否在本地
+                if probe.is_local:
+                    log_output("⚠️ 检测到本地环境，relay连接可能需要重新认证", "WARNING")
+                    return "recoverable"
+                
+                # 检查是否在relay环境中
+                if 'baidu' in output.lower():
+                    log_output("🔍 检测到relay环境，但可能未连接到目标服务器", "INFO")
+                    return "recoverable"
+                
+                # 无法明确判断，保守返回ready
+                return "ready"
+            
+            # 非relay连接：会话仍在本地时需要恢复
+            return "recoverable" if probe.is_local else "ready"
                 
         except Exception as e:
             log_output(f"❌ 连接状态检测异常: {str(e)}", "ERROR")
@@ -642,7 +703,7 @@ class EnhancedSSHManager:
             log_output("🔧 开始智能恢复流程...", "INFO")
             
             # 清理异常会话
-            subprocess.run(['tmux', 'kill-session', '-t', session_name], capture_output=True)
+            tmux_run(['tmux', 'kill-session', '-t', session_name], capture_output=True)
             time.sleep(1)
             
             # 重新建立连接
@@ -667,16 +728,17 @@ class EnhancedSSHManager:
         try:
             # 创建tmux会话
             create_cmd = ['tmux', 'new-session', '-d', '-s', session_name]
-            result = subprocess.run(create_cmd, capture_output=True, text=True)
+            result = tmux_run(create_cmd, capture_output=True, text=True)
             
             if result.returncode != 0:
                 return False, f"创建会话失败: {result.stderr}"
             
-            # 启动连接工具
-            connection_config = server.specs.get('connection', {})
-            connection_tool = connection_config.get('tool', 'ssh')
+            # 从会话创建开始记录输出流
+            reset_pane_stream(session_name)
+            invalidate_probe(session_name)
             
-            if connection_tool == 'relay-cli':
+            # 启动连接工具
+            if server.connection_tool == 'relay-cli':
                 success, msg = self._connect_via_relay_enhanced(server, session_name)
             else:
                 success, msg = self._connect_via_ssh_enhanced(server, session_name)
@@ -693,7 +755,7 @@ class EnhancedSSHManager:
         """增强版relay连接 - 实现完整的多级跳板连接流程"""
         try:
             connection_config = server.specs.get('connection', {})
-            target_host = connection_config.get('target', {}).get('host', server.host)
+            target_host = server.target_host
             username = getattr(server, 'username', 'unknown')
             
             # 检查是否为多级跳板配置
@@ -712,7 +774,7 @@ class EnhancedSSHManager:
         """通过分步send-keys实现简单relay连接 - 增强版交互式认证支持"""
         try:
             log_output("📡 正在启动 relay-cli...", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'relay-cli', 'Enter'], check=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 'relay-cli', 'Enter'], check=True)
 
             # 🔧 增强版: 检测认证状态并提供用户引导
             log_output("🔍 检测relay认证状态...", "INFO")
@@ -725,7 +787,7 @@ class EnhancedSSHManager:
 
             ssh_cmd = f"ssh -t {username}@{target_host}"
             log_output(f"🎯 正在通过跳板机连接到 {target_host}...", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, ssh_cmd, 'Enter'], check=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, ssh_cmd, 'Enter'], check=True)
 
             target_prompt = f"@{target_host.split('.')[0]}"
             if not self._wait_for_output(session_name, [target_prompt, f'~]$', f'# '], timeout=30):
@@ -757,7 +819,7 @@ class EnhancedSSHManager:
         while time.time() - start_time < timeout:
             try:
                 # 获取当前输出
-                pane_output = subprocess.run(
+                pane_output = tmux_run(
                     ['tmux', 'capture-pane', '-p', '-t', session_name],
                     capture_output=True, text=True, check=True
                 ).stdout
@@ -811,7 +873,7 @@ class EnhancedSSHManager:
             
             jump_cmd = f"ssh {jump_host_user}@{jump_host} -p {jump_port}"
             log_output(f"📡 正在连接到第一层跳板机: {jump_host}...", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, jump_cmd, 'Enter'], check=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, jump_cmd, 'Enter'], check=True)
             
             jump_prompt = f"@{jump_host.split('.')[0]}"
             if not self._wait_for_output(session_name, [jump_prompt, f'~]$', f'# '], timeout=30):
@@ -821,7 +883,7 @@ class EnhancedSSHManager:
             # 步骤2: 从跳板机连接到最终目标
             target_cmd = f"ssh -t {username}@{target_host}"
             log_output(f"🎯 正在通过跳板机连接到最终目标: {target_host}...", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, target_cmd, 'Enter'], check=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, target_cmd, 'Enter'], check=True)
 
             target_prompt = f"@{target_host.split('.')[0]}"
             if not self._wait_for_output(session_name, [target_prompt, f'~]$', f'# '], timeout=30):
@@ -853,22 +915,22 @@ class EnhancedSSHManager:
             # 进入Docker容器
             docker_cmd = f'docker exec -it {container_name} {shell_type}'
             log_output(f"📝 执行命令: {docker_cmd}", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, docker_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, docker_cmd, 'Enter'],
+                     capture_output=True)
             
             # 优化检测：使用容器特定的快速检测命令
             log_output("⏳ 等待进入容器环境...", "INFO")
             
             # 发送快速检测命令
             time.sleep(2)  # 给docker exec一些时间
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'echo "DOCKER_CONTAINER_CHECK_$(hostname)"', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 'echo "DOCKER_CONTAINER_CHECK_$(hostname)"', 'Enter'],
+                     capture_output=True)
             
             # 等待进入容器成功 - 使用更快的检测方式
             for i in range(15):  # 减少到15次检查，每次间隔更短
                 time.sleep(1)
-                result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 output = result.stdout
                 log_output(f"🔍 检测第{i+1}次: {output[-100:].strip()}", "INFO")
@@ -876,8 +938,8 @@ class EnhancedSSHManager:
                 # 优化检测：首先检查是否有配置向导需要处理
                 if 'Choice [ynrq]:' in output or 'Choice [ynq]:' in output or 'Powerlevel10k configuration wizard' in output:
                     log_output("⚙️ 检测到Powerlevel10k配置向导，自动跳过...", "INFO")
-                    subprocess.run(['tmux', 'send-keys', '-t', session_name, 'q', 'Enter'],
-                                 capture_output=True)
+                    tmux_run(['tmux', 'send-keys', '-t', session_name, 'q', 'Enter'],
+                             capture_output=True)
                     time.sleep(2)
                     
                     # 跳过向导后，认为已经成功进入容器
@@ -919,7 +981,7 @@ class EnhancedSSHManager:
             return False, f"Docker容器连接异常: {str(e)}"
     
     def _copy_zsh_configs_to_container(self, session_name: str, shell_type: str) -> bool:
-        """拷贝zsh配置文件到Docker容器 - 使用base64编码确保可靠传输"""
+        """拷贝zsh配置文件到Docker容器 - 先探测远端sha256，只传输有变化的文件"""
         try:
             log_output("📂 开始拷贝zsh配置文件到容器...", "INFO")
             
@@ -933,108 +995,57 @@ class EnhancedSSHManager:
                 return False
             
             # 首先确保在home目录
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'cd ~', 'Enter'],
-                         capture_output=True)
-            time.sleep(1)
+            sentinel, stream, start_offset = send_wrapped_command(session_name, 'cd ~')
+            wait_for_command(session_name, sentinel, stream, start_offset, timeout=5)
             
             # 配置文件列表
             config_files = ['.zshrc', '.p10k.zsh']  # 暂时跳过.zsh_history，因为它可能有编码问题
             
-            import base64
-            
+            artifacts = []
             for config_file in config_files:
                 source_file = zsh_config_dir / config_file
-                if source_file.exists():
-                    log_output(f"📋 拷贝 {config_file} 到 ~/{config_file}...", "INFO")
-                    
-                    # 读取文件内容并base64编码
-                    with open(source_file, 'rb') as f:
-                        file_content = f.read()
-                    
-                    encoded_content = base64.b64encode(file_content).decode('utf-8')
-                    
-                    # 分块传输（避免命令行长度限制）
-                    chunk_size = 1000
-                    chunks = [encoded_content[i:i+chunk_size] for i in range(0, len(encoded_content), chunk_size)]
-                    
-                    # 清空临时文件
-                    temp_file = f"{config_file}.b64"
-                    subprocess.run(['tmux', 'send-keys', '-t', session_name, f'rm -f {temp_file}', 'Enter'],
-                                 capture_output=True)
-                    time.sleep(0.5)
-                    
-                    # 逐块写入base64内容
-                    for i, chunk in enumerate(chunks):
-                        if i == 0:
-                            cmd = f"echo '{chunk}' > {temp_file}"
-                        else:
-                            cmd = f"echo '{chunk}' >> {temp_file}"
-                        
-                        subprocess.run(['tmux', 'send-keys', '-t', session_name, cmd, 'Enter'],
-                                     capture_output=True)
-                        time.sleep(0.1)
-                    
-                    # 解码并创建最终文件
-                    decode_cmd = f"base64 -d {temp_file} > {config_file} && rm {temp_file}"
-                    subprocess.run(['tmux', 'send-keys', '-t', session_name, decode_cmd, 'Enter'],
-                                 capture_output=True)
-                    time.sleep(1)
-                    
-                    # 验证文件是否创建成功
-                    file_marker = config_file.replace(".", "_")
-                    verify_cmd = f"ls -la {config_file} && echo 'FILE_CREATED_{file_marker}'"
-                    subprocess.run(['tmux', 'send-keys', '-t', session_name, verify_cmd, 'Enter'],
-                                 capture_output=True)
-                    time.sleep(1)
-                    
-                    # 检查验证结果 - 增加重试机制
-                    verification_marker = f"FILE_CREATED_{file_marker}"
-                    verification_success = False
-                    
-                    for retry in range(3):  # 最多重试3次
-                        time.sleep(0.5)  # 等待命令完成
-                        result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                              capture_output=True, text=True)
-                        
-                        if verification_marker in result.stdout:
-                            verification_success = True
-                            break
-                    
-                    if verification_success:
-                        log_output(f"✅ {config_file} 拷贝并验证成功", "SUCCESS")
-                    else:
-                        log_output(f"⚠️ {config_file} 验证超时，但文件可能已创建", "WARNING")
-                        # 不要返回False，继续处理其他文件
-                else:
+                if not source_file.exists():
                     log_output(f"⚠️ 配置文件不存在: {source_file}", "WARNING")
-            
-            # 设置文件权限
-            log_output("🔐 设置文件权限...", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'chmod 644 ~/.zshrc ~/.p10k.zsh', 'Enter'],
-                         capture_output=True)
-            time.sleep(0.5)
-            
-            # 禁用Powerlevel10k配置向导
-            log_output("⚙️ 禁用Powerlevel10k配置向导...", "INFO")
-            disable_cmd = "echo 'POWERLEVEL9K_DISABLE_CONFIGURATION_WIZARD=true' >> ~/.zshrc"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, disable_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(0.5)
+                    continue
+                content = source_file.read_bytes()
+                if config_file == '.zshrc' and ZSH_WIZARD_DISABLE_LINE not in content:
+                    # 禁用Powerlevel10k配置向导：直接写入部署内容，使远端文件与本地产物保持一致
+                    content = content.rstrip(b'\n') + b'\n' + ZSH_WIZARD_DISABLE_LINE + b'\n'
+                artifacts.append(Artifact(config_file, content, mode="644"))
+            
+            sync_result = sync_artifacts(session_name, artifacts)
+            for config_file in sync_result.skipped:
+                log_output(f"⏭️ {config_file} 与远端一致，跳过拷贝", "INFO")
+            for config_file in sync_result.transferred:
+                log_output(f"✅ {config_file} 拷贝并校验成功", "SUCCESS")
+            for config_file, message in sync_result.failed.items():
+                # 不要返回False，继续处理其他文件
+                log_output(f"⚠️ {config_file} 拷贝失败: {message}", "WARNING")
+            
+            if not sync_result.transferred:
+                if sync_result.failed:
+                    log_output("❌ zsh配置文件拷贝失败", "ERROR")
+                    return False
+                log_output("🎉 zsh配置文件已是最新，无需重新加载", "SUCCESS")
+                return True
             
             # 重新加载zsh配置
             log_output("🔄 重新加载zsh配置...", "INFO")
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'source ~/.zshrc', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 'source ~/.zshrc', 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
             # 最终验证
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'echo "CONFIG_RELOAD_COMPLETE"', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 'echo "CONFIG_RELOAD_COMPLETE"', 'Enter'],
+                     capture_output=True)
             time.sleep(1)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
+            if sync_result.failed:
+                log_output(f"⚠️ 已重新加载，但 {', '.join(sync_result.failed)} 拷贝失败", "WARNING")
+                return False
             if "CONFIG_RELOAD_COMPLETE" in result.stdout:
                 log_output("🎉 zsh配置文件拷贝和加载完成！", "SUCCESS")
                 return True
@@ -1050,15 +1061,15 @@ class EnhancedSSHManager:
         """增强版SSH连接 - 支持交互引导"""
         try:
             # 直接SSH连接
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                          f'ssh {server.username}@{server.host}', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                     f'ssh {server.username}@{server.host}', 'Enter'],
+                     capture_output=True)
             
             # 等待连接 - 支持交互引导
             for i in range(30):  # 30次检查
                 time.sleep(1)
-                result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 output = result.stdout
                 
@@ -1095,12 +1106,12 @@ class EnhancedSSHManager:
             log_output(f"🐳 设置Docker容器: {container_name}", "INFO")
             
             # 检查Docker可用性
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'docker --version', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 'docker --version', 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'command not found' in result.stdout:
                 return False, "Docker未安装或不可用"
@@ -1164,18 +1175,18 @@ class EnhancedSSHManager:
             
             # 创建目录命令
             create_cmd = f"mkdir -p {remote_workspace}"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, create_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, create_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(1)
             
             # 验证目录创建
             check_cmd = f"ls -la {remote_workspace} && echo 'WORKSPACE_CREATED'"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, check_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, check_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'WORKSPACE_CREATED' in result.stdout:
                 log_output("✅ 远程工作目录创建成功", "SUCCESS")
@@ -1204,67 +1215,28 @@ class EnhancedSSHManager:
             # 使用scp上传proftpd.tar.gz到远程工作目录
             # 这里需要获取当前连接的主机信息
             upload_cmd = f"cd {remote_workspace}"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, upload_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(1)
-            
-            # 由于我们已经在远程会话中，我们需要通过其他方式传输文件
-            # 这里使用base64编码的方式传输小文件
-            log_output("📤 使用base64编码传输proftpd.tar.gz...", "INFO")
-            
-            # 读取proftpd.tar.gz并base64编码
-            import base64
-            with open(proftpd_source, 'rb') as f:
-                file_content = f.read()
+            sentinel, stream, start_offset = send_wrapped_command(session_name, upload_cmd)
+            wait_for_command(session_name, sentinel, stream, start_offset, timeout=5)
             
-            encoded_content = base64.b64encode(file_content).decode('utf-8')
+            # 由于我们已经在远程会话中，通过会话传输通道（粘贴缓冲区+sha256校验）传输文件，
+            # 远端已有相同内容时跳过
+            log_output("📤 通过会话传输proftpd.tar.gz...", "INFO")
+            sync_result = sync_artifacts(session_name, [Artifact.from_file(proftpd_source, "proftpd.tar.gz")])
             
-            # 分块传输（避免命令行长度限制）
-            chunk_size = 1000
-            chunks = [encoded_content[i:i+chunk_size] for i in range(0, len(encoded_content), chunk_size)]
-            
-            # 清空目标文件
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'rm -f proftpd.tar.gz.b64', 'Enter'],
-                         capture_output=True)
-            time.sleep(1)
-            
-            # 逐块写入
-            for i, chunk in enumerate(chunks):
-                if i == 0:
-                    cmd = f"echo '{chunk}' > proftpd.tar.gz.b64"
+            if sync_result.success:
+                if sync_result.skipped:
+                    log_output("⏭️ 远端proftpd.tar.gz与本地一致，跳过上传", "SUCCESS")
                 else:
-                    cmd = f"echo '{chunk}' >> proftpd.tar.gz.b64"
-                
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, cmd, 'Enter'],
-                             capture_output=True)
-                time.sleep(0.1)
-            
-            # 解码文件
-            decode_cmd = "base64 -d proftpd.tar.gz.b64 > proftpd.tar.gz && rm proftpd.tar.gz.b64"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, decode_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(2)
-            
-            # 验证文件传输
-            check_cmd = "ls -la proftpd.tar.gz && echo 'PROFTPD_UPLOADED'"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, check_cmd, 'Enter'],
-                         capture_output=True)
-            time.sleep(2)
-            
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
-            
-            if 'PROFTPD_UPLOADED' in result.stdout:
-                log_output("✅ proftpd.tar.gz上传成功", "SUCCESS")
+                    log_output("✅ proftpd.tar.gz上传成功", "SUCCESS")
                 
                 # 解压文件
                 extract_cmd = "tar -xzf proftpd.tar.gz && echo 'PROFTPD_EXTRACTED'"
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, extract_cmd, 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, extract_cmd, 'Enter'],
+                         capture_output=True)
                 time.sleep(3)
                 
-                result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 if 'PROFTPD_EXTRACTED' in result.stdout:
                     log_output("✅ proftpd解压成功", "SUCCESS")
@@ -1273,7 +1245,7 @@ class EnhancedSSHManager:
                     log_output("❌ proftpd解压失败", "ERROR")
                     return False
             else:
-                log_output("❌ proftpd.tar.gz上传失败", "ERROR")
+                log_output(f"❌ proftpd.tar.gz上传失败: {sync_result.failed.get('proftpd.tar.gz')}", "ERROR")
                 return False
                 
         except Exception as e:
@@ -1287,31 +1259,31 @@ class EnhancedSSHManager:
             
             # 执行初始化脚本
             init_cmd = f"bash ./init.sh {remote_workspace}"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, init_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, init_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(5)
             
             # 检查初始化结果
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             log_output("📋 初始化脚本输出:", "INFO")
             log_output(result.stdout[-500:], "DEBUG")  # 显示最后500字符
             
             # 启动proftpd服务
             start_cmd = f"./proftpd -n -c ./proftpd.conf &"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, start_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, start_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(3)
             
             # 验证服务启动
             check_cmd = f"netstat -tlnp | grep {ftp_port} && echo 'PROFTPD_RUNNING'"
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, check_cmd, 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, check_cmd, 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'PROFTPD_RUNNING' in result.stdout or str(ftp_port) in result.stdout:
                 log_output(f"✅ proftpd服务已启动，监听端口: {ftp_port}", "SUCCESS")
@@ -1377,32 +1349,32 @@ class EnhancedSSHManager:
         """智能容器连接 - 自动检测和创建，配置本地环境"""
         try:
             # 检查容器是否存在
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                          f'docker inspect {container_name} >/dev/null 2>&1 && echo "EXISTS" || echo "NOT_EXISTS"', 
-                          'Enter'], capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                     f'docker inspect {container_name} >/dev/null 2>&1 && echo "EXISTS" || echo "NOT_EXISTS"', 
+                     'Enter'], capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             if 'EXISTS' in result.stdout and 'NOT_EXISTS' not in result.stdout:
                 # 容器存在，检查运行状态
                 log_output("✅ 容器已存在，检查状态...", "INFO")
                 
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                              f'docker start {container_name} 2>/dev/null', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                         f'docker start {container_name} 2>/dev/null', 'Enter'],
+                         capture_output=True)
                 time.sleep(3)
                 
                 # 进入容器
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                              f'docker exec -it {container_name} bash', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                         f'docker exec -it {container_name} bash', 'Enter'],
+                         capture_output=True)
                 time.sleep(2)
                 
                 # 验证是否成功进入
-                result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 if '@' in result.stdout or '#' in result.stdout:
                     log_output("🚀 已进入现有容器", "SUCCESS")
@@ -1419,15 +1391,15 @@ class EnhancedSSHManager:
                 
                 # 创建新容器（简化版）
                 docker_cmd = f"docker run -dit --name {container_name} --privileged {image_name}"
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, docker_cmd, 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, docker_cmd, 'Enter'],
+                         capture_output=True)
                 
                 time.sleep(10)  # 等待容器创建
                 
                 # 进入新容器
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                              f'docker exec -it {container_name} bash', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                         f'docker exec -it {container_name} bash', 'Enter'],
+                         capture_output=True)
                 time.sleep(2)
                 
                 log_output("🎉 新容器已创建并进入", "SUCCESS")
@@ -1552,8 +1524,8 @@ class EnhancedSSHManager:
                             create_cmd = f"cat > ~/{config_file} << 'EOF_CONFIG_FILE'\n{content}\nEOF_CONFIG_FILE"
                             
                             # 发送命令到容器
-                            subprocess.run(['tmux', 'send-keys', '-t', session_name, create_cmd, 'Enter'],
-                                         capture_output=True)
+                            tmux_run(['tmux', 'send-keys', '-t', session_name, create_cmd, 'Enter'],
+                                     capture_output=True)
                             time.sleep(1)
                             
                             log_output(f"✅ 已创建: {config_file}", "INFO")
@@ -1577,13 +1549,13 @@ class EnhancedSSHManager:
         """获取当前容器名称"""
         try:
             # 在容器内执行hostname命令获取容器ID
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                          'echo "CONTAINER_ID_START"; hostname; echo "CONTAINER_ID_END"', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                     'echo "CONTAINER_ID_START"; hostname; echo "CONTAINER_ID_END"', 'Enter'],
+                     capture_output=True)
             time.sleep(2)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             # 解析容器ID
             lines = result.stdout.split('\n')
@@ -1619,19 +1591,19 @@ class EnhancedSSHManager:
             
             if shell_type == 'zsh':
                 # 启动zsh并应用配置
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 'zsh', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 'zsh', 'Enter'],
+                         capture_output=True)
                 time.sleep(2)
                 
                 # 重新加载zsh配置
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 'source ~/.zshrc', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 'source ~/.zshrc', 'Enter'],
+                         capture_output=True)
                 time.sleep(1)
                 
             elif shell_type == 'bash':
                 # 重新加载bash配置
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 'source ~/.bashrc', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 'source ~/.bashrc', 'Enter'],
+                         capture_output=True)
                 time.sleep(1)
             
             log_output(f"✅ {shell_type}配置已应用", "SUCCESS")
@@ -1645,27 +1617,27 @@ class EnhancedSSHManager:
             log_output("🔧 设置默认配置...", "INFO")
             
             # 设置基本环境变量
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                          'export TERM=xterm-256color', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                     'export TERM=xterm-256color', 'Enter'],
+                     capture_output=True)
             time.sleep(0.5)
             
             if shell_type == 'zsh':
                 # 基本zsh配置
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                              'echo "export TERM=xterm-256color" >> ~/.zshrc', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                         'echo "export TERM=xterm-256color" >> ~/.zshrc', 'Enter'],
+                         capture_output=True)
                 time.sleep(0.5)
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 'zsh', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 'zsh', 'Enter'],
+                         capture_output=True)
             else:
                 # 基本bash配置
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 
-                              'echo "export TERM=xterm-256color" >> ~/.bashrc', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 
+                         'echo "export TERM=xterm-256color" >> ~/.bashrc', 'Enter'],
+                         capture_output=True)
                 time.sleep(0.5)
-                subprocess.run(['tmux', 'send-keys', '-t', session_name, 'source ~/.bashrc', 'Enter'],
-                             capture_output=True)
+                tmux_run(['tmux', 'send-keys', '-t', session_name, 'source ~/.bashrc', 'Enter'],
+                         capture_output=True)
             
             log_output("✅ 默认配置设置完成", "SUCCESS")
             return True
@@ -1678,12 +1650,12 @@ class EnhancedSSHManager:
         """环境验证"""
         try:
             # 发送验证命令
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, 'pwd && whoami', 'Enter'],
-                         capture_output=True)
+            tmux_run(['tmux', 'send-keys', '-t', session_name, 'pwd && whoami', 'Enter'],
+                     capture_output=True)
             time.sleep(1)
             
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True)
+            result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                              capture_output=True, text=True)
             
             # 简单验证：有输出且不在本地
             if (result.returncode == 0 and 
@@ -1723,8 +1695,14 @@ class EnhancedSSHManager:
         log_output("  • 查看状态: tmux list-sessions", "INFO")
         log_output("=" * 50, "INFO")
     
-    def get_connection_status(self, server_name: str) -> Dict[str, Any]:
-        """获取连接状态 - 第一阶段增强版"""
+    def get_connection_status(self, server_name: str, sessions: Optional[Dict[str, Dict[str, str]]] = None) -> Dict[str, Any]:
+        """
+        获取连接状态 - 第一阶段增强版
+        
+        Args:
+            server_name: 服务器名称
+            sessions: 已取回的tmux会话表（list_sessions的结果），为None时查询一次
+        """
         try:
             # 基础连接状态
             base_status = {}
@@ -1750,7 +1728,7 @@ class EnhancedSSHManager:
             health_data = {}
             if server_name in self.connection_metrics:
                 try:
-                    health_check = self.check_connection_health(server_name)
+                    health_check = self.get_cached_health(server_name)
                     metrics = self.connection_metrics[server_name]
                     
                     health_data = {
@@ -1763,6 +1741,7 @@ class EnhancedSSHManager:
                         "failed_checks": metrics.get('failed_checks', 0),
                         "auto_recovery_count": metrics.get('auto_recovery_count', 0),
                         "last_heartbeat": metrics.get('last_heartbeat', 0),
+                        "checked_at": health_check.get('checked_at', 0),
                         "recommendation": self._get_connection_recommendation(metrics)
                     }
                 except Exception as e:
@@ -1773,23 +1752,15 @@ class EnhancedSSHManager:
             if base_status.get("session_name"):
                 session_name = base_status["session_name"]
                 try:
-                    # 检查tmux会话是否存在
-                    session_check = subprocess.run(['tmux', 'has-session', '-t', session_name], 
-                                                 capture_output=True)
-                    session_info["tmux_session_exists"] = session_check.returncode == 0
-                    
-                    if session_info["tmux_session_exists"]:
-                        # 获取会话详细信息
-                        session_list = subprocess.run(['tmux', 'list-sessions', '-F', '#{session_name}:#{session_created}:#{session_last_attached}'], 
-                                                    capture_output=True, text=True)
-                        if session_check.returncode == 0:
-                            for line in session_list.stdout.strip().split('\\n'):
-                                if line.startswith(session_name + ':'):
-                                    parts = line.split(':')
-                                    if len(parts) >= 3:
-                                        session_info["created_time"] = parts[1]
-                                        session_info["last_attached"] = parts[2]
-                                    break
+                    # 会话是否存在及其详细信息（一次list-sessions）
+                    table = list_sessions() if sessions is None else sessions
+                    if table is None:
+                        raise RuntimeError("tmux list-sessions 执行失败")
+                    session = table.get(session_name)
+                    session_info["tmux_session_exists"] = session is not None
+                    if session is not None:
+                        session_info["created_time"] = session['created']
+                        session_info["last_attached"] = session['last_attached']
                 except Exception as e:
                     session_info["session_error"] = f"获取会话信息失败: {str(e)}"
             
@@ -1825,15 +1796,34 @@ class EnhancedSSHManager:
                 "status": "error"
             }
     
+    def get_all_connection_status(self, server_names: Optional[List[str]] = None,
+                                  max_parallel: int = 16) -> Dict[str, Dict[str, Any]]:
+        """
+        并发获取多台服务器的连接状态（默认所有已配置的服务器）
+        
+        所有服务器共用一次tmux list-sessions的结果；健康数据优先使用后台监控的
+        最近结果，没有或已过期的服务器在线程池中并发检查。结果按输入顺序返回。
+        """
+        if server_names is None:
+            server_names = [server.get('name') for server in self.list_servers_internal() if server.get('name')]
+        names = list(dict.fromkeys(server_names))
+        if not names:
+            return {}
+        sessions = list_sessions()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(names))),
+                                thread_name_prefix="status") as executor:
+            statuses = list(executor.map(lambda name: self.get_connection_status(name, sessions=sessions), names))
+        return dict(zip(names, statuses))
+    
     def list_servers(self) -> List[Dict[str, Any]]:
         """列出所有服务器（继承原有功能）"""
         return self.list_servers_internal()
     
-    def execute_command(self, server_name: str, command: str) -> Tuple[bool, str]:
-        """执行命令（继承原有功能，但增加智能重连）"""
+    def execute_command(self, server_name: str, command: str, raw: bool = False) -> Tuple[bool, str]:
+        """执行命令（继承原有功能，但增加智能重连；raw见execute_command_internal）"""
         try:
             # 先尝试执行
-            success, output = self.execute_command_internal(server_name, command)
+            success, output = self.execute_command_internal(server_name, command, raw)
             
             if success:
                 return True, output
@@ -1846,7 +1836,7 @@ class EnhancedSSHManager:
                 if reconnect_success:
                     # 重连成功，重新执行命令
                     time.sleep(2)
-                    return self.execute_command_internal(server_name, command)
+                    return self.execute_command_internal(server_name, command, raw)
                 else:
                     return False, f"自动重连失败: {msg}"
             
@@ -1892,20 +1882,20 @@ class EnhancedSSHManager:
                 }
             
             # 2. 获取会话信息
-            session_name = server.get('session', {}).get('name', f"{server_name}_session")
+            session_name = server.session_name
             
             # 3. 检查活动会话
             try:
-                result = subprocess.run(['tmux', 'list-sessions'], 
-                                      capture_output=True, text=True, timeout=10)
+                result = tmux_run(['tmux', 'list-sessions'], 
+                                  capture_output=True, text=True, timeout=10)
                 sessions_output = result.stdout
                 
                 active_sessions = []
                 if session_name in sessions_output:
                     # 检查会话中的窗口和连接
                     try:
-                        windows_result = subprocess.run(['tmux', 'list-windows', '-t', session_name],
-                                                      capture_output=True, text=True, timeout=10)
+                        windows_result = tmux_run(['tmux', 'list-windows', '-t', session_name],
+                                                  capture_output=True, text=True, timeout=10)
                         if windows_result.returncode == 0:
                             windows_count = len(windows_result.stdout.strip().split('\n'))
                             active_sessions.append({
@@ -1940,8 +1930,8 @@ class EnhancedSSHManager:
                 log_output(f"⚠️ 强制断开模式：清理活动会话", "WARNING")
                 try:
                     # 杀死tmux会话
-                    subprocess.run(['tmux', 'kill-session', '-t', session_name], 
-                                 capture_output=True, timeout=15)
+                    tmux_run(['tmux', 'kill-session', '-t', session_name], 
+                             capture_output=True, timeout=15)
                     cleanup_actions.append(f"Killed tmux session: {session_name}")
                     log_output(f"🗑️ 已清理tmux会话: {session_name}", "SUCCESS")
                 except subprocess.TimeoutExpired:
@@ -1958,24 +1948,23 @@ class EnhancedSSHManager:
                 del self.connection_metrics[server_name]
                 cleanup_actions.append("Cleared connection metrics")
             
+            self.health_monitor.unwatch(server_name)
+            
+            self.state_store.remove(server_name)
+            invalidate_probe(session_name)
+            
             if server_name in self.interactive_guides:
                 del self.interactive_guides[server_name]
                 cleanup_actions.append("Cleared interactive guides")
             
             # 7. 清理SSH连接（如果有持久连接）
             try:
-                # 检查并清理SSH控制套接字
-                ssh_control_path = f"/tmp/ssh-{server_name}-control"
-                if os.path.exists(ssh_control_path):
-                    os.remove(ssh_control_path)
-                    cleanup_actions.append("Removed SSH control socket")
+                # 关闭ControlMaster并清理控制套接字
+                if close_ssh_master(server_name):
+                    cleanup_actions.append("Closed SSH control master")
             except Exception as e:
                 warnings.append(f"Error cleaning SSH control socket: {str(e)}")
             
-            # 8. 更新服务器连接状态
-            if hasattr(server, 'session'):
-                server.session = {}
-            
             log_output(f"✅ 服务器 '{server_name}' 断开连接完成", "SUCCESS")
             
             result = {
@@ -2030,8 +2019,8 @@ class EnhancedSSHManager:
             
             try:
                 # 获取当前会话输出
-                result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                      capture_output=True, text=True)
+                result = tmux_run(['tmux', 'capture-pane', '-t', session_name, '-p'],
+                                  capture_output=True, text=True)
                 
                 if result.returncode != 0:
                     log_output("❌ 无法获取会话状态", "ERROR")
@@ -2124,20 +2113,22 @@ class EnhancedSSHManager:
 
     # 🚀 第一阶段优化：连接健康检查系统
     def start_connection_health_monitor(self, server_name: str) -> bool:
-        """启动连接健康监控"""
+        """启动连接健康监控（只在建立或恢复连接时调用，状态查询不会开始监控）"""
         try:
-            if server_name not in self.connection_metrics:
-                self.connection_metrics[server_name] = {
-                    'last_heartbeat': time.time(),
-                    'response_times': [],
-                    'success_rate': 1.0,
-                    'total_checks': 0,
-                    'failed_checks': 0,
-                    'connection_quality': 1.0,
-                    'auto_recovery_count': 0
-                }
+            with self._metrics_lock:
+                if server_name not in self.connection_metrics:
+                    self.connection_metrics[server_name] = {
+                        'last_heartbeat': time.time(),
+                        'latency': {},
+                        'success_rate': 1.0,
+                        'total_checks': 0,
+                        'failed_checks': 0,
+                        'connection_quality': 1.0,
+                        'auto_recovery_count': 0
+                    }
             
-            log_output(f"🔍 启动连接健康监控: {server_name}", "INFO")
+            if self.health_monitor.watch(server_name):
+                log_output(f"🔍 启动连接健康监控: {server_name}", "INFO")
             return True
             
         except Exception as e:
@@ -2145,80 +2136,103 @@ class EnhancedSSHManager:
             return False
     
     def check_connection_health(self, server_name: str) -> Dict[str, Any]:
-        """检查连接健康状态"""
+        """检查连接健康状态（带外心跳，不向窗格输入），结果同时写入后台监控的结果表"""
+        result = self._check_connection_health(server_name)
+        if server_name in self.connection_metrics:
+            self.health_monitor.record(server_name, result)
+        return result
+    
+    def _record_latency(self, server_name: str, operation: str, seconds: float):
+        """记录一次操作耗时（只记录已在监控中的服务器）"""
+        metrics = self.connection_metrics.get(server_name)
+        if metrics is None:
+            return
+        with self._metrics_lock:
+            stats = latency_stats(metrics, operation)
+        stats.record(seconds)
+    
+    def _record_stage(self, server_name: str, stage: str, stage_start: float):
+        """记录连接阶段耗时（stage_start为time.monotonic()）"""
+        self._record_latency(server_name, CONNECT_PREFIX + stage, time.monotonic() - stage_start)
+    
+    def get_cached_health(self, server_name: str) -> Dict[str, Any]:
+        """
+        最近的健康检查结果；后台监控还没有结果（或已过期）时直接检查一次
+        
+        不在监控中的服务器（从未连接或已断开）直接返回未连接，不发送心跳也不写状态存储。
+        """
+        if not self.health_monitor.is_watching(server_name):
+            return {"status": "disconnected", "message": "未建立连接", "connection_quality": 0}
+        cached = self.health_monitor.latest(server_name)
+        if cached is not None:
+            return cached
+        return self.check_connection_health(server_name)
+    
+    def _check_connection_health(self, server_name: str) -> Dict[str, Any]:
         try:
             server = self.get_server(server_name)
             if not server:
                 return {"status": "error", "message": "服务器不存在"}
             
-            session_name = server.session.get('name', f"{server_name}_session") if server.session else f"{server_name}_session"
-            
-            # 初始化指标
-            if server_name not in self.connection_metrics:
-                self.start_connection_health_monitor(server_name)
-            
-            metrics = self.connection_metrics[server_name]
-            start_time = time.time()
-            
-            # 发送心跳检测命令
-            heartbeat_cmd = f'echo "HEARTBEAT_$(date +%s)_RESPONSE"'
-            subprocess.run(['tmux', 'send-keys', '-t', session_name, heartbeat_cmd, 'Enter'], 
-                         capture_output=True, timeout=5)
-            
-            # 等待响应
-            time.sleep(2)
-            result = subprocess.run(['tmux', 'capture-pane', '-t', session_name, '-p'],
-                                  capture_output=True, text=True, timeout=5)
-            
-            response_time = time.time() - start_time
-            metrics['total_checks'] += 1
+            session_name = server.session_name
+            
+            # 指标在建立连接时初始化，没有指标说明从未连接，不在这里开始监控
+            metrics = self.connection_metrics.get(server_name)
+            if metrics is None:
+                return {"status": "disconnected", "message": "未建立连接", "connection_quality": 0}
+            
+            # 带外心跳：读取窗格前台进程，有ControlMaster时再做一次网络往返
+            beat = heartbeat(session_name, server, timeout=self.heartbeat_timeout)
+            
+            response_time = beat.latency
+            # 后台监控和调用方可能同时更新同一台服务器的指标；锁内只更新内存并取快照，
+            # 写状态存储（文件I/O，可能触发压缩）放到释放锁之后
+            with self._metrics_lock:
+                metrics['total_checks'] += 1
+            
+                if beat.alive:
+                    # 连接正常
+                    metrics['last_heartbeat'] = time.time()
+                    stats = latency_stats(metrics, HEARTBEAT)
+                    stats.record(response_time)
+                
+                    # 计算连接质量（最近的心跳样本）
+                    avg_response_time = stats.mean()
+                    metrics['success_rate'] = (metrics['total_checks'] - metrics['failed_checks']) / metrics['total_checks']
+                
+                    # 连接质量评分 (响应时间和成功率的综合评分)
+                    time_score = max(0, 1 - (avg_response_time - 1) / 10)  # 1秒以内满分，超过逐渐降分
+                    quality_score = (metrics['success_rate'] * 0.7) + (time_score * 0.3)
+                    metrics['connection_quality'] = max(0, min(1, quality_score))
+                
+                    result = {
+                        "status": "healthy",
+                        "response_time": response_time,
+                        "avg_response_time": avg_response_time,
+                        "response_percentiles": stats.percentiles(),
+                        "success_rate": metrics['success_rate'],
+                        "connection_quality": metrics['connection_quality'],
+                        "heartbeat_via": beat.via,
+                        "message": "连接健康"
+                    }
+                else:
+                    # 连接异常
+                    metrics['failed_checks'] += 1
+                    metrics['success_rate'] = (metrics['total_checks'] - metrics['failed_checks']) / metrics['total_checks']
+                
+                    result = {
+                        "status": "unhealthy",
+                        "response_time": response_time,
+                        "success_rate": metrics['success_rate'],
+                        "connection_quality": 0,
+                        "session_gone": beat.gone,
+                        "message": f"连接无响应或异常: {beat.message}"
+                    }
+                snapshot = metrics_snapshot(metrics)
             
-            if result.returncode == 0 and 'HEARTBEAT_' in result.stdout and 'RESPONSE' in result.stdout:
-                # 连接正常
-                metrics['last_heartbeat'] = time.time()
-                metrics['response_times'].append(response_time)
-                
-                # 保持最近20次响应时间
-                if len(metrics['response_times']) > 20:
-                    metrics['response_times'] = metrics['response_times'][-20:]
-                
-                # 计算连接质量
-                avg_response_time = sum(metrics['response_times']) / len(metrics['response_times'])
-                metrics['success_rate'] = (metrics['total_checks'] - metrics['failed_checks']) / metrics['total_checks']
-                
-                # 连接质量评分 (响应时间和成功率的综合评分)
-                time_score = max(0, 1 - (avg_response_time - 1) / 10)  # 1秒以内满分，超过逐渐降分
-                quality_score = (metrics['success_rate'] * 0.7) + (time_score * 0.3)
-                metrics['connection_quality'] = max(0, min(1, quality_score))
-                
-                return {
-                    "status": "healthy",
-                    "response_time": response_time,
-                    "avg_response_time": avg_response_time,
-                    "success_rate": metrics['success_rate'],
-                    "connection_quality": metrics['connection_quality'],
-                    "message": "连接健康"
-                }
-            else:
-                # 连接异常
-                metrics['failed_checks'] += 1
-                metrics['success_rate'] = (metrics['total_checks'] - metrics['failed_checks']) / metrics['total_checks']
-                
-                return {
-                    "status": "unhealthy",
-                    "response_time": response_time,
-                    "success_rate": metrics['success_rate'],
-                    "connection_quality": 0,
-                    "message": "连接无响应或异常"
-                }
+            self.state_store.record_metrics(server_name, session_name, snapshot, healthy=bool(beat.alive))
+            return result
                 
-        except subprocess.TimeoutExpired:
-            metrics['failed_checks'] += 1
-            return {
-                "status": "timeout", 
-                "message": "心跳检测超时",
-                "connection_quality": 0
-            }
         except Exception as e:
             return {
                 "status": "error", 
@@ -2264,7 +2278,7 @@ class EnhancedSSHManager:
                     return {"error": f"没有找到服务器 {server_name} 的监控数据"}
                 
                 metrics = self.connection_metrics[server_name]
-                health_status = self.check_connection_health(server_name)
+                health_status = self.get_cached_health(server_name)
                 
                 return {
                     "server_name": server_name,
@@ -2273,7 +2287,8 @@ class EnhancedSSHManager:
                     "total_checks": metrics.get('total_checks', 0),
                     "failed_checks": metrics.get('failed_checks', 0),
                     "auto_recovery_count": metrics.get('auto_recovery_count', 0),
-                    "avg_response_time": sum(metrics.get('response_times', [1])) / len(metrics.get('response_times', [1])),
+                    "avg_response_time": recent_mean(metrics, HEARTBEAT),
+                    "latency": latency_summary(metrics),
                     "last_heartbeat": metrics.get('last_heartbeat', 0),
                     "current_status": health_status.get('status', 'unknown'),
                     "recommendation": self._get_connection_recommendation(metrics)
@@ -2305,7 +2320,7 @@ class EnhancedSSHManager:
         """获取连接优化建议"""
         quality = metrics.get('connection_quality', 0)
         success_rate = metrics.get('success_rate', 0)
-        avg_response_time = sum(metrics.get('response_times', [1])) / len(metrics.get('response_times', [1]))
+        avg_response_time = recent_mean(metrics, HEARTBEAT)
         
         if quality >= 0.9:
             return "连接状态优秀，无需优化"
@@ -2437,10 +2452,11 @@ class EnhancedSSHManager:
             connected_count = 0
             healthy_count = 0
             
+            all_status = self.get_all_connection_status([server.get('name', 'unknown') for server in servers])
             for server in servers:
                 server_name = server.get('name', 'unknown')
                 try:
-                    status = self.get_connection_status(server_name)
+                    status = all_status[server_name]
                     
                     if "error" in status:
                         continue
@@ -2500,8 +2516,8 @@ class EnhancedSSHManager:
                 for server in servers:
                     server_name = server.get('name', 'unknown')
                     try:
-                        # 快速健康检查
-                        health_status = self.check_connection_health(server_name)
+                        # 读取后台监控的最近结果，没有时才直接检查
+                        health_status = self.get_cached_health(server_name)
                         
                         status = health_status.get("status", "unknown")
                         quality = health_status.get("connection_quality", 0)
@@ -2576,10 +2592,11 @@ class EnhancedSSHManager:
                 "timestamp": time.time()
             }
             
+            all_status = self.get_all_connection_status([server.get('name', 'unknown') for server in servers])
             for server in servers:
                 server_name = server.get('name', 'unknown')
                 try:
-                    status = self.get_connection_status(server_name)
+                    status = all_status[server_name]
                     
                     if "error" in status:
                         summary["error_servers"] += 1
@@ -3157,7 +3174,7 @@ class EnhancedSSHManager:
         start_time = time.time()
         while time.time() - start_time < timeout:
             try:
-                pane_output = subprocess.run(
+                pane_output = tmux_run(
                     ['tmux', 'capture-pane', '-p', '-t', session_name],
                     capture_output=True, text=True, check=True
                 ).stdout
@@ -3182,6 +3199,29 @@ def create_enhanced_manager(config_path: Optional[str] = None) -> EnhancedSSHMan
     return EnhancedSSHManager(config_path)
 
 
+# 进程级共享的管理器实例，键为(配置路径, HOME)
+_shared_managers: Dict[Tuple[Optional[str], str], EnhancedSSHManager] = {}
+_shared_managers_lock = threading.Lock()
+
+
+def get_enhanced_manager(config_path: Optional[str] = None) -> EnhancedSSHManager:
+    """
+    获取进程级共享的增强版SSH管理器
+    
+    首次调用时创建，之后复用同一实例，connection_metrics/connection_states
+    跨调用累积；配置文件mtime变化时自动重新加载服务器配置。
+    """
+    key = (config_path, str(Path.home()))
+    with _shared_managers_lock:
+        manager = _shared_managers.get(key)
+        if manager is None:
+            manager = create_enhanced_manager(config_path)
+            _shared_managers[key] = manager
+        else:
+            manager.reload_config_if_changed()
+        return manager
+
+
 if __name__ == "__main__":
     # 测试代码
     manager = create_enhanced_manager()
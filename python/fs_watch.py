@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+TreeWatcher - 目录树变化监听（inotify，回退到stat轮询）
+
+1. Linux上为目录树中的每个目录注册inotify监听，新建的子目录自动加入
+2. 不支持inotify或监听数超出系统限制时回退到定期stat扫描
+3. 短时间内的事件合并后一次性回调变化的相对路径，最多延迟 max_delay 秒
+4. 所有监听共享同一个inotify实例、轮询线程和合并线程
+"""
+
+import ctypes
+import ctypes.util
+import os
+import posixpath
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from path_filter import PathFilter, compile_path_filter
+
+# 事件合并的静默时间（秒）
+DEFAULT_QUIET_PERIOD = 0.2
+
+# 持续有事件时，第一次事件后最多延迟多久回调（秒）
+DEFAULT_MAX_DELAY = 2.0
+
+# 轮询模式的扫描间隔（秒）
+DEFAULT_POLL_INTERVAL = 2.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_EVENT_HEADER = struct.Struct('iIII')
+_libc = None
+_libc_lock = threading.Lock()
+
+
+def get_inotify_libc():
+    """加载提供inotify的libc，平台不支持时抛出OSError"""
+    global _libc
+    with _libc_lock:
+        if _libc is None:
+            libc_name = ctypes.util.find_library('c')
+            libc = ctypes.CDLL(libc_name or 'libc.so.6', use_errno=True)
+            if not hasattr(libc, 'inotify_init1'):
+                raise OSError("inotify不可用")
+            _libc = libc
+        return _libc
+
+
+class _DebounceHub:
+    """为所有监听合并变化路径，静默后在同一个线程中回调"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        # watcher -> [待处理路径, 第一次事件时间, 最近一次事件时间]
+        self._pending: Dict['TreeWatcher', list] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, watcher: 'TreeWatcher', paths: Iterable[str]):
+        with self._cond:
+            now = time.monotonic()
+            entry = self._pending.get(watcher)
+            if entry is None:
+                entry = self._pending[watcher] = [set(), now, now]
+            entry[0].update(paths)
+            entry[2] = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="fs-watch-debounce")
+                self._thread.start()
+            self._cond.notify()
+
+    def discard(self, watcher: 'TreeWatcher'):
+        with self._cond:
+            self._pending.pop(watcher, None)
+
+    @staticmethod
+    def _due(watcher: 'TreeWatcher', entry: list) -> float:
+        return min(entry[2] + watcher.quiet_period, entry[1] + watcher.max_delay)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    ready = [watcher for watcher, entry in self._pending.items()
+                             if self._due(watcher, entry) <= now]
+                    if ready:
+                        batches = [(watcher, self._pending.pop(watcher)[0]) for watcher in ready]
+                        break
+                    if self._pending:
+                        next_due = min(self._due(watcher, entry) for watcher, entry in self._pending.items())
+                        self._cond.wait(next_due - now)
+                    else:
+                        # 没有待处理的变化时无限期等待
+                        self._cond.wait()
+            for watcher, paths in batches:
+                try:
+                    watcher.callback(paths)
+                except Exception:
+                    pass
+
+
+class _InotifyHub:
+    """共享的inotify实例：一个fd、一个读取线程服务所有目录树"""
+
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fd = -1
+        self._libc = None
+        # wd -> [(watcher, 相对目录)]，同一目录被多个监听覆盖时共享一个wd
+        self._watches: Dict[int, List[Tuple['TreeWatcher', str]]] = {}
+
+    def _ensure_started(self) -> bool:
+        if self._fd >= 0:
+            return True
+        try:
+            libc = get_inotify_libc()
+        except (OSError, AttributeError):
+            return False
+        fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if fd < 0:
+            return False
+        self._libc, self._fd = libc, fd
+        threading.Thread(target=self._read_loop, daemon=True, name="fs-watch-inotify").start()
+        return True
+
+    def add(self, watcher: 'TreeWatcher') -> bool:
+        """为目录树注册监听，inotify不可用或超出监听数限制时返回False"""
+        with self._lock:
+            if not self._ensure_started():
+                return False
+            if not self._add_tree(watcher, ''):
+                # 通常是超出了 fs.inotify.max_user_watches
+                self._remove_locked(watcher)
+                return False
+            return True
+
+    def remove(self, watcher: 'TreeWatcher'):
+        with self._lock:
+            self._remove_locked(watcher)
+
+    def _remove_locked(self, watcher: 'TreeWatcher'):
+        for wd in list(self._watches):
+            owners = [owner for owner in self._watches[wd] if owner[0] is not watcher]
+            if owners:
+                self._watches[wd] = owners
+            else:
+                del self._watches[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _drop_tree(self, watcher: 'TreeWatcher', rel_root: str):
+        """目录被移走时删除该监听在这个子树上的wd映射（移到树内的位置会由IN_MOVED_TO重新加入）"""
+        prefix = rel_root + '/'
+        for wd in list(self._watches):
+            owners = [owner for owner in self._watches[wd]
+                      if owner[0] is not watcher or (owner[1] != rel_root and not owner[1].startswith(prefix))]
+            if len(owners) == len(self._watches[wd]):
+                continue
+            if owners:
+                self._watches[wd] = owners
+            else:
+                del self._watches[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _add_tree(self, watcher: 'TreeWatcher', rel_root: str) -> bool:
+        stack = [rel_root]
+        while stack:
+            rel_dir = stack.pop()
+            full_dir = os.path.join(watcher.root, rel_dir)
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(full_dir), self.MASK)
+            if wd < 0:
+                if ctypes.get_errno() == 28:  # ENOSPC
+                    return False
+                continue
+            # 同一目录被移动后inotify返回原来的wd，要更新为新的相对路径
+            owners = [owner for owner in self._watches.get(wd, ()) if owner[0] is not watcher]
+            owners.append((watcher, rel_dir))
+            self._watches[wd] = owners
+            try:
+                with os.scandir(full_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            rel_path = posixpath.join(rel_dir, entry.name) if rel_dir else entry.name
+                            if not watcher.path_filter.excludes_dir(rel_path, entry.name):
+                                stack.append(rel_path)
+            except OSError:
+                continue
+        return True
+
+    def _read_loop(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        while True:
+            try:
+                poller.poll()
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._handle(data)
+
+    def _handle(self, data: bytes):
+        changed: Dict['TreeWatcher', Set[str]] = {}
+        with self._lock:
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+                offset += name_len
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，丢失了部分事件，所有监听都要求全量扫描
+                    for owners in self._watches.values():
+                        for watcher, _ in owners:
+                            changed.setdefault(watcher, set()).add('')
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                for watcher, rel_dir in list(self._watches.get(wd, ())):
+                    if not name:
+                        continue
+                    rel_path = posixpath.join(rel_dir, name) if rel_dir else name
+                    if mask & IN_ISDIR:
+                        if watcher.path_filter.excludes_dir(rel_path, name):
+                            continue
+                    elif not watcher.path_filter.includes_file(rel_path, name):
+                        continue
+                    if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                        self._drop_tree(watcher, rel_path)
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        # 新目录（或移入的目录树）加入监听，目录下已有的文件由扫描补上
+                        self._add_tree(watcher, rel_path)
+                    changed.setdefault(watcher, set()).add(rel_path)
+        for watcher, paths in changed.items():
+            watcher.emit(paths)
+
+
+class _PollingHub:
+    """共享的stat轮询线程（不支持inotify时使用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: Dict['TreeWatcher', Tuple[float, Dict[str, tuple]]] = {}
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, watcher: 'TreeWatcher'):
+        snapshot = self._snapshot(watcher)
+        with self._lock:
+            self._snapshots[watcher] = (time.monotonic() + watcher.poll_interval, snapshot)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="fs-watch-poll")
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, watcher: 'TreeWatcher'):
+        with self._lock:
+            self._snapshots.pop(watcher, None)
+
+    @staticmethod
+    def _snapshot(watcher: 'TreeWatcher') -> Dict[str, tuple]:
+        return {rel_path: (st.st_size, st.st_mtime_ns)
+                for rel_path, st in watcher.path_filter.walk(watcher.root)}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                due = [watcher for watcher, (due_at, _) in self._snapshots.items() if due_at <= now]
+                next_due = min((due_at for due_at, _ in self._snapshots.values()), default=None)
+            for watcher in due:
+                with self._lock:
+                    if watcher not in self._snapshots:
+                        continue
+                    previous = self._snapshots[watcher][1]
+                current = self._snapshot(watcher)
+                changed = {path for path, signature in current.items() if previous.get(path) != signature}
+                changed.update(path for path in previous if path not in current)
+                with self._lock:
+                    if watcher in self._snapshots:
+                        self._snapshots[watcher] = (time.monotonic() + watcher.poll_interval, current)
+                if changed:
+                    watcher.emit(changed)
+            if not due:
+                self._wakeup.wait(None if next_due is None else max(0.0, next_due - time.monotonic()))
+                self._wakeup.clear()
+
+
+_debounce_hub = _DebounceHub()
+_inotify_hub = _InotifyHub()
+_polling_hub = _PollingHub()
+
+
+class TreeWatcher:
+    """监听目录树，合并后回调变化的相对路径（'' 表示需要全量扫描）"""
+
+    def __init__(self, root: str, callback: Callable[[Set[str]], None],
+                 path_filter: Optional[PathFilter] = None,
+                 quiet_period: float = DEFAULT_QUIET_PERIOD,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 use_inotify: bool = True):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.callback = callback
+        # 被排除的目录不加监听，不在规则内的文件变化不回调
+        self.path_filter = path_filter or compile_path_filter(exclude_patterns=['.git'])
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.mode = ""  # inotify / poll
+        self._stopped = False
+
+    def start(self) -> str:
+        """开始监听，返回实际使用的模式"""
+        if self.use_inotify and _inotify_hub.add(self):
+            self.mode = "inotify"
+        else:
+            _polling_hub.add(self)
+            self.mode = "poll"
+        return self.mode
+
+    def emit(self, paths: Iterable[str]):
+        """后端检测到变化时调用，进入合并队列"""
+        if not self._stopped:
+            _debounce_hub.add(self, paths)
+
+    def mark_dirty(self, paths: Iterable[str]):
+        """手动加入变化路径（例如推送失败后重试）"""
+        self.emit(paths)
+
+    def stop(self):
+        self._stopped = True
+        if self.mode == "inotify":
+            _inotify_hub.remove(self)
+        elif self.mode == "poll":
+            _polling_hub.remove(self)
+        _debounce_hub.discard(self)
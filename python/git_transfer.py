@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+GitBundleSync - 两端都是Git仓库时的快速同步（远端 -> 本地）
+
+1. 比较两端的HEAD，本地已有远端的提交时不传输历史
+2. 否则远端以本地已有的提交为边界打 `git bundle`，只包含本地缺少的提交
+3. 远端未提交的改动用 `git diff --binary HEAD` 传输，未跟踪文件打包为tar
+4. 本地stash后快进到远端的提交（分叉时需要force才会reset），再应用改动
+
+两端没有共同的提交时返回fallback，由调用方退回rsync。
+"""
+
+import io
+import os
+import shlex
+import subprocess
+import tarfile
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from parallel_upload import remote_quote
+
+# 发给远端用来确定bundle边界的本地提交数
+CANDIDATE_COMMITS = 64
+
+# 远端打bundle时使用的临时引用
+BUNDLE_REF = "refs/remote-terminal/sync"
+
+# 单条git/远程命令的超时时间（秒）
+GIT_TIMEOUT = 300
+
+
+@dataclass
+class GitTransferResult:
+    """一次Git同步的结果"""
+    success: bool
+    message: str = ""
+    fallback: bool = False  # 无法用Git方式同步，调用方应退回rsync
+    local_head: str = ""  # 同步前的本地HEAD
+    remote_head: str = ""
+    update: str = ""  # none / fast-forward / reset
+    bundle_bytes: int = 0
+    diff_bytes: int = 0
+    untracked_bytes: int = 0
+    untracked_files: int = 0
+    duration: float = 0.0
+
+    @property
+    def transferred_bytes(self) -> int:
+        return self.bundle_bytes + self.diff_bytes + self.untracked_bytes
+
+    def to_dict(self) -> Dict:
+        return {
+            'success': self.success,
+            'message': self.message,
+            'fallback': self.fallback,
+            'local_head': self.local_head,
+            'remote_head': self.remote_head,
+            'update': self.update,
+            'bundle_bytes': self.bundle_bytes,
+            'diff_bytes': self.diff_bytes,
+            'untracked_bytes': self.untracked_bytes,
+            'untracked_files': self.untracked_files,
+            'transferred_bytes': self.transferred_bytes,
+            'duration': round(self.duration, 3)
+        }
+
+
+def run_command(command: List[str], cwd: Optional[str] = None, input: Optional[bytes] = None,
+                timeout: float = GIT_TIMEOUT) -> subprocess.CompletedProcess:
+    """执行命令并捕获二进制输出"""
+    process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = process.communicate(input, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def _error_text(result: subprocess.CompletedProcess) -> str:
+    return result.stderr.decode('utf-8', 'replace').strip()[-300:]
+
+
+class GitBundleSync:
+    """把远端仓库的状态同步到本地仓库"""
+
+    def __init__(self, run_remote: Callable[[str], subprocess.CompletedProcess],
+                 local_path: str, remote_path: str):
+        """
+        Args:
+            run_remote: 在远端执行shell命令，返回捕获了二进制输出的CompletedProcess
+            local_path: 本地仓库路径
+            remote_path: 远端仓库路径
+        """
+        self.run_remote = run_remote
+        self.local_path = os.path.abspath(os.path.expanduser(local_path))
+        self.remote_path = remote_path
+
+    def _git(self, *args: str, input: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        return run_command(['git', *args], cwd=self.local_path, input=input)
+
+    def _remote(self, script: str) -> subprocess.CompletedProcess:
+        return self.run_remote(f"cd {remote_quote(self.remote_path)} && {script}")
+
+    def sync(self, commit_hash: Optional[str] = None, branch: Optional[str] = None,
+             force: bool = False) -> GitTransferResult:
+        """
+        同步到远端的HEAD（或指定的分支、提交）
+
+        同步HEAD时连同远端未提交的改动和未跟踪文件一起同步；指定分支或提交时只同步提交。
+        """
+        start_time = time.time()
+        result = self._sync(commit_hash or branch or 'HEAD', with_worktree=not (commit_hash or branch),
+                            force=force)
+        result.duration = time.time() - start_time
+        return result
+
+    def _sync(self, target: str, with_worktree: bool, force: bool) -> GitTransferResult:
+        local = self._git('rev-parse', '--verify', 'HEAD^{commit}')
+        if local.returncode != 0:
+            return GitTransferResult(False, "本地仓库没有提交", fallback=True)
+        result = GitTransferResult(True, local_head=local.stdout.decode().strip())
+
+        probe = self._remote(f"git rev-parse --verify {shlex.quote(target + '^{commit}')}")
+        if probe.returncode != 0:
+            return GitTransferResult(False, f"远端不是Git仓库或没有 {target}: {_error_text(probe)}",
+                                     fallback=True, local_head=result.local_head)
+        result.remote_head = probe.stdout.decode().strip().splitlines()[-1]
+
+        # 1. 本地缺少远端的提交时，只拉取缺少的部分
+        if self._git('cat-file', '-e', result.remote_head + '^{commit}').returncode != 0:
+            if not self._fetch_bundle(result):
+                return result
+
+        # 2. 远端未提交的改动（在本地stash之前取回，失败时本地不受影响）
+        diff = untracked = b''
+        if with_worktree:
+            diff_result = self._remote("git diff --binary HEAD")
+            untracked_result = self._remote(
+                "list=$(mktemp) && git ls-files -z --others --exclude-standard > \"$list\" && "
+                "if [ -s \"$list\" ]; then tar --null -T \"$list\" -cf -; fi; status=$?; "
+                "rm -f \"$list\"; exit $status")
+            for name, remote_result in (("diff", diff_result), ("未跟踪文件", untracked_result)):
+                if remote_result.returncode != 0:
+                    result.success = False
+                    result.message = f"获取远端{name}失败: {_error_text(remote_result)}"
+                    return result
+            diff, untracked = diff_result.stdout, untracked_result.stdout
+            result.diff_bytes, result.untracked_bytes = len(diff), len(untracked)
+
+        # 3. 本地保存未提交的工作后对齐到远端的提交
+        result.update = self._plan_update(result, force)
+        if not result.update:
+            result.success = False
+            result.message = ("本地有远端没有的提交（或远端落后于本地），未修改本地仓库；"
+                              "确认后使用force=True对齐到远端")
+            return result
+        stash = self._git('stash', 'push', '--include-untracked', '-m', 'Auto sync before remote sync')
+        if stash.returncode != 0:
+            result.success = False
+            result.message = f"本地git stash失败: {_error_text(stash)}"
+            return result
+        if result.update != "none":
+            if result.update == "fast-forward":
+                moved = self._git('merge', '--ff-only', '-q', result.remote_head)
+            else:
+                moved = self._git('reset', '--hard', '-q', result.remote_head)
+            if moved.returncode != 0:
+                result.success = False
+                result.message = f"本地更新到远端提交失败（本地改动已stash）: {_error_text(moved)}"
+                return result
+
+        # 4. 应用远端未提交的改动
+        if diff:
+            applied = self._git('apply', '--binary', '--whitespace=nowarn', input=diff)
+            if applied.returncode != 0:
+                result.success = False
+                result.message = f"应用远端改动失败: {_error_text(applied)}"
+                return result
+        if untracked:
+            result.untracked_files = self._extract_untracked(untracked)
+
+        result.message = (f"Git同步完成: {result.update}, 传输 {result.transferred_bytes} 字节 "
+                          f"(bundle {result.bundle_bytes}, diff {result.diff_bytes}, "
+                          f"未跟踪文件 {result.untracked_files} 个)")
+        return result
+
+    def _fetch_bundle(self, result: GitTransferResult) -> bool:
+        """远端以本地已有的提交为边界打bundle，本地fetch；失败时设置result并返回False"""
+        candidates = self._git('rev-list', '-n', str(CANDIDATE_COMMITS), 'HEAD').stdout.decode().split()
+        ref = shlex.quote(BUNDLE_REF)
+        negatives = ' '.join(shlex.quote(commit) for commit in candidates)
+        script = (
+            f"tmp=$(mktemp) && git update-ref {ref} {shlex.quote(result.remote_head)} && "
+            f"{{ for c in {negatives}; do git cat-file -e \"$c^{{commit}}\" 2>/dev/null && echo \"^$c\"; done; "
+            f"echo {ref}; }} > \"$tmp.revs\" && "
+            # 没有共同的提交时bundle会包含完整历史，不如直接rsync
+            f"if grep -q '^^' \"$tmp.revs\"; then "
+            f"git bundle create \"$tmp\" --stdin < \"$tmp.revs\" >/dev/null && cat \"$tmp\"; status=$?; "
+            f"else status=3; fi; git update-ref -d {ref}; rm -f \"$tmp\" \"$tmp.revs\"; exit $status"
+        )
+        bundle = self._remote(script)
+        if bundle.returncode != 0 or not bundle.stdout:
+            result.success = False
+            result.fallback = bundle.returncode == 3
+            result.message = "两端没有共同的提交" if result.fallback else \
+                f"远端创建bundle失败: {_error_text(bundle)}"
+            return False
+        result.bundle_bytes = len(bundle.stdout)
+
+        with tempfile.NamedTemporaryFile(suffix='.bundle', delete=False) as f:
+            f.write(bundle.stdout)
+            bundle_path = f.name
+        try:
+            fetched = self._git('fetch', '-q', bundle_path, BUNDLE_REF)
+        finally:
+            os.unlink(bundle_path)
+        if fetched.returncode != 0 or \
+                self._git('cat-file', '-e', result.remote_head + '^{commit}').returncode != 0:
+            result.success = False
+            result.message = f"本地导入bundle失败: {_error_text(fetched)}"
+            return False
+        return True
+
+    def _plan_update(self, result: GitTransferResult, force: bool) -> str:
+        """本地HEAD如何对齐到远端：none / fast-forward / reset，分叉且未force时返回空字符串"""
+        if result.remote_head == result.local_head:
+            return "none"
+        if self._git('merge-base', '--is-ancestor', result.local_head, result.remote_head).returncode == 0:
+            return "fast-forward"
+        return "reset" if force else ""
+
+    def _extract_untracked(self, data: bytes) -> int:
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:') as archive:
+            members = [member for member in archive.getmembers()
+                       if member.isfile() and not os.path.isabs(member.name)
+                       and '..' not in member.name.split('/')]
+            if hasattr(tarfile, 'data_filter'):
+                archive.extractall(self.local_path, members=members, filter='data')
+            else:
+                archive.extractall(self.local_path, members=members)
+        return len(members)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+HealthMonitor - 后台连接健康监控
+
+1. 每台已连接的服务器注册一个定期检查任务，间隔随机浮动
+2. 检查在独立调度器的少量工作线程上执行，并发数由 MCP_HEALTH_WORKERS 控制
+3. 检查结果写入共享的结果表，状态查询直接读取最近的结果
+4. 会话已不存在时停止检查
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from sync_scheduler import SyncScheduler
+
+# 默认检查间隔（秒）
+DEFAULT_HEALTH_INTERVAL = 30.0
+
+# 默认并发检查数
+DEFAULT_HEALTH_WORKERS = 4
+
+# 检查间隔的随机浮动比例
+HEALTH_JITTER = 0.2
+
+
+class _CheckDone:
+    """调度器要求的执行结果：健康与否是检查结果本身，任务总是视为成功"""
+    success = True
+
+
+class HealthMonitor:
+    """按计划在后台检查已连接服务器的健康状态"""
+
+    def __init__(self, check: Callable[[str], Dict[str, Any]], interval: float = DEFAULT_HEALTH_INTERVAL,
+                 max_workers: Optional[int] = None, jitter: float = HEALTH_JITTER):
+        """
+        Args:
+            check: 执行一次健康检查并返回结果字典（会通过record写回结果表）；
+                结果带session_gone=True时停止检查该服务器
+            interval: 检查间隔（秒）
+            max_workers: 同时进行的检查数上限
+            jitter: 间隔的随机浮动比例
+        """
+        self.check = check
+        self.interval = float(interval)
+        self.jitter = jitter
+        workers = max_workers if max_workers is not None else \
+            int(os.getenv('MCP_HEALTH_WORKERS', DEFAULT_HEALTH_WORKERS))
+        self.scheduler = SyncScheduler(max_workers=workers, retry_delay=self.interval)
+        self._lock = threading.Lock()
+        self._results: Dict[str, Dict[str, Any]] = {}
+
+    def watch(self, server_name: str) -> bool:
+        """开始定期检查服务器；已在监控中时返回False"""
+        if self.scheduler.job_stats(server_name) is not None:
+            return False
+        self.scheduler.register(server_name, lambda paths: self._run(server_name),
+                                interval=self.interval, jitter=self.jitter)
+        # 首次检查也错开，避免同时恢复的多台服务器一起探测
+        self.scheduler.submit(server_name, delay=random.uniform(0, self.interval * self.jitter))
+        return True
+
+    def unwatch(self, server_name: str):
+        """停止检查并丢弃结果（断开连接时调用）"""
+        self.scheduler.cancel(server_name)
+        with self._lock:
+            self._results.pop(server_name, None)
+
+    def is_watching(self, server_name: str) -> bool:
+        return self.scheduler.job_stats(server_name) is not None
+
+    def _run(self, server_name: str) -> _CheckDone:
+        try:
+            result = self.check(server_name)
+            if isinstance(result, dict) and result.get('session_gone'):
+                # 会话已不存在或窗格已退出，停止检查，重新连接时会再次开始监控
+                self.scheduler.cancel(server_name)
+        except Exception as e:
+            self.record(server_name, {"status": "error", "message": f"后台健康检查异常: {str(e)}",
+                                      "connection_quality": 0})
+        return _CheckDone()
+
+    def record(self, server_name: str, result: Dict[str, Any]):
+        """写入一次检查结果（后台检查和调用方的直接检查共用）"""
+        entry = dict(result)
+        entry['checked_at'] = time.time()
+        with self._lock:
+            self._results[server_name] = entry
+
+    def latest(self, server_name: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        最近一次检查结果（副本，带checked_at和age字段）
+
+        默认只返回两个检查间隔内的结果，更旧的结果视为没有。
+        """
+        with self._lock:
+            entry = self._results.get(server_name)
+        if entry is None:
+            return None
+        age = time.time() - entry['checked_at']
+        limit = self.interval * (2 + self.jitter) if max_age is None else max_age
+        if age > limit:
+            return None
+        result = dict(entry)
+        result['age'] = age
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """监控状态"""
+        scheduler = self.scheduler.stats()
+        with self._lock:
+            results = len(self._results)
+        return {
+            'interval': self.interval,
+            'jitter': self.jitter,
+            'max_workers': scheduler['max_workers'],
+            'workers': scheduler['workers'],
+            'active_checks': scheduler['active'],
+            'watched_servers': scheduler['jobs'],
+            'results': results
+        }
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Heartbeat - 不打扰用户窗格的带外心跳
+
+1. 不向窗格发送按键，用 `tmux display-message -p` 取回窗格状态和前台进程
+2. 窗格已退出或回到本地shell时判为连接断开
+3. 服务器已有ControlMaster时通过master在远端执行一次 `true` 测量往返延迟
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from ssh_pool import get_ssh_pool
+from tmux_client import tmux_run
+
+# 通过master往返的默认超时时间（秒）
+HEARTBEAT_TIMEOUT = 5.0
+
+# 连接断开后窗格回到的本地shell
+LOCAL_SHELLS = frozenset({'sh', 'bash', 'zsh', 'fish', 'dash', 'ksh', 'tcsh', 'csh', 'login'})
+
+PANE_FORMAT = '#{pane_dead}\t#{pane_current_command}'
+
+
+@dataclass
+class HeartbeatResult:
+    """一次带外心跳的结果"""
+    alive: bool
+    latency: float = 0.0  # 秒；有master时为网络往返时间，否则为tmux查询时间
+    via: str = "pane"  # pane / master
+    command: str = ""  # 窗格前台进程
+    message: str = ""
+    gone: bool = False  # 会话不存在或窗格进程已退出，心跳不会再恢复
+
+
+def parse_pane_status(line: str) -> Tuple[bool, str]:
+    """解析 PANE_FORMAT 的输出为 (窗格是否已退出, 前台进程名)"""
+    dead, _, command = line.strip().partition('\t')
+    return dead == '1', command.strip()
+
+
+def pane_status(session_name: str) -> Optional[Tuple[bool, str]]:
+    """会话当前窗格的状态；会话不存在时返回None"""
+    try:
+        result = tmux_run(['tmux', 'display-message', '-p', '-t', session_name, PANE_FORMAT],
+                          capture_output=True, text=True, timeout=5)
+    except Exception:
+        return None
+    if result.returncode != 0:
+        return None
+    return parse_pane_status(result.stdout or "")
+
+
+def heartbeat(session_name: str, server=None, timeout: float = HEARTBEAT_TIMEOUT) -> HeartbeatResult:
+    """
+    检查会话对应的连接是否存活，不向窗格发送任何输入
+
+    Args:
+        session_name: tmux会话名称
+        server: 服务器记录（ServerRecord），有master时用于网络往返
+        timeout: 网络往返的超时时间
+    """
+    start_time = time.monotonic()
+    status = pane_status(session_name)
+    if status is None:
+        return HeartbeatResult(False, time.monotonic() - start_time, message="会话不存在", gone=True)
+    dead, command = status
+    if dead:
+        return HeartbeatResult(False, time.monotonic() - start_time, command=command,
+                               message="窗格进程已退出", gone=True)
+    if os.path.basename(command).lstrip('-') in LOCAL_SHELLS:
+        return HeartbeatResult(False, time.monotonic() - start_time, command=command,
+                               message=f"会话已回到本地shell（{command}），远程连接可能已断开")
+
+    pane_latency = time.monotonic() - start_time
+    pool = get_ssh_pool()
+    if server is not None and pool.has_master(server.name):
+        latency = pool.ping(server, timeout)
+        if latency is None:
+            return HeartbeatResult(False, pane_latency, via="master", command=command,
+                                   message="通过ControlMaster的往返失败")
+        return HeartbeatResult(True, latency, via="master", command=command, message="连接正常")
+    return HeartbeatResult(True, pane_latency, command=command, message="连接进程运行中")
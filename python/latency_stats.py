@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+LatencyStats - 连接延迟的环形缓冲和对数分桶直方图
+
+1. 最近的样本保存在定长 array('d') 环形缓冲中，平均值O(1)
+2. 全部历史计入对数分桶直方图，用于计算 p50/p90/p99
+3. 持久化时只写非零桶
+"""
+
+import math
+import threading
+from array import array
+from typing import Any, Dict, List, Optional
+
+# 环形缓冲默认容量（连接质量评分使用最近的样本）
+RECENT_SAMPLES = 20
+
+# 直方图最小可分辨值（秒），更小的值计入第一个桶
+MIN_LATENCY = 1e-4
+
+# 每个2倍区间的桶数
+SUB_BUCKETS = 8
+
+# 覆盖的2倍区间数：MIN_LATENCY * 2**26 约 6700 秒
+OCTAVES = 26
+
+BUCKET_COUNT = SUB_BUCKETS * OCTAVES
+
+# 操作名称；连接阶段为 "connect.<阶段>"
+HEARTBEAT = "heartbeat"
+COMMAND = "command"
+CONNECT_PREFIX = "connect."
+
+
+def bucket_index(value: float) -> int:
+    """值所在的桶"""
+    if value <= MIN_LATENCY:
+        return 0
+    index = int(math.log2(value / MIN_LATENCY) * SUB_BUCKETS)
+    return min(index, BUCKET_COUNT - 1)
+
+
+def bucket_upper(index: int) -> float:
+    """桶的上界"""
+    return MIN_LATENCY * 2 ** ((index + 1) / SUB_BUCKETS)
+
+
+class LatencyStats:
+    """一种操作的延迟统计：最近样本的环形缓冲 + 全部历史的直方图"""
+
+    def __init__(self, capacity: int = RECENT_SAMPLES):
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._ring = array('d', [0.0] * self.capacity)
+        self._next = 0
+        self._size = 0
+        self._ring_sum = 0.0
+        self._buckets = array('Q', [0] * BUCKET_COUNT)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """记录一次耗时（秒）"""
+        seconds = max(0.0, float(seconds))
+        with self._lock:
+            if self._size == self.capacity:
+                self._ring_sum -= self._ring[self._next]
+            else:
+                self._size += 1
+            self._ring[self._next] = seconds
+            self._ring_sum += seconds
+            self._next = (self._next + 1) % self.capacity
+            if self._next == 0:
+                # 每绕一圈重新求和，消除浮点累计误差
+                self._ring_sum = sum(self._ring)
+            self._buckets[bucket_index(seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def recent(self) -> List[float]:
+        """环形缓冲中的样本（从旧到新）"""
+        with self._lock:
+            if self._size < self.capacity:
+                return list(self._ring[:self._size])
+            return list(self._ring[self._next:]) + list(self._ring[:self._next])
+
+    def mean(self, default: float = 0.0) -> float:
+        """最近样本的平均值；没有样本时返回default"""
+        with self._lock:
+            return self._ring_sum / self._size if self._size else default
+
+    def percentile(self, q: float) -> float:
+        """全部历史的分位数（q取0~100），按桶上界估计，不超过最大值"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(self.count * q / 100.0))
+            seen = 0
+            for index, hits in enumerate(self._buckets):
+                seen += hits
+                if seen >= rank:
+                    return min(bucket_upper(index), self.max)
+            return self.max
+
+    def percentiles(self) -> Dict[str, float]:
+        return {'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99)}
+
+    def summary(self) -> Dict[str, Any]:
+        """报告用的摘要"""
+        summary: Dict[str, Any] = {
+            'count': self.count,
+            'mean': self.mean(),
+            'max': self.max
+        }
+        summary.update(self.percentiles())
+        return summary
+
+    def bucket_counts(self) -> Dict[float, int]:
+        """非零桶：{桶上界: 次数}（导出直方图用）"""
+        with self._lock:
+            return {bucket_upper(i): hits for i, hits in enumerate(self._buckets) if hits}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可JSON序列化的形式，只保留非零桶"""
+        with self._lock:
+            buckets = {str(i): hits for i, hits in enumerate(self._buckets) if hits}
+        return {
+            'recent': self.recent(),
+            'buckets': buckets,
+            'count': self.count,
+            'total': self.total,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data: Any, capacity: int = RECENT_SAMPLES) -> 'LatencyStats':
+        """从to_dict的结果恢复；也接受旧版的 response_times 列表"""
+        stats = cls(capacity)
+        if isinstance(data, (list, tuple)):
+            for value in data:
+                stats.record(value)
+            return stats
+        if not isinstance(data, dict):
+            return stats
+        for value in (data.get('recent') or [])[-stats.capacity:]:
+            stats._size += 1
+            stats._ring[stats._next] = float(value)
+            stats._next = (stats._next + 1) % stats.capacity
+        stats._ring_sum = sum(stats._ring)
+        for index, hits in (data.get('buckets') or {}).items():
+            index = int(index)
+            if 0 <= index < BUCKET_COUNT:
+                stats._buckets[index] = int(hits)
+        stats.count = int(data.get('count', sum(stats._buckets)))
+        stats.total = float(data.get('total', 0.0))
+        stats.max = float(data.get('max', 0.0))
+        return stats
+
+
+def latency_stats(metrics: Dict[str, Any], operation: str) -> LatencyStats:
+    """服务器指标中某种操作的延迟统计，不存在时创建"""
+    latency = metrics.setdefault('latency', {})
+    stats = latency.get(operation)
+    if not isinstance(stats, LatencyStats):
+        stats = latency[operation] = LatencyStats()
+    return stats
+
+
+def recent_mean(metrics: Dict[str, Any], operation: str, default: float = 0.0) -> float:
+    """某种操作最近样本的平均值（只读，不创建统计）"""
+    stats = (metrics.get('latency') or {}).get(operation)
+    return stats.mean(default) if isinstance(stats, LatencyStats) else default
+
+
+def latency_summary(metrics: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """服务器所有操作的延迟摘要"""
+    return {operation: stats.summary() for operation, stats in (metrics.get('latency') or {}).items()
+            if isinstance(stats, LatencyStats)}
+
+
+def metrics_snapshot(metrics: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """把服务器指标转换为可JSON序列化的形式（持久化用）"""
+    if metrics is None:
+        return None
+    snapshot = dict(metrics)
+    if 'latency' in snapshot:
+        snapshot['latency'] = {operation: stats.to_dict() if isinstance(stats, LatencyStats) else stats
+                               for operation, stats in (metrics.get('latency') or {}).items()}
+    return snapshot
+
+
+def restore_metrics(data: Dict[str, Any]) -> Dict[str, Any]:
+    """metrics_snapshot 的逆操作；旧版的 response_times 列表并入心跳统计"""
+    metrics = dict(data)
+    latency = {operation: LatencyStats.from_dict(stats)
+               for operation, stats in (metrics.get('latency') or {}).items()}
+    legacy = metrics.pop('response_times', None)
+    if legacy and HEARTBEAT not in latency:
+        latency[HEARTBEAT] = LatencyStats.from_dict(legacy)
+    metrics['latency'] = latency
+    return metrics
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+MetricsExporter - Prometheus文本格式的指标导出
+
+1. 导出连接各阶段、命令执行、心跳的耗时直方图（由 LatencyStats 的对数分桶换算）
+2. 导出心跳次数、失败次数、成功率、连接质量、自动恢复次数和同步统计
+3. MCP_METRICS_PORT：在 127.0.0.1 上提供 /metrics（MCP_METRICS_HOST 可改地址）
+4. MCP_METRICS_TEXTFILE：每 MCP_METRICS_INTERVAL 秒（默认15）原子替换写入文件
+
+每次导出只读取内存中的计数，不执行任何tmux或ssh命令。
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from latency_stats import COMMAND, CONNECT_PREFIX, HEARTBEAT, LatencyStats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+METRIC_PREFIX = 'remote_terminal'
+
+# 导出直方图的桶上界（秒）
+EXPORT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# 写文本文件的默认间隔（秒）
+DEFAULT_TEXTFILE_INTERVAL = 15.0
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value: Any) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class _Family:
+    """一个指标族：HELP/TYPE 加若干样本行"""
+
+    def __init__(self, name: str, metric_type: str, help_text: str):
+        self.name = f'{METRIC_PREFIX}_{name}'
+        self.type = metric_type
+        self.help = help_text
+        self.lines: List[str] = []
+
+    def add(self, value: Any, suffix: str = '', **labels):
+        self.lines.append(f'{self.name}{suffix}{_labels(labels)} {_number(value)}')
+
+    def add_histogram(self, stats: LatencyStats, **labels):
+        counts = sorted(stats.bucket_counts().items())
+        cumulative = 0
+        position = 0
+        for bound in EXPORT_BUCKETS:
+            while position < len(counts) and counts[position][0] <= bound:
+                cumulative += counts[position][1]
+                position += 1
+            self.add(cumulative, '_bucket', **labels, le=_number(bound))
+        self.add(stats.count, '_bucket', **labels, le='+Inf')
+        self.add(stats.total, '_sum', **labels)
+        self.add(stats.count, '_count', **labels)
+
+    def render(self) -> List[str]:
+        if not self.lines:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}'] + self.lines
+
+
+def render_metrics(connection_metrics: Optional[Dict[str, Dict[str, Any]]] = None,
+                   sync_stats: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    渲染Prometheus文本格式
+
+    Args:
+        connection_metrics: EnhancedSSHManager.connection_metrics
+        sync_stats: {服务器名: SyncManager 的同步统计}
+    """
+    connect = _Family('connect_stage_seconds', 'histogram', '智能连接各阶段耗时')
+    command = _Family('command_seconds', 'histogram', '命令执行耗时（开始到结束标记）')
+    beat = _Family('heartbeat_seconds', 'histogram', '带外心跳耗时')
+    checks = _Family('heartbeat_checks_total', 'counter', '心跳检查次数')
+    failures = _Family('heartbeat_failures_total', 'counter', '失败的心跳检查次数')
+    success = _Family('heartbeat_success_ratio', 'gauge', '心跳成功率')
+    quality = _Family('connection_quality', 'gauge', '连接质量评分（0~1）')
+    recovery = _Family('auto_recovery_attempts', 'gauge', '当前连续自动恢复次数（恢复成功后清零）')
+    last_beat = _Family('last_heartbeat_timestamp_seconds', 'gauge', '最近一次成功心跳的时间')
+
+    for server, metrics in sorted((connection_metrics or {}).items()):
+        for operation, stats in sorted((metrics.get('latency') or {}).items()):
+            if not isinstance(stats, LatencyStats):
+                continue
+            if operation == HEARTBEAT:
+                beat.add_histogram(stats, server=server)
+            elif operation == COMMAND:
+                command.add_histogram(stats, server=server)
+            elif operation.startswith(CONNECT_PREFIX):
+                connect.add_histogram(stats, server=server, stage=operation[len(CONNECT_PREFIX):])
+        for family, key in ((checks, 'total_checks'), (failures, 'failed_checks'), (success, 'success_rate'),
+                            (quality, 'connection_quality'), (recovery, 'auto_recovery_count'),
+                            (last_beat, 'last_heartbeat')):
+            if key in metrics:
+                family.add(metrics[key], server=server)
+
+    ticks = _Family('sync_ticks_total', 'counter', '同步轮次')
+    pushes = _Family('sync_pushes_total', 'counter', '有文件变化的同步轮次')
+    sync_failures = _Family('sync_failures_total', 'counter', '失败的同步轮次')
+    files = _Family('sync_files_total', 'counter', '推送的文件数')
+    deleted = _Family('sync_deleted_files_total', 'counter', '远端删除的文件数')
+    sync_bytes = _Family('sync_bytes_total', 'counter', '推送的字节数')
+    tracked = _Family('sync_tracked_files', 'gauge', '同步引擎跟踪的文件数')
+
+    for server, stats in sorted((sync_stats or {}).items()):
+        for family, key in ((ticks, 'ticks'), (pushes, 'pushes'), (sync_failures, 'failures'),
+                            (files, 'files'), (deleted, 'deleted'), (sync_bytes, 'bytes'),
+                            (tracked, 'tracked_files')):
+            if key in stats:
+                family.add(stats[key], server=server)
+
+    lines: List[str] = []
+    for family in (connect, command, beat, checks, failures, success, quality, recovery, last_beat,
+                   ticks, pushes, sync_failures, files, deleted, sync_bytes, tracked):
+        lines.extend(family.render())
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def default_sources() -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """进程内共享的管理器指标和同步统计（同步模块未加载时不导入，避免创建同步管理器）"""
+    from enhanced_ssh_manager import get_enhanced_manager
+    connection_metrics = dict(get_enhanced_manager().connection_metrics)
+    sync_module = sys.modules.get('sync_manager')
+    sync_stats = sync_module.sync_manager.all_sync_stats() if sync_module is not None else {}
+    return connection_metrics, sync_stats
+
+
+class MetricsExporter:
+    """按需渲染指标，提供HTTP端点和/或定期写入textfile collector文件"""
+
+    def __init__(self, sources: Callable[[], Tuple[Dict[str, Any], Dict[str, Any]]] = default_sources):
+        self.sources = sources
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def render(self) -> str:
+        connection_metrics, sync_stats = self.sources()
+        return render_metrics(connection_metrics, sync_stats)
+
+    def start_http(self, port: int, host: str = '127.0.0.1') -> int:
+        """在后台线程提供 /metrics，返回实际监听的端口（port为0时随机分配）"""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                try:
+                    body = exporter.render().encode('utf-8')
+                except Exception:
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # stdout/stderr属于MCP协议，不输出访问日志
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self._server.server_address[1]
+
+    def write_textfile(self, path: str):
+        """原子替换写入（textfile collector不会读到写了一半的文件）"""
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def start_textfile(self, path: str, interval: float = DEFAULT_TEXTFILE_INTERVAL):
+        """后台定期写入文本文件"""
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.write_textfile(path)
+                except Exception:
+                    pass
+                self._stop.wait(interval)
+
+        thread = threading.Thread(target=loop, name='metrics-textfile', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+
+def start_metrics_exporter_from_env() -> Optional[MetricsExporter]:
+    """按环境变量启动导出；两个变量都没有设置时不启动"""
+    port = os.getenv('MCP_METRICS_PORT')
+    textfile = os.getenv('MCP_METRICS_TEXTFILE')
+    if not port and not textfile:
+        return None
+    exporter = MetricsExporter()
+    if port:
+        exporter.start_http(int(port), os.getenv('MCP_METRICS_HOST', '127.0.0.1'))
+    if textfile:
+        exporter.start_textfile(textfile, float(os.getenv('MCP_METRICS_INTERVAL', DEFAULT_TEXTFILE_INTERVAL)))
+    return exporter
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+PaneStream - 基于tmux pipe-pane的会话输出流与命令完成检测
+
+每个受管会话通过 `tmux pipe-pane -O` 把窗格输出写入一个FIFO，后台线程
+阻塞读取后写入按字节偏移寻址的定长环形缓冲区并唤醒等待者。命令完成
+可以在tmux输出结束标记的瞬间被检测到，不再需要每秒capture-pane轮询；
+命令输出直接从缓冲区截取，包括已经滚出屏幕的内容，每次检查只处理
+新到达的字节。
+
+命令用唯一的开始/结束标记包裹，结束标记携带 `$?`，因此可以拿到真实的
+退出码，而不是从 "command not found" 之类的字符串中猜测。前台程序不是
+shell（远端Python REPL、y/n提示、relay-cli等）时用 send_raw_command 原样发送。
+"""
+
+import os
+import re
+import time
+import uuid
+import shlex
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from tmux_client import tmux_run
+
+# 每个会话环形缓冲区的容量（字节）
+MAX_BUFFER_BYTES = 1024 * 1024
+
+# 等待cat打开FIFO写端的时间（秒），超时视为pipe-pane不可用
+STREAM_CONNECT_TIMEOUT = 0.5
+
+# pipe-pane建立失败后，多久之内不再重试（秒）
+STREAM_RETRY_INTERVAL = 30.0
+
+# 没有输出流时，若这么久仍在窗格中看不到包裹后的命令，则认为无法跟踪（秒）
+UNTRACKABLE_AFTER = 1.0
+
+# 跨数据块搜索时回看的字节数，需大于结束标记长度
+_SEARCH_OVERLAP = 256
+
+# 终端控制序列：CSI、OSC以及其它两字节ESC序列
+_ANSI_ESCAPE = re.compile(
+    r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]'
+)
+
+
+def clean_terminal_output(data: bytes) -> str:
+    """把原始终端输出转换为纯文本：去掉控制序列，按回车覆盖规则处理\\r"""
+    text = _ANSI_ESCAPE.sub('', data.decode('utf-8', 'replace'))
+    lines = []
+    for line in text.replace('\r\n', '\n').split('\n'):
+        # 进度条等用\r覆盖当前行，只保留最后一段
+        if '\r' in line:
+            line = line.rsplit('\r', 1)[-1]
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+@dataclass
+class CommandCompletion:
+    """命令完成检测结果"""
+    tracked: bool  # 是否通过结束标记确认了完成
+    completed: bool = False  # 是否在超时前完成
+    exit_code: Optional[int] = None
+    duration: float = 0.0
+    via: str = ""  # stream / poll
+    output: Optional[str] = None  # 开始与结束标记之间的命令输出
+    truncated: bool = False  # 输出开头是否已被环形缓冲区覆盖
+
+
+class CommandSentinel:
+    """命令开始/结束标记"""
+
+    def __init__(self, token: Optional[str] = None):
+        self.token = token or uuid.uuid4().hex[:12]
+        # 输入行中标记被 "" 拆开，只有真正执行后的输出才能匹配
+        self.end_pattern: Pattern[bytes] = re.compile(
+            rb'__RT_END_' + self.token.encode('ascii') + rb':(\d+)'
+        )
+        self.begin_pattern: Pattern[bytes] = re.compile(
+            rb'__RT_BEGIN_' + self.token.encode('ascii')
+        )
+
+    def wrap(self, command: str) -> str:
+        """
+        包裹命令，执行前输出开始标记，执行后输出带退出码的结束标记
+
+        命令放在 { } 中，结束标记另起一行：命令末尾的 # 注释、续行符、heredoc
+        都不会吞掉结束标记（中间的空行结束续行）。整个复合命令读完才执行，
+        回显的输入行都在开始标记之前。
+        """
+        body = command.rstrip()
+        return (f'echo "__RT_BE""GIN_{self.token}"; {{ {body}\n\n}}; '
+                f'echo "__RT_E""ND_{self.token}:$?"')
+
+    def find_exit_code(self, text: str) -> Optional[int]:
+        """在文本中查找结束标记，返回退出码"""
+        match = self.end_pattern.search(text.encode('utf-8', 'replace'))
+        return int(match.group(1)) if match else None
+
+    def extract_output(self, data: bytes) -> Tuple[bytes, bool]:
+        """
+        截取开始标记所在行之后、结束标记之前的输出
+
+        Returns:
+            (输出, 是否缺少开始标记即开头已丢失)
+        """
+        end_match = self.end_pattern.search(data)
+        if end_match:
+            data = data[:end_match.start()]
+        begin_match = None
+        for begin_match in self.begin_pattern.finditer(data):
+            pass
+        if begin_match is None:
+            return data, True
+        newline = data.find(b'\n', begin_match.end())
+        return (data[newline + 1:] if newline >= 0 else b''), False
+
+
+class OutputRingBuffer:
+    """定长环形缓冲区，按写入以来的绝对字节偏移寻址"""
+
+    def __init__(self, capacity: int = MAX_BUFFER_BYTES):
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._written = 0
+
+    @property
+    def start(self) -> int:
+        """缓冲区中最早一个字节的绝对偏移"""
+        return max(0, self._written - self.capacity)
+
+    @property
+    def end(self) -> int:
+        """下一个写入字节的绝对偏移（即总写入字节数）"""
+        return self._written
+
+    def write(self, chunk: bytes):
+        """写入数据，超出容量时覆盖最旧的数据"""
+        size = len(chunk)
+        view = memoryview(chunk)
+        skipped = 0
+        if size > self.capacity:
+            skipped = size - self.capacity
+            view = view[skipped:]
+        pos = (self._written + skipped) % self.capacity
+        first = min(len(view), self.capacity - pos)
+        self._data[pos:pos + first] = view[:first]
+        if first < len(view):
+            self._data[:len(view) - first] = view[first:]
+        self._written += size
+
+    def read(self, start: int, end: Optional[int] = None) -> bytes:
+        """读取[start, end)范围的数据，范围会被截断到缓冲区仍保留的部分"""
+        start = max(start, self.start)
+        end = self._written if end is None else min(end, self._written)
+        if start >= end:
+            return b''
+        pos = start % self.capacity
+        length = end - start
+        if pos + length <= self.capacity:
+            return bytes(self._data[pos:pos + length])
+        first = self.capacity - pos
+        return bytes(self._data[pos:]) + bytes(self._data[:length - first])
+
+
+class PaneStream:
+    """单个tmux会话的pipe-pane输出流"""
+
+    def __init__(self, session_name: str, stream_dir: Optional[str] = None):
+        self.session_name = session_name
+        self.stream_dir = stream_dir or _get_stream_dir()
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', session_name)
+        self.fifo_path = os.path.join(self.stream_dir, f"{safe_name}.{os.getpid()}.fifo")
+        self._ring = OutputRingBuffer()
+        self._cond = threading.Condition()
+        self._connected = threading.Event()
+        self._active = False
+        self._reader: Optional[threading.Thread] = None
+
+    @property
+    def position(self) -> int:
+        """已接收的总字节数（绝对偏移）"""
+        with self._cond:
+            return self._ring.end
+
+    def is_active(self) -> bool:
+        """输出流是否仍在接收数据"""
+        return self._active
+
+    def start(self) -> bool:
+        """建立pipe-pane到FIFO的输出流"""
+        try:
+            if os.path.exists(self.fifo_path):
+                os.unlink(self.fifo_path)
+            os.mkfifo(self.fifo_path, 0o600)
+        except OSError:
+            return False
+
+        self._active = True
+        self._connected.clear()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+        result = tmux_run(
+            ['tmux', 'pipe-pane', '-O', '-t', self.session_name,
+             f"cat > {shlex.quote(self.fifo_path)}"],
+            capture_output=True
+        )
+        if result.returncode == 0 and self._connected.wait(STREAM_CONNECT_TIMEOUT):
+            return True
+
+        self._unblock_reader()
+        self._active = False
+        return False
+
+    def stop(self):
+        """关闭pipe-pane并清理FIFO"""
+        try:
+            tmux_run(['tmux', 'pipe-pane', '-t', self.session_name], capture_output=True)
+        except Exception:
+            pass
+        self._unblock_reader()
+        self._active = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def _unblock_reader(self):
+        # 读线程可能还阻塞在open()上，打开一次写端让它拿到EOF后退出
+        if not self._connected.is_set():
+            try:
+                fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+                os.close(fd)
+            except OSError:
+                pass
+        try:
+            os.unlink(self.fifo_path)
+        except OSError:
+            pass
+
+    def _read_loop(self):
+        try:
+            fd = os.open(self.fifo_path, os.O_RDONLY)
+        except OSError:
+            self._active = False
+            return
+        self._connected.set()
+        try:
+            with os.fdopen(fd, 'rb', buffering=0) as fifo:
+                while True:
+                    chunk = fifo.read(65536)
+                    if not chunk:
+                        break
+                    self._append(chunk)
+        except OSError:
+            pass
+        finally:
+            # 会话被杀死时cat退出，这里收到EOF后顺带清理FIFO
+            try:
+                os.unlink(self.fifo_path)
+            except OSError:
+                pass
+            with self._cond:
+                self._active = False
+                self._cond.notify_all()
+
+    def _append(self, chunk: bytes):
+        with self._cond:
+            self._ring.write(chunk)
+            self._cond.notify_all()
+
+    def read(self, start: int, end: Optional[int] = None) -> Tuple[bytes, int]:
+        """
+        读取[start, end)范围内的原始输出
+
+        Returns:
+            (数据, 实际起始偏移)；start已被覆盖时实际起始偏移大于start
+        """
+        with self._cond:
+            actual_start = max(start, self._ring.start)
+            return self._ring.read(actual_start, end), actual_start
+
+    def wait_for(self, pattern: Pattern[bytes], start_offset: int,
+                 timeout: float) -> Optional[Tuple[int, int, tuple]]:
+        """
+        等待start_offset之后的输出匹配pattern
+
+        Returns:
+            (匹配开始偏移, 匹配结束偏移, 分组) ；超时或流已关闭时返回None
+        """
+        deadline = time.time() + timeout
+        scan_from = start_offset
+        with self._cond:
+            while True:
+                # 只扫描新到达的数据，保留少量重叠以匹配跨块的标记
+                window_start = max(scan_from, self._ring.start)
+                match = pattern.search(self._ring.read(window_start))
+                if match:
+                    return window_start + match.start(), window_start + match.end(), match.groups()
+                scan_from = max(self._ring.end - _SEARCH_OVERLAP, start_offset)
+                remaining = deadline - time.time()
+                if not self._active or remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+_stream_dir: Optional[str] = None
+_streams: Dict[str, PaneStream] = {}
+_failed_streams: Dict[str, float] = {}
+_session_locks: Dict[str, threading.Lock] = {}
+_streams_lock = threading.Lock()
+
+
+def _get_stream_dir() -> str:
+    global _stream_dir
+    if _stream_dir is None:
+        _stream_dir = tempfile.mkdtemp(prefix="remote-terminal-streams-")
+    return _stream_dir
+
+
+def _session_lock(session_name: str) -> threading.Lock:
+    with _streams_lock:
+        lock = _session_locks.get(session_name)
+        if lock is None:
+            lock = _session_locks[session_name] = threading.Lock()
+        return lock
+
+
+def get_pane_stream(session_name: str) -> Optional[PaneStream]:
+    """获取会话的输出流，必要时建立；pipe-pane不可用时返回None"""
+    # 建立输出流最多等待 STREAM_CONNECT_TIMEOUT，只锁住这个会话，其它会话的调用不用排队
+    with _session_lock(session_name):
+        with _streams_lock:
+            stream = _streams.get(session_name)
+            if stream is not None and stream.is_active():
+                return stream
+            failed_at = _failed_streams.get(session_name)
+            if failed_at is not None and time.time() - failed_at < STREAM_RETRY_INTERVAL:
+                return None
+            stream = PaneStream(session_name)
+
+        started = stream.start()
+        with _streams_lock:
+            if started:
+                _streams[session_name] = stream
+                _failed_streams.pop(session_name, None)
+                return stream
+            _streams.pop(session_name, None)
+            _failed_streams[session_name] = time.time()
+            return None
+
+
+def reset_pane_stream(session_name: str) -> Optional[PaneStream]:
+    """会话（重新）创建后调用：丢弃旧的输出流并从头建立新的输出流"""
+    close_pane_stream(session_name)
+    return get_pane_stream(session_name)
+
+
+def close_pane_stream(session_name: str):
+    """关闭会话的输出流（断开连接时调用）"""
+    with _session_lock(session_name):
+        with _streams_lock:
+            stream = _streams.pop(session_name, None)
+            _failed_streams.pop(session_name, None)
+        if stream is not None:
+            stream.stop()
+
+
+def _send_lines(session_name: str, text: str):
+    # 逐行发送再按Enter，参数中没有换行，仍然可以走控制连接
+    keys: List[str] = []
+    for line in text.split('\n'):
+        if line:
+            keys.append(line)
+        keys.append('Enter')
+    tmux_run(['tmux', 'send-keys', '-t', session_name] + keys, capture_output=True, check=True)
+
+
+def send_raw_command(session_name: str, command: str):
+    """原样发送输入，不加标记（前台程序不是shell时使用），完成只能按输出稳定性判断"""
+    _send_lines(session_name, command)
+
+
+def send_wrapped_command(session_name: str, command: str) -> Tuple[CommandSentinel, Optional[PaneStream], int]:
+    """
+    用开始/结束标记包裹命令并发送到会话
+
+    Returns:
+        (标记, 输出流, 发送前的流偏移)
+    """
+    sentinel = CommandSentinel()
+    stream = get_pane_stream(session_name)
+    start_offset = stream.position if stream else 0
+    _send_lines(session_name, sentinel.wrap(command))
+    return sentinel, stream, start_offset
+
+
+def wait_for_output(session_name: str, pattern: Pattern[bytes], stream: Optional[PaneStream],
+                    start_offset: int, timeout: float = 30) -> bool:
+    """
+    等待会话输出中出现pattern（用于命令执行过程中的中间标记）
+
+    有输出流时只匹配start_offset之后的输出；否则以自适应间隔轮询capture-pane。
+    """
+    if stream is not None:
+        if stream.wait_for(pattern, start_offset, timeout) is not None:
+            return True
+        if stream.is_active():
+            return False
+
+    start_time = time.time()
+    interval = 0.05
+    while time.time() - start_time < timeout:
+        result = tmux_run(
+            ['tmux', 'capture-pane', '-p', '-J', '-S', '-200', '-t', session_name],
+            capture_output=True
+        )
+        if result.returncode != 0:
+            return False
+        if pattern.search(result.stdout):
+            return True
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+    return False
+
+
+def wait_for_command(session_name: str, sentinel: CommandSentinel, stream: Optional[PaneStream],
+                     start_offset: int, timeout: float = 30) -> CommandCompletion:
+    """
+    等待包裹后的命令完成
+
+    有输出流时阻塞等待结束标记，标记到达即返回，输出取自环形缓冲区中
+    两个标记之间的字节；否则以自适应间隔(50ms起，最多500ms) 轮询
+    capture-pane查找结束标记。若窗格中始终看不到包裹后的命令（例如会话
+    未真正运行shell），返回tracked=False，由调用方回退到原有的输出稳定性判断。
+    """
+    start_time = time.time()
+
+    if stream is not None:
+        found = stream.wait_for(sentinel.end_pattern, start_offset, timeout)
+        if found is not None or stream.is_active():
+            end_offset = found[0] if found is not None else None
+            data, actual_start = stream.read(start_offset, end_offset)
+            raw_output, missing_begin = sentinel.extract_output(data)
+            return CommandCompletion(
+                tracked=True,
+                completed=found is not None,
+                exit_code=int(found[2][0]) if found is not None else None,
+                duration=time.time() - start_time,
+                via="stream",
+                output=clean_terminal_output(raw_output),
+                truncated=missing_begin and actual_start > start_offset
+            )
+        # 输出流中途关闭（会话被杀等），剩余时间改为轮询
+
+    interval = 0.05
+    seen_wrapper = False
+    while time.time() - start_time < timeout:
+        result = tmux_run(
+            ['tmux', 'capture-pane', '-p', '-J', '-S', '-200', '-t', session_name],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            break
+        exit_code = sentinel.find_exit_code(result.stdout)
+        if exit_code is not None:
+            raw_output, missing_begin = sentinel.extract_output(result.stdout.encode('utf-8', 'replace'))
+            return CommandCompletion(tracked=True, completed=True, exit_code=exit_code,
+                                     duration=time.time() - start_time, via="poll",
+                                     output=clean_terminal_output(raw_output),
+                                     truncated=missing_begin)
+        seen_wrapper = seen_wrapper or sentinel.token in result.stdout
+        if not seen_wrapper and time.time() - start_time >= UNTRACKABLE_AFTER:
+            return CommandCompletion(tracked=False, duration=time.time() - start_time, via="poll")
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+
+    return CommandCompletion(tracked=seen_wrapper, completed=False,
+                             duration=time.time() - start_time, via="poll")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+PaneTransfer - 通过tmux会话向远端（或容器内）传输文件
+
+1. 远端执行关闭回显的 `base64 -d >> 文件` 接收命令，本地用 load-buffer + paste-buffer 整块粘贴
+2. 每块以结束标记确认（见 pane_stream），块大小按实测吞吐自适应，可压缩的文件先gzip
+3. 写入临时文件，校验sha256一致后原子地mv到目标路径
+"""
+
+import base64
+import gzip
+import hashlib
+import os
+import re
+import shlex
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from pane_stream import send_wrapped_command, wait_for_command, wait_for_output
+from tmux_client import tmux_run
+
+# 第一块的原始字节数
+INITIAL_CHUNK_BYTES = 64 * 1024
+
+# 块大小上下限（原始字节）
+MIN_CHUNK_BYTES = 16 * 1024
+MAX_CHUNK_BYTES = 1024 * 1024
+
+# 自适应时每块期望耗时（秒）
+TARGET_CHUNK_SECONDS = 1.0
+
+# 小于该大小的文件不压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 压缩后至少要减小的比例，否则直接发送原始数据
+COMPRESS_MIN_SAVING = 0.1
+
+# 等待接收端就绪、单块写入完成的超时时间（秒）
+READY_TIMEOUT = 10
+CHUNK_TIMEOUT = 60
+
+_CHECKSUM_PATTERN = re.compile(r'sha256=([0-9a-f]{64})')
+
+
+@dataclass
+class TransferResult:
+    """文件传输结果"""
+    success: bool
+    message: str
+    bytes_sent: int = 0  # 文件原始大小
+    wire_bytes: int = 0  # 实际粘贴到会话中的base64字节数
+    duration: float = 0.0
+    chunks: int = 0
+    compressed: bool = False
+
+
+def next_chunk_size(chunk_bytes: int, elapsed: float) -> int:
+    """根据上一块的实测吞吐计算下一块大小"""
+    if elapsed <= 0:
+        return MAX_CHUNK_BYTES
+    rate = chunk_bytes / elapsed
+    return int(min(MAX_CHUNK_BYTES, max(MIN_CHUNK_BYTES, rate * TARGET_CHUNK_SECONDS)))
+
+
+def prepare_payload(data: bytes):
+    """
+    决定是否压缩
+
+    Returns:
+        (要发送的数据, 是否已压缩)
+    """
+    if len(data) < COMPRESS_MIN_BYTES:
+        return data, False
+    compressed = gzip.compress(data, compresslevel=6, mtime=0)
+    if len(compressed) <= len(data) * (1 - COMPRESS_MIN_SAVING):
+        return compressed, True
+    return data, False
+
+
+def receive_command(part_path: str, ready_marker: str) -> str:
+    """
+    单块接收命令：关闭回显，输出就绪标记，把stdin解码后追加到临时文件
+
+    就绪标记在命令行中被 "" 拆开，只有真正执行后的输出才能匹配。
+    """
+    head, tail = ready_marker[:6], ready_marker[6:]
+    return (f'stty -echo; echo "{head}""{tail}"; base64 -d >> {shlex.quote(part_path)}; '
+            f'rt_rc=$?; stty echo; (exit $rt_rc)')
+
+
+def finalize_command(part_path: str, remote_path: str, digest: str,
+                     compressed: bool, mode: Optional[str] = None) -> str:
+    """解压（如需要）、校验sha256，一致后原子地替换目标文件"""
+    part = shlex.quote(part_path)
+    target = shlex.quote(remote_path)
+    steps = []
+    if compressed:
+        plain = shlex.quote(part_path[:-len('.gz')])
+        steps.append(f'gunzip -c {part} > {plain} && rm -f {part}')
+        part = plain
+    steps.append(f'rt_sum=$( (sha256sum {part} 2>/dev/null || shasum -a 256 {part}) | cut -c1-64)')
+    steps.append('echo "sha256=$rt_sum"')
+    if mode:
+        steps.append(f'chmod {mode} {part}')
+    steps.append(f'[ "$rt_sum" = "{digest}" ] && mv -f {part} {target}')
+    return '; '.join(steps)
+
+
+def parse_checksum(output: Optional[str]) -> Optional[str]:
+    """从收尾命令输出中取出远端计算的sha256"""
+    if not output:
+        return None
+    match = _CHECKSUM_PATTERN.search(output)
+    return match.group(1) if match else None
+
+
+class PaneTransfer:
+    """通过指定tmux会话传输文件"""
+
+    def __init__(self, session_name: str):
+        self.session_name = session_name
+
+    def send_file(self, local_path: str, remote_path: str, mode: Optional[str] = None) -> TransferResult:
+        """传输本地文件到会话当前所在机器的remote_path（相对路径相对于当前目录）"""
+        try:
+            with open(local_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            return TransferResult(False, f"读取本地文件失败: {e}")
+        return self.send_bytes(data, remote_path, mode)
+
+    def send_bytes(self, data: bytes, remote_path: str, mode: Optional[str] = None) -> TransferResult:
+        """传输数据到remote_path"""
+        start_time = time.time()
+        digest = hashlib.sha256(data).hexdigest()
+        payload, compressed = prepare_payload(data)
+        part_path = f"{remote_path}.rt-part" + ('.gz' if compressed else '')
+        result = TransferResult(False, "", bytes_sent=len(data), compressed=compressed)
+
+        try:
+            if not self._run(f': > {shlex.quote(part_path)}', READY_TIMEOUT):
+                result.message = "无法在目标端创建临时文件"
+                return result
+
+            offset = 0
+            chunk_size = INITIAL_CHUNK_BYTES
+            while offset < len(payload):
+                chunk = payload[offset:offset + chunk_size]
+                chunk_start = time.time()
+                error = self._send_chunk(chunk, part_path)
+                if error:
+                    self._cleanup(remote_path)
+                    result.message = f"第{result.chunks + 1}块传输失败: {error}"
+                    return result
+                offset += len(chunk)
+                result.chunks += 1
+                result.wire_bytes += len(base64.encodebytes(chunk))
+                chunk_size = next_chunk_size(len(chunk), time.time() - chunk_start)
+
+            completion = self._finalize(part_path, remote_path, digest, compressed, mode)
+            remote_digest = parse_checksum(completion.output)
+            if not completion.completed or completion.exit_code != 0:
+                self._cleanup(remote_path)
+                result.message = (f"sha256校验失败: 本地 {digest[:12]}, 远端 {remote_digest[:12]}"
+                                  if remote_digest else "收尾命令执行失败或超时")
+                return result
+
+            result.success = True
+            result.message = f"传输完成 ({len(data)} 字节, {result.chunks} 块)"
+            return result
+        finally:
+            result.duration = time.time() - start_time
+
+    def _run(self, command: str, timeout: float) -> bool:
+        sentinel, stream, start_offset = send_wrapped_command(self.session_name, command)
+        completion = wait_for_command(self.session_name, sentinel, stream, start_offset, timeout)
+        return completion.completed and completion.exit_code == 0
+
+    def _finalize(self, part_path: str, remote_path: str, digest: str,
+                  compressed: bool, mode: Optional[str]):
+        command = finalize_command(part_path, remote_path, digest, compressed, mode)
+        sentinel, stream, start_offset = send_wrapped_command(self.session_name, command)
+        return wait_for_command(self.session_name, sentinel, stream, start_offset, CHUNK_TIMEOUT)
+
+    def _send_chunk(self, chunk: bytes, part_path: str) -> Optional[str]:
+        """发送一块，成功返回None，失败返回原因"""
+        ready_marker = f"__RT_READY_{uuid.uuid4().hex[:12]}"
+        sentinel, stream, start_offset = send_wrapped_command(
+            self.session_name, receive_command(part_path, ready_marker))
+        if not wait_for_output(self.session_name, re.compile(ready_marker.encode('ascii')),
+                               stream, start_offset, READY_TIMEOUT):
+            return "接收端未就绪"
+
+        buffer_name = f"rt-transfer-{uuid.uuid4().hex[:8]}"
+        fd, buffer_file = tempfile.mkstemp(prefix="rt-transfer-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(base64.encodebytes(chunk))
+            tmux_run(['tmux', 'load-buffer', '-b', buffer_name, buffer_file],
+                     capture_output=True, check=True)
+            tmux_run(['tmux', 'paste-buffer', '-d', '-b', buffer_name, '-t', self.session_name],
+                     capture_output=True, check=True)
+            # 数据以换行结尾，行首的Ctrl-D让base64 -d读到EOF
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, 'C-d'],
+                     capture_output=True, check=True)
+        except Exception as e:
+            # 接收端仍在等待输入，发送EOF让其退出
+            tmux_run(['tmux', 'send-keys', '-t', self.session_name, 'C-d'], capture_output=True)
+            return f"粘贴数据失败: {e}"
+        finally:
+            os.unlink(buffer_file)
+
+        completion = wait_for_command(self.session_name, sentinel, stream, start_offset, CHUNK_TIMEOUT)
+        if not completion.completed:
+            return "写入超时"
+        if completion.exit_code != 0:
+            return f"base64解码失败 (退出码 {completion.exit_code})"
+        return None
+
+    def _cleanup(self, remote_path: str):
+        quoted = shlex.quote(f"{remote_path}.rt-part")
+        self._run(f'rm -f {quoted} {quoted}.gz', READY_TIMEOUT)
+
+
+def transfer_file(session_name: str, local_path: str, remote_path: str,
+                  mode: Optional[str] = None) -> TransferResult:
+    """通过tmux会话传输文件的便捷入口"""
+    return PaneTransfer(session_name).send_file(local_path, remote_path, mode)
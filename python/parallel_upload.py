@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+ParallelUploader - 大批量同步的多通道并行上传
+
+一批成千上万个文件逐个上传时，耗时主要花在每个文件的往返上。这里把一批
+文件拆成若干上传单元，在多条并行通道上同时发送：
+
+- 小文件按路径顺序打包成tar流（每个单元一次往返），远端 `tar -xf -` 解包
+- 大文件单独占一条通道，用 `cat` 写入临时文件后改名，不会留下半个文件
+- 单元按大小从大到小分配给空闲通道，大文件先发，尾部由小单元填平
+
+每条通道是一次独立的 `ssh` 调用，通过ControlMaster复用同一条已认证的连接，
+不需要重新握手（sshd默认 MaxSessions=10，所以通道数上限为8）。
+上传结束后报告吞吐量和单文件延迟（从开始上传到远端确认写入），
+用于按链路调整通道数。
+"""
+
+import math
+import os
+import posixpath
+import shlex
+import subprocess
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+# 默认并行通道数，可通过环境变量 MCP_SYNC_STREAMS 或同步配置的 upload_streams 调整
+DEFAULT_UPLOAD_STREAMS = 4
+
+# 通道数上限（sshd默认每条连接最多10个会话）
+MAX_UPLOAD_STREAMS = 8
+
+# 不小于该大小的文件单独上传，不打包（字节）
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+
+# 单个tar包的上限
+TAR_BUNDLE_BYTES = 32 * 1024 * 1024
+TAR_BUNDLE_FILES = 2000
+
+# 单个上传单元的超时时间（秒）
+UPLOAD_TIMEOUT = 600
+
+
+@dataclass
+class UploadUnit:
+    """一个上传单元：一个tar包或一个大文件"""
+    kind: str  # tar / file
+    paths: List[str]
+    bytes: int
+
+
+@dataclass
+class UploadReport:
+    """一次并行上传的统计"""
+    files: int = 0
+    bytes: int = 0
+    streams: int = 0
+    bundles: int = 0
+    large_files: int = 0
+    skipped: int = 0  # 上传前已被删除的文件
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """字节/秒"""
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    def latency(self, quantile: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(quantile * (len(ordered) - 1))))]
+
+    def to_dict(self) -> Dict:
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'streams': self.streams,
+            'bundles': self.bundles,
+            'large_files': self.large_files,
+            'skipped': self.skipped,
+            'duration': round(self.duration, 3),
+            'throughput': round(self.throughput),
+            'latency': {
+                'p50': round(self.latency(0.5), 3),
+                'p95': round(self.latency(0.95), 3),
+                'max': round(self.latency(1.0), 3)
+            },
+            'errors': self.errors[:5]
+        }
+
+
+def plan_upload(files: Dict[str, int], streams: int = DEFAULT_UPLOAD_STREAMS,
+                large_file_bytes: int = LARGE_FILE_BYTES) -> List[UploadUnit]:
+    """
+    把 {相对路径: 大小} 拆成上传单元，按大小从大到小排列
+
+    小文件按路径排序后连续打包（同一目录的文件进同一个包），
+    包的大小取总量的 1/streams，保证每条通道都有活干。
+    """
+    large = [UploadUnit('file', [path], size) for path, size in files.items() if size >= large_file_bytes]
+    small = sorted(path for path, size in files.items() if size < large_file_bytes)
+    units = list(large)
+    if small:
+        small_bytes = sum(files[path] for path in small)
+        bundle_bytes = max(1, min(TAR_BUNDLE_BYTES, math.ceil(small_bytes / streams)))
+        bundle_files = max(1, min(TAR_BUNDLE_FILES, math.ceil(len(small) / streams)))
+        current = UploadUnit('tar', [], 0)
+        for path in small:
+            current.paths.append(path)
+            current.bytes += files[path]
+            if current.bytes >= bundle_bytes or len(current.paths) >= bundle_files:
+                units.append(current)
+                current = UploadUnit('tar', [], 0)
+        if current.paths:
+            units.append(current)
+    units.sort(key=lambda unit: unit.bytes, reverse=True)
+    return units
+
+
+class ParallelUploader:
+    """多通道并行上传器"""
+
+    def __init__(self, command_factory: Callable[[str], List[str]],
+                 streams: int = DEFAULT_UPLOAD_STREAMS,
+                 large_file_bytes: int = LARGE_FILE_BYTES, limiter=None):
+        """
+        Args:
+            command_factory: 把远程shell命令包装成本地可执行的参数列表，
+                             例如 lambda command: pool.ssh_command(server, command)
+            streams: 并行通道数
+            large_file_bytes: 单独上传的文件大小阈值
+            limiter: 共享的带宽限制器（见 sync_scheduler.BandwidthLimiter）
+        """
+        self.command_factory = command_factory
+        self.streams = max(1, min(MAX_UPLOAD_STREAMS, int(streams)))
+        self.large_file_bytes = large_file_bytes
+        self.limiter = limiter
+
+    def upload(self, local_root: str, remote_root: str, files: Dict[str, int]) -> UploadReport:
+        """
+        上传 {相对路径: 大小}，相对路径在远端保持不变
+
+        所有单元都会尝试上传；有失败时 report.errors 非空。
+        """
+        report = UploadReport()
+        units = plan_upload(files, self.streams, self.large_file_bytes)
+        if not units:
+            return report
+        report.streams = min(self.streams, len(units))
+        report.bundles = sum(1 for unit in units if unit.kind == 'tar')
+        report.large_files = len(units) - report.bundles
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=report.streams, thread_name_prefix="sync-upload") as executor:
+            futures = [executor.submit(self._send_unit, local_root, remote_root, unit, start_time)
+                       for unit in units]
+            for unit, future in zip(units, futures):
+                try:
+                    sent, skipped, finished_at = future.result()
+                except Exception as e:
+                    report.errors.append(f"{unit.paths[0]}{' 等' if len(unit.paths) > 1 else ''}: {e}")
+                    continue
+                report.files += len(sent)
+                report.bytes += sum(files[path] for path in sent)
+                report.skipped += skipped
+                report.latencies.extend([finished_at - start_time] * len(sent))
+        report.duration = time.time() - start_time
+        return report
+
+    def _send_unit(self, local_root: str, remote_root: str, unit: UploadUnit, start_time: float):
+        if self.limiter is not None:
+            self.limiter.acquire(unit.bytes)
+        if unit.kind == 'tar':
+            sent, skipped = self._send_tar(local_root, remote_root, unit.paths)
+        else:
+            sent, skipped = self._send_file(local_root, remote_root, unit.paths[0])
+        return sent, skipped, time.time()
+
+    def _run(self, command: str, feed) -> None:
+        """执行远程命令，feed(stdin) 负责写入数据"""
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(self.command_factory(command), stdin=subprocess.PIPE,
+                                       stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                try:
+                    feed(process.stdin)
+                finally:
+                    process.stdin.close()
+                returncode = process.wait(timeout=UPLOAD_TIMEOUT)
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            if returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', 'replace').strip()[-300:]
+                raise RuntimeError(f"退出码 {returncode}: {message}")
+
+    def _send_tar(self, local_root: str, remote_root: str, paths: List[str]):
+        sent, skipped = [], 0
+
+        def feed(stdin):
+            nonlocal skipped
+            with tarfile.open(fileobj=stdin, mode='w|', format=tarfile.PAX_FORMAT) as archive:
+                for rel_path in paths:
+                    try:
+                        archive.add(os.path.join(local_root, rel_path), arcname=rel_path, recursive=False)
+                    except FileNotFoundError:
+                        skipped += 1
+                        continue
+                    sent.append(rel_path)
+
+        root = remote_quote(remote_root)
+        self._run(f"mkdir -p {root} && tar -xf - -C {root}", feed)
+        return sent, skipped
+
+    def _send_file(self, local_root: str, remote_root: str, rel_path: str):
+        local_path = os.path.join(local_root, rel_path)
+        try:
+            source = open(local_path, 'rb')
+            mode = os.fstat(source.fileno()).st_mode & 0o7777
+        except FileNotFoundError:
+            return [], 1
+        target = posixpath.join(remote_root, rel_path)
+        temp_target = remote_quote(target + '.part')
+        command = (f"mkdir -p {remote_quote(posixpath.dirname(target))} && cat > {temp_target} && "
+                   f"chmod {mode:o} {temp_target} && mv -f {temp_target} {remote_quote(target)}")
+        with source:
+            self._run(command, lambda stdin: _copy_stream(source, stdin))
+        return [rel_path], 0
+
+
+def remote_quote(path: str) -> str:
+    """
+    为远端shell命令引用路径，开头的 `~/` 保持不引用
+
+    整体shlex.quote会阻止波浪号展开，`~/proj` 会变成远端当前目录下名为
+    `~` 的目录；rsync的 `host:~/proj/` 目标则会展开，两种推送方式要一致。
+    """
+    if path == '~':
+        return path
+    if path.startswith('~/'):
+        rest = path[2:]
+        return '~/' + shlex.quote(rest) if rest else '~/'
+    return shlex.quote(path)
+
+
+def _copy_stream(source, target, block_size: int = 1024 * 1024):
+    for block in iter(lambda: source.read(block_size), b''):
+        target.write(block)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+PathFilter - 编译后的同步包含/排除规则
+
+同步配置里的 sync_patterns / exclude_patterns 是 `*.py`、`node_modules`、`.git`
+这类glob列表。这里把它们一次性编译好，遍历目录时直接剪掉被排除的目录，
+`node_modules` 这样的大目录整棵不进入，而不是先遍历再逐个过滤。
+
+规则（与 .gitignore 的常见写法一致）：
+
+- 不含 `/` 的模式匹配任意一级的名称：`node_modules`、`*.pyc`
+- 含 `/` 的模式从同步根目录开始匹配相对路径：`build/output`、`/docs/*.md`
+- `**` 匹配任意多级目录：`src/**/generated`
+- 以 `/` 结尾的模式只匹配目录：`logs/`
+- 排除规则同时作用于文件和目录；包含规则只作用于文件，为空时包含所有文件
+
+不含通配符的名称放在集合里直接查找，其余同类模式合并为一个正则，
+每个目录项最多一次集合查找加一次正则匹配。
+"""
+
+import os
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_GLOB_CHARS = frozenset('*?[')
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """把glob翻译为正则：`*`、`?` 不跨越 `/`，`**` 跨越任意多级目录"""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                i += 2
+                if pattern.startswith('/', i):
+                    # `**/` 可以匹配零级目录
+                    parts.append('(?:.*/)?')
+                    i += 1
+                else:
+                    parts.append('.*')
+                continue
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 2 if pattern.startswith(('[!', '[]'), i) else i + 1)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = end
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+
+class _RuleSet:
+    """同一类模式：名称字面量集合 + 合并后的名称正则 + 合并后的路径正则"""
+
+    def __init__(self):
+        self.names = set()
+        self._name_globs: List[str] = []
+        self._path_globs: List[str] = []
+        self.name_regex = None
+        self.path_regex = None
+
+    def add(self, pattern: str):
+        if '/' in pattern:
+            self._path_globs.append(_glob_to_regex(pattern.lstrip('/')))
+        elif _GLOB_CHARS.intersection(pattern):
+            self._name_globs.append(_glob_to_regex(pattern))
+        else:
+            self.names.add(pattern)
+
+    def compile(self):
+        self.names = frozenset(self.names)
+        if self._name_globs:
+            self.name_regex = re.compile('|'.join(f'(?:{regex})' for regex in self._name_globs), re.S)
+        if self._path_globs:
+            self.path_regex = re.compile('|'.join(f'(?:{regex})' for regex in self._path_globs), re.S)
+
+    def __bool__(self):
+        return bool(self.names or self._name_globs or self._path_globs)
+
+    def match(self, rel_path: str, name: str) -> bool:
+        if name in self.names:
+            return True
+        if self.name_regex is not None and self.name_regex.fullmatch(name):
+            return True
+        return self.path_regex is not None and self.path_regex.fullmatch(rel_path) is not None
+
+
+def normalize_patterns(patterns: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """去掉空白、空行、注释和重复项，保持原有顺序"""
+    result = []
+    for pattern in patterns or ():
+        pattern = str(pattern).strip()
+        if pattern and not pattern.startswith('#') and pattern not in result:
+            result.append(pattern)
+    return tuple(result)
+
+
+class PathFilter:
+    """编译后的包含/排除规则，路径均为相对同步根目录、以 `/` 分隔"""
+
+    def __init__(self, include_patterns: Optional[Iterable[str]] = None,
+                 exclude_patterns: Optional[Iterable[str]] = None):
+        self.include_patterns = normalize_patterns(include_patterns)
+        self.exclude_patterns = normalize_patterns(exclude_patterns)
+        self._exclude = _RuleSet()
+        self._exclude_dirs = _RuleSet()  # 以 `/` 结尾、只匹配目录的排除模式
+        self._include = _RuleSet()
+        for pattern in self.exclude_patterns:
+            if pattern.endswith('/') and pattern.strip('/'):
+                self._exclude_dirs.add(pattern.rstrip('/'))
+            elif pattern.strip('/'):
+                self._exclude.add(pattern)
+        for pattern in self.include_patterns:
+            if pattern.strip('/'):
+                self._include.add(pattern.rstrip('/'))
+        for rules in (self._exclude, self._exclude_dirs, self._include):
+            rules.compile()
+
+    @property
+    def signature(self) -> str:
+        """规则的稳定描述，规则变化时清单需要重新核对"""
+        return repr((self.include_patterns, self.exclude_patterns))
+
+    def excludes_dir(self, rel_path: str, name: Optional[str] = None) -> bool:
+        """目录是否被排除（被排除的目录整棵跳过）"""
+        if name is None:
+            name = rel_path.rsplit('/', 1)[-1]
+        return self._exclude.match(rel_path, name) or \
+            (bool(self._exclude_dirs) and self._exclude_dirs.match(rel_path, name))
+
+    def includes_file(self, rel_path: str, name: Optional[str] = None) -> bool:
+        """文件本身是否需要同步（不检查上级目录）"""
+        if name is None:
+            name = rel_path.rsplit('/', 1)[-1]
+        if self._exclude.match(rel_path, name):
+            return False
+        return not self._include or self._include.match(rel_path, name)
+
+    def excludes_parent(self, rel_path: str) -> bool:
+        """路径的某一级上级目录是否被排除"""
+        parts = rel_path.split('/')
+        for depth in range(1, len(parts)):
+            if self.excludes_dir('/'.join(parts[:depth]), parts[depth - 1]):
+                return True
+        return False
+
+    def matches(self, rel_path: str, is_dir: bool = False) -> bool:
+        """任意相对路径（含上级目录）是否在同步范围内；用于监听事件等单个路径的判断"""
+        rel_path = rel_path.strip('/')
+        if not rel_path:
+            return True
+        if self.excludes_parent(rel_path):
+            return False
+        if is_dir:
+            return not self.excludes_dir(rel_path)
+        return self.includes_file(rel_path)
+
+    def walk(self, root: str, rel_root: str = '') -> Iterator[Tuple[str, os.stat_result]]:
+        """
+        遍历root（或其中的子目录rel_root），产出需要同步的 (相对路径, stat结果)
+
+        被排除的目录在进入之前就被剪掉；不跟随符号链接。
+        """
+        stack = [rel_root]
+        exclude_dir = self.excludes_dir
+        include_file = self.includes_file
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(root, rel_dir)) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                        if entry.is_dir(follow_symlinks=False):
+                            if not exclude_dir(rel_path, name):
+                                stack.append(rel_path)
+                        elif entry.is_file(follow_symlinks=False) and include_file(rel_path, name):
+                            yield rel_path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+    def sftp_ignore(self) -> List[str]:
+        """写入SFTP客户端配置（sftp.json的ignore字段）的排除列表"""
+        return list(self.exclude_patterns)
+
+
+_filter_cache: Dict[tuple, PathFilter] = {}
+_filter_cache_lock = threading.Lock()
+
+
+def compile_path_filter(include_patterns: Optional[Iterable[str]] = None,
+                        exclude_patterns: Optional[Iterable[str]] = None) -> PathFilter:
+    """获取编译后的规则，相同的模式列表共享同一个实例"""
+    key = (normalize_patterns(include_patterns), normalize_patterns(exclude_patterns))
+    with _filter_cache_lock:
+        path_filter = _filter_cache.get(key)
+        if path_filter is None:
+            path_filter = _filter_cache[key] = PathFilter(*key)
+        return path_filter
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+ServerRecord - 各管理器共享的服务器配置记录
+
+每次配置文件重新解析后为每台服务器构建一个只读的ServerRecord，
+EnhancedSSHManager、ConnectionManager/SimpleConnectionManager 和
+SyncManager 共用同一份记录。会话名、连接工具、Docker容器、跳板链等
+派生字段在构建时一次算好，热路径上不再重复解析嵌套字典。
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from config_store import FrozenDict, get_config_store
+
+# script_based 类型服务器中需要并入specs的顶层配置段
+_SCRIPT_BASED_SPEC_KEYS = ('connection', 'docker', 'bos', 'environment_setup')
+
+_EMPTY = FrozenDict()
+
+
+class ServerRecord:
+    """服务器配置记录（只读）"""
+
+    __slots__ = (
+        # 配置字段
+        'name', 'type', 'host', 'port', 'username', 'password', 'private_key_path',
+        'description', 'specs', 'session', 'jump_host', 'docker', 'sync_config', 'raw',
+        # 派生字段
+        'session_name', 'connection_tool', 'target_host', 'docker_container',
+        'docker_shell', 'jump_chain',
+    )
+
+    def __init__(self, name: str, data: Optional[Dict[str, Any]] = None):
+        data = data if data is not None else _EMPTY
+        raw_specs = data.get('specs') or _EMPTY
+
+        # script_based类型的connection、docker等配置可能写在顶层，统一并入specs
+        specs = raw_specs
+        if data.get('type') == 'script_based':
+            overrides = {key: data[key] for key in _SCRIPT_BASED_SPEC_KEYS if key in data}
+            if overrides:
+                specs = FrozenDict(raw_specs, **overrides)
+
+        connection = specs.get('connection') or _EMPTY
+        session = data.get('session')
+        docker = data.get('docker') or _EMPTY
+        docker_effective = raw_specs.get('docker') or docker or data.get('docker_config') or _EMPTY
+        jump_chain = tuple(
+            hop for hop in (connection.get('jump_host') or data.get('jump_host'),
+                            data.get('secondary_jump_host'))
+            if hop
+        )
+
+        fields = {
+            'name': name,
+            'type': data.get('type', 'direct_ssh'),
+            'host': data.get('host', ''),
+            'port': data.get('port', 22),
+            'username': data.get('username', ''),
+            'password': data.get('password'),
+            'private_key_path': data.get('private_key_path', ''),
+            'description': data.get('description', ''),
+            'specs': specs,
+            'session': session,
+            'jump_host': data.get('jump_host'),
+            'docker': docker,
+            'sync_config': data.get('sync_config') or _EMPTY,
+            'raw': data,
+            'session_name': (session or _EMPTY).get('name', f"{name}_session"),
+            'connection_tool': connection.get('tool', 'ssh'),
+            'target_host': (connection.get('target') or _EMPTY).get('host', data.get('host', '')),
+            'docker_container': docker_effective.get('container_name'),
+            'docker_shell': docker_effective.get('shell', 'zsh'),
+            'jump_chain': jump_chain,
+        }
+        for field, value in fields.items():
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"ServerRecord是只读的，不能修改字段 {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"ServerRecord是只读的，不能删除字段 {name}")
+
+    def __repr__(self) -> str:
+        return f"ServerRecord(name={self.name!r}, host={self.host!r}, tool={self.connection_tool!r})"
+
+
+def build_server_records(servers_config: Dict[str, Any]) -> FrozenDict:
+    """为配置中的全部服务器构建记录"""
+    return FrozenDict(
+        (name, ServerRecord(name, data or _EMPTY)) for name, data in servers_config.items()
+    )
+
+
+_records_cache: Dict[str, Tuple[int, FrozenDict]] = {}
+_records_lock = threading.Lock()
+
+
+def get_server_records(config_path) -> Tuple[int, FrozenDict]:
+    """
+    获取配置文件中全部服务器的记录
+
+    Returns:
+        (配置版本号, 服务器名 -> ServerRecord)；配置未变化时返回同一份记录
+    """
+    store = get_config_store(config_path)
+    version, config = store.snapshot()
+    with _records_lock:
+        cached = _records_cache.get(store.config_path)
+        if cached is not None and cached[0] == version:
+            return cached
+        records = build_server_records(config.get('servers') or _EMPTY)
+        _records_cache[store.config_path] = (version, records)
+        return version, records
+
+
+def get_server_record(config_path, server_name: str) -> Optional[ServerRecord]:
+    """获取单台服务器的记录，不存在时返回None"""
+    return get_server_records(config_path)[1].get(server_name)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+SessionProbe - 现有会话的快速存活探测
+
+1. 发送一条带唯一标记的探测命令，输出主机名和用户名
+2. 在会话输出流上等待结束标记，等待上限按最近的探测耗时自适应，最多等到 MCP_PROBE_TIMEOUT
+3. 探测成功且不在本地的结果缓存 MCP_PROBE_CACHE_TTL 秒，tmux会话重建后失效
+"""
+
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from pane_stream import send_wrapped_command, wait_for_command
+from state_store import live_session_id
+
+# 探测等待上限（秒），首次探测和没有耗时记录时使用
+PROBE_TIMEOUT = float(os.getenv('MCP_PROBE_TIMEOUT', 3.0))
+
+# 自适应等待的下限（秒）
+MIN_PROBE_TIMEOUT = 2.0
+
+# 探测成功结果的缓存时间（秒），0表示不缓存
+PROBE_CACHE_TTL = float(os.getenv('MCP_PROBE_CACHE_TTL', 30))
+
+PROBE_COMMAND = 'printf "%s %s\\n" "$(hostname)" "$(whoami)"'
+
+# 会话仍停留在本地时窗格中常见的主机名
+LOCAL_INDICATORS = ('MacBook-Pro', 'localhost', 'Mac-Studio')
+
+
+@dataclass
+class ProbeResult:
+    """一次会话探测的结果"""
+    alive: bool  # 会话中的shell是否在超时前执行了探测命令
+    hostname: str = ""
+    user: str = ""
+    output: str = ""
+    latency: float = 0.0
+    cached: bool = False
+    message: str = ""
+
+    @property
+    def is_local(self) -> bool:
+        """探测命令是否在本机执行（会话没有连到远端）"""
+        if not self.hostname:
+            return False
+        local = socket.gethostname().split('.')[0]
+        return self.hostname.split('.')[0] == local or \
+            any(indicator in self.hostname for indicator in LOCAL_INDICATORS)
+
+
+class SessionProber:
+    """会话探测器，缓存成功结果并记录每个会话的探测耗时"""
+
+    def __init__(self, cache_ttl: float = PROBE_CACHE_TTL, max_timeout: float = PROBE_TIMEOUT):
+        self.cache_ttl = cache_ttl
+        self.max_timeout = max_timeout
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[ProbeResult, float, Optional[str]]] = {}
+        self._latency: Dict[str, float] = {}  # 探测耗时的指数移动平均
+
+    def timeout_for(self, session_name: str) -> float:
+        """按最近的探测耗时确定等待上限"""
+        with self._lock:
+            latency = self._latency.get(session_name)
+        if latency is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(MIN_PROBE_TIMEOUT, latency * 4))
+
+    def cached(self, session_name: str) -> Optional[ProbeResult]:
+        """仍然有效的缓存结果：在缓存时间内，且tmux会话没有被重建"""
+        with self._lock:
+            entry = self._cache.get(session_name)
+        if entry is None:
+            return None
+        result, probed_at, session_id = entry
+        if time.time() - probed_at > self.cache_ttl or live_session_id(session_name) != session_id:
+            self.invalidate(session_name)
+            return None
+        return ProbeResult(result.alive, result.hostname, result.user, result.output,
+                           result.latency, cached=True, message=result.message)
+
+    def invalidate(self, session_name: str):
+        """会话被重建、断开或探测失败后调用"""
+        with self._lock:
+            self._cache.pop(session_name, None)
+
+    def probe(self, session_name: str, use_cache: bool = True,
+              timeout: Optional[float] = None) -> ProbeResult:
+        """
+        探测会话中的shell是否可用
+
+        Args:
+            session_name: tmux会话名称
+            use_cache: 是否复用缓存的成功结果
+            timeout: 等待上限，默认按会话自适应
+        """
+        if use_cache and self.cache_ttl > 0:
+            result = self.cached(session_name)
+            if result is not None:
+                return result
+
+        session_id = live_session_id(session_name)
+        if session_id is None:
+            self.invalidate(session_name)
+            return ProbeResult(False, message="会话不存在")
+
+        adaptive = timeout is None
+        timeout = self.timeout_for(session_name) if adaptive else timeout
+        start_time = time.time()
+        try:
+            sentinel, stream, start_offset = send_wrapped_command(session_name, PROBE_COMMAND)
+            completion = wait_for_command(session_name, sentinel, stream, start_offset, timeout)
+            if adaptive and completion.tracked and not completion.completed and timeout < self.max_timeout:
+                # 自适应等待只是估计，到期后继续等同一条探测命令直到上限再判定超时
+                completion = wait_for_command(session_name, sentinel, stream, start_offset,
+                                              self.max_timeout - timeout)
+        except Exception as e:
+            self.invalidate(session_name)
+            return ProbeResult(False, latency=time.time() - start_time, message=f"探测命令发送失败: {str(e)}")
+        latency = time.time() - start_time
+
+        if not completion.completed:
+            self.invalidate(session_name)
+            message = "探测超时" if completion.tracked else "会话未运行shell，无法执行探测命令"
+            return ProbeResult(False, latency=latency, message=message)
+
+        output = (completion.output or "").strip()
+        fields = output.splitlines()[-1].split() if output else []
+        result = ProbeResult(
+            alive=True,
+            hostname=fields[0] if fields else "",
+            user=fields[1] if len(fields) > 1 else "",
+            output=output,
+            latency=latency,
+            message="会话响应正常"
+        )
+        with self._lock:
+            previous = self._latency.get(session_name)
+            self._latency[session_name] = latency if previous is None else previous * 0.7 + latency * 0.3
+            if self.cache_ttl > 0 and not result.is_local:
+                self._cache[session_name] = (result, time.time(), session_id)
+        return result
+
+
+_prober: Optional[SessionProber] = None
+_prober_lock = threading.Lock()
+
+
+def get_session_prober() -> SessionProber:
+    """获取进程级共享的会话探测器"""
+    global _prober
+    with _prober_lock:
+        if _prober is None:
+            _prober = SessionProber()
+        return _prober
+
+
+def probe_session(session_name: str, use_cache: bool = True,
+                  timeout: Optional[float] = None) -> ProbeResult:
+    """用共享的探测器探测会话"""
+    return get_session_prober().probe(session_name, use_cache, timeout)
+
+
+def invalidate_probe(session_name: str):
+    """丢弃会话的缓存探测结果"""
+    get_session_prober().invalidate(session_name)
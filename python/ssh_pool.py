@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+SSHControlPool - 非交互SSH操作的ControlMaster连接复用
+
+1. 每台服务器一个后台ControlMaster，首次使用时建立，之后的ssh/scp/rsync通过ControlPath复用
+2. master用 `ssh -O check` 做健康检查（结果缓存一段时间）
+3. master无法建立（例如需要密码认证）时退回直接连接，一段时间内不再重试
+4. 断开服务器时用 `ssh -O exit` 关闭master并清理控制套接字
+"""
+
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+# master空闲多久后自动退出（秒）
+CONTROL_PERSIST = 600
+
+# 两次 `ssh -O check` 之间的最短间隔（秒），期间只检查套接字文件是否存在
+HEALTH_CHECK_INTERVAL = 30.0
+
+# 建立master的超时时间（秒）
+MASTER_START_TIMEOUT = 15
+
+# master建立失败后，多久之内不再重试（秒）
+MASTER_RETRY_INTERVAL = 60.0
+
+_COMMON_OPTIONS = ['-o', 'StrictHostKeyChecking=no', '-o', 'UserKnownHostsFile=/dev/null']
+
+
+def control_path(server_name: str) -> str:
+    """服务器对应的控制套接字路径"""
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', server_name)
+    return f"/tmp/ssh-{safe_name}-control"
+
+
+def ssh_target(server) -> str:
+    """ssh目标 user@host"""
+    return f"{server.username}@{server.host}" if server.username else server.host
+
+
+class SSHControlPool:
+    """按服务器管理的ControlMaster连接池"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._server_locks: Dict[str, threading.Lock] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._targets: Dict[str, str] = {}
+        self.stats = {'reused': 0, 'started': 0, 'direct': 0}
+
+    def _get_server_lock(self, server_name: str) -> threading.Lock:
+        with self._lock:
+            lock = self._server_locks.get(server_name)
+            if lock is None:
+                lock = self._server_locks[server_name] = threading.Lock()
+            return lock
+
+    def acquire(self, server) -> Optional[str]:
+        """
+        确保服务器的master可用
+
+        Returns:
+            控制套接字路径；master不可用时返回None（调用方直接连接）
+        """
+        name = server.name
+        path = control_path(name)
+        with self._get_server_lock(name):
+            now = time.time()
+            if os.path.exists(path):
+                checked_at = self._checked_at.get(name)
+                if checked_at is not None and now - checked_at < HEALTH_CHECK_INTERVAL:
+                    self.stats['reused'] += 1
+                    return path
+                if self._check(path, ssh_target(server)):
+                    self._checked_at[name] = now
+                    self.stats['reused'] += 1
+                    return path
+                # master已退出但套接字残留
+                self._remove_socket(path)
+
+            self._checked_at.pop(name, None)
+            failed_at = self._failed_at.get(name)
+            if failed_at is not None and now - failed_at < MASTER_RETRY_INTERVAL:
+                self.stats['direct'] += 1
+                return None
+
+            if self._start(server, path):
+                self._checked_at[name] = time.time()
+                self._failed_at.pop(name, None)
+                self._targets[name] = ssh_target(server)
+                self.stats['started'] += 1
+                return path
+
+            self._failed_at[name] = now
+            self.stats['direct'] += 1
+            return None
+
+    def _check(self, path: str, target: str) -> bool:
+        try:
+            result = subprocess.run(
+                ['ssh', '-O', 'check', '-o', f'ControlPath={path}', target],
+                capture_output=True, timeout=5
+            )
+            return result.returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            return False
+
+    def has_master(self, server_name: str) -> bool:
+        """是否已有master的控制套接字（不会建立新的master）"""
+        return os.path.exists(control_path(server_name))
+
+    def ping(self, server, timeout: float = 5.0) -> Optional[float]:
+        """
+        通过已有的master做一次往返（远端执行 `true`），返回耗时秒数
+
+        不建立新的master；没有master或往返失败时返回None。
+        """
+        path = control_path(server.name)
+        if not os.path.exists(path):
+            return None
+        start_time = time.monotonic()
+        try:
+            result = subprocess.run(
+                ['ssh', '-p', str(server.port), *_COMMON_OPTIONS, '-o', 'BatchMode=yes',
+                 '-o', f'ControlPath={path}', ssh_target(server), 'true'],
+                stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        if result.returncode != 0:
+            return None
+        return time.monotonic() - start_time
+
+    def _start(self, server, path: str) -> bool:
+        command = [
+            'ssh', '-M', '-N', '-f',
+            '-p', str(server.port),
+            *_COMMON_OPTIONS,
+            '-o', 'BatchMode=yes',
+            '-o', f'ControlPath={path}',
+            '-o', f'ControlPersist={CONTROL_PERSIST}',
+            ssh_target(server)
+        ]
+        try:
+            # -f 使ssh认证后转入后台，不能捕获输出，否则会一直等待后台进程关闭管道
+            result = subprocess.run(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, timeout=MASTER_START_TIMEOUT
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return result.returncode == 0 and os.path.exists(path)
+
+    @staticmethod
+    def _remove_socket(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def ssh_options(self, server) -> List[str]:
+        """ssh/scp通用选项，master可用时带上ControlPath"""
+        path = self.acquire(server)
+        if path is None:
+            return list(_COMMON_OPTIONS)
+        return [*_COMMON_OPTIONS, '-o', f'ControlPath={path}']
+
+    def ssh_command(self, server, command: str) -> List[str]:
+        """构建复用master的ssh命令"""
+        return ['ssh', '-p', str(server.port), *self.ssh_options(server), ssh_target(server), command]
+
+    def scp_command(self, server, local_path: str, remote_dir: str) -> List[str]:
+        """构建复用master的scp上传命令"""
+        return ['scp', '-P', str(server.port), *self.ssh_options(server),
+                str(local_path), f"{ssh_target(server)}:{remote_dir}"]
+
+    def rsync_shell(self, server) -> str:
+        """rsync -e 使用的远程shell命令"""
+        options = ' '.join(shlex.quote(option) for option in self.ssh_options(server))
+        return f"ssh -p {server.port} {options}"
+
+    def close(self, server_name: str) -> bool:
+        """关闭服务器的master并删除控制套接字，返回是否存在过master"""
+        path = control_path(server_name)
+        with self._get_server_lock(server_name):
+            self._checked_at.pop(server_name, None)
+            self._failed_at.pop(server_name, None)
+            target = self._targets.pop(server_name, server_name)
+            if not os.path.exists(path):
+                return False
+            try:
+                subprocess.run(
+                    ['ssh', '-O', 'exit', '-o', f'ControlPath={path}', target],
+                    capture_output=True, timeout=5
+                )
+            except (OSError, subprocess.SubprocessError):
+                pass
+            self._remove_socket(path)
+            return True
+
+    def close_all(self):
+        """关闭所有master"""
+        with self._lock:
+            server_names = list(self._server_locks)
+        for server_name in server_names:
+            self.close(server_name)
+
+
+_pool: Optional[SSHControlPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ssh_pool() -> SSHControlPool:
+    """获取进程级共享的ControlMaster连接池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SSHControlPool()
+        return _pool
+
+
+def close_ssh_master(server_name: str) -> bool:
+    """断开服务器时调用：关闭其ControlMaster"""
+    return get_ssh_pool().close(server_name)
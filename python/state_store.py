@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+StateStore - 跨进程重启保留的连接状态
+
+1. 保存会话与服务器的对应关系、tmux会话创建时间、最近验证通过的主机/容器和健康指标
+2. 状态写入 ~/.remote-terminal/state/connections.log，只追加的JSON行日志，后写的覆盖先写的
+3. 记录过多时在排它flock下重写为快照，多个进程可同时追加
+4. 状态的有效期由环境变量 MCP_STATE_TTL 控制
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from tmux_client import tmux_run
+
+# 验证结果的信任时长（秒）
+STATE_TTL = float(os.getenv('MCP_STATE_TTL', 600))
+
+# 日志记录数超过 max(该值, 服务器数*4) 时重写为快照
+COMPACT_MIN_RECORDS = 200
+
+STATE_FILE = "connections.log"
+
+
+@dataclass
+class ServerState:
+    """一台服务器的持久化连接状态"""
+    server_name: str
+    session_name: str
+    status: str = "ready"  # ready / unhealthy
+    host: str = ""
+    container: str = ""
+    session_created: str = ""  # tmux的#{session_created}，会话被重建后不再一致
+    verified_at: float = 0.0
+    updated_at: float = 0.0
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+    def is_fresh(self, ttl: Optional[float] = None) -> bool:
+        """最近一次验证通过是否在信任时长内"""
+        ttl = STATE_TTL if ttl is None else ttl
+        return self.status == "ready" and 0 <= time.time() - self.verified_at <= ttl
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ServerState':
+        return cls(**{key: value for key, value in data.items() if key in _FIELD_NAMES})
+
+
+_FIELD_NAMES = frozenset(f.name for f in fields(ServerState))
+
+
+def live_session_id(session_name: str) -> Optional[str]:
+    """tmux会话的创建时间，作为会话标识；会话不存在时返回None"""
+    try:
+        result = tmux_run(['tmux', 'display-message', '-p', '-t', session_name, '#{session_created}'],
+                          capture_output=True, text=True, timeout=5)
+    except Exception:
+        return None
+    if result.returncode != 0:
+        return None
+    return (result.stdout or "").strip()
+
+
+class StateStore:
+    """只追加日志形式的连接状态存储"""
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self.state_dir = Path(state_dir) if state_dir else Path.home() / ".remote-terminal" / "state"
+        self.path = self.state_dir / STATE_FILE
+        self._lock = threading.Lock()
+        self._states: Dict[str, ServerState] = {}
+        self._records = 0
+        self._file_id = None  # (st_dev, st_ino)
+        self._offset = 0
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        """读入日志中尚未读过的部分；文件被其它进程压缩替换后整体重读"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            self._states.clear()
+            self._records = 0
+            self._offset = 0
+            self._file_id = file_id
+        if stat.st_size == self._offset:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # 只处理完整的行，末尾写了一半的行留到下次
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            self._apply(line)
+        self._offset += end
+
+    def _apply(self, line: bytes):
+        try:
+            record = json.loads(line)
+            name = record['server_name']
+        except (ValueError, KeyError, TypeError):
+            return
+        self._records += 1
+        if record.get('deleted'):
+            self._states.pop(name, None)
+        else:
+            try:
+                self._states[name] = ServerState.from_dict(record)
+            except TypeError:
+                pass
+
+    def _open_locked(self, operation: int) -> int:
+        """
+        打开日志并加flock
+
+        拿到锁之前文件可能已被其它进程的压缩替换，此时锁住的是旧文件，
+        需要重新打开当前的日志。
+        """
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, operation)
+                stat = os.fstat(fd)
+                current = os.stat(self.path)
+            except OSError:
+                os.close(fd)
+                raise
+            if (stat.st_dev, stat.st_ino) == (current.st_dev, current.st_ino):
+                return fd
+            os.close(fd)
+
+    def _append(self, record: Dict[str, Any]):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n').encode('utf-8')
+        # O_APPEND下单次write追加一整行，多个进程同时写也不会交错；共享锁只用来避开压缩
+        fd = self._open_locked(fcntl.LOCK_SH)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self._refresh()
+        if self._records > max(COMPACT_MIN_RECORDS, len(self._states) * 4):
+            self._compact()
+
+    def _compact(self):
+        fd = self._open_locked(fcntl.LOCK_EX)
+        try:
+            # 持有排它锁后再读一次，其它进程在此之前追加的记录都包含在快照里
+            self._refresh()
+            temp_fd, temp_path = tempfile.mkstemp(dir=self.state_dir, prefix='.connections-', suffix='.tmp')
+            try:
+                with os.fdopen(temp_fd, 'w', encoding='utf-8') as f:
+                    for state in self._states.values():
+                        f.write(json.dumps(asdict(state), ensure_ascii=False, sort_keys=True) + '\n')
+                os.replace(temp_path, self.path)
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+        finally:
+            os.close(fd)
+        self._file_id = None
+        self._refresh()
+
+    def get(self, server_name: str) -> Optional[ServerState]:
+        """服务器的最新状态"""
+        with self._lock:
+            self._refresh()
+            return self._states.get(server_name)
+
+    def all(self) -> Dict[str, ServerState]:
+        with self._lock:
+            self._refresh()
+            return dict(self._states)
+
+    def update(self, server_name: str, session_name: str, **changes) -> Optional[ServerState]:
+        """在已有状态上修改字段并追加一条记录；写入失败时返回None"""
+        with self._lock:
+            self._refresh()
+            current = self._states.get(server_name)
+            data = asdict(current) if current and current.session_name == session_name else {}
+            data.update(changes, server_name=server_name, session_name=session_name, updated_at=time.time())
+            state = ServerState.from_dict(data)
+            try:
+                self._append(asdict(state))
+            except OSError:
+                return None
+            return state
+
+    def record_verified(self, server_name: str, session_name: str, host: str = "",
+                        container: str = "", metrics: Optional[Dict[str, Any]] = None,
+                        session_id: Optional[str] = None) -> Optional[ServerState]:
+        """记录一次验证通过的连接，同时记下当前tmux会话的标识（session_id已知时不再查询tmux）"""
+        changes = {
+            'status': "ready",
+            'host': host or "",
+            'container': container or "",
+            'session_created': (session_id if session_id is not None else live_session_id(session_name)) or "",
+            'verified_at': time.time()
+        }
+        if metrics is not None:
+            changes['metrics'] = metrics
+        return self.update(server_name, session_name, **changes)
+
+    def record_metrics(self, server_name: str, session_name: str, metrics: Dict[str, Any],
+                       healthy: Optional[bool] = None) -> Optional[ServerState]:
+        """
+        更新健康指标
+
+        healthy为False时撤销对该连接的信任。健康的心跳不延长信任：它只说明窗格
+        前台仍是ssh等进程，不能确认远端shell在目标主机或容器中，只有带标记的
+        探测通过后才由 record_verified 更新验证时间。
+        """
+        changes: Dict[str, Any] = {'metrics': metrics}
+        if healthy is False:
+            changes['status'] = "unhealthy"
+        return self.update(server_name, session_name, **changes)
+
+    def remove(self, server_name: str):
+        with self._lock:
+            self._refresh()
+            if server_name not in self._states:
+                return
+            try:
+                self._append({'server_name': server_name, 'deleted': True, 'updated_at': time.time()})
+            except OSError:
+                pass
+
+    def trusted(self, server_name: str, session_name: str, ttl: Optional[float] = None) -> Optional[ServerState]:
+        """
+        进程重启前最近一次验证通过的结果
+
+        要求状态在信任时长内验证通过、会话名一致，且tmux会话仍是验证时的那个会话。
+        会话仍在不代表连接仍在（ssh断开后窗格会回到本地shell），调用方仍需探测，
+        这里只用来决定能否跳过完整的连接流程。
+        """
+        state = self.get(server_name)
+        if state is None or state.session_name != session_name or not state.is_fresh(ttl):
+            return None
+        session_id = live_session_id(session_name)
+        if session_id is None or (state.session_created and session_id != state.session_created):
+            return None
+        return state
+
+
+_stores: Dict[str, StateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_state_store(state_dir: Optional[str] = None) -> StateStore:
+    """获取进程级共享的状态存储，按目录（默认随HOME变化）区分"""
+    path = str(Path(state_dir) if state_dir else Path.home() / ".remote-terminal" / "state")
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = StateStore(path)
+            _stores[path] = store
+        return store
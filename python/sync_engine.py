@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+IncrementalSyncEngine - 基于本地清单的增量同步
+
+为每个 (服务器, local_path) 维护一份持久化清单，记录每个文件的
+(大小, mtime, sha256)。每次同步：
+
+1. 扫描本地目录：大小和mtime与清单一致的文件直接跳过，不读取内容；
+   只有元数据变化的文件才计算sha256（内容未变的只更新元数据）
+2. 只把新增/修改的文件推送到远端（rsync --files-from 或已部署的FTP服务），
+   删除的文件在远端同步删除
+3. 推送成功后才把这些文件写回清单，失败的下一轮会重新推送
+
+文件数很多（或总量很大）的批次改用多通道并行上传（见 parallel_upload），
+不再由单个rsync进程串行处理。
+
+调用方（例如文件监听器）已经知道哪些路径变化时，可以只检查这些路径。
+遍历和单个路径的判断都使用编译后的包含/排除规则（见 path_filter）。
+"""
+
+import ftplib
+import hashlib
+import json
+import os
+import posixpath
+import re
+import stat
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from parallel_upload import DEFAULT_UPLOAD_STREAMS, ParallelUploader, UploadReport, remote_quote
+from path_filter import PathFilter, compile_path_filter
+from ssh_pool import get_ssh_pool, ssh_target
+
+# 总是排除的模式（追加在配置的exclude_patterns之后）
+DEFAULT_EXCLUDE_PATTERNS = ('.git',)
+
+# 单次rsync推送的超时时间（秒）
+RSYNC_TIMEOUT = 300
+
+# FTP连接超时时间（秒）
+FTP_TIMEOUT = 30
+
+# 每次远程删除命令最多包含的文件数
+DELETE_BATCH_SIZE = 200
+
+# 变化文件数或总大小达到阈值时改用并行上传（环境变量 MCP_SYNC_PARALLEL_MIN_FILES）
+PARALLEL_MIN_FILES = int(os.getenv('MCP_SYNC_PARALLEL_MIN_FILES', 200))
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+_RSYNC_SENT_PATTERN = re.compile(r'Total bytes sent:\s*([\d,]+)')
+
+
+@dataclass
+class ChangeSet:
+    """一次扫描得到的变化"""
+    changed: Dict[str, list] = field(default_factory=dict)  # 相对路径 -> [size, mtime_ns, sha256]
+    deleted: List[str] = field(default_factory=list)
+    untracked: List[str] = field(default_factory=list)  # 不再匹配同步规则的文件：只移出清单，远端保留
+    scanned: int = 0
+    hashed: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return not self.changed and not self.deleted
+
+    @property
+    def bytes(self) -> int:
+        return sum(entry[0] for entry in self.changed.values())
+
+
+@dataclass
+class SyncTickResult:
+    """一轮同步的统计"""
+    success: bool
+    transport: str
+    files: int = 0
+    deleted: int = 0
+    bytes: int = 0  # 变化文件的总大小
+    wire_bytes: Optional[int] = None  # 实际发送的字节数（rsync --stats）
+    upload: Optional[Dict] = None  # 并行上传的吞吐量和延迟（见 UploadReport.to_dict）
+    scanned: int = 0
+    hashed: int = 0
+    duration: float = 0.0
+    started_at: float = 0.0
+    error: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            'success': self.success,
+            'transport': self.transport,
+            'files': self.files,
+            'deleted': self.deleted,
+            'bytes': self.bytes,
+            'wire_bytes': self.wire_bytes,
+            'upload': self.upload,
+            'scanned': self.scanned,
+            'hashed': self.hashed,
+            'duration': round(self.duration, 3),
+            'started_at': self.started_at,
+            'error': self.error
+        }
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def engine_path_filter(include_patterns: Optional[Iterable[str]] = None,
+                       exclude_patterns: Optional[Iterable[str]] = None) -> PathFilter:
+    """同步使用的规则：配置的模式加上总是排除的模式（相同配置共享同一个实例）"""
+    return compile_path_filter(include_patterns, list(exclude_patterns or ()) + list(DEFAULT_EXCLUDE_PATTERNS))
+
+
+def default_manifest_path(server_name: str, local_path: str) -> Path:
+    """清单文件路径：~/.remote-terminal/sync_manifests/<服务器>-<本地路径摘要>.json"""
+    key = hashlib.sha1(os.path.abspath(local_path).encode('utf-8')).hexdigest()[:12]
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', server_name)
+    return Path.home() / ".remote-terminal" / "sync_manifests" / f"{safe_name}-{key}.json"
+
+
+class IncrementalSyncEngine:
+    """单个 (服务器, 本地目录) 的增量同步引擎"""
+
+    def __init__(self, server_name: str, local_path: str, remote_path: str,
+                 manifest_path: Optional[str] = None,
+                 include_patterns: Optional[Iterable[str]] = None,
+                 exclude_patterns: Optional[Iterable[str]] = None):
+        self.server_name = server_name
+        self.local_path = os.path.abspath(os.path.expanduser(local_path))
+        self.remote_path = remote_path
+        self.manifest_path = Path(manifest_path) if manifest_path else \
+            default_manifest_path(server_name, self.local_path)
+        self.path_filter = engine_path_filter(include_patterns, exclude_patterns)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, list] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, list]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('local_path') != self.local_path or data.get('remote_path') != self.remote_path:
+            # 同步目录变化后旧清单作废，下一轮全量推送
+            return {}
+        return data.get('files', {})
+
+    def _save_manifest(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'local_path': self.local_path, 'remote_path': self.remote_path,
+                       'files': self._entries}, f, separators=(',', ':'))
+        os.replace(temp_path, self.manifest_path)
+
+    @property
+    def file_count(self) -> int:
+        return len(self._entries)
+
+    def _check(self, rel_path: str, st, changes: ChangeSet):
+        changes.scanned += 1
+        known = self._entries.get(rel_path)
+        if known is not None and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return
+        try:
+            digest = _file_sha256(os.path.join(self.local_path, rel_path))
+        except OSError:
+            return
+        changes.hashed += 1
+        entry = [st.st_size, st.st_mtime_ns, digest]
+        if known is not None and known[2] == digest:
+            # 只是mtime变化（touch、git checkout等），内容相同无需推送
+            with self._lock:
+                self._entries[rel_path] = entry
+            return
+        changes.changed[rel_path] = entry
+
+    def scan(self, paths: Optional[Iterable[str]] = None) -> ChangeSet:
+        """
+        计算需要推送的变化
+
+        Args:
+            paths: 已知发生变化的相对路径（文件或目录）；为None时全量扫描
+        """
+        changes = ChangeSet()
+        if paths is not None:
+            paths = {path.strip('/') for path in paths}
+        if paths is None or '' in paths:
+            seen = set()
+            for rel_path, st in self.path_filter.walk(self.local_path):
+                seen.add(rel_path)
+                self._check(rel_path, st, changes)
+            self._split_missing([path for path in self._entries if path not in seen], changes)
+            return changes
+
+        missing = set()
+        for rel_path in sorted(paths):
+            prefix = rel_path + '/'
+            try:
+                st = os.stat(os.path.join(self.local_path, rel_path), follow_symlinks=False)
+            except OSError:
+                missing.update(path for path in self._entries
+                               if path == rel_path or path.startswith(prefix))
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if not self.path_filter.matches(rel_path, is_dir=True):
+                    missing.update(path for path in self._entries if path.startswith(prefix))
+                    continue
+                seen = set()
+                for sub_path, sub_st in self.path_filter.walk(self.local_path, rel_path):
+                    seen.add(sub_path)
+                    self._check(sub_path, sub_st, changes)
+                missing.update(path for path in self._entries
+                               if path.startswith(prefix) and path not in seen)
+            elif stat.S_ISREG(st.st_mode):
+                if self.path_filter.matches(rel_path):
+                    self._check(rel_path, st, changes)
+                elif rel_path in self._entries:
+                    missing.add(rel_path)
+        self._split_missing(sorted(missing), changes)
+        return changes
+
+    def _split_missing(self, missing: List[str], changes: ChangeSet):
+        # 清单中有、本轮没扫描到的文件：真的删除了才删远端，因规则变化被排除的只移出清单
+        for rel_path in missing:
+            if self.path_filter.matches(rel_path) and \
+                    not os.path.lexists(os.path.join(self.local_path, rel_path)):
+                changes.deleted.append(rel_path)
+            else:
+                changes.untracked.append(rel_path)
+
+    def commit(self, changes: ChangeSet):
+        """推送成功后把变化写回清单"""
+        with self._lock:
+            self._entries.update(changes.changed)
+            for rel_path in changes.deleted + changes.untracked:
+                self._entries.pop(rel_path, None)
+            self._save_manifest()
+
+    def sync(self, server, sync_config=None, transport: str = 'rsync',
+             paths: Optional[Iterable[str]] = None, limiter=None) -> SyncTickResult:
+        """执行一轮增量同步；limiter为共享的带宽限制器（见 sync_scheduler.BandwidthLimiter）"""
+        result = SyncTickResult(success=True, transport=transport, started_at=time.time())
+        start_time = time.time()
+        try:
+            changes = self.scan(paths)
+            result.scanned, result.hashed = changes.scanned, changes.hashed
+            if not changes.empty:
+                if transport == 'ftp':
+                    self.push_ftp(server, sync_config, changes, limiter)
+                elif self._use_parallel(changes):
+                    streams = getattr(sync_config, 'upload_streams', None) or \
+                        int(os.getenv('MCP_SYNC_STREAMS', DEFAULT_UPLOAD_STREAMS))
+                    report = self.push_parallel(server, changes, streams, limiter)
+                    result.transport = 'parallel'
+                    result.upload = report.to_dict()
+                else:
+                    result.wire_bytes = self.push_rsync(server, changes, limiter)
+                self.commit(changes)
+                result.files = len(changes.changed)
+                result.deleted = len(changes.deleted)
+                result.bytes = changes.bytes
+            elif changes.hashed or changes.untracked:
+                # 只有元数据变化或规则变化，保存刷新后的清单，下次不必重新计算
+                self.commit(changes)
+        except Exception as e:
+            result.success = False
+            result.error = str(e)
+        result.duration = time.time() - start_time
+        return result
+
+    @staticmethod
+    def _use_parallel(changes: ChangeSet) -> bool:
+        if len(changes.changed) < 2:
+            return False
+        return len(changes.changed) >= PARALLEL_MIN_FILES or changes.bytes >= PARALLEL_MIN_BYTES
+
+    def push_parallel(self, server, changes: ChangeSet, streams: int = DEFAULT_UPLOAD_STREAMS,
+                      limiter=None) -> UploadReport:
+        """多通道并行上传变化的文件（小文件打包为tar流），通道复用ControlMaster"""
+        pool = get_ssh_pool()
+        remote_root = self.remote_path.rstrip('/') or '/'
+        uploader = ParallelUploader(lambda command: pool.ssh_command(server, command),
+                                    streams=streams, limiter=limiter)
+        report = uploader.upload(self.local_path, remote_root,
+                                 {path: entry[0] for path, entry in changes.changed.items()})
+        if report.errors:
+            raise RuntimeError(f"并行上传失败 ({len(report.errors)} 个单元): {report.errors[0]}")
+        self._delete_remote(server, changes.deleted)
+        return report
+
+    def push_rsync(self, server, changes: ChangeSet, limiter=None) -> Optional[int]:
+        """通过rsync推送变化的文件，返回实际发送的字节数"""
+        pool = get_ssh_pool()
+        remote_root = self.remote_path.rstrip('/') or '/'
+        wire_bytes = None
+        if changes.changed:
+            command = [
+                'rsync', '-az', '--stats', '--from0', '--files-from=-',
+                '-e', pool.rsync_shell(server),
+                f"{self.local_path}/", f"{ssh_target(server)}:{remote_root}/"
+            ]
+            if limiter is not None and limiter.rate:
+                # 只等其它推送留下的欠额，本批次由rsync按--bwlimit限速，额度记入令牌桶
+                limiter.acquire(changes.bytes)
+                command.insert(1, f'--bwlimit={limiter.rsync_bwlimit()}')
+            file_list = '\0'.join(sorted(changes.changed)).encode('utf-8')
+            result = subprocess.run(command, input=file_list, capture_output=True, timeout=RSYNC_TIMEOUT)
+            if result.returncode != 0:
+                raise RuntimeError(f"rsync失败 (退出码 {result.returncode}): "
+                                   f"{result.stderr.decode('utf-8', 'replace').strip()[-300:]}")
+            match = _RSYNC_SENT_PATTERN.search(result.stdout.decode('utf-8', 'replace'))
+            if match:
+                wire_bytes = int(match.group(1).replace(',', ''))
+
+        self._delete_remote(server, changes.deleted)
+        return wire_bytes
+
+    def _delete_remote(self, server, deleted: List[str]):
+        pool = get_ssh_pool()
+        remote_root = self.remote_path.rstrip('/') or '/'
+        for start in range(0, len(deleted), DELETE_BATCH_SIZE):
+            batch = deleted[start:start + DELETE_BATCH_SIZE]
+            targets = ' '.join(remote_quote(posixpath.join(remote_root, path)) for path in batch)
+            result = subprocess.run(pool.ssh_command(server, f"rm -f -- {targets}"),
+                                    capture_output=True, timeout=60)
+            if result.returncode != 0:
+                raise RuntimeError(f"远程删除失败 (退出码 {result.returncode})")
+
+    def push_ftp(self, server, sync_config, changes: ChangeSet, limiter=None):
+        """通过已部署的FTP服务推送变化的文件"""
+        ftp = ftplib.FTP()
+        ftp.connect(server.host, int(sync_config.ftp_port), timeout=FTP_TIMEOUT)
+        try:
+            ftp.login(sync_config.ftp_user, sync_config.ftp_password)
+            try:
+                ftp.cwd(self.remote_path)
+            except ftplib.error_perm:
+                # proftpd以remote_path为根目录时，登录后已位于同步目录
+                pass
+            created = set()
+            for rel_path in sorted(changes.changed):
+                directory = posixpath.dirname(rel_path)
+                parts = []
+                for part in directory.split('/') if directory else []:
+                    parts.append(part)
+                    current = '/'.join(parts)
+                    if current not in created:
+                        try:
+                            ftp.mkd(current)
+                        except ftplib.error_perm:
+                            pass
+                        created.add(current)
+                if limiter is not None:
+                    limiter.acquire(changes.changed[rel_path][0])
+                with open(os.path.join(self.local_path, rel_path), 'rb') as f:
+                    ftp.storbinary(f'STOR {rel_path}', f)
+            for rel_path in changes.deleted:
+                try:
+                    ftp.delete(rel_path)
+                except ftplib.error_perm:
+                    pass
+        finally:
+            try:
+                ftp.quit()
+            except (OSError, ftplib.Error):
+                ftp.close()
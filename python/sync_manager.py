@@ -10,15 +10,28 @@ import time
 import threading
 import json
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, List
+from collections import deque
 from dataclasses import dataclass
 import yaml
 import json
 
+from config_store import invalidate_config
+from server_record import ServerRecord, get_server_record
+from ssh_pool import get_ssh_pool
+from sync_engine import IncrementalSyncEngine, SyncTickResult, engine_path_filter
+from path_filter import compile_path_filter
+from git_transfer import GitBundleSync, run_command
+from fs_watch import TreeWatcher
+from sync_scheduler import get_sync_scheduler
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 每台服务器保留的同步日志条数
+MAX_SYNC_LOGS = 100
+
 
 @dataclass
 class SyncConfig:
@@ -31,6 +44,15 @@ class SyncConfig:
     ftp_password: str = "syncpass"
     auto_sync_interval: int = 30
     sync_type: str = "rsync"  # rsync, ftp, git
+    sync_mode: str = "watch"  # watch: 文件变化后立即推送, interval: 按auto_sync_interval定期扫描
+    include_patterns: list = None  # 只同步匹配的文件，为空表示所有文件
+    exclude_patterns: list = None  # 排除的文件和目录（.git总是排除）
+    upload_streams: Optional[int] = None  # 大批量并行上传的通道数，None表示使用MCP_SYNC_STREAMS或默认值
+
+    @property
+    def path_filter(self):
+        """编译后的包含/排除规则"""
+        return compile_path_filter(self.include_patterns, self.exclude_patterns)
 
 
 class SyncManager:
@@ -38,16 +60,18 @@ class SyncManager:
     
     def __init__(self, config_path: str = "~/.remote-terminal/config.yaml"):
         self.config_path = Path(config_path).expanduser()
-        self.sync_threads: Dict[str, threading.Thread] = {}
         self.sync_running: Dict[str, bool] = {}
         self.sync_logs: Dict[str, List[str]] = {}
+        self.sync_engines: Dict[str, IncrementalSyncEngine] = {}
+        self.sync_stats: Dict[str, Dict[str, Any]] = {}
+        self.sync_watchers: Dict[str, TreeWatcher] = {}
+        # 以上状态会被调度器的工作线程并发访问
+        self._lock = threading.Lock()
         
-    def load_server_config(self, server_name: str) -> Optional[Dict[str, Any]]:
+    def load_server_config(self, server_name: str) -> Optional[ServerRecord]:
         """加载服务器配置"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-                return config.get('servers', {}).get(server_name)
+            return get_server_record(self.config_path, server_name)
         except Exception as e:
             logger.error(f"加载服务器配置失败: {e}")
             return None
@@ -71,11 +95,16 @@ class SyncManager:
                 'ftp_user': sync_config.ftp_user,
                 'ftp_password': sync_config.ftp_password,
                 'auto_sync_interval': sync_config.auto_sync_interval,
-                'sync_type': sync_config.sync_type
+                'sync_type': sync_config.sync_type,
+                'sync_mode': sync_config.sync_mode,
+                'include_patterns': list(sync_config.include_patterns or []),
+                'exclude_patterns': list(sync_config.exclude_patterns or []),
+                'upload_streams': sync_config.upload_streams
             }
             
             with open(self.config_path, 'w', encoding='utf-8') as f:
                 yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+            invalidate_config(self.config_path)
             
             return True
         except Exception as e:
@@ -120,7 +149,7 @@ class SyncManager:
                 return {'success': False, 'error': f'服务器 {server_name} 配置不存在'}
             
             # 获取同步配置
-            sync_config_data = server_config.get('sync_config', {})
+            sync_config_data = server_config.sync_config
             sync_config = SyncConfig(
                 enabled=True,
                 local_path=local_path or sync_config_data.get('local_path', ''),
@@ -129,7 +158,11 @@ class SyncManager:
                 ftp_user=sync_config_data.get('ftp_user', 'syncuser'),
                 ftp_password=sync_config_data.get('ftp_password', 'syncpass'),
                 auto_sync_interval=sync_config_data.get('auto_sync_interval', 30),
-                sync_type=sync_config_data.get('sync_type', 'rsync')
+                sync_type=sync_config_data.get('sync_type', 'rsync'),
+                sync_mode=sync_config_data.get('sync_mode', 'watch'),
+                include_patterns=sync_config_data.get('include_patterns'),
+                exclude_patterns=sync_config_data.get('exclude_patterns'),
+                upload_streams=sync_config_data.get('upload_streams')
             )
             
             # 1. 检查远端proftpd进程
@@ -153,6 +186,10 @@ class SyncManager:
             if not self.save_server_config(server_name, sync_config):
                 return {'success': False, 'error': '保存配置失败'}
             
+            # 5. 启动增量同步线程
+            if sync_config.local_path and sync_config.remote_path and sync_config.sync_type in ('rsync', 'ftp'):
+                self._start_sync_thread(server_name, sync_config)
+            
             return {
                 'success': True,
                 'message': f'自动同步已启用: {server_name}',
@@ -162,7 +199,8 @@ class SyncManager:
                     'ftp_port': sync_config.ftp_port,
                     'ftp_user': sync_config.ftp_user,
                     'sync_type': sync_config.sync_type,
-                    'interval': sync_config.auto_sync_interval
+                    'interval': sync_config.auto_sync_interval,
+                    'sync_mode': sync_config.sync_mode
                 },
                 'deployment': {
                     'proftpd_running': proftpd_running,
@@ -182,14 +220,15 @@ class SyncManager:
             if not server_config:
                 return {'success': False, 'error': f'服务器 {server_name} 配置不存在'}
             
-            # 1. 远程执行stop.sh
+            # 1. 停止本地同步线程并远程执行stop.sh
+            self._stop_sync_thread(server_name)
             logger.info(f"远程执行stop.sh: {server_name}")
             stop_result = self._execute_remote_stop(server_config)
             if not stop_result['success']:
                 return stop_result
             
             # 2. 更新配置
-            sync_config_data = server_config.get('sync_config', {})
+            sync_config_data = server_config.sync_config
             sync_config = SyncConfig(
                 enabled=False,
                 local_path=sync_config_data.get('local_path', ''),
@@ -198,7 +237,11 @@ class SyncManager:
                 ftp_user=sync_config_data.get('ftp_user', 'syncuser'),
                 ftp_password=sync_config_data.get('ftp_password', 'syncpass'),
                 auto_sync_interval=sync_config_data.get('auto_sync_interval', 30),
-                sync_type=sync_config_data.get('sync_type', 'rsync')
+                sync_type=sync_config_data.get('sync_type', 'rsync'),
+                sync_mode=sync_config_data.get('sync_mode', 'watch'),
+                include_patterns=sync_config_data.get('include_patterns'),
+                exclude_patterns=sync_config_data.get('exclude_patterns'),
+                upload_streams=sync_config_data.get('upload_streams')
             )
             self.save_server_config(server_name, sync_config)
             
@@ -214,8 +257,13 @@ class SyncManager:
     
     def git_sync(self, server_name: str, local_path: Optional[str] = None, 
                 remote_path: Optional[str] = None, commit_hash: Optional[str] = None, 
-                branch: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
-        """Git代码同步 - 新实现逻辑，支持明确指定路径"""
+                branch: Optional[str] = None, force: bool = False, mode: str = 'auto') -> Dict[str, Any]:
+        """
+        Git代码同步（远端 -> 本地），支持明确指定路径
+
+        mode为auto/git时比较两端HEAD，只传输本地缺少的提交（git bundle）和远端未提交的改动；
+        两端没有共同提交时auto模式退回stash + rsync整个目录，rsync模式总是整目录同步。
+        """
         try:
             # 加载配置
             server_config = self.load_server_config(server_name)
@@ -223,7 +271,7 @@ class SyncManager:
                 return {'success': False, 'error': f'服务器 {server_name} 配置不存在'}
             
             # 优先使用用户指定的路径，否则从配置中获取
-            sync_config_data = server_config.get('sync_config', {})
+            sync_config_data = server_config.sync_config
             local_path = local_path or sync_config_data.get('local_path', '')
             remote_path = remote_path or sync_config_data.get('remote_path', '')
             
@@ -243,6 +291,29 @@ class SyncManager:
             if not git_dir.exists():
                 return {'success': False, 'error': f'本地路径不是Git仓库: {local_path}'}
             
+            fallback_reason = None
+            if mode in ('auto', 'git'):
+                logger.info(f"Git增量同步: {remote_path} -> {local_path}")
+                transfer = GitBundleSync(
+                    lambda command: run_command(self._build_ssh_command(server_config, command)),
+                    str(local_path_obj), remote_path
+                ).sync(commit_hash, branch, force)
+                if transfer.success:
+                    return {
+                        'success': True,
+                        'message': f'Git同步成功: {server_name} ({transfer.message})',
+                        'mode': 'git',
+                        'git': transfer.to_dict(),
+                        'paths': {
+                            'local': str(local_path_obj),
+                            'remote': remote_path
+                        }
+                    }
+                if not transfer.fallback or mode == 'git':
+                    return {'success': False, 'error': transfer.message, 'mode': 'git', 'git': transfer.to_dict()}
+                fallback_reason = transfer.message
+                logger.info(f"无法使用Git增量同步（{fallback_reason}），改用rsync")
+            
             # 1. 本地git stash
             logger.info(f"执行本地git stash: {local_path}")
             stash_result = self._execute_local_git_stash(local_path_obj)
@@ -258,6 +329,8 @@ class SyncManager:
             return {
                 'success': True,
                 'message': f'Git同步成功: {server_name}',
+                'mode': 'rsync',
+                'fallback_reason': fallback_reason,
                 'stash': stash_result,
                 'sync': sync_result,
                 'paths': {
@@ -270,136 +343,119 @@ class SyncManager:
             logger.error(f"Git同步失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _execute_git_sync(self, repo_path: Path, commit_hash: Optional[str], 
-                         branch: Optional[str], force: bool) -> Dict[str, Any]:
-        """执行Git同步操作"""
-        try:
-            commands = []
-            
-            # 1. 保存当前工作
-            commands.append(['git', 'stash', 'push', '-m', 'Auto sync before update'])
-            
-            # 2. 获取最新代码
-            commands.append(['git', 'fetch', '--all'])
-            
-            # 3. 根据参数选择同步方式
-            if commit_hash:
-                commands.append(['git', 'checkout', commit_hash])
-            elif branch:
-                commands.append(['git', 'checkout', branch])
-                commands.append(['git', 'pull', 'origin', branch])
-            else:
-                # 默认同步到最新
-                commands.append(['git', 'pull', 'origin', 'main'])
-            
-            # 4. 如果强制同步，重置到指定状态
-            if force and (commit_hash or branch):
-                if commit_hash:
-                    commands.append(['git', 'reset', '--hard', commit_hash])
-                elif branch:
-                    commands.append(['git', 'reset', '--hard', f'origin/{branch}'])
-            
-            # 执行命令
-            results = []
-            for cmd in commands:
-                try:
-                    result = subprocess.run(
-                        cmd, 
-                        cwd=repo_path, 
-                        capture_output=True, 
-                        text=True, 
-                        timeout=60
-                    )
-                    results.append({
-                        'command': ' '.join(cmd),
-                        'success': result.returncode == 0,
-                        'stdout': result.stdout,
-                        'stderr': result.stderr,
-                        'returncode': result.returncode
-                    })
-                    
-                    if result.returncode != 0:
-                        return {
-                            'success': False,
-                            'error': f'Git命令失败: {" ".join(cmd)}',
-                            'details': result.stderr,
-                            'results': results
-                        }
-                        
-                except subprocess.TimeoutExpired:
-                    return {
-                        'success': False,
-                        'error': f'Git命令超时: {" ".join(cmd)}',
-                        'results': results
-                    }
-            
-            return {
-                'success': True,
-                'message': 'Git同步成功',
-                'results': results
-            }
-            
-        except Exception as e:
-            logger.error(f"执行Git同步失败: {e}")
-            return {'success': False, 'error': str(e)}
-    
     def _start_sync_thread(self, server_name: str, sync_config: SyncConfig):
-        """启动同步线程"""
-        if server_name in self.sync_running and self.sync_running[server_name]:
-            logger.info(f"同步线程已运行: {server_name}")
-            return
+        """
+        启动同步：注册到共享调度器
+
+        watch模式监听文件变化后提交变化路径，interval模式由调度器定期全量扫描；
+        两种模式都不再为每台服务器单独占用线程。
+        """
+        with self._lock:
+            if self.sync_running.get(server_name):
+                logger.info(f"同步已运行: {server_name}")
+                return
+            self.sync_running[server_name] = True
+            self.sync_logs[server_name] = []
         
-        self.sync_running[server_name] = True
-        self.sync_logs[server_name] = []
+        transport = sync_config.sync_type
+        scheduler = get_sync_scheduler()
+        interval = sync_config.auto_sync_interval if sync_config.sync_mode != 'watch' else None
+        scheduler.register(
+            server_name,
+            lambda paths: self._run_sync_tick(server_name, sync_config, transport, paths),
+            interval=interval
+        )
         
-        def sync_worker():
-            while self.sync_running.get(server_name, False):
-                try:
-                    if sync_config.sync_type == 'rsync':
-                        self._rsync_sync(server_name, sync_config)
-                    elif sync_config.sync_type == 'ftp':
-                        self._ftp_sync(server_name, sync_config)
-                    
-                    time.sleep(sync_config.auto_sync_interval)
-                except Exception as e:
-                    logger.error(f"同步错误 {server_name}: {e}")
-                    self.sync_logs[server_name].append(f"错误: {e}")
-                    time.sleep(60)  # 错误后等待1分钟再重试
+        if sync_config.sync_mode == 'watch':
+            engine = self._get_sync_engine(server_name, sync_config)
+            watcher = TreeWatcher(sync_config.local_path,
+                                  lambda paths: scheduler.submit(server_name, paths),
+                                  path_filter=engine.path_filter)
+            mode = watcher.start()
+            with self._lock:
+                self.sync_watchers[server_name] = watcher
+            logger.info(f"同步监听已启动: {server_name} ({mode})")
+        else:
+            logger.info(f"定期同步已启动: {server_name} (每{interval}秒)")
         
-        thread = threading.Thread(target=sync_worker, daemon=True)
-        thread.start()
-        self.sync_threads[server_name] = thread
-        logger.info(f"同步线程已启动: {server_name}")
+        # 启动时全量同步一次，补上未运行期间的变化
+        scheduler.submit(server_name)
     
     def _stop_sync_thread(self, server_name: str):
-        """停止同步线程"""
-        self.sync_running[server_name] = False
-        if server_name in self.sync_threads:
-            self.sync_threads[server_name].join(timeout=5)
-            del self.sync_threads[server_name]
-        logger.info(f"同步线程已停止: {server_name}")
+        """停止同步：取消调度任务并停止文件监听"""
+        with self._lock:
+            self.sync_running[server_name] = False
+            watcher = self.sync_watchers.pop(server_name, None)
+        get_sync_scheduler().cancel(server_name)
+        if watcher is not None:
+            watcher.stop()
+        logger.info(f"同步已停止: {server_name}")
     
-    def _rsync_sync(self, server_name: str, sync_config: SyncConfig):
-        """rsync同步"""
-        try:
-            # 这里需要根据服务器配置构建rsync命令
-            # 暂时记录日志
-            self.sync_logs[server_name].append(
-                f"rsync同步: {sync_config.local_path} -> {sync_config.remote_path}"
-            )
-        except Exception as e:
-            logger.error(f"rsync同步失败: {e}")
+    def _get_sync_engine(self, server_name: str, sync_config: SyncConfig) -> IncrementalSyncEngine:
+        """获取服务器的增量同步引擎，同步目录或同步规则变化时重建"""
+        local_path = os.path.abspath(os.path.expanduser(sync_config.local_path))
+        with self._lock:
+            engine = self.sync_engines.get(server_name)
+            path_filter = engine_path_filter(sync_config.include_patterns, sync_config.exclude_patterns)
+            if engine is None or engine.local_path != local_path or engine.remote_path != sync_config.remote_path \
+                    or engine.path_filter is not path_filter:
+                engine = IncrementalSyncEngine(server_name, sync_config.local_path, sync_config.remote_path,
+                                               include_patterns=sync_config.include_patterns,
+                                               exclude_patterns=sync_config.exclude_patterns)
+                self.sync_engines[server_name] = engine
+            return engine
     
-    def _ftp_sync(self, server_name: str, sync_config: SyncConfig):
-        """FTP同步"""
-        try:
-            # 这里需要实现FTP同步逻辑
-            # 暂时记录日志
-            self.sync_logs[server_name].append(
-                f"FTP同步: {sync_config.local_path} -> {sync_config.remote_path}"
-            )
-        except Exception as e:
-            logger.error(f"FTP同步失败: {e}")
+    def _run_sync_tick(self, server_name: str, sync_config: SyncConfig, transport: str,
+                       paths: Optional[Iterable[str]] = None) -> SyncTickResult:
+        """执行一轮增量同步并记录统计；paths为已知变化的相对路径"""
+        server_config = self.load_server_config(server_name)
+        if not server_config:
+            result = SyncTickResult(success=False, transport=transport, started_at=time.time(),
+                                    error=f'服务器 {server_name} 配置不存在')
+        else:
+            result = self._get_sync_engine(server_name, sync_config).sync(
+                server_config, sync_config, transport, paths, limiter=get_sync_scheduler().limiter)
+        self._record_sync_tick(server_name, result)
+        return result
+    
+    def _record_sync_tick(self, server_name: str, result: SyncTickResult):
+        """累计同步统计并写入日志"""
+        with self._lock:
+            stats = self.sync_stats.setdefault(server_name, {
+                'ticks': 0, 'pushes': 0, 'failures': 0,
+                'files': 0, 'deleted': 0, 'bytes': 0,
+                'last_tick': None, 'history': deque(maxlen=20)
+            })
+            logs = self.sync_logs.setdefault(server_name, [])
+            stats['ticks'] += 1
+            stats['last_tick'] = result.to_dict()
+            if not result.success:
+                stats['failures'] += 1
+                stats['history'].append(stats['last_tick'])
+                logs.append(f"{result.transport}同步失败: {result.error}")
+            elif result.files or result.deleted:
+                stats['pushes'] += 1
+                stats['files'] += result.files
+                stats['deleted'] += result.deleted
+                stats['bytes'] += result.bytes
+                stats['history'].append(stats['last_tick'])
+                message = (f"{result.transport}同步: {result.files} 个文件 ({result.bytes} 字节), "
+                           f"删除 {result.deleted} 个, 耗时 {result.duration:.2f}s")
+                if result.upload:
+                    message += (f", {result.upload['streams']} 通道 {result.upload['throughput'] / 1024:.0f}KB/s, "
+                                f"单文件延迟 p50 {result.upload['latency']['p50']}s / "
+                                f"p95 {result.upload['latency']['p95']}s")
+                logs.append(message)
+            # 日志只保留最近的部分
+            del logs[:-MAX_SYNC_LOGS]
+    
+    def _rsync_sync(self, server_name: str, sync_config: SyncConfig) -> SyncTickResult:
+        """rsync增量同步"""
+        return self._run_sync_tick(server_name, sync_config, 'rsync')
+    
+    def _ftp_sync(self, server_name: str, sync_config: SyncConfig) -> SyncTickResult:
+        """FTP增量同步（推送到已部署的proftpd）"""
+        return self._run_sync_tick(server_name, sync_config, 'ftp')
     
     def get_sync_status(self, server_name: str) -> Dict[str, Any]:
         """获取同步状态"""
@@ -408,23 +464,50 @@ class SyncManager:
             if not server_config:
                 return {'success': False, 'error': f'服务器 {server_name} 配置不存在'}
             
-            sync_config_data = server_config.get('sync_config', {})
-            is_running = self.sync_running.get(server_name, False)
+            sync_config_data = server_config.sync_config
+            with self._lock:
+                is_running = self.sync_running.get(server_name, False)
+                watcher = self.sync_watchers.get(server_name)
+                logs = self.sync_logs.get(server_name, [])[-10:]  # 最近10条日志
+            scheduler = get_sync_scheduler()
             
             return {
                 'success': True,
                 'server_name': server_name,
                 'enabled': sync_config_data.get('enabled', False),
                 'running': is_running,
+                'watch_mode': watcher.mode if watcher else None,
                 'config': sync_config_data,
-                'logs': self.sync_logs.get(server_name, [])[-10:]  # 最近10条日志
+                'logs': logs,
+                'stats': self._get_sync_stats(server_name),
+                'schedule': scheduler.job_stats(server_name),
+                'scheduler': scheduler.stats()
             }
             
         except Exception as e:
             logger.error(f"获取同步状态失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _check_remote_proftpd(self, server_config: Dict[str, Any]) -> bool:
+    def _get_sync_stats(self, server_name: str) -> Dict[str, Any]:
+        """同步统计快照：累计值、最近一轮以及最近的推送记录"""
+        with self._lock:
+            stats = self.sync_stats.get(server_name)
+            if not stats:
+                return {}
+            engine = self.sync_engines.get(server_name)
+            return {
+                **{key: value for key, value in stats.items() if key != 'history'},
+                'history': list(stats['history']),
+                'tracked_files': engine.file_count if engine else 0
+            }
+    
+    def all_sync_stats(self) -> Dict[str, Dict[str, Any]]:
+        """所有服务器的同步统计（指标导出用）"""
+        with self._lock:
+            servers = list(self.sync_stats)
+        return {server_name: self._get_sync_stats(server_name) for server_name in servers}
+    
+    def _check_remote_proftpd(self, server_config: ServerRecord) -> bool:
         """检查远端proftpd进程"""
         try:
             # 构建SSH命令检查proftpd进程
@@ -438,7 +521,7 @@ class SyncManager:
             logger.error(f"检查远端proftpd失败: {e}")
             return False
     
-    def _deploy_remote_proftpd(self, server_config: Dict[str, Any], sync_config: SyncConfig) -> Dict[str, Any]:
+    def _deploy_remote_proftpd(self, server_config: ServerRecord, sync_config: SyncConfig) -> Dict[str, Any]:
         """部署远端proftpd"""
         try:
             # 1. 上传proftpd tar包
@@ -487,7 +570,7 @@ class SyncManager:
             logger.error(f"部署远端proftpd失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _update_sftp_config(self, server_name: str, server_config: Dict[str, Any], 
+    def _update_sftp_config(self, server_name: str, server_config: ServerRecord, 
                            sync_config: SyncConfig) -> Dict[str, Any]:
         """更新本地sftp.json配置"""
         try:
@@ -505,13 +588,14 @@ class SyncManager:
             profile_name = f"{server_name}_sync"
             profile_config = {
                 "name": profile_name,
-                "host": server_config['host'],
-                "port": server_config.get('port', 22),
-                "username": server_config['username'],
-                "password": server_config.get('password', ''),
+                "host": server_config.host,
+                "port": server_config.port,
+                "username": server_config.username,
+                "password": (server_config.password or ''),
                 "remotePath": sync_config.remote_path,
                 "localPath": sync_config.local_path,
-                "protocol": "sftp"
+                "protocol": "sftp",
+                "ignore": sync_config.path_filter.sftp_ignore()
             }
             
             # 更新配置
@@ -533,7 +617,7 @@ class SyncManager:
             logger.error(f"更新sftp.json配置失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _execute_remote_stop(self, server_config: Dict[str, Any]) -> Dict[str, Any]:
+    def _execute_remote_stop(self, server_config: ServerRecord) -> Dict[str, Any]:
         """远程执行stop.sh"""
         try:
             result = self._execute_remote_command(server_config, "cd /tmp/proftpd && ./stop.sh")
@@ -575,7 +659,7 @@ class SyncManager:
             logger.error(f"执行本地git stash失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _sync_remote_to_local(self, server_config: Dict[str, Any], remote_path: str, local_path: str) -> Dict[str, Any]:
+    def _sync_remote_to_local(self, server_config: ServerRecord, remote_path: str, local_path: str) -> Dict[str, Any]:
         """远程到本地同步"""
         try:
             # 构建rsync命令
@@ -601,45 +685,27 @@ class SyncManager:
             logger.error(f"远程到本地同步失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _build_ssh_command(self, server_config: Dict[str, Any], command: str) -> List[str]:
-        """构建SSH命令"""
-        ssh_cmd = [
-            'ssh',
-            '-p', str(server_config.get('port', 22)),
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null'
-        ]
-        
-        # 添加用户名和主机
-        ssh_cmd.append(f"{server_config['username']}@{server_config['host']}")
-        ssh_cmd.append(command)
-        
-        return ssh_cmd
+    def _build_ssh_command(self, server_config: ServerRecord, command: str) -> List[str]:
+        """构建SSH命令（复用该服务器的ControlMaster连接）"""
+        return get_ssh_pool().ssh_command(server_config, command)
     
-    def _build_rsync_command(self, server_config: Dict[str, Any], remote_path: str, local_path: str) -> List[str]:
-        """构建rsync命令"""
+    def _build_rsync_command(self, server_config: ServerRecord, remote_path: str, local_path: str) -> List[str]:
+        """构建rsync命令（复用该服务器的ControlMaster连接）"""
         rsync_cmd = [
             'rsync',
             '-avz',
-            '-e', f"ssh -p {server_config.get('port', 22)} -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null",
-            f"{server_config['username']}@{server_config['host']}:{remote_path}/",
+            '-e', get_ssh_pool().rsync_shell(server_config),
+            f"{server_config.username}@{server_config.host}:{remote_path}/",
             f"{local_path}/"
         ]
         
         return rsync_cmd
     
-    def _upload_file_to_remote(self, server_config: Dict[str, Any], local_path: Path, remote_dir: str) -> Dict[str, Any]:
+    def _upload_file_to_remote(self, server_config: ServerRecord, local_path: Path, remote_dir: str) -> Dict[str, Any]:
         """上传文件到远程"""
         try:
-            # 构建scp命令
-            scp_cmd = [
-                'scp',
-                '-P', str(server_config.get('port', 22)),
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                str(local_path),
-                f"{server_config['username']}@{server_config['host']}:{remote_dir}"
-            ]
+            # 构建scp命令（复用该服务器的ControlMaster连接）
+            scp_cmd = get_ssh_pool().scp_command(server_config, str(local_path), remote_dir)
             
             result = subprocess.run(scp_cmd, capture_output=True, text=True, timeout=60)
             
@@ -655,7 +721,7 @@ class SyncManager:
             logger.error(f"上传文件到远程失败: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _execute_remote_command(self, server_config: Dict[str, Any], command: str) -> Dict[str, Any]:
+    def _execute_remote_command(self, server_config: ServerRecord, command: str) -> Dict[str, Any]:
         """执行远程命令"""
         try:
             ssh_command = self._build_ssh_command(server_config, command)
@@ -706,9 +772,9 @@ def disable_auto_sync(server_name: str) -> Dict[str, Any]:
 
 def git_sync(server_name: str, local_path: Optional[str] = None, 
             remote_path: Optional[str] = None, commit_hash: Optional[str] = None, 
-            branch: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+            branch: Optional[str] = None, force: bool = False, mode: str = 'auto') -> Dict[str, Any]:
     """Git同步 - MCP工具接口，支持明确指定路径"""
-    return sync_manager.git_sync(server_name, local_path, remote_path, commit_hash, branch, force)
+    return sync_manager.git_sync(server_name, local_path, remote_path, commit_hash, branch, force, mode)
 
 
 def get_sync_status(server_name: str) -> Dict[str, Any]:
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+SyncScheduler - 所有服务器共享的同步调度器
+
+1. 按到期时间排序的任务队列，由少量工作线程执行
+2. 每台服务器一个任务，多次提交合并为一次
+3. 同一台服务器同一时间只执行一个同步
+4. 所有推送共享一个全局带宽令牌桶
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# 默认工作线程数，可通过环境变量 MCP_SYNC_WORKERS 调整
+DEFAULT_SYNC_WORKERS = 4
+
+# 同步失败后的重试间隔（秒）
+RETRY_DELAY = 10.0
+
+
+class BandwidthLimiter:
+    """全局带宽令牌桶（字节/秒），rate为0表示不限速"""
+
+    def __init__(self, rate: int = 0):
+        self.rate = max(0, int(rate))
+        self._lock = threading.Lock()
+        self._available = float(self.rate)
+        self._updated = time.monotonic()
+
+    def acquire(self, nbytes: int) -> float:
+        """
+        申请发送nbytes字节
+
+        只等待之前的申请留下的欠额，本次的nbytes立即记入（允许透支）：
+        大块数据不用先等自己的额度，之后的申请按欠额等待，总速率仍然受限。
+
+        Returns:
+            等待的秒数
+        """
+        if not self.rate or nbytes <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(float(self.rate), self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = -self._available / self.rate if self._available < 0 else 0.0
+            self._available -= nbytes
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def rsync_bwlimit(self) -> Optional[int]:
+        """
+        单次rsync的 --bwlimit 参数（KB/s），保证单个大批次也不超过全局速率
+
+        rsync自己按这个速率发送，acquire只记账不预先等待本批次的额度，
+        同一批次不会被限速两次。
+        """
+        if not self.rate:
+            return None
+        return max(1, self.rate // 1024)
+
+
+@dataclass
+class _Job:
+    key: str
+    runner: Callable[[Set[str]], object]
+    interval: Optional[float] = None  # 定期全量扫描的间隔；None表示只响应提交
+    jitter: float = 0.0  # 定期间隔的随机浮动比例，避免大量任务同时到期
+    paths: Set[str] = field(default_factory=set)
+    due: Optional[float] = None
+    running: bool = False
+    runs: int = 0
+    failures: int = 0
+    last_started: float = 0.0
+    last_duration: float = 0.0
+
+
+class SyncScheduler:
+    """同步任务调度器"""
+
+    def __init__(self, max_workers: int = DEFAULT_SYNC_WORKERS, bandwidth_limit: int = 0,
+                 retry_delay: float = RETRY_DELAY):
+        self.max_workers = max(1, max_workers)
+        self.retry_delay = retry_delay
+        self.limiter = BandwidthLimiter(bandwidth_limit)
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, _Job] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._workers: List[threading.Thread] = []
+        self._active = 0
+
+    @property
+    def thread_count(self) -> int:
+        return len(self._workers)
+
+    @property
+    def active(self) -> int:
+        """正在执行的同步数"""
+        return self._active
+
+    def register(self, key: str, runner: Callable[[Set[str]], object],
+                 interval: Optional[float] = None, jitter: float = 0.0):
+        """
+        注册（或替换）一台服务器的同步任务
+
+        Args:
+            key: 任务键（服务器名）
+            runner: 执行一次同步，参数为变化的相对路径（'' 表示全量扫描），
+                    返回带 success 属性的结果
+            interval: 定期全量扫描间隔（秒），None表示只在提交时执行
+            jitter: 每次间隔在 interval*(1±jitter) 内随机浮动
+        """
+        with self._cond:
+            self._jobs[key] = _Job(key, runner, interval, max(0.0, min(1.0, jitter)))
+
+    def submit(self, key: str, paths: Optional[Iterable[str]] = None, delay: float = 0.0):
+        """提交变化，paths为None表示全量扫描；已在队列中的任务合并路径并取较早的到期时间"""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job.paths.update({''} if paths is None else paths)
+            self._schedule(job, time.monotonic() + delay)
+
+    def cancel(self, key: str):
+        """移除任务；正在执行的同步完成后不再重新排队"""
+        with self._cond:
+            self._jobs.pop(key, None)
+
+    def _schedule(self, job: _Job, due: float):
+        if job.due is not None and job.due <= due:
+            return
+        job.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), job.key))
+        self._ensure_workers()
+        self._cond.notify()
+
+    def _ensure_workers(self):
+        # 工作线程按需创建，最多max_workers个
+        busy = self._active + len(self._heap)
+        while len(self._workers) < min(self.max_workers, busy):
+            thread = threading.Thread(target=self._worker, daemon=True,
+                                      name=f"sync-worker-{len(self._workers)}")
+            self._workers.append(thread)
+            thread.start()
+
+    def _next_job(self) -> _Job:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._heap:
+                    due, _, key = self._heap[0]
+                    job = self._jobs.get(key)
+                    if job is None or job.due != due:
+                        heapq.heappop(self._heap)  # 已取消或已被提前的过期条目
+                        continue
+                    if job.running:
+                        # 同一台服务器同一时间只执行一个同步，完成后会重新排队
+                        heapq.heappop(self._heap)
+                        job.due = None
+                        continue
+                    break
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, key = self._heap[0]
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                job = self._jobs[key]
+                job.due = None
+                job.running = True
+                job.last_started = now
+                self._active += 1
+                return job
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            with self._cond:
+                paths, job.paths = job.paths, set()
+            start_time = time.monotonic()
+            try:
+                success = bool(getattr(job.runner(paths), 'success', True))
+            except Exception:
+                success = False
+            with self._cond:
+                self._active -= 1
+                job.running = False
+                job.runs += 1
+                job.last_duration = time.monotonic() - start_time
+                if self._jobs.get(job.key) is not job:
+                    continue
+                now = time.monotonic()
+                if not success:
+                    job.failures += 1
+                    # 失败的变化没有写回清单，合并后稍后重试
+                    job.paths.update(paths)
+                    self._schedule(job, now + self.retry_delay)
+                elif job.paths:
+                    # 执行期间又有新变化，排到当前已到期任务之后
+                    self._schedule(job, now)
+                elif job.interval:
+                    job.paths.add('')
+                    interval = job.interval
+                    if job.jitter:
+                        interval *= random.uniform(1 - job.jitter, 1 + job.jitter)
+                    self._schedule(job, now + interval)
+
+    def stats(self) -> Dict:
+        """调度器状态"""
+        with self._cond:
+            return {
+                'workers': len(self._workers),
+                'max_workers': self.max_workers,
+                'active': self._active,
+                'jobs': len(self._jobs),
+                'queued': sum(1 for job in self._jobs.values() if job.due is not None),
+                'bandwidth_limit': self.limiter.rate
+            }
+
+    def job_stats(self, key: str) -> Optional[Dict]:
+        """单个任务的调度状态"""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            return {
+                'runs': job.runs,
+                'failures': job.failures,
+                'running': job.running,
+                'next_run_in': None if job.due is None else max(0.0, round(job.due - time.monotonic(), 3)),
+                'last_duration': round(job.last_duration, 3)
+            }
+
+
+_scheduler: Optional[SyncScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_sync_scheduler() -> SyncScheduler:
+    """获取进程级共享的同步调度器（环境变量 MCP_SYNC_WORKERS、MCP_SYNC_BANDWIDTH_LIMIT 字节/秒）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SyncScheduler(
+                max_workers=int(os.getenv('MCP_SYNC_WORKERS', DEFAULT_SYNC_WORKERS)),
+                bandwidth_limit=int(os.getenv('MCP_SYNC_BANDWIDTH_LIMIT', 0))
+            )
+        return _scheduler
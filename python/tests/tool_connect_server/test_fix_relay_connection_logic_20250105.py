@@ -29,6 +29,7 @@ sys.path.insert(0, str(project_root / "python"))
 
 try:
     from enhanced_ssh_manager import EnhancedSSHManager, InteractiveGuide
+    from session_probe import ProbeResult
 except ImportError as e:
     print(f"❌ 导入失败: {e}")
     print(f"项目根目录: {project_root}")
@@ -101,27 +102,26 @@ class TestRelayConnectionLogicFix(unittest.TestCase):
                 with patch('builtins.open', create=True):
                     self.manager = EnhancedSSHManager()
         
-        # 模拟测试命令输出（本地环境）
-        local_output = "CONNECTION_TEST_MacBook-Pro_xuyehua_1704441600"
+        # 模拟探测结果（本地环境）
+        local_probe = ProbeResult(True, hostname="xuyehua-MacBook-Pro", user="xuyehua")
         
-        # 模拟测试命令输出（远程环境）
-        remote_output = "CONNECTION_TEST_bjhw-sys-rpm0221_xuyehua_1704441600"
+        # 模拟探测结果（远程环境）
+        remote_probe = ProbeResult(True, hostname="bjhw-sys-rpm0221", user="xuyehua")
         
-        # 模拟relay环境输出
-        relay_output = "CONNECTION_TEST_baidu-relay_xuyehua_1704441600"
-        
-        with patch('subprocess.run') as mock_run:
-            # 测试本地环境检测
+        with patch('subprocess.run') as mock_run, \
+                patch('enhanced_ssh_manager.probe_session') as mock_probe:
+            # tmux会话存在
             mock_run.return_value.returncode = 0
-            mock_run.return_value.stdout = local_output
             
+            # 测试本地环境检测
+            mock_probe.return_value = local_probe
             result = self.manager._detect_existing_connection('test_relay_server', 'test_session')
             self.assertEqual(result, "recoverable", 
                            "❌ 本地环境应该返回'recoverable'")
             print("✅ 本地环境检测正确")
             
             # 测试远程环境检测
-            mock_run.return_value.stdout = remote_output
+            mock_probe.return_value = remote_probe
             result = self.manager._detect_existing_connection('test_relay_server', 'test_session')
             self.assertEqual(result, "ready", 
                            "❌ 远程环境应该返回'ready'")
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+TmuxClient - 常驻tmux控制模式(tmux -C)客户端
+
+原先每一次send-keys / capture-pane / has-session都会fork一个新的tmux进程，
+一次smart_connect就可能产生上百次fork+exec。本模块维护一条长期存在的
+`tmux -C` 控制模式连接，把命令按行写入，解析 %begin/%end/%error 应答块
+和 %output 通知，多个线程可以共享同一条连接。
+
+控制模式不可用时（未安装tmux、被环境变量禁用、连接断开、参数含换行等）
+自动回退到 subprocess.run，返回值与 subprocess.run 保持一致。
+"""
+
+import os
+import re
+import time
+import shutil
+import threading
+import subprocess
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# 控制连接挂载的隐藏会话名称
+CONTROL_SESSION_NAME = "_remote_terminal_ctl"
+
+# 设置为0可禁用控制模式，全部回退到subprocess
+CONTROL_MODE_ENV = "REMOTE_TERMINAL_TMUX_CONTROL"
+
+# 未指定timeout时等待应答的最长时间（秒）
+DEFAULT_REPLY_TIMEOUT = 30.0
+
+# 控制连接断开后，两次重连之间的最小间隔（秒）
+RECONNECT_INTERVAL = 5.0
+
+_OCTAL_ESCAPE = re.compile(rb'\\([0-7]{3})')
+
+
+def decode_output(data: bytes) -> bytes:
+    """解码 %output 通知中的八进制转义（tmux会把控制字符和反斜杠转义为 \\ooo）"""
+    if b'\\' not in data:
+        return data
+    return _OCTAL_ESCAPE.sub(lambda m: bytes([int(m.group(1), 8)]), data)
+
+
+def quote_argument(arg: str) -> Optional[str]:
+    """
+    按tmux命令解析规则给参数加引号
+
+    Returns:
+        加引号后的参数；无法在单行内表示（含换行）时返回None
+    """
+    if '\n' in arg or '\r' in arg:
+        return None
+    if "'" not in arg:
+        return f"'{arg}'"
+    escaped = arg.replace('\\', '\\\\').replace('"', '\\"').replace('$', '\\$')
+    return f'"{escaped}"'
+
+
+def build_command_line(args: List[str]) -> Optional[str]:
+    """把tmux参数列表(不含开头的'tmux')拼成一行控制模式命令"""
+    quoted = []
+    for arg in args:
+        q = quote_argument(str(arg))
+        if q is None:
+            return None
+        quoted.append(q)
+    return ' '.join(quoted)
+
+
+class ControlModeParser:
+    """
+    tmux控制模式输出解析器
+
+    逐行喂入控制连接的原始输出（bytes，不含行尾换行），返回解析出的事件：
+    - ('reply', cmd_number, ok, lines)  本客户端命令的应答块
+    - ('output', pane_id, data)         %output 通知，data为解码后的bytes
+    - ('exit', reason)                  %exit，连接即将关闭
+    - ('notify', line)                  其它通知（%session-changed等）
+    """
+
+    def __init__(self):
+        self._in_block = False
+        self._block_number = None
+        self._block_ours = False
+        self._block_lines: List[str] = []
+
+    def feed_line(self, line: bytes) -> Optional[Tuple]:
+        """解析一行输出，返回事件或None"""
+        if self._in_block:
+            if line.startswith(b'%end ') or line.startswith(b'%error '):
+                parts = line.split(b' ')
+                number = parts[2] if len(parts) > 2 else b''
+                if number.decode('ascii', 'replace') == self._block_number:
+                    self._in_block = False
+                    lines = self._block_lines
+                    self._block_lines = []
+                    if not self._block_ours:
+                        return None
+                    ok = line.startswith(b'%end ')
+                    return ('reply', int(self._block_number), ok, lines)
+            self._block_lines.append(line.decode('utf-8', 'replace'))
+            return None
+
+        if line.startswith(b'%begin '):
+            parts = line.split(b' ')
+            self._in_block = True
+            self._block_number = parts[2].decode('ascii', 'replace') if len(parts) > 2 else ''
+            flags = parts[3] if len(parts) > 3 else b'0'
+            # flags第0位为1表示该命令由本客户端发出，启动时的初始块flags为0
+            self._block_ours = flags.isdigit() and int(flags) & 1 == 1
+            self._block_lines = []
+            return None
+
+        if line.startswith(b'%output '):
+            parts = line.split(b' ', 2)
+            pane_id = parts[1].decode('ascii', 'replace') if len(parts) > 1 else ''
+            data = parts[2] if len(parts) > 2 else b''
+            return ('output', pane_id, decode_output(data))
+
+        if line.startswith(b'%exit'):
+            reason = line[6:].decode('utf-8', 'replace') if len(line) > 6 else ''
+            return ('exit', reason)
+
+        return ('notify', line.decode('utf-8', 'replace'))
+
+
+class _PendingReply:
+    """等待控制模式应答的命令"""
+
+    __slots__ = ('event', 'ok', 'lines')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.ok = False
+        self.lines: List[str] = []
+
+
+class TmuxClient:
+    """常驻tmux控制模式客户端，所有tmux命令共享同一条 tmux -C 连接"""
+
+    def __init__(self, tmux_bin: str = "tmux", control_session: str = CONTROL_SESSION_NAME):
+        self.tmux_bin = tmux_bin
+        self.control_session = control_session
+        self._proc: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._pending: Deque[_PendingReply] = deque()
+        self._output_listeners: List[Callable[[str, bytes], None]] = []
+        self._ready = threading.Event()
+        self._wanted = False
+        self._last_attempt = 0.0
+        self.stats: Dict[str, int] = {'control': 0, 'fallback': 0}
+
+    # ------------------------------------------------------------------
+    # 连接管理
+    # ------------------------------------------------------------------
+
+    def start(self) -> bool:
+        """打开控制模式连接，成功返回True；不可用时返回False并保持回退模式"""
+        self._wanted = True
+        with self._state_lock:
+            if self._is_alive():
+                return True
+            return self._connect()
+
+    def stop(self):
+        """关闭控制模式连接"""
+        self._wanted = False
+        with self._state_lock:
+            self._close()
+
+    def is_control_mode(self) -> bool:
+        """当前是否通过控制模式连接执行命令"""
+        return self._is_alive()
+
+    def _is_alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _connect(self) -> bool:
+        self._last_attempt = time.time()
+        if os.environ.get(CONTROL_MODE_ENV, "1") == "0":
+            return False
+        if not shutil.which(self.tmux_bin):
+            return False
+        try:
+            proc = subprocess.Popen(
+                [self.tmux_bin, '-C', 'new-session', '-A', '-s', self.control_session],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0
+            )
+        except OSError:
+            return False
+
+        self._proc = proc
+        self._pending.clear()
+        self._ready.clear()
+        self._reader = threading.Thread(target=self._read_loop, args=(proc,), daemon=True)
+        self._reader.start()
+
+        # 必须等客户端挂上会话后再发命令，否则命令会先于会话创建执行
+        if not self._ready.wait(5.0):
+            self._close()
+            return False
+
+        # 所有控制客户端退出后自动销毁隐藏会话，避免残留在 tmux ls 中
+        try:
+            result = self._send(['set-option', '-t', self.control_session, 'destroy-unattached', 'on'], 5.0)
+        except subprocess.TimeoutExpired:
+            result = None
+        if result is None or not result.ok:
+            self._close()
+            return False
+        return True
+
+    def _close(self):
+        proc = self._proc
+        self._proc = None
+        if proc is not None:
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+            try:
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+        self._fail_pending()
+
+    def _fail_pending(self):
+        while self._pending:
+            pending = self._pending.popleft()
+            pending.ok = False
+            pending.lines = ['tmux control client exited']
+            pending.event.set()
+
+    def _read_loop(self, proc: subprocess.Popen):
+        parser = ControlModeParser()
+        try:
+            for raw in iter(proc.stdout.readline, b''):
+                event = parser.feed_line(raw.rstrip(b'\n').rstrip(b'\r'))
+                if event is None:
+                    continue
+                kind = event[0]
+                if kind == 'reply':
+                    if self._pending:
+                        pending = self._pending.popleft()
+                        pending.ok = event[2]
+                        pending.lines = event[3]
+                        pending.event.set()
+                elif kind == 'output':
+                    for listener in list(self._output_listeners):
+                        try:
+                            listener(event[1], event[2])
+                        except Exception:
+                            pass
+                elif kind == 'notify':
+                    if event[1].startswith('%session-changed'):
+                        self._ready.set()
+                elif kind == 'exit':
+                    break
+        finally:
+            if self._proc is proc:
+                self._proc = None
+            self._fail_pending()
+
+    # ------------------------------------------------------------------
+    # 命令执行
+    # ------------------------------------------------------------------
+
+    def add_output_listener(self, listener: Callable[[str, bytes], None]):
+        """注册 %output 通知回调，参数为 (pane_id, data)"""
+        self._output_listeners.append(listener)
+
+    def remove_output_listener(self, listener: Callable[[str, bytes], None]):
+        """移除 %output 通知回调"""
+        if listener in self._output_listeners:
+            self._output_listeners.remove(listener)
+
+    def _send(self, args: List[str], timeout: Optional[float]) -> Optional[_PendingReply]:
+        """通过控制连接发送命令并等待应答；无法发送时返回None"""
+        line = build_command_line(args)
+        if line is None:
+            return None
+        pending = _PendingReply()
+        with self._write_lock:
+            proc = self._proc
+            if proc is None or proc.poll() is not None:
+                return None
+            # 入队与写入在同一把锁内完成，保证应答顺序与命令顺序一致
+            self._pending.append(pending)
+            try:
+                proc.stdin.write(line.encode('utf-8') + b'\n')
+                proc.stdin.flush()
+            except (OSError, ValueError):
+                self._pending.remove(pending)
+                return None
+        wait_timeout = timeout if timeout is not None else DEFAULT_REPLY_TIMEOUT
+        if not pending.event.wait(wait_timeout):
+            raise subprocess.TimeoutExpired(['tmux'] + list(args), wait_timeout)
+        return pending
+
+    def _ensure_connected(self) -> bool:
+        if self._is_alive():
+            return True
+        if not self._wanted or time.time() - self._last_attempt < RECONNECT_INTERVAL:
+            return False
+        with self._state_lock:
+            if self._is_alive():
+                return True
+            return self._connect()
+
+    def run(self, cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+        """
+        执行tmux命令，接口与 subprocess.run 一致
+
+        Args:
+            cmd: 完整命令列表，如 ['tmux', 'send-keys', '-t', 'sess', 'ls', 'Enter']
+            **kwargs: 透传给subprocess.run的参数（capture_output、text、timeout、check等）
+        """
+        args = [str(c) for c in cmd[1:]]
+        use_control = (
+            len(cmd) > 1
+            and not args[0].startswith('-')
+            and 'input' not in kwargs
+            and self._ensure_connected()
+        )
+        pending = self._send(args, kwargs.get('timeout')) if use_control else None
+        if pending is None:
+            self.stats['fallback'] += 1
+            return subprocess.run(cmd, **kwargs)
+
+        self.stats['control'] += 1
+        output = '\n'.join(pending.lines) + '\n' if pending.lines else ''
+        stdout, stderr = (output, '') if pending.ok else ('', output)
+        if not (kwargs.get('text') or kwargs.get('universal_newlines')):
+            stdout, stderr = stdout.encode('utf-8'), stderr.encode('utf-8')
+        result = subprocess.CompletedProcess(cmd, 0 if pending.ok else 1, stdout, stderr)
+        if kwargs.get('check'):
+            result.check_returncode()
+        return result
+
+    # ------------------------------------------------------------------
+    # 常用命令快捷方式
+    # ------------------------------------------------------------------
+
+    def send_keys(self, target: str, *keys: str) -> subprocess.CompletedProcess:
+        """向目标窗格发送按键"""
+        return self.run(['tmux', 'send-keys', '-t', target] + list(keys), capture_output=True)
+
+    def capture_pane(self, target: str, *extra: str) -> str:
+        """获取目标窗格当前可见内容"""
+        result = self.run(['tmux', 'capture-pane', '-p', '-t', target] + list(extra),
+                          capture_output=True, text=True)
+        return result.stdout if result.returncode == 0 else ''
+
+    def has_session(self, session_name: str) -> bool:
+        """检查会话是否存在"""
+        result = self.run(['tmux', 'has-session', '-t', session_name], capture_output=True)
+        return result.returncode == 0
+
+
+# 进程级共享实例
+_tmux_client: Optional[TmuxClient] = None
+_tmux_client_lock = threading.Lock()
+
+
+def get_tmux_client() -> TmuxClient:
+    """获取进程级共享的TmuxClient"""
+    global _tmux_client
+    if _tmux_client is None:
+        with _tmux_client_lock:
+            if _tmux_client is None:
+                _tmux_client = TmuxClient()
+    return _tmux_client
+
+
+def tmux_run(cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """执行tmux命令，控制模式已启动时走共享连接，否则回退到subprocess.run"""
+    return get_tmux_client().run(cmd, **kwargs)
+
+
+# list_sessions 的输出格式：会话名、创建时间、最近一次attach时间
+SESSION_LIST_FORMAT = '#{session_name}\t#{session_created}\t#{session_last_attached}'
+
+# tmux服务未运行（或socket已失效）时 list-sessions 的错误输出
+_NO_SERVER_MESSAGES = ('no server running', 'error connecting to')
+
+
+def list_sessions() -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    一次 `tmux list-sessions` 取回所有会话（不含控制连接的隐藏会话）
+
+    created 即 #{session_created}，可作为会话标识（见 state_store.live_session_id）。
+
+    Returns:
+        {会话名: {'created': ..., 'last_attached': ...}}；tmux服务未运行时为空，
+        命令超时或出错时为None（调用方应逐个会话检查，不能当作没有会话）
+    """
+    try:
+        result = tmux_run(['tmux', 'list-sessions', '-F', SESSION_LIST_FORMAT],
+                          capture_output=True, text=True, timeout=5)
+    except Exception:
+        return None
+    if result.returncode != 0:
+        stderr = (result.stderr or '').lower()
+        return {} if any(message in stderr for message in _NO_SERVER_MESSAGES) else None
+    sessions: Dict[str, Dict[str, str]] = {}
+    for line in (result.stdout or '').splitlines():
+        name, _, rest = line.partition('\t')
+        if not name or name == CONTROL_SESSION_NAME:
+            continue
+        created, _, last_attached = rest.partition('\t')
+        sessions[name] = {'created': created, 'last_attached': last_attached}
+    return sessions
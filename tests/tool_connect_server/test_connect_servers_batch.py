@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+批量并发连接测试
+测试connect_servers并发连接、按完成顺序回调、并发上限以及单台失败不影响其它服务器
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import connect
+from connect import ConnectionResult, ConnectionStatus, connect_servers
+
+
+class FakeManager:
+    """按服务器名模拟不同耗时的连接管理器"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def connect(self, server_name, force_recreate=False):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delays[server_name])
+            if server_name == "broken":
+                raise RuntimeError("handshake failed")
+            return ConnectionResult(success=True, message="连接成功",
+                                    session_name=f"{server_name}_session",
+                                    status=ConnectionStatus.CONNECTED)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class TestConnectServersBatch(unittest.TestCase):
+    """批量连接测试类"""
+
+    def run_batch(self, manager, names, **kwargs):
+        finished = []
+        with patch.object(connect, "get_connection_manager", return_value=manager):
+            start = time.time()
+            results = connect_servers(names, on_result=lambda name, result: finished.append(name), **kwargs)
+        return results, finished, time.time() - start
+
+    def test_parallel_wall_clock_and_completion_order(self):
+        """总耗时接近最慢的一台，回调按完成顺序触发，结果按输入顺序返回"""
+        manager = FakeManager({"slow": 0.4, "mid": 0.2, "fast": 0.05})
+        results, finished, elapsed = self.run_batch(manager, ["slow", "mid", "fast", "fast"])
+
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(finished, ["fast", "mid", "slow"])
+        self.assertEqual(list(results), ["slow", "mid", "fast"])
+        self.assertTrue(all(result.success for result in results.values()))
+        self.assertIn("latency", results["slow"].details)
+
+    def test_parallelism_cap(self):
+        """并发数不超过max_parallel"""
+        manager = FakeManager({f"s{i}": 0.05 for i in range(6)})
+        self.run_batch(manager, [f"s{i}" for i in range(6)], max_parallel=2)
+        self.assertEqual(manager.max_active, 2)
+
+    def test_failure_is_isolated(self):
+        """单台服务器异常只影响它自己的结果"""
+        manager = FakeManager({"broken": 0.01, "ok": 0.01})
+        results, finished, _ = self.run_batch(manager, ["broken", "ok"])
+
+        self.assertFalse(results["broken"].success)
+        self.assertIn("handshake failed", results["broken"].message)
+        self.assertEqual(results["broken"].status, ConnectionStatus.ERROR)
+        self.assertTrue(results["ok"].success)
+        self.assertEqual(sorted(finished), ["broken", "ok"])
+
+
+if __name__ == '__main__':
+    unittest.main()
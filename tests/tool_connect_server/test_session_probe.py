@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+会话快速探测测试
+测试探测结果解析、成功结果缓存（过期和会话重建后失效）、自适应等待上限，
+以及重连健康会话时只探测一次、不再固定等待
+"""
+
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+# 添加tests/utils目录到Python路径（共用的服务器测试夹具）
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+import enhanced_ssh_manager
+import session_probe
+from enhanced_ssh_manager import EnhancedSSHManager
+from heartbeat import HeartbeatResult
+from pane_stream import CommandCompletion
+from server_fixtures import use_temp_config
+from session_probe import ProbeResult, SessionProber
+
+
+class FakeSession:
+    """模拟会话：记录发送的探测命令，按设定返回完成结果"""
+
+    def __init__(self, output="gpu-a dev\n", completed=True, tracked=True):
+        self.output = output
+        self.completed = completed
+        self.tracked = tracked
+        self.session_id = "1700000000"
+        self.sent = []
+
+    def send(self, session_name, command):
+        self.sent.append(command)
+        return object(), None, 0
+
+    def wait(self, session_name, sentinel, stream, start_offset, timeout):
+        self.timeout = timeout
+        return CommandCompletion(tracked=self.tracked, completed=self.completed, exit_code=0,
+                                 output=self.output if self.completed else None)
+
+    def patch(self, test):
+        for name, value in (("send_wrapped_command", self.send), ("wait_for_command", self.wait),
+                            ("live_session_id", lambda session_name: self.session_id)):
+            patcher = patch.object(session_probe, name, side_effect=value)
+            patcher.start()
+            test.addCleanup(patcher.stop)
+        return self
+
+
+class TestSessionProber(unittest.TestCase):
+    """会话探测器测试类"""
+
+    def test_probe_parses_and_caches(self):
+        """解析主机名和用户名，缓存时间内复用结果，会话重建后重新探测"""
+        session = FakeSession().patch(self)
+        prober = SessionProber(cache_ttl=30)
+        result = prober.probe("gpu_a_session")
+        self.assertTrue(result.alive)
+        self.assertEqual((result.hostname, result.user, result.cached), ("gpu-a", "dev", False))
+
+        self.assertTrue(prober.probe("gpu_a_session").cached)
+        self.assertEqual(len(session.sent), 1)
+        self.assertIn("hostname", session.sent[0])
+
+        session.session_id = "1700000999"
+        self.assertFalse(prober.probe("gpu_a_session").cached)
+        self.assertEqual(len(session.sent), 2)
+        self.assertFalse(prober.probe("gpu_a_session", use_cache=False).cached)
+
+    def test_cache_expires(self):
+        """缓存过期或为0时每次都发送探测命令"""
+        session = FakeSession().patch(self)
+        prober = SessionProber(cache_ttl=0)
+        prober.probe("gpu_a_session")
+        prober.probe("gpu_a_session")
+        self.assertEqual(len(session.sent), 2)
+
+    def test_failures_not_cached(self):
+        """超时、会话不运行shell或会话不存在时探测失败，且不缓存"""
+        session = FakeSession(completed=False).patch(self)
+        prober = SessionProber(cache_ttl=30)
+        self.assertEqual(prober.probe("gpu_a_session").message, "探测超时")
+        session.tracked = False
+        self.assertFalse(prober.probe("gpu_a_session").alive)
+        session.session_id = None
+        self.assertEqual(prober.probe("gpu_a_session").message, "会话不存在")
+        self.assertEqual(len(session.sent), 2)
+        self.assertIsNone(prober.cached("gpu_a_session"))
+
+    def test_local_result_not_cached(self):
+        """会话仍在本地时不缓存，连接完成后的下一次探测能看到远端主机"""
+        import socket
+        session = FakeSession(output=f"{socket.gethostname()} dev\n").patch(self)
+        prober = SessionProber(cache_ttl=30)
+        self.assertTrue(prober.probe("gpu_a_session").is_local)
+        self.assertIsNone(prober.cached("gpu_a_session"))
+        session.output = "gpu-a dev\n"
+        result = prober.probe("gpu_a_session")
+        self.assertEqual((result.hostname, result.cached), ("gpu-a", False))
+        self.assertEqual(len(session.sent), 2)
+
+    def test_adaptive_timeout(self):
+        """没有耗时记录时用上限，探测很快的会话使用较短的等待"""
+        session = FakeSession().patch(self)
+        prober = SessionProber(cache_ttl=0, max_timeout=3.0)
+        self.assertEqual(prober.timeout_for("gpu_a_session"), 3.0)
+        prober.probe("gpu_a_session")
+        self.assertEqual(session.timeout, 3.0)
+        prober.probe("gpu_a_session")
+        self.assertEqual(session.timeout, session_probe.MIN_PROBE_TIMEOUT)
+
+    def test_slow_probe_waits_until_max_timeout(self):
+        """自适应等待到期后继续等同一条探测命令到上限，延迟抖动不判为会话不可用"""
+        session = FakeSession().patch(self)
+        prober = SessionProber(cache_ttl=0, max_timeout=3.0)
+        prober.probe("gpu_a_session")
+
+        timeouts = []
+
+        def slow_wait(session_name, sentinel, stream, start_offset, timeout):
+            timeouts.append(timeout)
+            completed = len(timeouts) > 1
+            return CommandCompletion(tracked=True, completed=completed, exit_code=0,
+                                     output="gpu-a dev\n" if completed else None)
+
+        with patch.object(session_probe, "wait_for_command", side_effect=slow_wait):
+            result = prober.probe("gpu_a_session")
+        self.assertTrue(result.alive)
+        self.assertEqual(len(session.sent), 2)
+        self.assertEqual(timeouts, [session_probe.MIN_PROBE_TIMEOUT, 3.0 - session_probe.MIN_PROBE_TIMEOUT])
+
+    def test_is_local(self):
+        """主机名为本机或常见本地主机名时视为本地"""
+        import socket
+        self.assertTrue(ProbeResult(True, hostname=socket.gethostname()).is_local)
+        self.assertTrue(ProbeResult(True, hostname="xuyehua-MacBook-Pro.local").is_local)
+        self.assertFalse(ProbeResult(True, hostname="gpu-a-remote-host").is_local)
+
+
+class TestReconnectHealthySession(unittest.TestCase):
+    """重连健康会话测试类"""
+
+    def setUp(self):
+        self.config_path, _ = use_temp_config(self, modules=(enhanced_ssh_manager,))
+        prober_patch = patch.object(session_probe, "_prober", SessionProber(cache_ttl=30))
+        prober_patch.start()
+        self.addCleanup(prober_patch.stop)
+
+    def test_smart_connect_probes_once(self):
+        """检测现有连接只探测一次，健康检查走带外心跳，不再固定等待"""
+        session = FakeSession(output="gpu-a-remote dev\n").patch(self)
+        manager = EnhancedSSHManager(self.config_path)
+        with patch.object(manager, "_establish_smart_connection") as establish, \
+                patch.object(enhanced_ssh_manager, "heartbeat",
+                             return_value=HeartbeatResult(True, latency=0.002, command="ssh")):
+            start = time.time()
+            success, message = manager.smart_connect("gpu_a")
+            elapsed = time.time() - start
+        self.assertTrue(success, message)
+        establish.assert_not_called()
+        self.assertEqual(len(session.sent), 1)
+        self.assertLess(elapsed, 0.2)
+
+    def test_local_session_needs_recovery(self):
+        """探测命令在本机执行时判定为需要恢复"""
+        import socket
+        FakeSession(output=f"{socket.gethostname()} dev\n").patch(self)
+        manager = EnhancedSSHManager(self.config_path)
+        self.assertEqual(manager._detect_existing_connection("gpu_a", "gpu_a_session"), "recoverable")
+
+
+if __name__ == '__main__':
+    unittest.main()
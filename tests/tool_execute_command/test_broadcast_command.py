@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+批量执行命令测试
+测试broadcast_command并发执行、逐台记录退出码和耗时以及相同输出分组
+"""
+
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import connect
+from connect import ConnectionResult, ConnectionStatus, broadcast_command, group_command_outputs
+
+OUTPUTS = {
+    "gpu1": (0, "Driver Version: 535.104"),
+    "gpu2": (0, "Driver Version: 535.104"),
+    "gpu3": (0, "Driver Version: 525.60"),
+    "cpu1": (127, "nvidia-smi: command not found"),
+}
+
+
+def fake_execute(server_name, command, config_path=None, simple_mode=False):
+    time.sleep(0.2)
+    exit_code, output = OUTPUTS[server_name]
+    return ConnectionResult(
+        success=exit_code == 0,
+        message=output if exit_code == 0 else f"命令退出码: {exit_code}",
+        status=ConnectionStatus.READY if exit_code == 0 else ConnectionStatus.ERROR,
+        details={"command": command, "output": output + "\n", "exit_code": exit_code}
+    )
+
+
+class TestBroadcastCommand(unittest.TestCase):
+    """批量执行命令测试类"""
+
+    def test_concurrent_execution_with_per_host_results(self):
+        """各服务器并发执行，总耗时接近单台，结果包含退出码和耗时"""
+        with patch.object(connect, "execute_server_command", side_effect=fake_execute):
+            start = time.time()
+            results = broadcast_command("nvidia-smi", list(OUTPUTS))
+            elapsed = time.time() - start
+
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(list(results), list(OUTPUTS))
+        self.assertEqual(results["cpu1"].details["exit_code"], 127)
+        self.assertFalse(results["cpu1"].success)
+        self.assertGreaterEqual(results["gpu1"].details["latency"], 0.2)
+
+    def test_group_identical_outputs(self):
+        """输出和退出码相同的服务器归为一组，按组大小排序"""
+        with patch.object(connect, "execute_server_command", side_effect=fake_execute):
+            results = broadcast_command("nvidia-smi", list(OUTPUTS))
+        groups = group_command_outputs(results)
+
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(groups[0]["servers"], ["gpu1", "gpu2"])
+        self.assertEqual(groups[0]["output"], "Driver Version: 535.104")
+        self.assertEqual(groups[0]["exit_code"], 0)
+        self.assertIn({"servers": ["cpu1"], "exit_code": 127,
+                       "output": "nvidia-smi: command not found", "success": False}, groups)
+
+    def test_default_targets_are_active_sessions(self):
+        """未指定服务器时只发送到已有会话的服务器"""
+        with patch.object(connect, "list_active_servers", return_value=["gpu3"]), \
+             patch.object(connect, "execute_server_command", side_effect=fake_execute) as execute:
+            results = broadcast_command("nvidia-smi")
+        self.assertEqual(list(results), ["gpu3"])
+        self.assertEqual(execute.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
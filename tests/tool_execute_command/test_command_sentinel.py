@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+命令完成检测测试
+测试命令开始/结束标记包裹、退出码解析、输出流上的结束标记等待，
+以及前台程序不是shell时原样发送命令
+"""
+
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+# 添加tests/utils目录到Python路径（共用的服务器测试夹具）
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+import connect
+import pane_stream
+from connect import ConnectionManager
+from pane_stream import CommandSentinel, PaneStream, get_pane_stream, send_raw_command
+from server_fixtures import use_temp_config
+
+
+class TestCommandSentinel(unittest.TestCase):
+    """命令标记测试类"""
+
+    def test_wrap_contains_exit_code_marker(self):
+        """包裹后的命令在末尾输出带$?的结束标记，结束标记另起一行"""
+        sentinel = CommandSentinel("abc123")
+        wrapped = sentinel.wrap("ls -la;")
+        self.assertEqual(
+            wrapped,
+            'echo "__RT_BE""GIN_abc123"; { ls -la;\n\n}; echo "__RT_E""ND_abc123:$?"'
+        )
+
+    def run_wrapped(self, command):
+        sentinel = CommandSentinel("abc123")
+        # conftest替换了subprocess.run，这里直接用Popen
+        proc = subprocess.Popen(['bash', '-c', sentinel.wrap(command)],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        stdout, _ = proc.communicate(timeout=10)
+        output, missing_begin = sentinel.extract_output(stdout)
+        self.assertFalse(missing_begin)
+        return sentinel.find_exit_code(stdout.decode()), output
+
+    def test_wrap_survives_trailing_syntax(self):
+        """命令末尾的注释、续行符、heredoc和后台符号不影响结束标记"""
+        self.assertEqual(self.run_wrapped("echo tmp | head -1  # list tmp"), (0, b"tmp\n"))
+        self.assertEqual(self.run_wrapped("echo a \\"), (0, b"a\n"))
+        self.assertEqual(self.run_wrapped("cat <<EOF\nhere\nEOF"), (0, b"here\n"))
+        self.assertEqual(self.run_wrapped("true && false"), (1, b""))
+        self.assertEqual(self.run_wrapped("sleep 0 &")[0], 0)
+
+    def test_typed_line_does_not_match(self):
+        """窗格中回显的输入行不能被误判为命令完成"""
+        sentinel = CommandSentinel("abc123")
+        typed = f"bash$ {sentinel.wrap('make')}\n"
+        self.assertIsNone(sentinel.find_exit_code(typed))
+        self.assertEqual(sentinel.find_exit_code(typed + "__RT_END_abc123:2\n"), 2)
+
+
+class TestPaneStreamWait(unittest.TestCase):
+    """输出流等待测试类"""
+
+    def make_stream(self):
+        stream = PaneStream("test_session", stream_dir="/tmp")
+        stream._active = True
+        return stream
+
+    def test_wait_for_marker_split_across_chunks(self):
+        """结束标记被拆成多个数据块时也能匹配"""
+        stream = self.make_stream()
+        sentinel = CommandSentinel("abc123")
+        start = stream.position
+
+        def feed():
+            time.sleep(0.05)
+            stream._append(b"output line\r\n__RT_EN")
+            stream._append(b"D_abc123:0\r\n")
+
+        threading.Thread(target=feed).start()
+        found = stream.wait_for(sentinel.end_pattern, start, timeout=2)
+        self.assertIsNotNone(found)
+        self.assertEqual(found[2], (b"0",))
+
+    def test_wait_ignores_output_before_start(self):
+        """发送命令前已有的输出不参与匹配"""
+        stream = self.make_stream()
+        sentinel = CommandSentinel("abc123")
+        stream._append(b"__RT_END_abc123:5\r\n")
+        self.assertIsNone(stream.wait_for(sentinel.end_pattern, stream.position, timeout=0.1))
+
+
+class TestRawCommand(unittest.TestCase):
+    """原样发送测试类"""
+
+    def typed_bytes(self, send, command):
+        """发送命令并把send-keys的参数还原成窗格收到的输入"""
+        with patch.object(pane_stream, "tmux_run") as run:
+            send("repl_session", command)
+        keys = run.call_args[0][0][4:]
+        return "".join("\n" if key == "Enter" else key for key in keys).encode()
+
+    def test_raw_input_reaches_non_shell_reader(self):
+        """前台是Python REPL之类的非shell程序时，原样发送的输入被完整读到，不含标记"""
+        reader = "import sys\nfor line in sys.stdin:\n    print(repr(line))"
+        # conftest替换了subprocess.run，这里直接用Popen
+        proc = subprocess.Popen([sys.executable, '-c', reader], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        stdout, _ = proc.communicate(self.typed_bytes(send_raw_command, "print(1 + 1)\ny"), timeout=10)
+        self.assertEqual(stdout.decode().splitlines(), ["'print(1 + 1)\\n'", "'y\\n'"])
+
+        wrapped = self.typed_bytes(lambda session, command: pane_stream._send_lines(
+            session, CommandSentinel("abc123").wrap(command)), "print(1 + 1)")
+        self.assertIn(b"__RT_BE", wrapped)
+
+    def test_execute_command_raw_skips_markers(self):
+        """raw=True时不包裹命令，按输出稳定性判断完成"""
+        config_path, _ = use_temp_config(self, modules=(connect,))
+        manager = ConnectionManager(config_path)
+        with patch.object(manager, "_check_existing_connection", return_value=True), \
+                patch.object(connect, "tmux_run"), \
+                patch.object(connect, "send_raw_command") as raw, \
+                patch.object(connect, "send_wrapped_command") as wrapped, \
+                patch.object(manager, "_wait_for_command_completion", return_value=(True, ">>> 2")) as wait:
+            result = manager.execute_command("gpu_a", "1 + 1", raw=True)
+        self.assertTrue(result.success)
+        self.assertEqual(result.details["output"], ">>> 2")
+        raw.assert_called_once_with("gpu_a_session", "1 + 1")
+        wrapped.assert_not_called()
+        wait.assert_called_once()
+
+
+class TestGetPaneStream(unittest.TestCase):
+    """输出流建立测试类"""
+
+    def test_slow_start_does_not_block_other_sessions(self):
+        """一个会话建立输出流较慢时，其它会话不用等待"""
+        release = threading.Event()
+
+        def start(stream):
+            if stream.session_name == "slow_session":
+                release.wait(2)
+            return True
+
+        with patch.object(PaneStream, "start", autospec=True, side_effect=start):
+            slow = threading.Thread(target=get_pane_stream, args=("slow_session",))
+            slow.start()
+            time.sleep(0.05)
+            try:
+                begin = time.time()
+                self.assertIsNotNone(get_pane_stream("fast_session"))
+                self.assertLess(time.time() - begin, 0.5)
+            finally:
+                release.set()
+                slow.join()
+        for name in ("slow_session", "fast_session"):
+            pane_stream._streams.pop(name, None)
+
+if __name__ == '__main__':
+    unittest.main()
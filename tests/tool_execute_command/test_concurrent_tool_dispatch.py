@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+MCP工具并发执行测试
+测试慢工具不会阻塞其它服务器上的工具调用，同一服务器上的调用保持串行
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from python import mcp_server
+
+
+def tool_request(request_id, server_name):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": "execute_command", "arguments": {"server": server_name, "command": "ls"}}
+    }
+
+
+class TestConcurrentToolDispatch(unittest.TestCase):
+    """工具并发调度测试类"""
+
+    def run_requests(self, fake_execute, *requests):
+        finished = []
+
+        async def run_one(request):
+            response = await mcp_server.handle_request(request)
+            finished.append(response["id"])
+
+        async def run_all():
+            await asyncio.gather(*(run_one(r) for r in requests))
+
+        with patch.object(mcp_server, "_execute_tool_call", side_effect=fake_execute):
+            asyncio.run(run_all())
+        return finished
+
+    def test_slow_server_does_not_block_other_server(self):
+        """慢服务器上的调用不阻塞另一台服务器"""
+        def fake_execute(request_id, params):
+            if params["arguments"]["server"] == "slow":
+                time.sleep(0.5)
+            return {"jsonrpc": "2.0", "id": request_id, "result": {}}
+
+        start = time.time()
+        finished = self.run_requests(fake_execute, tool_request(1, "slow"), tool_request(2, "fast"))
+        self.assertEqual(finished, [2, 1])
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_same_server_calls_are_serialized(self):
+        """同一服务器上的调用不会并发执行"""
+        active = []
+        overlap = threading.Event()
+
+        def fake_execute(request_id, params):
+            active.append(request_id)
+            if len(active) > 1:
+                overlap.set()
+            time.sleep(0.1)
+            active.remove(request_id)
+            return {"jsonrpc": "2.0", "id": request_id, "result": {}}
+
+        finished = self.run_requests(fake_execute, tool_request(1, "same"), tool_request(2, "same"))
+        self.assertEqual(sorted(finished), [1, 2])
+        self.assertFalse(overlap.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+输出环形缓冲区测试
+测试按绝对字节偏移读写、覆盖旧数据、命令输出截取和终端控制序列清理
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from pane_stream import CommandSentinel, OutputRingBuffer, clean_terminal_output
+
+
+class TestOutputRingBuffer(unittest.TestCase):
+    """环形缓冲区测试类"""
+
+    def test_read_by_offset(self):
+        """按绝对偏移读取任意区间"""
+        ring = OutputRingBuffer(capacity=16)
+        ring.write(b"hello ")
+        ring.write(b"world")
+        self.assertEqual(ring.end, 11)
+        self.assertEqual(ring.read(0), b"hello world")
+        self.assertEqual(ring.read(6, 9), b"wor")
+
+    def test_wraparound_keeps_latest_bytes(self):
+        """超出容量后覆盖最旧数据，偏移保持单调递增"""
+        ring = OutputRingBuffer(capacity=8)
+        ring.write(b"0123456")
+        ring.write(b"789ab")
+        self.assertEqual(ring.start, 4)
+        self.assertEqual(ring.end, 12)
+        self.assertEqual(ring.read(0), b"456789ab")
+        self.assertEqual(ring.read(6, 10), b"6789")
+
+    def test_chunk_larger_than_capacity(self):
+        """单次写入超过容量时只保留末尾部分"""
+        ring = OutputRingBuffer(capacity=4)
+        ring.write(b"ab")
+        ring.write(b"cdefghij")
+        self.assertEqual(ring.end, 10)
+        self.assertEqual(ring.read(0), b"ghij")
+
+
+class TestCommandOutputExtraction(unittest.TestCase):
+    """命令输出截取测试类"""
+
+    def test_extract_between_markers(self):
+        """只返回开始标记行之后、结束标记之前的输出"""
+        sentinel = CommandSentinel("abc123")
+        raw = (b'$ echo "__RT_BE""GIN_abc123"; ls; echo "__RT_E""ND_abc123:$?"\r\n'
+               b'__RT_BEGIN_abc123\r\n'
+               b'\x1b[01;34mdir\x1b[0m  file.txt\r\n'
+               b'__RT_END_abc123:0\r\n$ ')
+        output, missing_begin = sentinel.extract_output(raw)
+        self.assertFalse(missing_begin)
+        self.assertEqual(clean_terminal_output(output), "dir  file.txt\n")
+
+    def test_missing_begin_marker(self):
+        """开始标记已被覆盖时返回全部可用数据并标记缺失"""
+        sentinel = CommandSentinel("abc123")
+        output, missing_begin = sentinel.extract_output(b"tail of output\r\n__RT_END_abc123:0\r\n")
+        self.assertTrue(missing_begin)
+        self.assertEqual(output, b"tail of output\r\n")
+
+    def test_carriage_return_overwrite(self):
+        """进度条的\\r覆盖只保留最后结果"""
+        self.assertEqual(clean_terminal_output(b"10%\r50%\r100%\r\ndone"), "100%\ndone")
+
+
+if __name__ == '__main__':
+    unittest.main()
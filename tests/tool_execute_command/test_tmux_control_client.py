@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+TmuxClient 控制模式测试
+测试 %begin/%end/%error/%output 解析、命令行引号处理以及回退到subprocess的行为
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from tmux_client import (
+    ControlModeParser, TmuxClient, build_command_line, decode_output, quote_argument
+)
+
+
+class TestControlModeParser(unittest.TestCase):
+    """控制模式输出解析测试类"""
+
+    def feed(self, parser, lines):
+        events = []
+        for line in lines:
+            event = parser.feed_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def test_initial_block_is_ignored(self):
+        """启动时flags为0的初始应答块不应被当作命令应答"""
+        parser = ControlModeParser()
+        events = self.feed(parser, [
+            b'%begin 1700000000 10 0',
+            b'%end 1700000000 10 0',
+            b'%session-changed $1 _remote_terminal_ctl',
+        ])
+        self.assertEqual(events, [('notify', '%session-changed $1 _remote_terminal_ctl')])
+
+    def test_reply_success_and_error(self):
+        """解析本客户端命令的成功和失败应答"""
+        parser = ControlModeParser()
+        events = self.feed(parser, [
+            b'%begin 1700000000 11 1',
+            b'line one',
+            b'%end in output',
+            b'%end 1700000000 11 1',
+            b'%begin 1700000000 12 1',
+            b"can't find session: nope",
+            b'%error 1700000000 12 1',
+        ])
+        self.assertEqual(events[0], ('reply', 11, True, ['line one', '%end in output']))
+        self.assertEqual(events[1], ('reply', 12, False, ["can't find session: nope"]))
+
+    def test_output_notification_decoded(self):
+        """%output 通知中的八进制转义应被解码"""
+        parser = ControlModeParser()
+        events = self.feed(parser, [b'%output %3 hello\\015\\012a\\134b'])
+        self.assertEqual(events, [('output', '%3', b'hello\r\na\\b')])
+
+    def test_exit(self):
+        """%exit 通知"""
+        parser = ControlModeParser()
+        self.assertEqual(parser.feed_line(b'%exit'), ('exit', ''))
+        self.assertEqual(decode_output(b'plain'), b'plain')
+
+
+class TestCommandQuoting(unittest.TestCase):
+    """控制模式命令行引号测试类"""
+
+    def test_quote_plain_and_single_quote(self):
+        """普通参数用单引号，含单引号的参数转为双引号并转义$"""
+        self.assertEqual(quote_argument('ls -la'), "'ls -la'")
+        self.assertEqual(quote_argument('echo "it\'s $HOME"'), '"echo \\"it\'s \\$HOME\\""')
+
+    def test_newline_not_representable(self):
+        """含换行的参数无法放进单行命令"""
+        self.assertIsNone(quote_argument('a\nb'))
+        self.assertIsNone(build_command_line(['send-keys', '-t', 's', 'a\nb']))
+        self.assertEqual(build_command_line(['has-session', '-t', 's']), "'has-session' '-t' 's'")
+
+
+class TestFallback(unittest.TestCase):
+    """控制模式未启动时回退到subprocess.run"""
+
+    def test_run_falls_back_without_control_mode(self):
+        """未调用start()时所有命令都走subprocess.run"""
+        client = TmuxClient()
+        result = client.run(['tmux', 'has-session', '-t', 'whatever'], capture_output=True)
+        self.assertIsNotNone(result)
+        self.assertFalse(client.is_control_mode())
+        self.assertEqual(client.stats['fallback'], 1)
+        self.assertEqual(client.stats['control'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
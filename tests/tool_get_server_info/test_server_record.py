@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+ServerRecord 服务器记录测试
+测试派生字段预计算、script_based配置并入specs、只读约束以及按配置版本共享记录
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from server_record import ServerRecord, get_server_records
+
+RELAY_SERVER = {
+    "host": "target.example.com",
+    "username": "dev",
+    "type": "script_based",
+    "session": {"name": "gpu_dev"},
+    "connection": {
+        "tool": "relay-cli",
+        "jump_host": {"host": "jump.example.com", "username": "jumper"},
+        "target": {"host": "10.1.1.1"},
+    },
+    "docker": {"container_name": "dev_env", "shell": "bash"},
+}
+
+
+class TestServerRecord(unittest.TestCase):
+    """服务器记录测试类"""
+
+    def test_derived_fields(self):
+        """会话名、连接工具、目标主机、容器和跳板链在构建时算好"""
+        record = ServerRecord("gpu", RELAY_SERVER)
+        self.assertEqual(record.session_name, "gpu_dev")
+        self.assertEqual(record.connection_tool, "relay-cli")
+        self.assertEqual(record.target_host, "10.1.1.1")
+        self.assertEqual(record.docker_container, "dev_env")
+        self.assertEqual(record.docker_shell, "bash")
+        self.assertEqual([hop["host"] for hop in record.jump_chain], ["jump.example.com"])
+        self.assertEqual(record.specs["connection"]["tool"], "relay-cli")
+
+    def test_defaults(self):
+        """缺省配置使用与原实现一致的默认值"""
+        record = ServerRecord("plain", {"host": "1.2.3.4", "docker_config": {"container_name": "c1"}})
+        self.assertEqual(record.session_name, "plain_session")
+        self.assertEqual(record.connection_tool, "ssh")
+        self.assertEqual(record.type, "direct_ssh")
+        self.assertEqual(record.port, 22)
+        self.assertEqual(record.docker_container, "c1")
+        self.assertEqual(record.jump_chain, ())
+
+    def test_read_only(self):
+        """记录不能修改，也没有实例字典"""
+        record = ServerRecord("plain", {"host": "1.2.3.4"})
+        with self.assertRaises(AttributeError):
+            record.session = {}
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_records_shared_per_config_version(self):
+        """配置未变化时返回同一份记录，变化后重新构建"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = os.path.join(temp_dir, "config.yaml")
+            with open(config_path, "w", encoding="utf-8") as f:
+                yaml.safe_dump({"servers": {"gpu": RELAY_SERVER}}, f)
+            os.utime(config_path, (1_000_000, 1_000_000))
+
+            version, records = get_server_records(config_path)
+            self.assertIs(get_server_records(config_path)[1], records)
+            self.assertIs(get_server_records(config_path)[1]["gpu"], records["gpu"])
+
+            with open(config_path, "w", encoding="utf-8") as f:
+                yaml.safe_dump({"servers": {"other": {"host": "5.6.7.8"}}}, f)
+            os.utime(config_path, (2_000_000, 2_000_000))
+            new_version, new_records = get_server_records(config_path)
+            self.assertGreater(new_version, version)
+            self.assertEqual(list(new_records), ["other"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+全部服务器状态查询测试
+测试一次list-sessions取回所有会话（不含控制连接会话）、存在会话的服务器
+都并发探测（持久化的信任不能代替探测），以及增强版管理器的并发状态查询
+"""
+
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+# 添加tests/utils目录到Python路径（共用的服务器测试夹具）
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+import connect
+import enhanced_ssh_manager
+import state_store
+import tmux_client
+from connect import ConnectionManager, ConnectionStatus
+from enhanced_ssh_manager import EnhancedSSHManager
+from heartbeat import HeartbeatResult
+from server_fixtures import use_temp_config
+from tmux_client import CONTROL_SESSION_NAME, list_sessions
+
+SERVER_COUNT = 8
+
+PROBE_DELAY = 0.3
+
+CONFIG = "servers:\n" + "".join(f"""  gpu_{i}:
+    host: 10.0.0.{i}
+    username: dev
+    port: 22
+    type: script_based
+    specs:
+      connection:
+        tool: ssh
+""" for i in range(SERVER_COUNT))
+
+
+class TestListSessions(unittest.TestCase):
+    """会话列表测试类"""
+
+    def test_parses_and_skips_control_session(self):
+        """解析会话名、创建和attach时间，忽略控制连接的隐藏会话"""
+        stdout = f"gpu_0_session\t1700000000\t1700000100\n{CONTROL_SESSION_NAME}\t1700000000\t\n"
+        with patch.object(tmux_client, "tmux_run",
+                          return_value=subprocess.CompletedProcess([], 0, stdout, "")) as run:
+            sessions = list_sessions()
+        run.assert_called_once()
+        self.assertEqual(sessions, {"gpu_0_session": {"created": "1700000000", "last_attached": "1700000100"}})
+
+        with patch.object(tmux_client, "tmux_run",
+                          return_value=subprocess.CompletedProcess([], 1, "", "no server running")):
+            self.assertEqual(list_sessions(), {})
+
+    def test_failure_is_not_empty(self):
+        """list-sessions超时或出错时返回None，不能与tmux服务未运行混淆"""
+        missing_socket = "error connecting to /tmp/tmux-0/default (No such file or directory)"
+        with patch.object(tmux_client, "tmux_run",
+                          return_value=subprocess.CompletedProcess([], 1, "", missing_socket)):
+            self.assertEqual(list_sessions(), {})
+        with patch.object(tmux_client, "tmux_run",
+                          return_value=subprocess.CompletedProcess([], 1, "", "server exited unexpectedly")):
+            self.assertIsNone(list_sessions())
+        with patch.object(tmux_client, "tmux_run", side_effect=subprocess.TimeoutExpired("tmux", 5)):
+            self.assertIsNone(list_sessions())
+
+
+class FleetTestCase(unittest.TestCase):
+    """准备多台服务器的配置、状态存储和会话表"""
+
+    def setUp(self):
+        self.config_path, self.store = use_temp_config(self, CONFIG, modules=(connect, enhanced_ssh_manager))
+        self.sessions = {f"gpu_{i}_session": {"created": "1700000000", "last_attached": ""}
+                         for i in range(SERVER_COUNT - 1)}
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        patcher = patch.object(state_store, "live_session_id", return_value="1700000000")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slow(self, result):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(PROBE_DELAY)
+        with self.lock:
+            self.running -= 1
+        return result
+
+
+class TestConnectionManagerFleet(FleetTestCase):
+    """ConnectionManager 全部服务器状态测试类"""
+
+    def test_list_servers_concurrent(self):
+        """一次list-sessions，存在会话的服务器并发探测，总耗时不随服务器数累加"""
+        self.store.record_verified("gpu_0", "gpu_0_session", host="10.0.0.0")
+        manager = ConnectionManager(self.config_path)
+        with patch.object(connect, "list_sessions", return_value=self.sessions) as sessions, \
+                patch.object(manager, "_check_existing_connection") as has_session, \
+                patch.object(manager, "_verify_connection_health",
+                             side_effect=lambda *args: self.slow(True)) as verify:
+            start = time.time()
+            servers = manager.list_servers()
+            elapsed = time.time() - start
+        sessions.assert_called_once()
+        has_session.assert_not_called()
+        self.assertEqual(verify.call_count, SERVER_COUNT - 1)
+        self.assertGreater(self.max_running, 1)
+        self.assertLess(elapsed, 1.0)
+
+        self.assertEqual([server["name"] for server in servers], [f"gpu_{i}" for i in range(SERVER_COUNT)])
+        statuses = {server["name"]: server["status"] for server in servers}
+        self.assertEqual(statuses["gpu_0"], ConnectionStatus.READY.value)
+        self.assertEqual(statuses["gpu_3"], ConnectionStatus.READY.value)
+        self.assertEqual(statuses[f"gpu_{SERVER_COUNT - 1}"], ConnectionStatus.DISCONNECTED.value)
+
+    def test_list_servers_reuses_session_created(self):
+        """记录验证结果时会话标识取自会话列表，不再逐台查询tmux"""
+        self.store.record_verified("gpu_0", "gpu_0_session", host="10.0.0.0")
+        manager = ConnectionManager(self.config_path)
+        with patch.object(connect, "list_sessions", return_value=self.sessions), \
+                patch.object(state_store, "live_session_id") as live, \
+                patch.object(manager, "_verify_connection_health", return_value=True):
+            servers = manager.list_servers()
+        live.assert_not_called()
+        self.assertEqual(servers[0]["status"], ConnectionStatus.READY.value)
+
+    def test_list_sessions_failure_keeps_state(self):
+        """会话列表取不到时逐台检查会话，不把所有服务器当作未连接，也不清除持久化状态"""
+        self.store.record_verified("gpu_0", "gpu_0_session", host="10.0.0.0")
+        self.store.record_verified("gpu_1", "gpu_1_session", host="10.0.0.1")
+        manager = ConnectionManager(self.config_path)
+        with patch.object(connect, "list_sessions", return_value=None), \
+                patch.object(manager, "_check_existing_connection", return_value=True) as has_session, \
+                patch.object(manager, "_verify_connection_health", return_value=True):
+            servers = manager.list_servers()
+        self.assertTrue(has_session.called)
+        self.assertNotIn(ConnectionStatus.DISCONNECTED.value, {server["status"] for server in servers})
+        self.assertIsNotNone(self.store.get("gpu_1"))
+
+
+class TestEnhancedManagerFleet(FleetTestCase):
+    """增强版管理器全部服务器状态测试类"""
+
+    def test_all_connection_status_concurrent(self):
+        """共用一次会话列表，没有缓存结果的服务器并发检查健康状态"""
+        manager = EnhancedSSHManager(self.config_path)
+        for i in range(SERVER_COUNT):
+            with patch.object(manager.health_monitor.scheduler, "submit"):
+                manager.start_connection_health_monitor(f"gpu_{i}")
+        manager.health_monitor.record("gpu_0", {"status": "healthy", "connection_quality": 0.9})
+        beat = HeartbeatResult(True, latency=0.002, command="ssh")
+        with patch.object(enhanced_ssh_manager, "list_sessions", return_value=self.sessions) as sessions, \
+                patch.object(enhanced_ssh_manager, "heartbeat", side_effect=lambda *args, **kwargs: self.slow(beat)):
+            start = time.time()
+            statuses = manager.get_all_connection_status()
+            elapsed = time.time() - start
+        sessions.assert_called_once()
+        self.assertLess(elapsed, 1.0)
+        self.assertGreater(self.max_running, 1)
+        self.assertEqual(list(statuses), [f"gpu_{i}" for i in range(SERVER_COUNT)])
+        self.assertEqual(statuses["gpu_0"]["health"]["connection_quality"], 0.9)
+        self.assertEqual(statuses["gpu_1"]["health"]["health_status"], "healthy")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+后台健康监控测试
+测试定期检查所有已注册服务器且并发受限、停止监控（包括会话已不存在时）、结果过期，
+以及状态查询直接读取后台检查结果而不再探测会话
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+# 添加tests/utils目录到Python路径（共用的服务器测试夹具）
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+import enhanced_ssh_manager
+from enhanced_ssh_manager import EnhancedSSHManager
+from health_monitor import HealthMonitor
+from heartbeat import HeartbeatResult
+from server_fixtures import use_temp_config
+
+
+class TestHealthMonitor(unittest.TestCase):
+    """健康监控测试类"""
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    def check(self, server_name):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.calls.append(server_name)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        self.monitor.record(server_name, {"status": "healthy"})
+
+    def wait_for(self, condition, timeout=3.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_checks_all_servers_with_bounded_concurrency(self):
+        """所有服务器都被定期检查，同时进行的检查不超过上限"""
+        self.monitor = HealthMonitor(self.check, interval=0.1, max_workers=2)
+        servers = [f"server_{i}" for i in range(8)]
+        for server in servers:
+            self.assertTrue(self.monitor.watch(server))
+        self.assertFalse(self.monitor.watch("server_0"))
+
+        self.assertTrue(self.wait_for(lambda: all(self.calls.count(s) >= 2 for s in servers)))
+        self.assertLessEqual(self.max_running, 2)
+        self.assertEqual(self.monitor.latest("server_3")["status"], "healthy")
+        self.assertEqual(self.monitor.stats()["watched_servers"], 8)
+
+    def test_unwatch_and_expiry(self):
+        """停止监控后不再检查并丢弃结果，过旧的结果视为没有"""
+        self.monitor = HealthMonitor(self.check, interval=0.05, max_workers=1)
+        self.monitor.watch("server_a")
+        self.assertTrue(self.wait_for(lambda: "server_a" in self.calls))
+        self.monitor.unwatch("server_a")
+        self.assertIsNone(self.monitor.latest("server_a"))
+        time.sleep(0.1)
+        count = len(self.calls)
+        time.sleep(0.15)
+        self.assertEqual(len(self.calls), count)
+
+        self.monitor.record("server_b", {"status": "healthy"})
+        self.assertIsNotNone(self.monitor.latest("server_b"))
+        self.assertIsNone(self.monitor.latest("server_b", max_age=-1))
+
+    def test_failed_check_recorded(self):
+        """检查抛出异常时记录为error，监控继续"""
+        def failing(server_name):
+            raise RuntimeError("boom")
+        self.monitor = HealthMonitor(failing, interval=0.05, max_workers=1)
+        self.monitor.watch("server_a")
+        self.assertTrue(self.wait_for(lambda: self.monitor.latest("server_a") is not None))
+        self.assertEqual(self.monitor.latest("server_a")["status"], "error")
+
+    def test_stops_when_session_gone(self):
+        """会话不存在时停止检查，保留最后一次结果"""
+        def gone(server_name):
+            self.calls.append(server_name)
+            result = {"status": "unhealthy", "session_gone": True}
+            self.monitor.record(server_name, result)
+            return result
+        self.monitor = HealthMonitor(gone, interval=0.05, max_workers=1)
+        self.monitor.watch("server_a")
+        self.assertTrue(self.wait_for(lambda: not self.monitor.is_watching("server_a")))
+        time.sleep(0.15)
+        self.assertEqual(self.calls, ["server_a"])
+        self.assertTrue(self.monitor.latest("server_a", max_age=10)["session_gone"])
+        self.assertTrue(self.monitor.watch("server_a"))
+
+
+class TestStatusReadsCachedHealth(unittest.TestCase):
+    """状态查询读取缓存健康结果测试类"""
+
+    def setUp(self):
+        self.config_path, _ = use_temp_config(self, modules=(enhanced_ssh_manager,))
+
+    def test_status_uses_monitor_result(self):
+        """后台已有结果时get_connection_status和质量报告不探测会话"""
+        manager = EnhancedSSHManager(self.config_path)
+        with patch.object(manager.health_monitor.scheduler, "submit"):
+            manager.start_connection_health_monitor("gpu_a")
+        manager.health_monitor.record("gpu_a", {"status": "healthy", "connection_quality": 0.95,
+                                                "response_time": 0.03})
+        with patch.object(enhanced_ssh_manager, "heartbeat") as beat:
+            start = time.time()
+            status = manager.get_connection_status("gpu_a")
+            report = manager.get_connection_quality_report("gpu_a")
+            elapsed = time.time() - start
+        beat.assert_not_called()
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(status["health"]["health_status"], "healthy")
+        self.assertEqual(status["health"]["connection_quality"], 0.95)
+        self.assertEqual(report["current_status"], "healthy")
+
+    def test_direct_check_published(self):
+        """直接执行的检查结果也写入结果表并更新指标"""
+        manager = EnhancedSSHManager(self.config_path)
+        with patch.object(manager.health_monitor.scheduler, "submit"):
+            manager.start_connection_health_monitor("gpu_a")
+        with patch.object(enhanced_ssh_manager, "heartbeat",
+                          return_value=HeartbeatResult(True, latency=0.002, command="ssh")):
+            manager.check_connection_health("gpu_a")
+        self.assertEqual(manager.health_monitor.latest("gpu_a")["status"], "healthy")
+        self.assertEqual(manager.connection_metrics["gpu_a"]["total_checks"], 1)
+
+    def test_metrics_persisted_outside_lock(self):
+        """写状态存储时不持有指标锁，文件I/O不会阻塞其它服务器的指标更新"""
+        manager = EnhancedSSHManager(self.config_path)
+        with patch.object(manager.health_monitor.scheduler, "submit"):
+            manager.start_connection_health_monitor("gpu_a")
+        held = []
+        with patch.object(enhanced_ssh_manager, "heartbeat",
+                          return_value=HeartbeatResult(True, latency=0.002, command="ssh")), \
+                patch.object(manager.state_store, "record_metrics",
+                             side_effect=lambda *args, **kwargs: held.append(manager._metrics_lock.locked())) as record:
+            self.assertEqual(manager.check_connection_health("gpu_a")["status"], "healthy")
+        self.assertEqual(held, [False])
+        self.assertEqual(record.call_args[0][2]["total_checks"], 1)
+        self.assertTrue(record.call_args[1]["healthy"])
+
+    def test_missing_session_stops_monitoring(self):
+        """会话在工具之外被关闭后，后台监控记录一次失败即停止，不再反复写状态存储"""
+        manager = EnhancedSSHManager(self.config_path)
+        with patch.object(manager.health_monitor.scheduler, "submit"):
+            manager.start_connection_health_monitor("gpu_a")
+        with patch.object(enhanced_ssh_manager, "heartbeat",
+                          return_value=HeartbeatResult(False, message="会话不存在", gone=True)), \
+                patch.object(manager.state_store, "record_metrics") as record:
+            manager.health_monitor._run("gpu_a")
+        record.assert_called_once()
+        self.assertFalse(manager.health_monitor.is_watching("gpu_a"))
+        self.assertEqual(manager.get_cached_health("gpu_a")["status"], "disconnected")
+
+    def test_status_query_does_not_start_monitoring(self):
+        """查询从未连接的服务器不开始后台监控，不发送心跳，也不写状态存储"""
+        manager = EnhancedSSHManager(self.config_path)
+        with patch.object(enhanced_ssh_manager, "heartbeat") as beat, \
+                patch.object(manager.state_store, "record_metrics") as record:
+            status = manager.get_connection_status("gpu_a")
+            health = manager.get_cached_health("gpu_a")
+            checked = manager.check_connection_health("gpu_a")
+        beat.assert_not_called()
+        record.assert_not_called()
+        self.assertEqual(status["status"], "disconnected")
+        self.assertEqual(health["status"], "disconnected")
+        self.assertEqual(checked["status"], "disconnected")
+        self.assertFalse(manager.health_monitor.is_watching("gpu_a"))
+        self.assertNotIn("gpu_a", manager.connection_metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+带外心跳测试
+测试窗格状态解析、按前台进程判断连接是否断开、通过ControlMaster的往返，
+以及心跳不向用户窗格发送任何按键
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import heartbeat
+import ssh_pool
+from heartbeat import heartbeat as run_heartbeat, parse_pane_status
+from server_record import ServerRecord
+from ssh_pool import SSHControlPool, control_path
+
+
+class TestHeartbeat(unittest.TestCase):
+    """带外心跳测试类"""
+
+    def setUp(self):
+        self.tmux_calls = []
+        self.pane_line = "0\tssh\n"
+        tmux_patch = patch.object(heartbeat, "tmux_run", side_effect=self.fake_tmux)
+        tmux_patch.start()
+        self.addCleanup(tmux_patch.stop)
+        self.pool = MagicMock()
+        self.pool.has_master.return_value = False
+        pool_patch = patch.object(heartbeat, "get_ssh_pool", return_value=self.pool)
+        pool_patch.start()
+        self.addCleanup(pool_patch.stop)
+        self.server = ServerRecord("gpu_a", {"host": "10.0.0.8", "username": "dev"})
+
+    def fake_tmux(self, cmd, **kwargs):
+        self.tmux_calls.append(cmd)
+        if self.pane_line is None:
+            return subprocess.CompletedProcess(cmd, 1, "", "can't find session")
+        return subprocess.CompletedProcess(cmd, 0, self.pane_line, "")
+
+    def test_parse_pane_status(self):
+        """解析窗格是否退出和前台进程名"""
+        self.assertEqual(parse_pane_status("0\tssh\n"), (False, "ssh"))
+        self.assertEqual(parse_pane_status("1\trelay-cli"), (True, "relay-cli"))
+        self.assertEqual(parse_pane_status(""), (False, ""))
+
+    def test_connection_tool_in_foreground(self):
+        """前台是连接工具时存活，只查询一次tmux且不发送按键"""
+        result = run_heartbeat("gpu_a_session", self.server)
+        self.assertTrue(result.alive)
+        self.assertEqual((result.via, result.command), ("pane", "ssh"))
+        self.assertLess(result.latency, 0.1)
+        self.assertEqual(len(self.tmux_calls), 1)
+        self.assertEqual(self.tmux_calls[0][1], "display-message")
+        self.assertFalse(any("send-keys" in cmd for cmd in self.tmux_calls))
+
+    def test_disconnected_states(self):
+        """回到本地shell、窗格已退出或会话不存在时判定为断开，后两种不会再恢复"""
+        for line, message, gone in (("0\tzsh\n", "本地shell", False), ("0\t-bash\n", "本地shell", False),
+                                    ("1\tssh\n", "已退出", True), (None, "会话不存在", True)):
+            self.pane_line = line
+            result = run_heartbeat("gpu_a_session", self.server)
+            self.assertFalse(result.alive, line)
+            self.assertIn(message, result.message)
+            self.assertEqual(result.gone, gone, line)
+
+    def test_round_trip_through_master(self):
+        """有master时通过master往返测量延迟，往返失败判定为断开"""
+        self.pool.has_master.return_value = True
+        self.pool.ping.return_value = 0.004
+        result = run_heartbeat("gpu_a_session", self.server, timeout=2)
+        self.assertTrue(result.alive)
+        self.assertEqual((result.via, result.latency), ("master", 0.004))
+        self.pool.ping.assert_called_once_with(self.server, 2)
+
+        self.pool.ping.return_value = None
+        self.assertFalse(run_heartbeat("gpu_a_session", self.server).alive)
+
+        # 没有master时不建立新连接
+        self.pool.reset_mock()
+        self.pool.has_master.return_value = False
+        self.assertTrue(run_heartbeat("gpu_a_session", self.server).alive)
+        self.pool.ping.assert_not_called()
+        self.pool.acquire.assert_not_called()
+
+
+class TestMasterPing(unittest.TestCase):
+    """ControlMaster往返测试类"""
+
+    def setUp(self):
+        self.server = ServerRecord("heartbeat_ping_test", {"host": "10.0.0.8", "username": "dev", "port": 2222})
+        self.path = control_path(self.server.name)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.unlink(self.path))
+
+    def test_ping_uses_existing_master_only(self):
+        """没有控制套接字时不执行ssh；有时通过它在远端执行true"""
+        pool = SSHControlPool()
+        with patch.object(ssh_pool.subprocess, "run") as run:
+            self.assertIsNone(pool.ping(self.server))
+            run.assert_not_called()
+
+            Path(self.path).touch()
+            run.return_value = subprocess.CompletedProcess([], 0, b"", b"")
+            self.assertIsNotNone(pool.ping(self.server))
+            command = run.call_args[0][0]
+            self.assertIn(f"ControlPath={self.path}", command)
+            self.assertEqual(command[-2:], ["dev@10.0.0.8", "true"])
+
+            run.return_value = subprocess.CompletedProcess([], 255, b"", b"")
+            self.assertIsNone(pool.ping(self.server))
+
+
+if __name__ == '__main__':
+    unittest.main()
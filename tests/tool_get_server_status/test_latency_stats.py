@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+延迟统计测试
+测试环形缓冲的最近平均值、直方图分位数、序列化大小和旧版指标迁移，
+以及健康检查和命令执行按操作记录延迟
+"""
+
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+# 添加tests/utils目录到Python路径（共用的服务器测试夹具）
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+import enhanced_ssh_manager
+from enhanced_ssh_manager import EnhancedSSHManager
+from heartbeat import HeartbeatResult
+from latency_stats import (HEARTBEAT, LatencyStats, bucket_index, bucket_upper, metrics_snapshot,
+                           restore_metrics)
+from server_fixtures import use_temp_config
+from state_store import StateStore
+
+
+class TestLatencyStats(unittest.TestCase):
+    """延迟统计测试类"""
+
+    def test_ring_keeps_recent_samples(self):
+        """环形缓冲只保留最近的样本，平均值随之滚动"""
+        stats = LatencyStats(capacity=4)
+        self.assertEqual(stats.mean(default=1.0), 1.0)
+        for value in (1.0, 2.0, 3.0, 4.0, 5.0, 6.0):
+            stats.record(value)
+        self.assertEqual(stats.recent(), [3.0, 4.0, 5.0, 6.0])
+        self.assertAlmostEqual(stats.mean(), 4.5)
+        self.assertEqual(stats.count, 6)
+        self.assertEqual(stats.max, 6.0)
+
+    def test_percentiles_within_bucket_precision(self):
+        """分位数覆盖全部历史，误差在一个桶宽以内"""
+        stats = LatencyStats()
+        for i in range(1, 1001):
+            stats.record(i / 1000.0)
+        for q, expected in ((50, 0.5), (90, 0.9), (99, 0.99)):
+            value = stats.percentile(q)
+            self.assertGreaterEqual(value, expected)
+            self.assertLess(value, expected * 1.1)
+        self.assertEqual(stats.percentile(100), 1.0)
+        self.assertLessEqual(bucket_index(0.5), bucket_index(0.51))
+        self.assertGreater(bucket_upper(bucket_index(0.5)), 0.5)
+
+    def test_serialization_is_compact(self):
+        """长期历史序列化后只有几百字节，恢复后统计不变"""
+        stats = LatencyStats()
+        for i in range(100000):
+            stats.record(0.002 + (i % 50) * 0.0001)
+        data = stats.to_dict()
+        self.assertLess(len(json.dumps(data)), 2048)
+
+        restored = LatencyStats.from_dict(json.loads(json.dumps(data)))
+        self.assertEqual(restored.count, 100000)
+        self.assertEqual(restored.percentiles(), stats.percentiles())
+        self.assertEqual(restored.recent(), stats.recent())
+        self.assertAlmostEqual(restored.mean(), stats.mean())
+
+    def test_legacy_response_times_migrated(self):
+        """旧版持久化的response_times列表并入心跳统计"""
+        metrics = restore_metrics({"total_checks": 2, "response_times": [0.1, 0.3]})
+        self.assertNotIn("response_times", metrics)
+        self.assertAlmostEqual(metrics["latency"][HEARTBEAT].mean(), 0.2)
+        snapshot = metrics_snapshot(metrics)
+        json.dumps(snapshot)
+        self.assertEqual(restore_metrics(snapshot)["latency"][HEARTBEAT].count, 2)
+
+
+class TestManagerLatency(unittest.TestCase):
+    """管理器延迟记录测试类"""
+
+    def setUp(self):
+        self.config_path, self.store = use_temp_config(self, modules=(enhanced_ssh_manager,))
+        self.manager = EnhancedSSHManager(self.config_path)
+        with patch.object(self.manager.health_monitor.scheduler, "submit"):
+            self.manager.start_connection_health_monitor("gpu_a")
+
+    def test_heartbeat_latency_reported_and_persisted(self):
+        """心跳延迟进入统计，质量报告给出分位数，持久化的指标可JSON恢复"""
+        for latency in (0.01, 0.02, 0.03):
+            with patch.object(enhanced_ssh_manager, "heartbeat",
+                              return_value=HeartbeatResult(True, latency=latency, command="ssh")):
+                result = self.manager.check_connection_health("gpu_a")
+        self.assertAlmostEqual(result["avg_response_time"], 0.02)
+        self.assertIn("p99", result["response_percentiles"])
+
+        report = self.manager.get_connection_quality_report("gpu_a")
+        self.assertAlmostEqual(report["avg_response_time"], 0.02)
+        self.assertEqual(report["latency"][HEARTBEAT]["count"], 3)
+        self.assertEqual(report["recommendation"], "连接状态优秀，无需优化")
+
+        persisted = StateStore(self.store.state_dir).get("gpu_a")
+        self.assertEqual(restore_metrics(persisted.metrics)["latency"][HEARTBEAT].count, 3)
+
+    def test_command_latency_recorded(self):
+        """命令执行耗时按command操作记录"""
+        self.manager._record_latency("gpu_a", "command", 0.25)
+        self.manager._record_latency("unknown", "command", 0.25)
+        report = self.manager.get_connection_quality_report("gpu_a")
+        self.assertEqual(report["latency"]["command"]["count"], 1)
+        self.assertNotIn("unknown", self.manager.connection_metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+管理器实例缓存测试
+测试同一进程内复用管理器实例，以及配置文件变化后自动重新加载服务器配置
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from connect import get_connection_manager
+from enhanced_ssh_manager import get_enhanced_manager
+
+CONFIG_TEMPLATE = """servers:
+  {name}:
+    host: 192.168.1.10
+    username: tester
+    port: 22
+    type: script_based
+    specs:
+      connection:
+        tool: ssh
+"""
+
+
+class TestManagerCache(unittest.TestCase):
+    """管理器缓存测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.temp_dir.name, "config.yaml")
+        self.write_config("server_a", mtime=1_000_000)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_config(self, server_name, mtime):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write(CONFIG_TEMPLATE.format(name=server_name))
+        os.utime(self.config_path, (mtime, mtime))
+
+    def test_enhanced_manager_reused_and_reloaded(self):
+        """增强版管理器被复用，连接指标保留，配置变化后服务器列表更新"""
+        manager = get_enhanced_manager(self.config_path)
+        manager.connection_metrics["server_a"] = {"success_count": 3}
+        self.assertIs(get_enhanced_manager(self.config_path), manager)
+        self.assertIn("server_a", manager.servers)
+
+        self.write_config("server_b", mtime=2_000_000)
+        self.assertIs(get_enhanced_manager(self.config_path), manager)
+        self.assertIn("server_b", manager.servers)
+        self.assertNotIn("server_a", manager.servers)
+        self.assertEqual(manager.connection_metrics["server_a"], {"success_count": 3})
+
+    def test_connection_manager_reused_and_reloaded(self):
+        """连接管理器按模式分别缓存，配置变化后重新加载"""
+        manager = get_connection_manager(self.config_path)
+        simple_manager = get_connection_manager(self.config_path, simple_mode=True)
+        self.assertIsNot(manager, simple_manager)
+        self.assertIs(get_connection_manager(self.config_path), manager)
+        self.assertFalse(manager.reload_if_changed())
+
+        self.write_config("server_b", mtime=2_000_000)
+        self.assertIs(get_connection_manager(self.config_path), manager)
+        self.assertIn("server_b", manager.servers)
+        self.assertTrue(simple_manager.reload_if_changed())
+        self.assertIn("server_b", simple_manager.servers)
+
+
+if __name__ == '__main__':
+    unittest.main()
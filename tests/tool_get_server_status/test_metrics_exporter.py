@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+指标导出测试
+测试连接/命令/心跳直方图和同步计数的Prometheus文本格式、
+通过本地HTTP端点抓取，以及textfile collector文件的原子写入
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from latency_stats import LatencyStats
+from metrics_exporter import MetricsExporter, render_metrics
+
+
+def sample_sources():
+    heartbeat = LatencyStats()
+    for latency in (0.003, 0.004, 0.2):
+        heartbeat.record(latency)
+    establish = LatencyStats()
+    establish.record(1.5)
+    connection_metrics = {
+        "gpu_a": {
+            "latency": {"heartbeat": heartbeat, "connect.establish": establish},
+            "total_checks": 3, "failed_checks": 0, "success_rate": 1.0,
+            "connection_quality": 0.97, "auto_recovery_count": 0
+        }
+    }
+    sync_stats = {"gpu_a": {"ticks": 5, "pushes": 2, "failures": 1, "files": 12, "deleted": 1,
+                            "bytes": 40960, "tracked_files": 300}}
+    return connection_metrics, sync_stats
+
+
+class TestRenderMetrics(unittest.TestCase):
+    """指标渲染测试类"""
+
+    def setUp(self):
+        self.text = render_metrics(*sample_sources())
+        self.samples = {}
+        for line in self.text.splitlines():
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                self.samples[name] = float(value)
+
+    def test_histograms_are_cumulative(self):
+        """直方图桶累计计数，+Inf等于总数，_sum为总耗时"""
+        prefix = 'remote_terminal_heartbeat_seconds'
+        self.assertIn(f"# TYPE {prefix} histogram", self.text)
+        self.assertEqual(self.samples[f'{prefix}_bucket{{server="gpu_a",le="0.005"}}'], 2)
+        self.assertEqual(self.samples[f'{prefix}_bucket{{server="gpu_a",le="0.25"}}'], 3)
+        self.assertEqual(self.samples[f'{prefix}_bucket{{server="gpu_a",le="+Inf"}}'], 3)
+        self.assertAlmostEqual(self.samples[f'{prefix}_sum{{server="gpu_a"}}'], 0.207)
+        self.assertEqual(self.samples[
+            'remote_terminal_connect_stage_seconds_count{server="gpu_a",stage="establish"}'], 1)
+
+    def test_counters_and_gauges(self):
+        """心跳、质量、自动恢复和同步计数按服务器导出"""
+        self.assertEqual(self.samples['remote_terminal_heartbeat_checks_total{server="gpu_a"}'], 3)
+        self.assertEqual(self.samples['remote_terminal_connection_quality{server="gpu_a"}'], 0.97)
+        self.assertEqual(self.samples['remote_terminal_auto_recovery_attempts{server="gpu_a"}'], 0)
+        self.assertEqual(self.samples['remote_terminal_sync_bytes_total{server="gpu_a"}'], 40960)
+        self.assertEqual(self.samples['remote_terminal_sync_files_total{server="gpu_a"}'], 12)
+        # 没有数据的指标族不输出
+        self.assertNotIn("remote_terminal_command_seconds", self.text)
+
+    def test_empty(self):
+        self.assertEqual(render_metrics({}, {}), "")
+
+
+class TestMetricsExporter(unittest.TestCase):
+    """指标导出端点测试类"""
+
+    def setUp(self):
+        self.exporter = MetricsExporter(sources=sample_sources)
+        self.addCleanup(self.exporter.stop)
+
+    def test_http_scrape(self):
+        """本地抓取/metrics得到文本格式，其它路径返回404"""
+        port = self.exporter.start_http(0)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            self.assertIn("text/plain", response.headers["Content-Type"])
+        self.assertEqual(body, render_metrics(*sample_sources()))
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+
+    def test_textfile(self):
+        """textfile写入完整内容，不留下临时文件"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "remote_terminal.prom")
+            self.exporter.write_textfile(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertIn('remote_terminal_sync_ticks_total{server="gpu_a"} 5', f.read())
+            self.assertEqual(os.listdir(temp_dir), ["remote_terminal.prom"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+连接状态持久化测试
+测试状态日志的读写、合并、删除和压缩，信任条件（时效、会话是否被重建、健康状态），
+以及进程重启后连接和状态查询仍然探测会话，持久化的信任只让探测通过的智能连接
+跳过完整的连接流程
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+# 添加tests/utils目录到Python路径（共用的服务器测试夹具）
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+import connect
+import enhanced_ssh_manager
+import state_store
+from connect import ConnectionManager, ConnectionStatus
+from enhanced_ssh_manager import EnhancedSSHManager
+from server_fixtures import use_temp_config
+from state_store import StateStore
+
+
+class TestStateStore(unittest.TestCase):
+    """状态存储测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.state_dir = os.path.join(self.temp_dir.name, "state")
+        session_patch = patch.object(state_store, "live_session_id", return_value="1700000000")
+        self.live_session_id = session_patch.start()
+        self.addCleanup(session_patch.stop)
+
+    def test_state_survives_restart(self):
+        """新实例（重启后的进程）读到验证结果、指标和删除标记"""
+        store = StateStore(self.state_dir)
+        store.record_verified("gpu_a", "gpu_a_session", host="10.0.0.8", container="dev",
+                              metrics={"total_checks": 3})
+        store.record_verified("gpu_b", "gpu_b_session")
+        store.remove("gpu_b")
+
+        restarted = StateStore(self.state_dir)
+        state = restarted.get("gpu_a")
+        self.assertEqual((state.session_name, state.host, state.container), ("gpu_a_session", "10.0.0.8", "dev"))
+        self.assertEqual(state.session_created, "1700000000")
+        self.assertEqual(state.metrics, {"total_checks": 3})
+        self.assertIsNone(restarted.get("gpu_b"))
+
+    def test_other_process_appends_visible(self):
+        """其它进程追加的记录在下次读取时增量读入，写了一半的行被忽略"""
+        store = StateStore(self.state_dir)
+        other = StateStore(self.state_dir)
+        other.record_verified("gpu_a", "gpu_a_session")
+        with open(store.path, "a", encoding="utf-8") as f:
+            f.write('{"server_name": "gpu_c", "session_na')
+        self.assertIsNotNone(store.get("gpu_a"))
+        self.assertEqual(set(store.all()), {"gpu_a"})
+
+    def test_metrics_update_keeps_verification(self):
+        """健康的心跳不延长信任，失败时撤销信任，指标写入同一条状态"""
+        store = StateStore(self.state_dir)
+        store.record_verified("gpu_a", "gpu_a_session", host="10.0.0.8")
+        verified_at = store.get("gpu_a").verified_at
+        time.sleep(0.01)
+        store.record_metrics("gpu_a", "gpu_a_session", {"failed_checks": 0}, healthy=True)
+        self.assertIsNotNone(store.trusted("gpu_a", "gpu_a_session"))
+        self.assertEqual(store.get("gpu_a").host, "10.0.0.8")
+        self.assertEqual(store.get("gpu_a").verified_at, verified_at)
+
+        store.record_metrics("gpu_a", "gpu_a_session", {"failed_checks": 1}, healthy=False)
+        self.assertIsNone(store.trusted("gpu_a", "gpu_a_session"))
+        self.assertEqual(store.get("gpu_a").metrics, {"failed_checks": 1})
+
+        store.record_metrics("gpu_new", "gpu_new_session", {"total_checks": 1}, healthy=True)
+        self.assertIsNone(store.trusted("gpu_new", "gpu_new_session"))
+
+    def test_trust_requires_fresh_state_and_same_session(self):
+        """过期、会话被重建或会话不存在时不信任"""
+        store = StateStore(self.state_dir)
+        store.record_verified("gpu_a", "gpu_a_session")
+        self.assertIsNotNone(store.trusted("gpu_a", "gpu_a_session"))
+        self.assertIsNone(store.trusted("gpu_a", "other_session"))
+        self.assertIsNone(store.trusted("gpu_a", "gpu_a_session", ttl=-1))
+
+        self.live_session_id.return_value = "1700000999"
+        self.assertIsNone(store.trusted("gpu_a", "gpu_a_session"))
+        self.live_session_id.return_value = None
+        self.assertIsNone(store.trusted("gpu_a", "gpu_a_session"))
+
+    def test_log_compacted(self):
+        """记录数远多于服务器数时重写为每台服务器一行"""
+        store = StateStore(self.state_dir)
+        with patch.object(state_store, "COMPACT_MIN_RECORDS", 10):
+            for i in range(25):
+                store.record_metrics("gpu_a", "gpu_a_session", {"total_checks": i})
+        lines = Path(store.path).read_text(encoding="utf-8").splitlines()
+        self.assertLessEqual(len(lines), 11)
+        self.assertEqual(json.loads(lines[-1])["metrics"], {"total_checks": 24})
+        self.assertEqual(StateStore(self.state_dir).get("gpu_a").metrics, {"total_checks": 24})
+
+    def test_compaction_keeps_concurrent_appends(self):
+        """压缩期间其它进程追加的记录写入新日志，不留下临时文件"""
+        store = StateStore(self.state_dir)
+        other = StateStore(self.state_dir)
+        writers = []
+        real_mkstemp = tempfile.mkstemp
+
+        def mkstemp_with_append(*args, **kwargs):
+            # 快照开始写入时另一个实例追加记录，它要等压缩结束后写到新日志里
+            if not writers:
+                writer = threading.Thread(target=other.record_verified, args=("gpu_b", "gpu_b_session"))
+                writer.start()
+                writers.append(writer)
+                time.sleep(0.1)
+            return real_mkstemp(*args, **kwargs)
+
+        with patch.object(state_store, "COMPACT_MIN_RECORDS", 10), \
+                patch.object(state_store.tempfile, "mkstemp", side_effect=mkstemp_with_append):
+            for i in range(12):
+                store.record_metrics("gpu_a", "gpu_a_session", {"total_checks": i})
+        writers[0].join(timeout=5)
+
+        fresh = StateStore(self.state_dir)
+        self.assertEqual(fresh.get("gpu_a").metrics, {"total_checks": 11})
+        self.assertEqual(fresh.get("gpu_b").status, "ready")
+        self.assertEqual(os.listdir(self.state_dir), [state_store.STATE_FILE])
+
+
+class TestRestartUsesPersistedState(unittest.TestCase):
+    """重启后使用持久化状态测试类"""
+
+    def setUp(self):
+        self.config_path, self.store = use_temp_config(self, modules=(connect, enhanced_ssh_manager))
+        session_patch = patch.object(state_store, "live_session_id", return_value="1700000000")
+        session_patch.start()
+        self.addCleanup(session_patch.stop)
+
+    def test_recent_state_still_probed(self):
+        """最近验证过、会话也没有重建，但ssh已断开时get_status和connect仍能发现"""
+        self.store.record_verified("gpu_a", "gpu_a_session", host="10.0.0.8")
+        manager = ConnectionManager(self.config_path)
+        failed = connect.ConnectionResult(success=False, message="stop", status=ConnectionStatus.ERROR)
+        with patch.object(manager, "_check_existing_connection", return_value=True), \
+                patch.object(manager, "_verify_connection_health", return_value=False) as verify, \
+                patch.object(manager, "_create_session", return_value=failed) as create:
+            self.assertEqual(manager.get_status("gpu_a").status, ConnectionStatus.CONNECTED)
+            manager.connect("gpu_a")
+        self.assertEqual(verify.call_count, 2)
+        create.assert_called_once()
+
+    def test_get_status_probes_and_records_without_state(self):
+        """探测验证通过后写入状态"""
+        manager = ConnectionManager(self.config_path)
+        with patch.object(manager, "_check_existing_connection", return_value=True), \
+                patch.object(manager, "_verify_connection_health", return_value=True) as verify:
+            self.assertEqual(manager.get_status("gpu_a").status, ConnectionStatus.READY)
+        verify.assert_called_once()
+        self.assertEqual(self.store.get("gpu_a").host, "10.0.0.8")
+
+    def test_enhanced_manager_restores_and_probes(self):
+        """增强版管理器恢复指标和连接状态，智能连接探测通过后跳过心跳和连接流程，探测失败时照常恢复"""
+        self.store.record_verified("gpu_a", "gpu_a_session",
+                                   metrics={"total_checks": 4, "failed_checks": 1, "response_times": [0.1]})
+        manager = EnhancedSSHManager(self.config_path)
+        self.assertEqual(manager.connection_metrics["gpu_a"]["total_checks"], 4)
+        self.assertEqual(manager.connection_states["gpu_a"].stage, "initializing")
+
+        with patch.object(manager, "_detect_existing_connection", return_value="ready") as detect, \
+                patch.object(manager, "check_connection_health") as health:
+            success, message = manager.smart_connect("gpu_a")
+        self.assertTrue(success, message)
+        detect.assert_called_once()
+        health.assert_not_called()
+
+        with patch.object(manager, "_detect_existing_connection", return_value="recoverable"), \
+                patch.object(manager, "auto_recovery_connection", return_value=(True, "ok")) as recover:
+            success, message = manager.smart_connect("gpu_a")
+        self.assertTrue(success, message)
+        recover.assert_called_once()
+
+    def test_enhanced_manager_skips_missing_session(self):
+        """会话已不存在的持久化状态只恢复指标，不恢复连接状态"""
+        self.store.record_verified("gpu_a", "gpu_a_session", metrics={"total_checks": 4})
+        with patch.object(state_store, "live_session_id", return_value=None):
+            manager = EnhancedSSHManager(self.config_path)
+        self.assertEqual(manager.connection_metrics["gpu_a"]["total_checks"], 4)
+        self.assertNotIn("gpu_a", manager.connection_states)
+        with patch.object(enhanced_ssh_manager, "list_sessions", return_value={}):
+            self.assertEqual(manager.get_connection_status("gpu_a")["status"], "disconnected")
+
+
+if __name__ == '__main__':
+    unittest.main()
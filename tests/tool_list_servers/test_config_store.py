@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+ConfigStore 配置缓存测试
+测试配置只解析一次、文件变化后重新解析、只读记录以及inotify后台预解析
+"""
+
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import yaml
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from config_store import ConfigStore, FrozenDict, thaw
+
+
+class TestConfigStore(unittest.TestCase):
+    """配置缓存测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.temp_dir.name, "config.yaml")
+        self.write_config({"servers": {"server_a": {"host": "10.0.0.1", "ports": [22, 8022]}}}, mtime=1_000_000)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_config(self, config, mtime):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(config, f)
+        os.utime(self.config_path, (mtime, mtime))
+
+    def test_parse_once_until_file_changes(self):
+        """文件未变化时直接命中缓存，变化后重新解析并递增版本号"""
+        store = ConfigStore(self.config_path, watch=False)
+        first = store.get_servers()
+        self.assertIs(store.get_servers(), first)
+        self.assertEqual(store.stats["loads"], 1)
+        version = store.version
+
+        self.write_config({"servers": {"server_b": {"host": "10.0.0.2"}}}, mtime=2_000_000)
+        self.assertEqual(list(store.get_servers()), ["server_b"])
+        self.assertEqual(store.stats["loads"], 2)
+        self.assertGreater(store.version, version)
+
+    def test_records_are_read_only(self):
+        """服务器记录只读，thaw()和deepcopy返回可修改的普通对象"""
+        store = ConfigStore(self.config_path, watch=False)
+        server = store.get_server("server_a")
+        self.assertIsInstance(server, FrozenDict)
+        self.assertEqual(server["ports"], (22, 8022))
+        with self.assertRaises(TypeError):
+            server["host"] = "changed"
+
+        mutable = thaw(server)
+        mutable["host"] = "changed"
+        self.assertEqual(mutable["ports"], [22, 8022])
+        self.assertEqual(copy.deepcopy(server)["host"], "10.0.0.1")
+        self.assertEqual(json.loads(json.dumps(server))["host"], "10.0.0.1")
+        self.assertIn("10.0.0.1", yaml.safe_dump(server))
+
+    def test_missing_file_returns_empty(self):
+        """配置文件不存在时返回空配置"""
+        store = ConfigStore(os.path.join(self.temp_dir.name, "missing.yaml"), watch=False)
+        self.assertEqual(store.get_servers(), {})
+        self.assertIsNone(store.get_server("server_a"))
+
+    def test_inotify_event_triggers_background_reload(self):
+        """inotify可用时，文件写入后在后台提前解析"""
+        store = ConfigStore(self.config_path)
+        if not store.is_watching:
+            self.skipTest("inotify不可用")
+        store.get_config()
+        self.write_config({"servers": {"server_c": {}}}, mtime=3_000_000)
+
+        deadline = time.time() + 2
+        while store.stats["loads"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(store.stats["loads"], 2)
+        self.assertIn("server_c", store.get_servers())
+
+
+if __name__ == '__main__':
+    unittest.main()
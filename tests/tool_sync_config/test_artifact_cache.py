@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+部署产物缓存测试
+用本地bash执行远端探测命令，测试一致时跳过传输、不一致时只传输变化的产物以及探测失败时全部传输，
+以及zsh配置拷贝失败时如实报告
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import artifact_cache
+import enhanced_ssh_manager
+from artifact_cache import Artifact, ArtifactSyncResult, parse_probe_output, sync_artifacts
+from enhanced_ssh_manager import EnhancedSSHManager
+from pane_stream import CommandCompletion, CommandSentinel, clean_terminal_output
+from pane_transfer import PaneTransfer, TransferResult
+
+
+class FakeRemote:
+    """在本地目录中执行探测命令，传输直接写文件"""
+
+    def __init__(self, workdir, probe_ok=True):
+        self.workdir = workdir
+        self.probe_ok = probe_ok
+        self.completions = {}
+        self.sent = []
+
+    def send_wrapped_command(self, session_name, command):
+        sentinel = CommandSentinel()
+        # conftest替换了subprocess.run，这里直接用Popen
+        proc = subprocess.Popen(['bash', '-c', sentinel.wrap(command)], cwd=self.workdir,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        stdout, _ = proc.communicate()
+        output, _ = sentinel.extract_output(stdout)
+        self.completions[sentinel.token] = CommandCompletion(
+            tracked=self.probe_ok, completed=self.probe_ok,
+            exit_code=sentinel.find_exit_code(stdout.decode()),
+            output=clean_terminal_output(output))
+        return sentinel, None, 0
+
+    def wait_for_command(self, session_name, sentinel, stream, start_offset, timeout=30):
+        return self.completions[sentinel.token]
+
+    def send_bytes(self, transfer, data, remote_path, mode=None):
+        self.sent.append(remote_path)
+        with open(os.path.join(self.workdir, remote_path), 'wb') as f:
+            f.write(data)
+        return TransferResult(True, "传输完成", bytes_sent=len(data))
+
+
+class TestArtifactCache(unittest.TestCase):
+    """部署产物缓存测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.remote_dir = os.path.join(self.temp_dir.name, "remote")
+        os.mkdir(self.remote_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def sync(self, artifacts, probe_ok=True):
+        remote = FakeRemote(self.remote_dir, probe_ok)
+        with patch.object(artifact_cache, "send_wrapped_command", side_effect=remote.send_wrapped_command), \
+                patch.object(artifact_cache, "wait_for_command", side_effect=remote.wait_for_command), \
+                patch.object(PaneTransfer, "send_bytes", autospec=True, side_effect=remote.send_bytes):
+            return sync_artifacts("fake_session", artifacts), remote
+
+    def test_repeat_sync_transfers_nothing(self):
+        """首次部署全部传输，再次部署时远端一致，零传输"""
+        artifacts = [Artifact(".zshrc", b"export A=1\n"), Artifact(".p10k.zsh", b"p10k\n")]
+        first, remote = self.sync(artifacts)
+        self.assertEqual(remote.sent, [".zshrc", ".p10k.zsh"])
+        self.assertEqual(first.probe, "remote")
+
+        second, remote = self.sync(artifacts)
+        self.assertEqual(remote.sent, [])
+        self.assertEqual(second.skipped, [".zshrc", ".p10k.zsh"])
+        self.assertTrue(second.success)
+
+    def test_only_changed_artifact_transferred(self):
+        """只有远端内容不一致的产物被重新传输"""
+        self.sync([Artifact(".zshrc", b"old\n"), Artifact(".p10k.zsh", b"p10k\n")])
+        result, remote = self.sync([Artifact(".zshrc", b"new\n"), Artifact(".p10k.zsh", b"p10k\n")])
+
+        self.assertEqual(remote.sent, [".zshrc"])
+        self.assertEqual(result.skipped, [".p10k.zsh"])
+        with open(os.path.join(self.remote_dir, ".zshrc"), 'rb') as f:
+            self.assertEqual(f.read(), b"new\n")
+
+    def test_probe_failure_transfers_all(self):
+        """探测失败时不假设远端已有产物（例如容器刚重建），全部重新传输"""
+        artifact = Artifact("proftpd.tar.gz", b"\x1f\x8b binary")
+        self.sync([artifact])
+
+        result, remote = self.sync([artifact], probe_ok=False)
+        self.assertEqual(result.probe, "none")
+        self.assertEqual(remote.sent, ["proftpd.tar.gz"])
+        self.assertTrue(result.success)
+
+    def test_parse_probe_output(self):
+        """解析sha256sum和shasum的输出"""
+        digest = "0" * 64
+        output = f"{digest}  .zshrc\n{digest} *proftpd.tar.gz\nsha256sum: x: No such file\n"
+        self.assertEqual(parse_probe_output(output), {".zshrc": digest, "proftpd.tar.gz": digest})
+
+    def copy_zsh_configs(self, sync_result):
+        manager = EnhancedSSHManager.__new__(EnhancedSSHManager)
+        with patch.object(enhanced_ssh_manager, "send_wrapped_command", return_value=(None, None, 0)), \
+                patch.object(enhanced_ssh_manager, "wait_for_command"), \
+                patch.object(enhanced_ssh_manager, "sync_artifacts", return_value=sync_result), \
+                patch.object(enhanced_ssh_manager, "tmux_run") as run, \
+                patch.object(enhanced_ssh_manager.time, "sleep"):
+            run.return_value.stdout = "CONFIG_RELOAD_COMPLETE"
+            return manager._copy_zsh_configs_to_container("fake_session", "zsh")
+
+    def test_zsh_copy_reports_failures(self):
+        """zsh配置拷贝失败时不报告已是最新或成功"""
+        self.assertTrue(self.copy_zsh_configs(ArtifactSyncResult(True, skipped=[".zshrc", ".p10k.zsh"])))
+        self.assertTrue(self.copy_zsh_configs(ArtifactSyncResult(True, transferred=[".zshrc"])))
+        self.assertFalse(self.copy_zsh_configs(ArtifactSyncResult(False, failed={".zshrc": "x", ".p10k.zsh": "x"})))
+        self.assertFalse(self.copy_zsh_configs(ArtifactSyncResult(False, transferred=[".zshrc"],
+                                                                  failed={".p10k.zsh": "x"})))
+
+
+if __name__ == '__main__':
+    unittest.main()
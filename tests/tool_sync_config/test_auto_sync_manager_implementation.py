@@ -161,7 +161,7 @@ class TestAutoSyncManagerImplementation(unittest.TestCase):
             log_test_output(f"❌ ServerConfig自动同步字段测试失败: {e}", "ERROR")
             self.fail(f"ServerConfig自动同步字段测试失败: {e}")
     
-    @patch('auto_sync_manager.subprocess.run')
+    @patch('auto_sync_manager.tmux_run')
     @patch('auto_sync_manager.time.sleep')
     def test_docker_environment_integration(self, mock_sleep, mock_subprocess):
         """测试Docker环境AutoSyncManager集成（跳过，依赖外部Docker环境）"""
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+目录树监听测试
+测试inotify和轮询两种模式下的变化检测、连续事件合并、新建子目录自动监听以及watch模式下编辑后立即推送
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from fs_watch import TreeWatcher
+from sync_engine import SyncTickResult
+from sync_manager import SyncConfig, SyncManager
+
+
+class Collector:
+    """收集回调批次"""
+
+    def __init__(self):
+        self.batches = []
+        self.event = threading.Event()
+
+    def __call__(self, paths):
+        self.batches.append(set(paths))
+        self.event.set()
+
+    def wait(self, timeout=3.0):
+        found = self.event.wait(timeout)
+        self.event.clear()
+        return found
+
+
+class TestTreeWatcher(unittest.TestCase):
+    """目录树监听测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        os.makedirs(os.path.join(self.root, "src"))
+        os.makedirs(os.path.join(self.root, ".git"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, rel_path, text="x"):
+        with open(os.path.join(self.root, rel_path), 'w') as f:
+            f.write(text)
+
+    def start(self, collector, **kwargs):
+        watcher = TreeWatcher(self.root, collector, quiet_period=0.1, poll_interval=0.1, **kwargs)
+        mode = watcher.start()
+        self.addCleanup(watcher.stop)
+        return watcher, mode
+
+    def test_inotify_burst_coalesced(self):
+        """一串保存事件合并为一次回调，排除目录不触发"""
+        collector = Collector()
+        _, mode = self.start(collector)
+        if mode != "inotify":
+            self.skipTest("当前平台不支持inotify")
+
+        self.write("src/a.py")
+        self.write("src/a.py", "y")
+        self.write("src/b.py")
+        self.write(".git/index")
+        self.assertTrue(collector.wait())
+        time.sleep(0.2)
+        self.assertEqual(collector.batches, [{"src/a.py", "src/b.py"}])
+
+    def test_inotify_new_directory_watched(self):
+        """新建的子目录自动加入监听"""
+        collector = Collector()
+        _, mode = self.start(collector)
+        if mode != "inotify":
+            self.skipTest("当前平台不支持inotify")
+
+        os.makedirs(os.path.join(self.root, "pkg"))
+        self.assertTrue(collector.wait())
+        self.write("pkg/mod.py")
+        self.assertTrue(collector.wait())
+        self.assertIn("pkg/mod.py", collector.batches[-1])
+
+    def test_inotify_renamed_directory_watched(self):
+        """重命名目录后，其子目录中的写入按新路径上报"""
+        os.makedirs(os.path.join(self.root, "a", "sub"))
+        collector = Collector()
+        _, mode = self.start(collector)
+        if mode != "inotify":
+            self.skipTest("当前平台不支持inotify")
+
+        os.rename(os.path.join(self.root, "a"), os.path.join(self.root, "b"))
+        self.assertTrue(collector.wait())
+        self.write("b/sub/f.txt")
+        self.assertTrue(collector.wait())
+        time.sleep(0.2)
+        paths = set().union(*collector.batches[1:])
+        self.assertIn("b/sub/f.txt", paths)
+        self.assertNotIn("a/sub/f.txt", paths)
+
+    def test_watchers_share_threads(self):
+        """多个目录树的监听共享固定数量的线程"""
+        for i in range(10):
+            os.makedirs(os.path.join(self.root, f"tree{i}"))
+            for use_inotify in (True, False):
+                watcher = TreeWatcher(os.path.join(self.root, f"tree{i}"), Collector(), use_inotify=use_inotify)
+                watcher.start()
+                watcher.emit({"x"})
+                self.addCleanup(watcher.stop)
+        names = [thread.name for thread in threading.enumerate() if thread.name.startswith("fs-watch-")]
+        self.assertLessEqual(len(names), 3)
+
+    def test_polling_fallback(self):
+        """不使用inotify时通过stat轮询检测新增、修改和删除"""
+        self.write("src/a.py")
+        collector = Collector()
+        _, mode = self.start(collector, use_inotify=False)
+        self.assertEqual(mode, "poll")
+
+        self.write("src/new.py")
+        os.unlink(os.path.join(self.root, "src/a.py"))
+        self.assertTrue(collector.wait())
+        self.assertEqual(collector.batches[0], {"src/new.py", "src/a.py"})
+
+
+class TestWatchModeSync(unittest.TestCase):
+    """watch模式同步测试类"""
+
+    def test_edit_pushed_within_a_second(self):
+        """启动时全量同步一次，之后编辑文件不到1秒就触发推送"""
+        with tempfile.TemporaryDirectory() as root:
+            manager = SyncManager(config_path=os.path.join(root, "config.yaml"))
+            config = SyncConfig(enabled=True, local_path=root, remote_path="/srv/project")
+            ticks = []
+            pushed = threading.Event()
+
+            def fake_tick(server_name, sync_config, transport, paths=None):
+                ticks.append((time.time(), set(paths)))
+                pushed.set()
+                return SyncTickResult(success=True, transport=transport)
+
+            with patch.object(manager, "_run_sync_tick", side_effect=fake_tick):
+                manager._start_sync_thread("watch_test", config)
+                try:
+                    self.assertTrue(pushed.wait(3))
+                    self.assertEqual(ticks[0][1], {""})
+                    pushed.clear()
+
+                    saved_at = time.time()
+                    with open(os.path.join(root, "main.py"), 'w') as f:
+                        f.write("print(1)\n")
+                    self.assertTrue(pushed.wait(3))
+                    self.assertIn("main.py", ticks[-1][1])
+                    self.assertLess(ticks[-1][0] - saved_at, 1.0)
+                finally:
+                    manager._stop_sync_thread("watch_test")
+            self.assertNotIn("watch_test", manager.sync_watchers)
+
+
+if __name__ == '__main__':
+    unittest.main()
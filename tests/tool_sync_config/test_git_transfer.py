@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Git增量同步测试
+测试只传输缺少的提交和未提交的改动、分叉时需要force、没有共同提交时退回rsync以及SyncManager.git_sync的模式选择
+（本地shell代替ssh，两端都是真实的Git仓库）
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+from git_transfer import GitBundleSync, run_command
+from server_record import ServerRecord
+from sync_manager import SyncManager
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'sync', 'GIT_AUTHOR_EMAIL': 'sync@example.com',
+    'GIT_COMMITTER_NAME': 'sync', 'GIT_COMMITTER_EMAIL': 'sync@example.com',
+    'GIT_CONFIG_NOSYSTEM': '1'
+}
+
+
+def local_shell(command):
+    """用本地shell执行“远程”命令"""
+    return run_command(['sh', '-c', command])
+
+
+@unittest.skipUnless(shutil.which('git') and shutil.which('tar'), "需要git和tar")
+class TestGitBundleSync(unittest.TestCase):
+    """Git增量同步测试类"""
+
+    def setUp(self):
+        env_patch = patch.dict(os.environ, GIT_ENV)
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.remote = os.path.join(self.temp_dir.name, "remote")
+        self.local = os.path.join(self.temp_dir.name, "local")
+        os.makedirs(self.remote)
+        self.git(self.remote, 'init', '-q')
+        self.write(self.remote, "big.bin", os.urandom(1024 * 1024))
+        self.write(self.remote, "main.py", "print('v1')\n")
+        self.commit(self.remote, "initial")
+        self.git(self.temp_dir.name, 'clone', '-q', self.remote, self.local)
+
+    def git(self, cwd, *args):
+        result = run_command(['git', *args], cwd=cwd)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+        return result.stdout.decode().strip()
+
+    def write(self, repo, rel_path, content):
+        path = Path(repo, rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode()
+        path.write_bytes(content)
+
+    def commit(self, repo, message):
+        self.git(repo, 'add', '-A')
+        self.git(repo, 'commit', '-q', '-m', message)
+
+    def sync(self, **kwargs):
+        return GitBundleSync(local_shell, self.local, self.remote).sync(**kwargs)
+
+    def test_only_missing_commits_and_worktree_transferred(self):
+        """远端新提交以bundle传输，未提交改动和未跟踪文件一起同步，本地改动被stash"""
+        self.write(self.remote, "main.py", "print('v2')\n")
+        self.commit(self.remote, "v2")
+        self.write(self.remote, "main.py", "print('v3 draft')\n")
+        self.write(self.remote, "notes/todo.txt", "untracked\n")
+        self.write(self.local, "local.txt", "local work\n")
+
+        result = self.sync()
+
+        self.assertTrue(result.success, result.message)
+        self.assertEqual(result.update, "fast-forward")
+        self.assertEqual(self.git(self.local, 'rev-parse', 'HEAD'), self.git(self.remote, 'rev-parse', 'HEAD'))
+        self.assertGreater(result.bundle_bytes, 0)
+        self.assertLess(result.transferred_bytes, 64 * 1024)
+        self.assertEqual(Path(self.local, "main.py").read_text(), "print('v3 draft')\n")
+        self.assertEqual(Path(self.local, "notes/todo.txt").read_text(), "untracked\n")
+        self.assertEqual(result.untracked_files, 1)
+        self.assertFalse(Path(self.local, "local.txt").exists())
+        self.assertIn("Auto sync before remote sync", self.git(self.local, 'stash', 'list'))
+
+    def test_up_to_date_transfers_nothing(self):
+        """两端一致时不传输任何内容"""
+        result = self.sync()
+        self.assertTrue(result.success, result.message)
+        self.assertEqual((result.update, result.transferred_bytes), ("none", 0))
+
+    def test_home_relative_remote_path(self):
+        """远端路径以~/开头时在远端家目录下展开"""
+        self.write(self.remote, "main.py", "print('v2')\n")
+        self.commit(self.remote, "v2")
+        home_shell = lambda command: run_command(['env', f'HOME={self.temp_dir.name}', 'sh', '-c', command])
+        result = GitBundleSync(home_shell, self.local, "~/remote").sync()
+        self.assertTrue(result.success, result.message)
+        self.assertEqual(Path(self.local, "main.py").read_text(), "print('v2')\n")
+
+    def test_diverged_requires_force(self):
+        """本地有远端没有的提交时默认不修改本地仓库，force时reset到远端"""
+        self.write(self.remote, "main.py", "print('remote')\n")
+        self.commit(self.remote, "remote change")
+        self.write(self.local, "main.py", "print('local')\n")
+        self.commit(self.local, "local change")
+        local_head = self.git(self.local, 'rev-parse', 'HEAD')
+
+        result = self.sync()
+        self.assertFalse(result.success)
+        self.assertFalse(result.fallback)
+        self.assertEqual(self.git(self.local, 'rev-parse', 'HEAD'), local_head)
+
+        result = self.sync(force=True)
+        self.assertTrue(result.success, result.message)
+        self.assertEqual(result.update, "reset")
+        self.assertEqual(Path(self.local, "main.py").read_text(), "print('remote')\n")
+
+    def test_unrelated_history_falls_back(self):
+        """两端没有共同的提交时要求退回rsync"""
+        shutil.rmtree(self.local)
+        os.makedirs(self.local)
+        self.git(self.local, 'init', '-q')
+        self.write(self.local, "other.txt", "x")
+        self.commit(self.local, "unrelated")
+
+        result = self.sync()
+        self.assertFalse(result.success)
+        self.assertTrue(result.fallback)
+
+    def test_sync_manager_uses_git_mode(self):
+        """SyncManager.git_sync优先使用Git增量同步"""
+        self.write(self.remote, "main.py", "print('v2')\n")
+        self.commit(self.remote, "v2")
+        manager = SyncManager(config_path=os.path.join(self.temp_dir.name, "config.yaml"))
+        server = ServerRecord("git_test", {"host": "10.0.0.8", "username": "dev"})
+
+        with patch.object(manager, "load_server_config", return_value=server), \
+                patch.object(manager, "_build_ssh_command", side_effect=lambda server, command: ['sh', '-c', command]), \
+                patch.object(manager, "_sync_remote_to_local") as rsync:
+            result = manager.git_sync("git_test", self.local, self.remote)
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['mode'], 'git')
+        self.assertEqual(result['git']['update'], 'fast-forward')
+        rsync.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
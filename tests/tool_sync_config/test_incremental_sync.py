@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+增量同步引擎测试
+测试基于清单的变化检测、只推送变化文件、推送失败不写回清单、按路径增量扫描以及同步统计
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import sync_engine
+from server_record import ServerRecord
+from sync_engine import IncrementalSyncEngine
+from sync_manager import SyncConfig, SyncManager
+
+
+class FakeRsync:
+    """记录rsync推送的文件列表和远程删除命令"""
+
+    def __init__(self, returncode=0):
+        self.returncode = returncode
+        self.pushed = []
+        self.removed = []
+
+    def __call__(self, command, **kwargs):
+        if command[0] == 'rsync':
+            self.pushed.append(sorted(kwargs['input'].decode().split('\0')))
+            stdout = b"Total bytes sent: 1,234\n"
+            return subprocess.CompletedProcess(command, self.returncode, stdout, b"connection refused")
+        self.removed.append(command[-1])
+        return subprocess.CompletedProcess(command, 0, b"", b"")
+
+
+class TestIncrementalSyncEngine(unittest.TestCase):
+    """增量同步引擎测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.local = os.path.join(self.temp_dir.name, "project")
+        self.manifest = os.path.join(self.temp_dir.name, "manifest.json")
+        self.server = ServerRecord("sync_test", {"host": "10.0.0.8", "username": "dev"})
+        os.makedirs(os.path.join(self.local, "src"))
+        os.makedirs(os.path.join(self.local, ".git"))
+        self.write("src/main.py", "print('v1')\n")
+        self.write("README.md", "readme\n")
+        self.write(".git/HEAD", "ref: refs/heads/main\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, rel_path, text):
+        with open(os.path.join(self.local, rel_path), 'w') as f:
+            f.write(text)
+
+    def engine(self):
+        return IncrementalSyncEngine("sync_test", self.local, "/home/dev/project", self.manifest)
+
+    def run_sync(self, engine, fake, paths=None):
+        with patch.object(sync_engine.subprocess, "run", side_effect=fake), \
+                patch.object(sync_engine, "get_ssh_pool") as pool:
+            pool.return_value.rsync_shell.return_value = "ssh -p 22"
+            pool.return_value.ssh_command.side_effect = lambda server, command: ['ssh', command]
+            return engine.sync(self.server, paths=paths)
+
+    def test_only_changes_pushed_and_manifest_persisted(self):
+        """首轮推送全部文件，之后只推送变化，删除同步到远端；清单在新实例中仍有效"""
+        fake = FakeRsync()
+        first = self.run_sync(self.engine(), fake)
+        self.assertEqual(fake.pushed, [["README.md", "src/main.py"]])
+        self.assertEqual((first.files, first.wire_bytes), (2, 1234))
+
+        engine = self.engine()
+        idle = self.run_sync(engine, fake)
+        self.assertEqual(len(fake.pushed), 1)
+        self.assertEqual((idle.files, idle.hashed, idle.scanned), (0, 0, 2))
+
+        self.write("src/main.py", "print('v2')\n")
+        os.unlink(os.path.join(self.local, "README.md"))
+        result = self.run_sync(engine, fake)
+        self.assertEqual(fake.pushed[-1], ["src/main.py"])
+        self.assertEqual(result.deleted, 1)
+        self.assertIn("/home/dev/project/README.md", fake.removed[-1])
+
+    def test_home_relative_delete_expands(self):
+        """远端目录以~/开头时删除命令保留波浪号展开"""
+        fake = FakeRsync()
+        engine = IncrementalSyncEngine("sync_test", self.local, "~/project", self.manifest)
+        self.run_sync(engine, fake)
+        os.unlink(os.path.join(self.local, "README.md"))
+        self.run_sync(engine, fake)
+        self.assertEqual(fake.removed[-1], "rm -f -- ~/project/README.md")
+
+    def test_touch_without_content_change_is_not_pushed(self):
+        """只改mtime的文件不推送"""
+        fake = FakeRsync()
+        engine = self.engine()
+        self.run_sync(engine, fake)
+        path = os.path.join(self.local, "README.md")
+        os.utime(path, (1_000_000, 1_000_000))
+        result = self.run_sync(engine, fake)
+        self.assertEqual((result.files, result.hashed), (0, 1))
+        self.assertEqual(len(fake.pushed), 1)
+
+    def test_failed_push_is_retried(self):
+        """推送失败时不写回清单，下一轮重新推送"""
+        engine = self.engine()
+        failed = self.run_sync(engine, FakeRsync(returncode=12))
+        self.assertFalse(failed.success)
+        self.assertIn("connection refused", failed.error)
+
+        fake = FakeRsync()
+        self.run_sync(engine, fake)
+        self.assertEqual(fake.pushed, [["README.md", "src/main.py"]])
+
+    def test_scan_given_paths_only(self):
+        """指定路径时只检查这些路径"""
+        engine = self.engine()
+        self.run_sync(engine, FakeRsync())
+        self.write("src/new.py", "x = 1\n")
+        self.write("README.md", "changed\n")
+
+        changes = engine.scan(["src"])
+        self.assertEqual(list(changes.changed), ["src/new.py"])
+        self.assertEqual(changes.scanned, 2)
+        self.assertEqual(engine.scan([".git/HEAD"]).scanned, 0)
+
+    def test_sync_manager_records_stats(self):
+        """SyncManager记录每轮的文件数、字节数和耗时"""
+        manager = SyncManager(config_path=os.path.join(self.temp_dir.name, "config.yaml"))
+        manager.sync_engines["sync_test"] = self.engine()
+        config = SyncConfig(enabled=True, local_path=self.local, remote_path="/home/dev/project")
+
+        with patch.object(manager, "load_server_config", return_value=self.server), \
+                patch.object(sync_engine.subprocess, "run", side_effect=FakeRsync()), \
+                patch.object(sync_engine, "get_ssh_pool"):
+            manager._rsync_sync("sync_test", config)
+            manager._rsync_sync("sync_test", config)
+
+        stats = manager._get_sync_stats("sync_test")
+        self.assertEqual((stats["ticks"], stats["pushes"], stats["files"]), (2, 1, 2))
+        self.assertEqual(stats["bytes"], len("print('v1')\n") + len("readme\n"))
+        self.assertEqual(stats["last_tick"]["files"], 0)
+        self.assertEqual(stats["tracked_files"], 2)
+        self.assertEqual(len(stats["history"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
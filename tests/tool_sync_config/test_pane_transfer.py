@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+会话文件传输测试
+用本地bash扮演会话另一端，测试分块粘贴、压缩、sha256校验与原子替换、校验失败清理以及块大小自适应
+"""
+
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import pane_transfer
+from pane_stream import CommandCompletion, CommandSentinel, clean_terminal_output
+from pane_transfer import (
+    MAX_CHUNK_BYTES, MIN_CHUNK_BYTES, PaneTransfer, next_chunk_size, parse_checksum
+)
+
+
+class FakeSession:
+    """模拟tmux会话：包裹后的命令交给本地bash执行，粘贴的数据在Ctrl-D时作为stdin送入"""
+
+    def __init__(self, workdir, corrupt=False):
+        self.workdir = workdir
+        self.corrupt = corrupt
+        self.buffers = {}
+        self.pasted = b''
+        self.pending = None
+        self.completions = {}
+        self.commands = []
+
+    def execute(self, sentinel, command, stdin=b''):
+        # conftest替换了subprocess.run，这里直接用Popen
+        proc = subprocess.Popen(['bash', '-c', sentinel.wrap(command)], cwd=self.workdir,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        stdout, _ = proc.communicate(stdin)
+        output, _ = sentinel.extract_output(stdout)
+        self.completions[sentinel.token] = CommandCompletion(
+            tracked=True, completed=True, exit_code=sentinel.find_exit_code(stdout.decode()),
+            via="stream", output=clean_terminal_output(output))
+
+    def send_wrapped_command(self, session_name, command):
+        sentinel = CommandSentinel()
+        self.commands.append(command)
+        if 'base64 -d' in command:
+            self.pending = (sentinel, command)
+        else:
+            self.execute(sentinel, command)
+        return sentinel, None, 0
+
+    def wait_for_command(self, session_name, sentinel, stream, start_offset, timeout=30):
+        return self.completions[sentinel.token]
+
+    def tmux_run(self, cmd, **kwargs):
+        if cmd[1] == 'load-buffer':
+            with open(cmd[-1], 'rb') as f:
+                self.buffers[cmd[3]] = f.read()
+        elif cmd[1] == 'paste-buffer':
+            self.pasted = self.buffers.pop(cmd[4])
+            if self.corrupt:
+                self.pasted = self.pasted.replace(b'A', b'B', 1)
+        elif cmd[-1] == 'C-d':
+            sentinel, command = self.pending
+            self.execute(sentinel, command, self.pasted)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    def patches(self):
+        return [
+            patch.object(pane_transfer, 'send_wrapped_command', side_effect=self.send_wrapped_command),
+            patch.object(pane_transfer, 'wait_for_command', side_effect=self.wait_for_command),
+            patch.object(pane_transfer, 'wait_for_output', return_value=True),
+            patch.object(pane_transfer, 'tmux_run', side_effect=self.tmux_run),
+        ]
+
+
+class TestPaneTransfer(unittest.TestCase):
+    """会话文件传输测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.workdir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def send(self, data, remote_path, corrupt=False, **kwargs):
+        session = FakeSession(self.workdir, corrupt=corrupt)
+        patches = session.patches()
+        for p in patches:
+            p.start()
+        try:
+            return PaneTransfer("fake_session").send_bytes(data, remote_path, **kwargs), session
+        finally:
+            for p in patches:
+                p.stop()
+
+    def test_incompressible_data_multiple_chunks(self):
+        """不可压缩的数据原样分多块发送，校验后出现在目标路径，不留临时文件"""
+        data = os.urandom(300 * 1024)
+        result, session = self.send(data, "proftpd.tar.gz")
+
+        self.assertTrue(result.success, result.message)
+        self.assertFalse(result.compressed)
+        self.assertGreaterEqual(result.chunks, 2)
+        with open(os.path.join(self.workdir, "proftpd.tar.gz"), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.workdir), ["proftpd.tar.gz"])
+        # 每块只有一次接收命令，不再逐行echo
+        self.assertEqual(sum('base64 -d' in command for command in session.commands), result.chunks)
+
+    def test_compressible_data_and_mode(self):
+        """文本文件压缩传输，远端解压并设置权限"""
+        data = b"export ZSH_THEME=powerlevel10k\n" * 2000
+        result, _ = self.send(data, ".zshrc", mode="600")
+
+        self.assertTrue(result.success, result.message)
+        self.assertTrue(result.compressed)
+        self.assertLess(result.wire_bytes, len(data) // 10)
+        target = os.path.join(self.workdir, ".zshrc")
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(stat.S_IMODE(os.stat(target).st_mode), 0o600)
+
+    def test_checksum_mismatch_keeps_target_and_cleans_up(self):
+        """数据损坏时校验失败：目标文件保持原样，临时文件被删除"""
+        target = os.path.join(self.workdir, "proftpd.tar.gz")
+        with open(target, 'wb') as f:
+            f.write(b"old")
+
+        result, _ = self.send(os.urandom(4096), "proftpd.tar.gz", corrupt=True)
+
+        self.assertFalse(result.success)
+        self.assertIn("sha256", result.message)
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(os.listdir(self.workdir), ["proftpd.tar.gz"])
+
+    def test_next_chunk_size_adapts_within_bounds(self):
+        """块大小随吞吐调整，并限制在上下限之间"""
+        self.assertEqual(next_chunk_size(64 * 1024, 0.5), 128 * 1024)
+        self.assertEqual(next_chunk_size(64 * 1024, 100), MIN_CHUNK_BYTES)
+        self.assertEqual(next_chunk_size(1024 * 1024, 0.01), MAX_CHUNK_BYTES)
+        self.assertEqual(parse_checksum("sha256=" + "a" * 64), "a" * 64)
+        self.assertIsNone(parse_checksum("sha256="))
+
+
+if __name__ == '__main__':
+    unittest.main()
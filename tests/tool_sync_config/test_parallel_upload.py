@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+并行上传测试
+测试上传单元划分、多通道上传（本地shell代替ssh，真实执行tar解包和cat写入）、失败报告以及同步引擎对大批次的切换
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import sync_engine
+from parallel_upload import ParallelUploader, plan_upload, remote_quote
+from server_record import ServerRecord
+from sync_engine import IncrementalSyncEngine
+
+
+def local_shell(command):
+    """用本地shell执行“远程”命令"""
+    return ['sh', '-c', command]
+
+
+@unittest.skipUnless(shutil.which('tar'), "需要tar")
+class TestParallelUpload(unittest.TestCase):
+    """并行上传测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.local = os.path.join(self.temp_dir.name, "local")
+        self.remote = os.path.join(self.temp_dir.name, "remote")
+        self.files = {}
+        for i in range(120):
+            self.write(f"pkg{i % 6}/mod{i}.py", f"value = {i}\n")
+        self.write("assets/model.bin", os.urandom(64 * 1024))
+        self.write("assets/data.bin", os.urandom(48 * 1024))
+        os.chmod(os.path.join(self.local, "pkg0/mod0.py"), 0o755)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, rel_path, content):
+        path = Path(self.local, rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode()
+        path.write_bytes(content)
+        self.files[rel_path] = len(content)
+
+    def test_plan_upload(self):
+        """大文件单独上传，小文件打包且包数不少于通道数，按大小从大到小排列"""
+        units = plan_upload(self.files, streams=4, large_file_bytes=32 * 1024)
+        large = [unit for unit in units if unit.kind == 'file']
+        bundles = [unit for unit in units if unit.kind == 'tar']
+        self.assertEqual(sorted(unit.paths[0] for unit in large), ["assets/data.bin", "assets/model.bin"])
+        self.assertGreaterEqual(len(bundles), 4)
+        self.assertEqual(sum(len(unit.paths) for unit in bundles), 120)
+        self.assertEqual([unit.bytes for unit in units], sorted((unit.bytes for unit in units), reverse=True))
+
+    def test_upload_tree(self):
+        """所有文件按相对路径写到远端，权限保留，不留下临时文件，报告吞吐量和延迟"""
+        uploader = ParallelUploader(local_shell, streams=4, large_file_bytes=32 * 1024)
+        report = uploader.upload(self.local, self.remote, self.files)
+
+        self.assertEqual(report.errors, [])
+        self.assertEqual((report.files, report.bytes), (122, sum(self.files.values())))
+        self.assertEqual((report.streams, report.large_files), (4, 2))
+        self.assertEqual(len(report.latencies), 122)
+        for rel_path in self.files:
+            self.assertEqual(Path(self.remote, rel_path).read_bytes(), Path(self.local, rel_path).read_bytes())
+        self.assertEqual(os.stat(os.path.join(self.remote, "pkg0/mod0.py")).st_mode & 0o777, 0o755)
+        self.assertFalse(list(Path(self.remote).rglob("*.part")))
+
+        summary = report.to_dict()
+        self.assertGreater(summary['throughput'], 0)
+        self.assertLessEqual(summary['latency']['p50'], summary['latency']['max'])
+
+    def test_vanished_file_skipped(self):
+        """扫描后被删除的文件跳过，不影响同一个包里的其它文件"""
+        files = dict(self.files)
+        os.unlink(os.path.join(self.local, "pkg1/mod1.py"))
+        report = ParallelUploader(local_shell, streams=2).upload(self.local, self.remote, files)
+        self.assertEqual(report.errors, [])
+        self.assertEqual((report.files, report.skipped), (121, 1))
+
+    def test_failed_units_reported(self):
+        """远端命令失败时记录错误"""
+        uploader = ParallelUploader(lambda command: ['sh', '-c', 'cat >/dev/null; echo denied >&2; exit 3'])
+        report = uploader.upload(self.local, self.remote, self.files)
+        self.assertEqual(report.files, 0)
+        self.assertTrue(report.errors)
+        self.assertIn("denied", report.errors[0])
+
+    def test_home_relative_remote_path(self):
+        """远端路径以~/开头时在远端家目录下展开，不会解包到名为~的目录"""
+        self.assertEqual(remote_quote("~/my proj/a.py"), "~/'my proj/a.py'")
+        self.assertEqual(remote_quote("/srv/~x"), "'/srv/~x'")
+        home = os.path.join(self.temp_dir.name, "home")
+        os.makedirs(home)
+        uploader = ParallelUploader(lambda command: ['env', f'HOME={home}', 'sh', '-c', command],
+                                    streams=2, large_file_bytes=32 * 1024)
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            report = uploader.upload(self.local, "~/proj", self.files)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(report.errors, [])
+        self.assertTrue(os.path.exists(os.path.join(home, "proj", "pkg0", "mod0.py")))
+        self.assertTrue(os.path.exists(os.path.join(home, "proj", "assets", "model.bin")))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir.name, "~")))
+
+    def test_engine_uses_parallel_for_large_batches(self):
+        """变化文件数达到阈值时同步引擎改用并行上传"""
+        engine = IncrementalSyncEngine("parallel_test", self.local, self.remote,
+                                       os.path.join(self.temp_dir.name, "manifest.json"))
+        server = ServerRecord("parallel_test", {"host": "10.0.0.8", "username": "dev"})
+        with patch.object(sync_engine, "PARALLEL_MIN_FILES", 100), \
+                patch.object(sync_engine, "get_ssh_pool") as pool:
+            pool.return_value.ssh_command.side_effect = lambda server, command: local_shell(command)
+            result = engine.sync(server)
+
+        self.assertTrue(result.success, result.error)
+        self.assertEqual((result.transport, result.files), ("parallel", 122))
+        self.assertEqual(result.upload['files'], 122)
+        self.assertTrue(os.path.exists(os.path.join(self.remote, "assets/model.bin")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+同步规则测试
+测试包含/排除模式的匹配语义、遍历时剪掉被排除的目录、增量同步按规则推送以及规则变化后不误删远端文件
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import path_filter
+import sync_engine
+from path_filter import PathFilter, compile_path_filter
+from server_record import ServerRecord
+from sync_engine import IncrementalSyncEngine
+
+
+class TestPathFilter(unittest.TestCase):
+    """同步规则测试类"""
+
+    def test_name_and_path_patterns(self):
+        """不含/的模式匹配任意一级名称，含/的模式从根目录匹配"""
+        rules = PathFilter(exclude_patterns=["node_modules", "*.pyc", "build/", "/docs/*.md", "src/**/gen"])
+        self.assertTrue(rules.excludes_dir("web/node_modules"))
+        self.assertFalse(rules.includes_file("pkg/__init__.pyc"))
+        self.assertTrue(rules.excludes_dir("build"))
+        self.assertTrue(rules.includes_file("build"))  # build/ 只匹配目录
+        self.assertFalse(rules.includes_file("docs/index.md"))
+        self.assertTrue(rules.includes_file("docs/api/index.md"))
+        self.assertTrue(rules.excludes_dir("src/gen"))
+        self.assertTrue(rules.excludes_dir("src/a/b/gen"))
+        self.assertFalse(rules.matches("web/node_modules/react/index.js"))
+        self.assertTrue(rules.matches("web/src/index.js"))
+
+    def test_include_patterns_apply_to_files(self):
+        """包含模式只作用于文件，目录照常进入"""
+        rules = PathFilter(include_patterns=["*.py", "config/*.yaml"], exclude_patterns=["test_*.py"])
+        self.assertFalse(rules.excludes_dir("pkg"))
+        self.assertTrue(rules.includes_file("pkg/mod.py"))
+        self.assertFalse(rules.includes_file("pkg/test_mod.py"))
+        self.assertTrue(rules.includes_file("config/app.yaml"))
+        self.assertFalse(rules.includes_file("deploy/app.yaml"))
+        self.assertFalse(rules.includes_file("README.md"))
+
+    def test_glob_details(self):
+        """* 和 ? 不跨越 /，字符类和 [!...] 取反"""
+        rules = PathFilter(exclude_patterns=["a/*.log", "?.tmp", "[!x]y.bin"])
+        self.assertFalse(rules.includes_file("a/out.log"))
+        self.assertTrue(rules.includes_file("a/b/out.log"))
+        self.assertFalse(rules.includes_file("z/1.tmp"))
+        self.assertTrue(rules.includes_file("12.tmp"))
+        self.assertFalse(rules.includes_file("ay.bin"))
+        self.assertTrue(rules.includes_file("xy.bin"))
+
+    def test_normalize_and_shared_instances(self):
+        """空白、注释和重复项被去掉，相同规则共享编译结果"""
+        rules = compile_path_filter(None, [" .git ", "", "# 注释", ".git", "*.pyc"])
+        self.assertEqual(rules.exclude_patterns, (".git", "*.pyc"))
+        self.assertIs(rules, compile_path_filter([], [".git", "*.pyc"]))
+        self.assertEqual(rules.sftp_ignore(), [".git", "*.pyc"])
+
+    def test_walk_prunes_excluded_directories(self):
+        """被排除的目录不进入遍历"""
+        with tempfile.TemporaryDirectory() as root:
+            for rel_dir in ("src", "node_modules/react/lib", "src/node_modules/x"):
+                os.makedirs(os.path.join(root, rel_dir))
+            for rel_path in ("src/a.py", "src/a.pyc", "node_modules/react/lib/index.js",
+                             "src/node_modules/x/y.js", "README.md"):
+                Path(root, rel_path).write_text("x")
+
+            scanned = []
+            real_scandir = os.scandir
+
+            def counting_scandir(path):
+                if str(path).startswith(root):
+                    scanned.append(os.path.relpath(path, root))
+                return real_scandir(path)
+
+            rules = PathFilter(exclude_patterns=["node_modules", "*.pyc"])
+            with patch.object(path_filter.os, "scandir", side_effect=counting_scandir):
+                files = sorted(rel_path for rel_path, _ in rules.walk(root))
+            self.assertEqual(files, ["README.md", "src/a.py"])
+            self.assertEqual(sorted(scanned), [".", "src"])
+
+
+class TestSyncEngineRules(unittest.TestCase):
+    """增量同步按规则推送测试类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.local = os.path.join(self.temp_dir.name, "project")
+        self.manifest = os.path.join(self.temp_dir.name, "manifest.json")
+        self.server = ServerRecord("rules_test", {"host": "10.0.0.8", "username": "dev"})
+        os.makedirs(os.path.join(self.local, "node_modules", "pkg"))
+        os.makedirs(os.path.join(self.local, "dist"))
+        for rel_path in ("main.py", "main.pyc", "node_modules/pkg/index.js", "dist/app.js"):
+            Path(self.local, rel_path).write_text("x")
+        self.pushed = []
+        self.removed = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def fake_run(self, command, **kwargs):
+        if command[0] == 'rsync':
+            self.pushed.append(sorted(kwargs['input'].decode().split('\0')))
+        else:
+            self.removed.append(command[-1])
+        return subprocess.CompletedProcess(command, 0, b"", b"")
+
+    def run_sync(self, engine, paths=None):
+        with patch.object(sync_engine.subprocess, "run", side_effect=self.fake_run), \
+                patch.object(sync_engine, "get_ssh_pool") as pool:
+            pool.return_value.ssh_command.side_effect = lambda server, command: ['ssh', command]
+            return engine.sync(self.server, paths=paths)
+
+    def engine(self, exclude_patterns):
+        return IncrementalSyncEngine("rules_test", self.local, "/srv/project", self.manifest,
+                                     exclude_patterns=exclude_patterns)
+
+    def test_excluded_files_not_pushed(self):
+        """排除的文件和目录不推送，监听到的排除路径也不推送"""
+        engine = self.engine(["node_modules", "*.pyc"])
+        self.run_sync(engine)
+        self.assertEqual(self.pushed, [["dist/app.js", "main.py"]])
+
+        Path(self.local, "node_modules/pkg/index.js").write_text("y")
+        result = self.run_sync(engine, ["node_modules/pkg/index.js", "main.pyc"])
+        self.assertEqual((result.files, result.scanned), (0, 0))
+
+    def test_newly_excluded_files_kept_on_remote(self):
+        """规则变化后被排除的文件只移出清单，不删除远端文件"""
+        self.run_sync(self.engine(["node_modules", "*.pyc"]))
+        engine = self.engine(["node_modules", "*.pyc", "dist/"])
+        result = self.run_sync(engine)
+        self.assertEqual((result.files, result.deleted), (0, 0))
+        self.assertEqual(self.removed, [])
+        self.assertEqual(engine.file_count, 1)
+
+        os.unlink(os.path.join(self.local, "main.py"))
+        result = self.run_sync(engine)
+        self.assertEqual(result.deleted, 1)
+        self.assertIn("/srv/project/main.py", self.removed[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+SSH ControlMaster连接池测试
+测试master的建立与复用、健康检查缓存、建立失败时回退到直接连接以及断开时清理
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import ssh_pool
+from server_record import ServerRecord
+from ssh_pool import SSHControlPool, control_path
+
+
+class FakeSSH:
+    """模拟ssh：-M时创建控制套接字文件，-O exit时删除"""
+
+    def __init__(self, master_ok=True):
+        self.master_ok = master_ok
+        self.calls = []
+
+    def __call__(self, command, **kwargs):
+        self.calls.append(command)
+        path = next((arg.split('=', 1)[1] for arg in command if arg.startswith('ControlPath=')), None)
+        if '-M' in command and self.master_ok:
+            open(path, 'w').close()
+            return subprocess.CompletedProcess(command, 0)
+        if '-M' in command:
+            return subprocess.CompletedProcess(command, 255)
+        if command[1:3] == ['-O', 'exit'] and os.path.exists(path):
+            os.unlink(path)
+        return subprocess.CompletedProcess(command, 0)
+
+
+class TestSSHControlPool(unittest.TestCase):
+    """ControlMaster连接池测试类"""
+
+    def setUp(self):
+        self.server = ServerRecord(f"pool_test_{uuid.uuid4().hex[:8]}",
+                                   {"host": "10.0.0.5", "username": "dev", "port": 2222})
+        self.path = control_path(self.server.name)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def test_master_started_once_and_reused(self):
+        """首次使用建立master，之后的命令复用同一个ControlPath"""
+        fake = FakeSSH()
+        pool = SSHControlPool()
+        with patch.object(ssh_pool.subprocess, "run", side_effect=fake):
+            first = pool.ssh_command(self.server, "uptime")
+            second = pool.ssh_command(self.server, "ls")
+            rsync_shell = pool.rsync_shell(self.server)
+
+        self.assertEqual(sum('-M' in call for call in fake.calls), 1)
+        self.assertIn(f"ControlPath={self.path}", first)
+        self.assertEqual(first[-2:], ["dev@10.0.0.5", "uptime"])
+        self.assertEqual(second[-1], "ls")
+        self.assertIn(f"ControlPath={self.path}", rsync_shell)
+        self.assertTrue(rsync_shell.startswith("ssh -p 2222 "))
+        self.assertEqual(pool.stats["started"], 1)
+        self.assertEqual(pool.stats["reused"], 2)
+
+    def test_fallback_to_direct_connection(self):
+        """master建立失败时直接连接，并且在重试间隔内不再尝试"""
+        fake = FakeSSH(master_ok=False)
+        pool = SSHControlPool()
+        with patch.object(ssh_pool.subprocess, "run", side_effect=fake):
+            command = pool.scp_command(self.server, "/tmp/a.tar.gz", "/tmp/")
+            pool.scp_command(self.server, "/tmp/b.tar.gz", "/tmp/")
+
+        self.assertFalse(any(arg.startswith("ControlPath=") for arg in command))
+        self.assertEqual(command[:3], ["scp", "-P", "2222"])
+        self.assertEqual(sum('-M' in call for call in fake.calls), 1)
+        self.assertEqual(pool.stats["direct"], 2)
+
+    def test_close_removes_master(self):
+        """断开时发送-O exit并删除控制套接字"""
+        fake = FakeSSH()
+        pool = SSHControlPool()
+        with patch.object(ssh_pool.subprocess, "run", side_effect=fake):
+            pool.acquire(self.server)
+            self.assertTrue(os.path.exists(self.path))
+            self.assertTrue(pool.close(self.server.name))
+            self.assertFalse(pool.close(self.server.name))
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIn(['ssh', '-O', 'exit', '-o', f'ControlPath={self.path}', 'dev@10.0.0.5'], fake.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+同步调度器测试
+测试多台服务器共享少量工作线程、同一服务器不并发、执行期间的变化合并、公平调度、失败重试以及全局带宽限制
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# 添加python目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
+
+import sync_scheduler
+from sync_scheduler import BandwidthLimiter, SyncScheduler
+
+
+class Recorder:
+    """记录每台服务器的执行批次和并发情况"""
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.runs = []
+        self.running = {}
+        self.max_parallel_per_key = 0
+        self.done = threading.Event()
+        self.expected = None
+
+    def runner(self, key, results=None):
+        def run(paths):
+            with self.lock:
+                self.running[key] = self.running.get(key, 0) + 1
+                self.max_parallel_per_key = max(self.max_parallel_per_key, self.running[key])
+            time.sleep(self.duration)
+            with self.lock:
+                self.running[key] -= 1
+                self.runs.append((key, set(paths)))
+                if self.expected is not None and len(self.runs) >= self.expected:
+                    self.done.set()
+            success = results.pop(0) if results else True
+            return SimpleNamespace(success=success)
+        return run
+
+
+class TestSyncScheduler(unittest.TestCase):
+    """同步调度器测试类"""
+
+    def test_many_servers_few_threads(self):
+        """50台服务器只用max_workers个线程"""
+        scheduler = SyncScheduler(max_workers=4)
+        recorder = Recorder(duration=0.01)
+        recorder.expected = 50
+        for i in range(50):
+            scheduler.register(f"server{i}", recorder.runner(f"server{i}"))
+            scheduler.submit(f"server{i}")
+
+        self.assertTrue(recorder.done.wait(5))
+        self.assertEqual(scheduler.thread_count, 4)
+        self.assertEqual({key for key, _ in recorder.runs}, {f"server{i}" for i in range(50)})
+        self.assertTrue(all(paths == {""} for _, paths in recorder.runs))
+
+    def test_one_sync_per_server_and_changes_merged(self):
+        """同一台服务器不并发执行，执行期间提交的变化合并为下一批"""
+        scheduler = SyncScheduler(max_workers=4)
+        recorder = Recorder(duration=0.2)
+        recorder.expected = 2
+        scheduler.register("gpu", recorder.runner("gpu"))
+        scheduler.submit("gpu", ["a.py"])
+        time.sleep(0.05)
+        scheduler.submit("gpu", ["b.py"])
+        scheduler.submit("gpu", ["c.py"])
+
+        self.assertTrue(recorder.done.wait(3))
+        self.assertEqual(recorder.max_parallel_per_key, 1)
+        self.assertEqual([paths for _, paths in recorder.runs], [{"a.py"}, {"b.py", "c.py"}])
+
+    def test_busy_server_does_not_starve_others(self):
+        """持续变化的服务器在执行完后排到队尾，其它服务器及时得到执行"""
+        scheduler = SyncScheduler(max_workers=1)
+        recorder = Recorder(duration=0.05)
+        stop = threading.Event()
+
+        def busy(paths):
+            result = recorder.runner("busy")(paths)
+            if not stop.is_set():
+                scheduler.submit("busy", ["hot.py"])
+            return result
+
+        scheduler.register("busy", busy)
+        scheduler.register("quiet", recorder.runner("quiet"))
+        scheduler.submit("busy", ["hot.py"])
+        time.sleep(0.02)
+        scheduler.submit("quiet", ["cold.py"])
+        time.sleep(0.3)
+        stop.set()
+
+        keys = [key for key, _ in recorder.runs]
+        self.assertIn("quiet", keys)
+        self.assertLessEqual(keys.index("quiet"), 2)
+
+    def test_failed_run_retried_with_paths(self):
+        """失败后按重试间隔重新执行，保留失败批次的路径"""
+        scheduler = SyncScheduler(max_workers=2, retry_delay=0.1)
+        recorder = Recorder()
+        recorder.expected = 2
+        scheduler.register("gpu", recorder.runner("gpu", results=[False, True]))
+        scheduler.submit("gpu", ["a.py"])
+
+        self.assertTrue(recorder.done.wait(3))
+        self.assertEqual([paths for _, paths in recorder.runs], [{"a.py"}, {"a.py"}])
+        self.assertEqual(scheduler.job_stats("gpu")["failures"], 1)
+
+    def test_cancelled_job_not_rescheduled(self):
+        """取消后不再执行定期扫描"""
+        scheduler = SyncScheduler(max_workers=1)
+        recorder = Recorder()
+        recorder.expected = 1
+        scheduler.register("gpu", recorder.runner("gpu"), interval=0.05)
+        scheduler.submit("gpu")
+        self.assertTrue(recorder.done.wait(3))
+        scheduler.cancel("gpu")
+        time.sleep(0.2)
+        self.assertLessEqual(len(recorder.runs), 2)
+        self.assertIsNone(scheduler.job_stats("gpu"))
+
+    def test_bandwidth_limiter(self):
+        """令牌桶：本次申请不预先等待（允许透支），之后的申请按欠额等待"""
+        limiter = BandwidthLimiter(rate=100 * 1024)
+        with patch.object(sync_scheduler.time, "sleep") as sleep:
+            self.assertEqual(limiter.acquire(100 * 1024), 0.0)
+            self.assertEqual(limiter.acquire(50 * 1024), 0.0)
+            wait = limiter.acquire(10 * 1024)
+        self.assertAlmostEqual(wait, 0.5, delta=0.05)
+        sleep.assert_called_once()
+        self.assertEqual(limiter.rsync_bwlimit(), 100)
+        self.assertIsNone(BandwidthLimiter(0).rsync_bwlimit())
+        self.assertEqual(BandwidthLimiter(0).acquire(10 ** 9), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+服务器测试夹具 - 临时配置文件和状态存储
+
+1. GPU_A_CONFIG：单台ssh直连的script_based服务器配置
+2. use_temp_config：在临时目录中写入配置、创建状态存储，并替换指定模块的get_state_store
+"""
+
+import os
+import sys
+import tempfile
+from typing import Iterable, Tuple
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../python')))
+
+from state_store import StateStore
+
+GPU_A_CONFIG = """servers:
+  gpu_a:
+    host: 10.0.0.8
+    username: dev
+    port: 22
+    type: script_based
+    specs:
+      connection:
+        tool: ssh
+"""
+
+
+def use_temp_config(test: TestCase, config: str = GPU_A_CONFIG, modules: Iterable = ()) -> Tuple[str, StateStore]:
+    """
+    为测试准备临时配置文件和状态存储，清理动作注册在test上
+
+    Args:
+        test: 当前测试用例（一般在setUp中调用）
+        config: 配置文件内容
+        modules: 需要改用临时状态存储的模块（替换其get_state_store）
+
+    Returns:
+        (配置文件路径, 状态存储)
+    """
+    temp_dir = tempfile.TemporaryDirectory()
+    test.addCleanup(temp_dir.cleanup)
+    config_path = os.path.join(temp_dir.name, "config.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(config)
+    store = StateStore(os.path.join(temp_dir.name, "state"))
+    for module in modules:
+        patcher = patch.object(module, "get_state_store", return_value=store)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return config_path, store